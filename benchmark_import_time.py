@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Import-time / startup benchmark for the CLI entry points
+
+Runs each entry point with --help in a fresh interpreter (several times, best run wins)
+and reports wall-clock startup time against the sub-second target. Entry points that exit
+nonzero are reported as FAIL, and the script exits nonzero if any entry point fails or is
+slow. With --importtime, also prints the slowest imports from `python -X importtime` for
+each module.
+
+Usage:
+    python benchmark_import_time.py
+    python benchmark_import_time.py --runs 5 --importtime --top 15
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent
+
+TARGET_SECONDS = 1.0
+
+# (label, interpreter arguments)
+ENTRY_POINTS = [
+    ('step1_extract.main --help', ['-m', 'step1_extract.main', '--help']),
+    ('step3_mapping.main --help', ['-m', 'step3_mapping.main', '--help']),
+    ('step4_sql.generate_receipt_sql --help', ['-m', 'step4_sql.generate_receipt_sql', '--help']),
+    ('workflow.py --help', ['workflow.py', '--help']),
+]
+
+# Modules whose import cost is broken down with --importtime
+IMPORT_MODULES = [
+    'step1_extract.main',
+    'step1_extract.ai_line_interpreter',
+    'step1_extract.pdf_processor_unified',
+    'step3_mapping.query_database',
+]
+
+
+def time_command(args: List[str], runs: int) -> Tuple[Optional[float], int, str]:
+    """Run `python <args>` `runs` times; return (best seconds, first nonzero exit code or 0, its stderr tail)"""
+    best = None
+    returncode = 0
+    stderr = ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable] + args, cwd=PROJECT_ROOT,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if proc.returncode and not returncode:
+            # Keep the first failure
+            returncode = proc.returncode
+            stderr = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''
+        best = elapsed if best is None else min(best, elapsed)
+    return best, returncode, stderr
+
+
+def _importtime(code: str) -> Dict[str, int]:
+    """Cumulative import time (microseconds) per module for `python -X importtime -c code`"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=PROJECT_ROOT, capture_output=True, text=True)
+    rows: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            rows[parts[2].strip()] = int(parts[1])
+        except ValueError:
+            continue
+    return rows
+
+
+def slowest_imports(module: str, top: int) -> List[Tuple[int, str]]:
+    """Return the `top` slowest imports (cumulative microseconds, name) for a module"""
+    # Skip what the bare interpreter already imports at startup (site, .pth hooks)
+    startup = _importtime('pass')
+    rows = {name: us for name, us in _importtime(f'import {module}').items() if name not in startup}
+    return sorted(((us, name) for name, us in rows.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup / import time')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per entry point (best is reported)')
+    parser.add_argument('--importtime', action='store_true', help='Show slowest imports per module')
+    parser.add_argument('--top', type=int, default=10, help='Number of slow imports to show')
+    args = parser.parse_args()
+
+    print(f"Startup time (best of {args.runs}, target < {TARGET_SECONDS:.1f}s)")
+    print('-' * 72)
+    over_target = 0
+    failed = 0
+    for label, cmd in ENTRY_POINTS:
+        seconds, returncode, stderr = time_command(cmd, max(1, args.runs))
+        # A crashing entry point "starts" fast but is not OK
+        if returncode:
+            status = 'FAIL'
+            failed += 1
+        elif seconds < TARGET_SECONDS:
+            status = 'OK'
+        else:
+            status = 'SLOW'
+            over_target += 1
+        note = f"  (exit {returncode}: {stderr[:60]})" if returncode else ''
+        print(f"{label:<42} {seconds:7.3f}s  {status}{note}")
+
+    if args.importtime:
+        for module in IMPORT_MODULES:
+            print()
+            print(f"Slowest imports for {module}:")
+            for us, name in slowest_imports(module, args.top):
+                print(f"  {us / 1000:8.1f} ms  {name}")
+
+    return 1 if failed or over_target else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Step 1 PDF text engine benchmark and parity harness
+
+Extracts each sample PDF receipt with every text engine (step1_extract/pdf_text_engines.py),
+parses the text with the vendor's step1_rules rule set the way UnifiedPDFProcessor does,
+diffs the parsed items and totals against pdfplumber_layout (the reference engine), and
+reports pages/sec per engine. Files whose rule set uses OCR are skipped.
+
+The vendor comes from VendorDetector (filename / folder rules) unless --vendor is given.
+Without sample receipts, --synthetic N generates N Costco-style text PDFs to run on.
+
+Usage:
+    python benchmark_pdf_text_engines.py data/step1_input
+    python benchmark_pdf_text_engines.py receipts/costco_1.pdf receipts/jewel_2.pdf --runs 5
+    python benchmark_pdf_text_engines.py receipts/ --vendor COSTCO --show-diffs 20
+    python benchmark_pdf_text_engines.py --synthetic 25
+"""
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from step1_extract.pdf_processor_unified import UnifiedPDFProcessor
+from step1_extract.pdf_text_engines import (
+    REFERENCE_TEXT_ENGINE,
+    TEXT_ENGINES,
+    engine_available,
+    extract_page_texts,
+    resolve_text_engine,
+)
+from step1_extract.rule_loader import RuleLoader
+from step1_extract.vendor_detector import VendorDetector
+
+SYNTHETIC_NAMES = [
+    'KS ORGANIC MILK', 'BANANAS', 'JASMINE RICE 25LB', 'EGGS LARGE 24CT', 'UNSALTED BUTTER',
+    'HEAVY CREAM', 'CANE SUGAR 10LB', 'LIMES 5LB', 'MANGO CHUNKS', 'OAT MILK 6PK',
+]
+
+
+def make_synthetic_receipts(directory: Path, count: int, seed: int = 0) -> List[Path]:
+    """Costco-style text PDFs (E <item> <name> <price> N lines, then totals)"""
+    from step1_extract.pdf_text_engines import fitz
+
+    rng = random.Random(seed)
+    paths = []
+    for number in range(count):
+        doc = fitz.open()
+        for _ in range(rng.randint(1, 3)):
+            page = doc.new_page(width=300, height=800)
+            y = 40
+            page.insert_text((20, y), 'COSTCO WHOLESALE', fontsize=10)
+            subtotal = 0.0
+            for _ in range(rng.randint(10, 50)):
+                y += 13
+                price = round(rng.uniform(1, 90), 2)
+                subtotal += price
+                page.insert_text((20, y), f"E {rng.randint(1000, 999999)}", fontsize=9)
+                page.insert_text((90, y), rng.choice(SYNTHETIC_NAMES), fontsize=9)
+                page.insert_text((240, y), f"{price:.2f} N", fontsize=9)
+            tax = round(subtotal * 0.0625, 2)
+            for label, amount in (('SUBTOTAL', subtotal), ('TAX', tax), ('TOTAL', subtotal + tax)):
+                y += 13
+                page.insert_text((20, y), label, fontsize=9)
+                page.insert_text((240, y), f"{amount:.2f}", fontsize=9)
+        path = directory / f"costco_synthetic_{number:03d}.pdf"
+        doc.save(str(path))
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def collect_pdfs(paths: List[Path]) -> List[Path]:
+    pdfs = []
+    for path in paths:
+        if path.is_dir():
+            pdfs.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() == '.pdf'))
+        elif path.suffix.lower() == '.pdf':
+            pdfs.append(path)
+    return pdfs
+
+
+def extract(file_path: Path, engine: str, runs: int) -> Tuple[str, int, float]:
+    """(text as _extract_pdf_text joins it, pages, best seconds)"""
+    best = None
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        pages = extract_page_texts(file_path, engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return ''.join(page + '\n' for page in pages if page), len(pages), best
+
+
+def parse(processor: UnifiedPDFProcessor, text: str, rules: Dict[str, Any]) -> Dict[str, Any]:
+    return {'items': processor._parse_receipt_text(text, rules),
+            'totals': processor._extract_totals_from_text(text, rules)}
+
+
+def diff_parsed(reference: Dict[str, Any], other: Dict[str, Any]) -> List[str]:
+    """Human-readable differences between two parse results"""
+    diffs = []
+    if reference['totals'] != other['totals']:
+        diffs.append(f"totals {reference['totals']} != {other['totals']}")
+    ref_items, items = reference['items'], other['items']
+    if len(ref_items) != len(items):
+        diffs.append(f"{len(ref_items)} items != {len(items)} items")
+    for index, (ref_item, item) in enumerate(zip(ref_items, items)):
+        for field in sorted(set(ref_item) | set(item)):
+            if ref_item.get(field) != item.get(field):
+                diffs.append(f"item {index} {field}: {ref_item.get(field)!r} != {item.get(field)!r}")
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and diff step 1 PDF text engines')
+    parser.add_argument('paths', nargs='*', type=Path, help='Sample PDF receipts or folders of them')
+    parser.add_argument('--engines', nargs='+', default=list(TEXT_ENGINES), choices=TEXT_ENGINES)
+    parser.add_argument('--vendor', help='Vendor code for all files (default: detect per file)')
+    parser.add_argument('--runs', type=int, default=3, help='Extractions per file and engine (best is timed)')
+    parser.add_argument('--rules-dir', type=Path, default=PROJECT_ROOT / 'step1_rules')
+    parser.add_argument('--synthetic', type=int, default=0, help='Also generate this many Costco-style PDFs')
+    parser.add_argument('--show-diffs', type=int, default=10, help='Differences shown per file and engine')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    engines = [engine for engine in dict.fromkeys([REFERENCE_TEXT_ENGINE] + args.engines) if engine_available(engine)]
+    if REFERENCE_TEXT_ENGINE not in engines:
+        print(f"{REFERENCE_TEXT_ENGINE} is not available (pip install pdfplumber)")
+        return 2
+
+    rule_loader = RuleLoader(args.rules_dir)
+    processor = UnifiedPDFProcessor(rule_loader)
+    detector = VendorDetector(rule_loader)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdfs = collect_pdfs(args.paths)
+        vendors = {pdf: args.vendor for pdf in pdfs}
+        if args.synthetic:
+            for pdf in make_synthetic_receipts(Path(tmp), args.synthetic):
+                pdfs.append(pdf)
+                vendors[pdf] = args.vendor or 'COSTCO'
+        if not pdfs:
+            parser.error('no PDF files given (pass sample receipts or --synthetic N)')
+
+        pages = {engine: 0 for engine in engines}
+        seconds = {engine: 0.0 for engine in engines}
+        identical = {engine: 0 for engine in engines}
+        failures: List[str] = []
+        selected_mismatch = False
+        files = 0
+
+        for pdf in pdfs:
+            vendor = vendors[pdf] or detector.detect_vendor(pdf)[0] or ''
+            rules: Optional[Dict[str, Any]] = processor._load_vendor_pdf_rules(vendor, pdf) if vendor else None
+            if not rules or rules.get('extraction_method') == 'ocr':
+                print(f"skip {pdf.name}: {'OCR rule set' if rules else f'no PDF rules for vendor {vendor!r}'}")
+                continue
+            files += 1
+            selected = resolve_text_engine(rules.get('text_engine'))
+            results = {}
+            for engine in engines:
+                try:
+                    text, page_count, elapsed = extract(pdf, engine, args.runs)
+                except Exception as e:
+                    failures.append(f"{pdf.name} [{engine}]: {e}")
+                    continue
+                pages[engine] += page_count
+                seconds[engine] += elapsed
+                results[engine] = parse(processor, text, rules)
+
+            reference = results.get(REFERENCE_TEXT_ENGINE)
+            for engine, parsed in results.items():
+                diffs = diff_parsed(reference, parsed) if reference is not None else ['no reference result']
+                if not diffs:
+                    identical[engine] += 1
+                    continue
+                if engine == selected:
+                    selected_mismatch = True
+                print(f"{pdf.name} [{vendor}, {engine}{' - selected' if engine == selected else ''}]: "
+                      f"{len(diffs)} differences from {REFERENCE_TEXT_ENGINE}")
+                for line in diffs[:args.show_diffs]:
+                    print(f"    {line}")
+
+    print(f"{files} files, best of {args.runs} extractions")
+    print('-' * 72)
+    reference_rate = pages[REFERENCE_TEXT_ENGINE] / seconds[REFERENCE_TEXT_ENGINE] if seconds[REFERENCE_TEXT_ENGINE] else 0
+    for engine in engines:
+        rate = pages[engine] / seconds[engine] if seconds[engine] else 0.0
+        speedup = rate / reference_rate if reference_rate else 0.0
+        print(f"{engine:<18} {pages[engine]:6d} pages {seconds[engine]:8.3f}s {rate:10,.1f} pages/sec "
+              f"{speedup:6.2f}x  items identical: {identical[engine]}/{files}")
+    for failure in failures:
+        print(f"failed: {failure}")
+    print(f"selected engines match {REFERENCE_TEXT_ENGINE}: {'NO' if selected_mismatch else 'yes'}")
+    return 1 if selected_mismatch or failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Step 3 rule executor benchmark: staged vs fused stage engine
+
+Runs the step3_rules processing order over synthetic receipt items the way
+process_rules does with --engine staged (rule_executor.execute_stage, stage file saved
+after every stage) and --engine fused (stage_engine.FusedStageEngine, stage file saved
+after each segment), checks that both produce the same items, and reports items/sec.
+Runs offline: stages that would connect to the database are run without it
+(ProductMatcher uses a small synthetic catalog).
+
+Usage:
+    python benchmark_rule_executor.py
+    python benchmark_rule_executor.py --items 50000 --runs 5
+    python benchmark_rule_executor.py --no-save    # stage execution only
+    python benchmark_rule_executor.py --workers 4  # also fused on a 4-process pool
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from step3_mapping.main import _save_stage_output
+from step3_mapping.product_matcher import ProductMatcher
+from step3_mapping.rule_executor import execute_stage
+from step3_mapping.rule_loader import RuleLoader
+from step3_mapping.stage_engine import FusedStageEngine
+
+PRODUCT_NAMES = [
+    'Whole Milk 1 Gal', 'KIRKLAND ORGANIC WHOLE MILK', 'Heavy Whipping Cream', 'ORG BANANAS',
+    'Lime 40ct', 'Jasmine Rice 25 lb', 'Eggs Large 24ct', 'Unsalted Butter', 'Cane Sugar 10 lb',
+    'Fresh Basil', 'Mango Chunks', 'Oat Milk Barista', 'Strawberries 2 lb', 'Paper Cups 16oz',
+]
+VENDORS = [
+    ('Costco', 'Costco/receipt_{n}.pdf'),
+    ('Instacart', 'Instacart/order_{n}.pdf'),
+    ('Restaurant Depot', 'RD_{n}.pdf'),
+    ('Jewel-Osco', 'Jewel/receipt_{n}.pdf'),
+    ('Aldi', 'Aldi/receipt_{n}.pdf'),
+]
+UOMS = ['each', 'lb', 'gal', 'ct', 'case', 'oz']
+
+
+def make_catalog(path: Path) -> Path:
+    """Small products_uom_analysis.json covering the synthetic product names"""
+    uoms = {str(i): {'name': name} for i, name in enumerate(['Units', 'lb', 'gal', 'Dozens', 'Case', 'oz'], 1)}
+    templates = {str(100 + i): {'name': name, 'uom_id': 1 + i % 6} for i, name in enumerate(PRODUCT_NAMES)}
+    products = {str(1000 + i): {'product_tmpl_id': str(100 + i), 'uom_id': 1 + i % 6} for i in range(len(PRODUCT_NAMES))}
+    path.write_text(json.dumps({'uoms': uoms, 'product_templates': templates, 'products': products}))
+    return path
+
+
+def make_items(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Items shaped like process_rules' input (item fields plus receipt context)"""
+    rng = random.Random(seed)
+    items = []
+    receipts = {}
+    for index in range(count):
+        receipt_no = index // 20
+        if receipt_no not in receipts:
+            vendor, source_file = rng.choice(VENDORS)
+            source_file = source_file.format(n=receipt_no)
+            receipts[receipt_no] = {'vendor': vendor, 'filename': Path(source_file).name,
+                                    'source_file': source_file, 'source_type': 'localgrocery_based'}
+        receipt = receipts[receipt_no]
+        quantity = rng.randint(1, 6)
+        unit_price = round(rng.uniform(0.5, 40), 2)
+        items.append({
+            'product_name': rng.choice(PRODUCT_NAMES),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': round(quantity * unit_price, 2),
+            'purchase_uom': rng.choice(UOMS),
+            'receipt_id': f"R{receipt_no:06d}",
+            'receipt_data': receipt,
+            'source_type': receipt['source_type'],
+            'source_file': receipt['source_file'],
+        })
+    return items
+
+
+def fresh_copies(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(item) for item in items]
+
+
+def run_staged(items, rule_loader, context, order, output_dir=None):
+    for rule_file in order:
+        items = execute_stage(items, rule_file, rule_loader, context)
+        if output_dir:
+            _save_stage_output(items, rule_loader, rule_file, output_dir)
+    return items
+
+
+def run_fused(items, rule_loader, context, order, output_dir=None, workers=1):
+    on_segment = None
+    if output_dir:
+        on_segment = lambda rule_file, segment_items: _save_stage_output(segment_items, rule_loader, rule_file, output_dir)
+    return FusedStageEngine(rule_loader, context, order, workers=workers).run(items, on_segment=on_segment)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark staged vs fused step 3 rule execution')
+    parser.add_argument('--items', type=int, default=20000, help='Number of synthetic items')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per engine (best is reported)')
+    parser.add_argument('--rules-dir', type=Path, default=PROJECT_ROOT / 'step3_rules')
+    parser.add_argument('--no-save', action='store_true', help='Do not write stage files (stage execution only)')
+    parser.add_argument('--workers', type=int, default=1, help='Also run the fused engine on this many processes')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    rule_loader = RuleLoader(args.rules_dir)
+    # Offline: no DB connection attempts, the quality report writes nothing
+    for rule_file in rule_loader.get_processing_order():
+        rule_data = rule_loader.get_rule(rule_file) or {}
+        for stage_config in rule_data.values():
+            if isinstance(stage_config, dict):
+                stage_config.pop('connection', None)
+    order = [rule_file for rule_file in rule_loader.get_processing_order() if 'quality_report' not in rule_file]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        matcher = ProductMatcher(str(make_catalog(Path(tmp) / 'products_uom_analysis.json')), use_snapshot=False)
+        items = make_items(args.items)
+
+        runners = [('staged', run_staged), ('fused', run_fused)]
+        if args.workers > 1:
+            runners.append((f"fused x{args.workers}",
+                            lambda *run_args: run_fused(*run_args, workers=args.workers)))
+
+        results = {}
+        outputs = {}
+        for label, runner in runners:
+            best = None
+            for _ in range(max(1, args.runs)):
+                batch = fresh_copies(items)
+                start = time.perf_counter()
+                outputs[label] = runner(batch, rule_loader, {'product_matcher': matcher}, order,
+                                        None if args.no_save else Path(tmp))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = best
+
+    same = all(output == outputs['staged'] for output in outputs.values())
+    print(f"{len(order)} stages, {args.items} items, stage files {'off' if args.no_save else 'on'} "
+          f"(best of {args.runs})")
+    print('-' * 56)
+    for label, seconds in results.items():
+        speedup = results['staged'] / seconds
+        print(f"{label:<10} {seconds:8.3f}s  {args.items / seconds:12,.0f} items/sec  {speedup:5.2f}x")
+    print(f"outputs identical: {'yes' if same else 'NO'}")
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
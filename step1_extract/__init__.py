@@ -4,63 +4,46 @@ Reads PDF, Excel, and CSV files and extracts structured receipt data.
 Uses rule-driven architecture with vendor detection, layout application, and UoM extraction.
 """
 
-from .main import process_files, detect_group
-from .rule_loader import RuleLoader
-from .vendor_detector import VendorDetector
-from .layout_applier import LayoutApplier
-from .receipt_line_engine import ReceiptLineEngine
-from .uom_extractor import UoMExtractor
-from .receipt_processor import ReceiptProcessor
-from .csv_processor import CSVProcessor
-from .fee_extractor import FeeExtractor
-from .utils.text_extractor import TextExtractor
-from .instacart_csv_matcher import InstacartCSVMatcher
-from .vendor_profiles import VendorProfileHandler
-from .receipt_parsers import VendorIdentifier, ItemLineParser, UnitDetector, TotalValidator
+import importlib
 
-# Optional AI line interpreter (gracefully handles ImportError)
-try:
-    from .ai_line_interpreter import AILineInterpreter, AI_AVAILABLE, AI_BACKEND
-    __all__ = [
-        'process_files',
-        'detect_group',
-        'RuleLoader',
-        'VendorDetector',
-        'LayoutApplier',
-        'ReceiptLineEngine',
-        'UoMExtractor',
-        'ReceiptProcessor', 
-        'CSVProcessor', 
-        'FeeExtractor',
-        'TextExtractor',
-        'InstacartCSVMatcher',
-        'VendorProfileHandler',
-        'VendorIdentifier',
-        'ItemLineParser',
-        'UnitDetector',
-        'TotalValidator',
-        'AILineInterpreter',
-        'AI_AVAILABLE',
-        'AI_BACKEND',
-    ]
-except ImportError:
-    __all__ = [
-        'process_files',
-        'detect_group',
-        'RuleLoader',
-        'VendorDetector',
-        'LayoutApplier',
-        'ReceiptLineEngine',
-        'UoMExtractor',
-        'ReceiptProcessor', 
-        'CSVProcessor', 
-        'FeeExtractor',
-        'TextExtractor',
-        'InstacartCSVMatcher',
-        'VendorProfileHandler',
-        'VendorIdentifier',
-        'ItemLineParser',
-        'UnitDetector',
-        'TotalValidator',
-    ]
+# Public names are resolved on first access (PEP 562), so importing a single submodule
+# (e.g. `python -m step1_extract.main --help`) doesn't load every processor and backend.
+_EXPORTS = {
+    'process_files': '.main',
+    'detect_group': '.main',
+    'RuleLoader': '.rule_loader',
+    'VendorDetector': '.vendor_detector',
+    'LayoutApplier': '.layout_applier',
+    'ReceiptLineEngine': '.receipt_line_engine',
+    'UoMExtractor': '.uom_extractor',
+    'ReceiptProcessor': '.receipt_processor',
+    'CSVProcessor': '.csv_processor',
+    'FeeExtractor': '.fee_extractor',
+    'TextExtractor': '.utils.text_extractor',
+    'InstacartCSVMatcher': '.instacart_csv_matcher',
+    'VendorProfileHandler': '.vendor_profiles',
+    'VendorIdentifier': '.receipt_parsers',
+    'ItemLineParser': '.receipt_parsers',
+    'UnitDetector': '.receipt_parsers',
+    'TotalValidator': '.receipt_parsers',
+    # Optional AI line interpreter (backend is detected on first use)
+    'AILineInterpreter': '.ai_line_interpreter',
+    'AI_AVAILABLE': '.ai_line_interpreter',
+    'AI_BACKEND': '.ai_line_interpreter',
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    if name not in ('AI_AVAILABLE', 'AI_BACKEND'):
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -6,40 +6,108 @@ Falls back to semantic interpretation when regex parsing fails
 
 import re
 import json
+import hashlib
 import logging
-from typing import Dict, Optional, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, List, Tuple
 from pathlib import Path
 
+from .lookup_cache import LookupCache, DAY
+from .utils.lazy_import import module_available
+
 logger = logging.getLogger(__name__)
 
-# Check for available LLM backends
-AI_AVAILABLE = False
-AI_BACKEND = None
+# LLM backend detection is deferred until first use (see detect_backend):
+# importing this module must not block on an HTTP probe or import transformers.
+_backend_lock = threading.Lock()
+_backend_detected = False
+_AI_AVAILABLE = False
+_AI_BACKEND = None
+
+
+def detect_backend(ollama_url: str = 'http://localhost:11434') -> Tuple[bool, Optional[str]]:
+    """
+    Detect an available local LLM backend (probed once per process).
+    
+    Priority: Ollama > Transformers (local LLMs only - no API keys required)
+    
+    Returns:
+        (AI_AVAILABLE, AI_BACKEND)
+    """
+    global _backend_detected, _AI_AVAILABLE, _AI_BACKEND
+    if _backend_detected:
+        return _AI_AVAILABLE, _AI_BACKEND
+    with _backend_lock:
+        if _backend_detected:
+            return _AI_AVAILABLE, _AI_BACKEND
+        try:
+            # Try Ollama (local LLM API)
+            import requests
+            try:
+                response = requests.get(f'{ollama_url}/api/tags', timeout=1)
+                if response.status_code == 200:
+                    _AI_AVAILABLE = True
+                    _AI_BACKEND = 'ollama'
+                    logger.info("Ollama LLM backend detected")
+            except Exception:
+                pass
+        except ImportError:
+            pass
+        
+        # Try transformers (Hugging Face local models) - only check it is installed;
+        # the library itself is imported when a pipeline is created
+        if not _AI_AVAILABLE and module_available('transformers'):
+            _AI_AVAILABLE = True
+            _AI_BACKEND = 'transformers'
+            logger.info("Transformers backend available")
+        
+        _backend_detected = True
+    return _AI_AVAILABLE, _AI_BACKEND
+
 
-# Priority: Ollama > Transformers (local LLMs only - no API keys required)
-try:
-    # Try Ollama (local LLM API)
-    import requests
-    try:
-        response = requests.get('http://localhost:11434/api/tags', timeout=1)
-        if response.status_code == 200:
-            AI_AVAILABLE = True
-            AI_BACKEND = 'ollama'
-            logger.info("Ollama LLM backend detected")
-    except:
-        pass
-except ImportError:
-    pass
+# Bump when the interpretation prompts change, so cached answers from an old prompt are not reused
+PROMPT_VERSION = 2
 
-if not AI_AVAILABLE:
-    try:
-        # Try transformers (Hugging Face local models)
-        from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-        AI_AVAILABLE = True
-        AI_BACKEND = 'transformers'
-        logger.info("Transformers backend available")
-    except ImportError:
-        pass
+
+def normalize_line(line: str) -> str:
+    """Normalize a receipt line for cache keys / de-duplication (case and whitespace)"""
+    return ' '.join(line.split()).upper()
+
+
+def stub_llm_response(prompt: str) -> str:
+    """
+    Deterministic local stand-in for an LLM (backend 'stub', used by tests).
+    
+    Answers both the single-line and the batch prompt: the product name is the line
+    without its trailing number, the trailing number is the total price.
+    """
+    def _item(text: str) -> Dict:
+        match = re.search(r'(\d+(?:\.\d+)?)\s*$', text.strip())
+        name = text[:match.start()].strip() if match else text.strip()
+        return {
+            'product_name': name,
+            'quantity': 1,
+            'unit_price': None,
+            'total_price': float(match.group(1)) if match else None,
+            'unit': None,
+            'confidence': 0.5,
+        }
+    
+    batch_lines = re.findall(r'^\[(\d+)\] (.*)$', prompt, re.MULTILINE)
+    if batch_lines:
+        return json.dumps({'items': [{'index': int(idx), **_item(text)} for idx, text in batch_lines]})
+    single = re.search(r'^Receipt line: (.*)$', prompt, re.MULTILINE)
+    return json.dumps(_item(single.group(1))) if single else '{}'
+
+
+def __getattr__(name):
+    # AI_AVAILABLE / AI_BACKEND keep working as module attributes, probed on first access
+    if name == 'AI_AVAILABLE':
+        return detect_backend()[0]
+    if name == 'AI_BACKEND':
+        return detect_backend()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class AILineInterpreter:
@@ -71,14 +139,41 @@ class AILineInterpreter:
         else:
             self.config = config or {}
         
-        self.enabled = self.config.get('enabled', True) and AI_AVAILABLE
-        self.backend = self.config.get('backend', AI_BACKEND)
-        self.model_name = self.config.get('model_name', 'llama3.2:1b' if AI_BACKEND == 'ollama' else 'gpt2')
+        if self.config.get('backend') == 'stub':
+            # Local stub backend (tests): no probing
+            ai_available, ai_backend = True, 'stub'
+        else:
+            ai_available, ai_backend = detect_backend(self.config.get('ollama_base_url', 'http://localhost:11434'))
+        self.enabled = self.config.get('enabled', True) and ai_available
+        self.backend = self.config.get('backend', ai_backend)
+        self.model_name = self.config.get('model_name', 'llama3.2:1b' if ai_backend == 'ollama' else 'gpt2')
         # Load vendor list from rules (for legacy heuristics-based fallback)
         self.use_for_vendors = self.config.get('use_for_vendors', ['Restaurant Depot', 'Mariano'])
         self.max_retries = self.config.get('max_retries', 2)
         self.temperature = self.config.get('temperature', 0.1)  # Low temperature for consistency
         
+        # Batching: unique uncached lines are packed into prompts of batch_size lines,
+        # with at most max_concurrency LLM requests in flight
+        self.batch_size = max(1, int(self.config.get('batch_size', 20)))
+        self.max_concurrency = max(1, int(self.config.get('max_concurrency', 2)))
+        self._stub_responder: Callable[[str], str] = self.config.get('stub_responder') or stub_llm_response
+        self._stats = {'lines': 0, 'cache_hits': 0, 'deduplicated': 0, 'llm_calls': 0, 'lines_sent': 0}
+        self._stats_lock = threading.Lock()
+        
+        # Persistent result cache keyed by (normalized line, vendor, model, prompt version)
+        self._cache = None
+        if self.config.get('cache_enabled', True):
+            cache_file = self.config.get('cache_file', 'cache/lookup_cache.sqlite')
+            try:
+                self._cache = LookupCache(
+                    Path(cache_file),
+                    namespace='ai_line',
+                    default_ttl=self.config.get('cache_ttl_days', 180) * DAY,
+                    negative_ttl=self.config.get('failure_ttl_days', 7) * DAY,
+                )
+            except Exception as e:
+                logger.warning(f"AI line cache unavailable ({cache_file}): {e}")
+        
         self._pipeline = None
         self._model = None
         self._tokenizer = None
@@ -92,8 +187,10 @@ class AILineInterpreter:
             self._initialize_ollama()
         elif self.backend == 'transformers':
             self._initialize_transformers()
+        elif self.backend == 'stub':
+            logger.info("Using stub AI backend")
         else:
-            logger.warning(f"Unknown AI backend: {self.backend}. Only 'ollama' and 'transformers' are supported.")
+            logger.warning(f"Unknown AI backend: {self.backend}. Only 'ollama', 'transformers' and 'stub' are supported.")
             self.enabled = False
     
     def _initialize_ollama(self):
@@ -228,107 +325,163 @@ class AILineInterpreter:
         if not self.should_interpret(line, vendor):
             return None
         
+        self._bump('lines')
+        key = self._cache_key(line, vendor)
+        found, cached = self._cache_lookup(key, line)
+        if found:
+            return cached
+        
         try:
-            if self.backend == 'ollama':
-                result = self._interpret_with_ollama(line, vendor, context)
-                if result is None:
-                    # AI failed - return failure marker
-                    return {
-                        'product_name': line.strip(),
-                        'line_text': line,
-                        'parsed_by': 'ai_fallback_failed',
-                        'needs_review': True,
-                    }
-                return result
-            elif self.backend == 'transformers':
-                result = self._interpret_with_transformers(line, vendor, context)
-                if result is None:
-                    # AI failed - return failure marker
-                    return {
-                        'product_name': line.strip(),
-                        'line_text': line,
-                        'parsed_by': 'ai_fallback_failed',
-                        'needs_review': True,
-                    }
-                return result
+            prompt = self._create_interpretation_prompt(line, vendor, context)
+            generated_text = self._generate(prompt, num_predict=200, timeout=10)
+            if generated_text is None:
+                # Backend error/timeout - not cached, may succeed next run
+                return self._failure_item(line)
+            result = self._parse_ai_response(generated_text, line)
         except Exception as e:
             logger.debug(f"AI interpretation error for line '{line[:50]}...': {e}")
             # AI failed (timeout, error, etc.) - return failure marker
-            return {
-                'product_name': line.strip(),
-                'line_text': line,
-                'parsed_by': 'ai_fallback_failed',
-                'needs_review': True,
-            }
+            return self._failure_item(line)
         
-        return None
+        if result is None:
+            logger.debug(f"Failed to parse AI JSON response for line: {line[:50]}...")
+        self._cache_store(key, result)
+        return result if result is not None else self._failure_item(line)
     
-    def _interpret_with_ollama(self, line: str, vendor: Optional[str] = None, context: Optional[str] = None) -> Optional[Dict]:
-        """Interpret line using Ollama"""
-        try:
-            import requests
-            
-            # Create prompt for receipt line interpretation
-            prompt = self._create_interpretation_prompt(line, vendor, context)
+    def interpret_lines(self, lines: List[str], vendor: Optional[str] = None,
+                        context: Optional[str] = None) -> List[Optional[Dict]]:
+        """
+        Interpret many lines with as few LLM calls as possible
+        
+        Lines are de-duplicated (normalized text), answered from the cache where possible,
+        and the remaining unique lines are sent batch_size at a time in one prompt each,
+        with up to max_concurrency prompts in flight.
+        
+        Args:
+            lines: Receipt lines
+            vendor: Vendor name or vendor code
+            context: Additional context shared by all lines
             
-            # Call Ollama API
-            response = requests.post(
-                f'{self._ollama_base_url}/api/generate',
-                json={
+        Returns:
+            One entry per input line (same order): item dict, failure marker
+            (parsed_by="ai_fallback_failed"), or None if the line is not sent to AI
+        """
+        results: List[Optional[Dict]] = [None] * len(lines)
+        if not self.enabled:
+            return results
+        
+        # key -> indexes of lines sharing that key
+        pending: Dict[str, List[int]] = {}
+        for i, line in enumerate(lines):
+            if not line or not line.strip() or not self.should_interpret(line, vendor):
+                continue
+            self._bump('lines')
+            key = self._cache_key(line, vendor)
+            if key in pending:
+                self._bump('deduplicated')
+                pending[key].append(i)
+                continue
+            found, cached = self._cache_lookup(key, line)
+            if found:
+                results[i] = cached
+                continue
+            pending[key] = [i]
+        
+        if not pending:
+            return results
+        
+        keys = list(pending)
+        batches = [keys[start:start + self.batch_size] for start in range(0, len(keys), self.batch_size)]
+        batch_lines = [[lines[pending[key][0]] for key in batch] for batch in batches]
+        
+        if len(batches) == 1 or self.max_concurrency == 1:
+            answers = [self._interpret_batch_prompt(chunk, vendor, context) for chunk in batch_lines]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                answers = list(executor.map(lambda chunk: self._interpret_batch_prompt(chunk, vendor, context),
+                                            batch_lines))
+        
+        for batch, answer in zip(batches, answers):
+            for j, key in enumerate(batch):
+                if answer is None:
+                    # Backend error - not cached
+                    item = None
+                else:
+                    item = answer.get(j)
+                    self._cache_store(key, item)
+                for i in pending[key]:
+                    if item is None:
+                        results[i] = self._failure_item(lines[i])
+                    else:
+                        results[i] = dict(item, line_text=lines[i])
+        
+        s = self.get_stats()
+        logger.debug(f"AI batch: {len(lines)} lines, {len(keys)} unique uncached, {len(batches)} LLM calls "
+                     f"(totals: {s['cache_hits']} cache hits, {s['llm_calls']} calls)")
+        return results
+    
+    def _interpret_batch_prompt(self, lines: List[str], vendor: Optional[str],
+                                context: Optional[str]) -> Optional[Dict[int, Dict]]:
+        """Send one batch prompt; return {position in batch: item} or None on backend error"""
+        self._bump('lines_sent', len(lines))
+        if len(lines) == 1:
+            # Single line: the single-line prompt is shorter and more reliable for small models
+            prompt = self._create_interpretation_prompt(lines[0], vendor, context)
+            text = self._generate(prompt, num_predict=200, timeout=10)
+            if text is None:
+                return None
+            item = self._parse_ai_response(text, lines[0])
+            return {0: item} if item else {}
+        
+        prompt = self._create_batch_prompt(lines, vendor, context)
+        text = self._generate(prompt, num_predict=80 * len(lines) + 50, timeout=10 + 3 * len(lines),
+                              json_format=True)
+        if text is None:
+            return None
+        return self._parse_batch_response(text, lines)
+    
+    def _generate(self, prompt: str, num_predict: int = 200, timeout: float = 10,
+                  json_format: bool = False) -> Optional[str]:
+        """
+        Run one prompt through the configured backend
+        
+        Returns:
+            Generated text, or None on backend error (HTTP error, timeout, exception)
+        """
+        self._bump('llm_calls')
+        try:
+            if self.backend == 'ollama':
+                import requests
+                payload = {
                     'model': self.model_name,
                     'prompt': prompt,
                     'stream': False,
                     'options': {
                         'temperature': self.temperature,
-                        'num_predict': 200,
+                        'num_predict': num_predict,
                     }
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                generated_text = result.get('response', '').strip()
-                parsed = self._parse_ai_response(generated_text, line)
-                if parsed is None:
-                    # Failed to parse JSON from AI response
-                    logger.debug(f"Failed to parse AI JSON response for line: {line[:50]}...")
+                }
+                if json_format:
+                    # Ollama structured output: response is constrained to valid JSON
+                    payload['format'] = 'json'
+                response = requests.post(f'{self._ollama_base_url}/api/generate', json=payload, timeout=timeout)
+                if response.status_code != 200:
+                    logger.debug(f"Ollama API returned status {response.status_code}")
                     return None
-                return parsed
-            else:
-                # HTTP error
-                logger.debug(f"Ollama API returned status {response.status_code}")
-                return None
-        except requests.Timeout:
-            logger.debug(f"Ollama request timeout for line: {line[:50]}...")
-            return None
-        except Exception as e:
-            logger.debug(f"Ollama interpretation error: {e}")
-            return None
-        
-        return None
-    
-    def _interpret_with_transformers(self, line: str, vendor: Optional[str] = None, context: Optional[str] = None) -> Optional[Dict]:
-        """Interpret line using transformers"""
-        try:
-            # Create prompt
-            prompt = self._create_interpretation_prompt(line, vendor, context)
-            
-            # Generate response
-            result = self._pipeline(
-                prompt,
-                max_new_tokens=100,
-                return_full_text=False,
-                temperature=self.temperature,
-                do_sample=True,
-            )
-            
-            if result and len(result) > 0:
-                generated_text = result[0].get('generated_text', '').strip()
-                return self._parse_ai_response(generated_text, line)
+                return response.json().get('response', '').strip()
+            elif self.backend == 'transformers':
+                result = self._pipeline(
+                    prompt,
+                    max_new_tokens=num_predict,
+                    return_full_text=False,
+                    temperature=self.temperature,
+                    do_sample=True,
+                )
+                return result[0].get('generated_text', '').strip() if result else None
+            elif self.backend == 'stub':
+                return self._stub_responder(prompt)
         except Exception as e:
-            logger.debug(f"Transformers interpretation error: {e}")
-        
+            logger.debug(f"{self.backend} generation error: {e}")
         return None
     
     def _create_interpretation_prompt(self, line: str, vendor: Optional[str] = None, context: Optional[str] = None) -> str:
@@ -361,6 +514,69 @@ JSON:"""
         
         return prompt
     
+    def _create_batch_prompt(self, lines: List[str], vendor: Optional[str] = None, context: Optional[str] = None) -> str:
+        """Create prompt interpreting several numbered lines at once"""
+        vendor_info = f"Vendor: {vendor}\n" if vendor else ""
+        context_info = f"Context: {context}\n" if context else ""
+        numbered = '\n'.join(f"[{i}] {line.strip()}" for i, line in enumerate(lines))
+        
+        prompt = f"""You are a receipt line parser. Extract product information from each numbered receipt line.
+
+{vendor_info}{context_info}Receipt lines:
+{numbered}
+
+Return ONLY a JSON object with one entry per line, using the line number as "index":
+{{
+  "items": [
+    {{
+      "index": <line number>,
+      "product_name": "extracted product name",
+      "quantity": <number or null>,
+      "unit_price": <number or null>,
+      "total_price": <number or null>,
+      "unit": "extracted unit (LB, OZ, CT, EACH, etc.) or null",
+      "confidence": <0.0 to 1.0>
+    }}
+  ]
+}}
+
+Rules:
+- If price is missing, use null
+- Extract unit from text (LB, OZ, CT, EACH, etc.)
+- Product name should be cleaned (remove extra spaces, formatting artifacts)
+- Quantity defaults to 1.0 if not found
+- Return ONLY valid JSON, no explanations.
+
+JSON:"""
+        
+        return prompt
+    
+    def _parse_batch_response(self, response_text: str, lines: List[str]) -> Dict[int, Dict]:
+        """Parse a batch response into {line index: item}; lines missing from the answer are omitted"""
+        items: Dict[int, Dict] = {}
+        try:
+            json_match = re.search(r'[\[{].*[\]}]', response_text, re.DOTALL)
+            if not json_match:
+                logger.debug("No JSON found in AI batch response")
+                return items
+            parsed = json.loads(json_match.group(0))
+            entries = parsed.get('items', []) if isinstance(parsed, dict) else parsed
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    index = int(entry.get('index'))
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= index < len(lines) and index not in items:
+                    item = self._convert_to_item_dict(entry, lines[index])
+                    if item:
+                        item['ai_confidence'] = float(entry.get('confidence', 0.5))
+                        items[index] = item
+        except json.JSONDecodeError as e:
+            logger.debug(f"Failed to parse AI batch JSON response: {e}")
+        return items
+    
     def _parse_ai_response(self, response_text: str, original_line: str) -> Optional[Dict]:
         """Parse AI response into structured dict"""
         try:
@@ -575,7 +791,7 @@ JSON:"""
     
     def interpret_batch(self, lines: List[str], vendor: Optional[str] = None) -> List[Dict]:
         """
-        Interpret multiple lines
+        Interpret multiple lines (batched and cached, see interpret_lines)
         
         Args:
             lines: List of receipt lines
@@ -584,10 +800,59 @@ JSON:"""
         Returns:
             List of interpreted items
         """
-        items = []
-        for line in lines:
-            item = self.interpret_line(line, vendor)
-            if item:
-                items.append(item)
-        return items
+        return [item for item in self.interpret_lines(lines, vendor) if item]
+    
+    def get_stats(self) -> Dict:
+        """Get line/cache/LLM call counters for logging/monitoring"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        if self._cache is not None:
+            cache_stats = self._cache.get_stats()
+            stats['negative_cache_hits'] = cache_stats['negative_hits']
+        return stats
+    
+    def close(self) -> None:
+        """Flush and close the result cache"""
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+    
+    # ---------------- helpers ----------------
+    def _bump(self, counter: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[counter] += amount
+    
+    def _cache_key(self, line: str, vendor: Optional[str]) -> str:
+        raw = json.dumps([normalize_line(line), (vendor or '').upper(), self.backend, self.model_name, PROMPT_VERSION])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def _cache_lookup(self, key: str, line: str) -> Tuple[bool, Optional[Dict]]:
+        """Return (found, item or failure marker) from the persistent cache"""
+        if self._cache is None:
+            return False, None
+        found, value = self._cache.lookup(key)
+        if not found:
+            return False, None
+        self._bump('cache_hits')
+        if value is None:
+            # Negative entry: the model could not interpret this line last time
+            return True, self._failure_item(line)
+        return True, dict(value, line_text=line)
+    
+    def _cache_store(self, key: str, item: Optional[Dict]) -> None:
+        if self._cache is None:
+            return
+        if item is None:
+            self._cache.put_negative(key)
+        else:
+            self._cache.put(key, {k: v for k, v in item.items() if k != 'line_text'})
+    
+    @staticmethod
+    def _failure_item(line: str) -> Dict:
+        return {
+            'product_name': line.strip(),
+            'line_text': line,
+            'parsed_by': 'ai_fallback_failed',
+            'needs_review': True,
+        }
 
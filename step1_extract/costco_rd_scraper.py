@@ -12,10 +12,12 @@ Not used by the main workflow - for manual analysis and knowledge base updates.
 Usage:
   python costco_rd_scraper.py --report data/step1_output/group1/extracted_data.json --out costco_rd_specs.csv
   python costco_rd_scraper.py --kb-file data/step1_input/knowledge_base.json --report data/step1_output/group1/extracted_data.json
+  python costco_rd_scraper.py --enrich-upc --concurrency 4 --rps 1 --report data/step1_output/group1/extracted_data.json
 
 Notes:
 - Uses a local knowledge base (JSON file or hardcoded) for item lookups
-- No web scraping or API calls - simple and reliable
+- No web scraping or API calls by default; --enrich-upc looks up the remaining UPCs
+  concurrently via the rate-limited enrichment engine (per-URL cache consulted first)
 - Knowledge base can be manually updated as new items are encountered
 - Standalone script - not imported by main workflow
 """
@@ -23,7 +25,6 @@ Notes:
 import argparse
 import csv
 import json
-import random
 import re
 import sys
 import time
@@ -33,6 +34,14 @@ from typing import Dict, List, Optional, Union
 
 from bs4 import BeautifulSoup
 
+try:
+    from .enrichment_engine import AsyncEnrichmentEngine
+    from .lookup_cache import LookupCache
+except ImportError:
+    # Run as a standalone script from step1_extract/
+    from enrichment_engine import AsyncEnrichmentEngine
+    from lookup_cache import LookupCache
+
 def _import_scrape_libs():
     import cloudscraper  # type: ignore
     from bs4 import BeautifulSoup as _BSoup  # noqa: F401
@@ -50,11 +59,44 @@ CACHE_DIR.mkdir(exist_ok=True)
 DEBUG = False
 
 def _get_cache_path(url: str) -> Path:
-    """Generate cache file path from URL"""
+    """Generate legacy per-URL cache file path (read-only; new entries go to the lookup cache)"""
     import hashlib
     cache_key = hashlib.md5(url.encode('utf-8')).hexdigest()
     return CACHE_DIR / f"{cache_key}.html"
 
+_URL_CACHE = None
+
+def _get_url_cache() -> LookupCache:
+    """Open the shared URL cache (negative entries, TTLs, LRU bound) on first use"""
+    global _URL_CACHE
+    if _URL_CACHE is None:
+        _URL_CACHE = LookupCache(CACHE_DIR / 'lookup_cache.sqlite', namespace='url')
+    return _URL_CACHE
+
+def _cache_lookup(url: str):
+    """
+    Look up a URL in the cache.
+    
+    Returns:
+        (found, text): text is None for a cached "not found"
+    """
+    cache = _get_url_cache()
+    found, text = cache.lookup(url)
+    if found:
+        return found, text
+    # Migrate legacy per-URL HTML files on first read
+    cache_path = _get_cache_path(url)
+    if cache_path.exists():
+        debug_print(f"Legacy cache file exists, size: {cache_path.stat().st_size} bytes")
+        try:
+            with open(cache_path, 'r', encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            cache.put(url, text)
+            return True, text
+        except Exception as e:
+            print(f"  Warning: Could not read cache file {cache_path}: {e}")
+    return False, None
+
 def debug_print(msg: str):
     """Print debug message if DEBUG mode is enabled"""
     if DEBUG:
@@ -77,26 +119,20 @@ def safe_get(scraper, url: str, headers: Dict, timeout: int = 20, max_retries: i
     global RATE_LIMIT_MULTIPLIER
     
     # Check cache first
-    cache_path = _get_cache_path(url)
-    debug_print(f"Cache path: {cache_path}")
-    if cache_path.exists():
-        debug_print(f"Cache file exists, size: {cache_path.stat().st_size} bytes")
+    found, cached_html = _cache_lookup(url)
+    if found:
+        if cached_html is None:
+            print(f"  Cached not-found for {url[:60]}...")
+            return None
         print(f"  Using cached file for {url[:60]}...")
-        try:
-            with open(cache_path, 'r', encoding='utf-8', errors='ignore') as f:
-                cached_html = f.read()
-            debug_print(f"Loaded {len(cached_html)} characters from cache")
-            # Create a mock response object with the cached content
-            class MockResponse:
-                def __init__(self, text, status_code=200):
-                    self.text = text
-                    self.status_code = status_code
-                    self.headers = {}
-            return MockResponse(cached_html, 200)
-        except Exception as e:
-            print(f"  Warning: Could not read cache file {cache_path}: {e}")
-            debug_print(f"Cache read error: {type(e).__name__}: {e}")
-            # Continue to fetch from web
+        debug_print(f"Loaded {len(cached_html)} characters from cache")
+        # Create a mock response object with the cached content
+        class MockResponse:
+            def __init__(self, text, status_code=200):
+                self.text = text
+                self.status_code = status_code
+                self.headers = {}
+        return MockResponse(cached_html, 200)
     
     # Retry logic
     delay = 2.0  # Initial delay in seconds
@@ -123,14 +159,18 @@ def safe_get(scraper, url: str, headers: Dict, timeout: int = 20, max_retries: i
                     debug_print(f"Reducing rate limit multiplier to {RATE_LIMIT_MULTIPLIER:.2f}")
                 # Save to cache
                 try:
-                    with open(cache_path, 'w', encoding='utf-8') as f:
-                        f.write(response.text)
-                    debug_print(f"Saved to cache: {cache_path}")
+                    _get_url_cache().put(url, response.text)
+                    debug_print(f"Saved to cache: {url}")
                 except Exception as e:
                     print(f"  Warning: Could not save to cache: {e}")
                     debug_print(f"Cache save error: {type(e).__name__}: {e}")
                 
                 return response
+            elif response.status_code == 404:
+                # Definitive miss - remember it so the next run doesn't ask again
+                print(f"  HTTP 404 for {url[:60]}...")
+                _get_url_cache().put_negative(url)
+                return None
             elif response.status_code == 429:
                 # Rate limited - increase delay significantly
                 RATE_LIMIT_MULTIPLIER = min(RATE_LIMIT_MULTIPLIER * 2.0, 10.0)  # Cap at 10x
@@ -221,12 +261,6 @@ def parse_json_to_records(json_data):
     
     return records
 
-def polite_sleep(a=1.0, b=3.0, delay_multiplier=1.0):
-    """Sleep with configurable delay multiplier for rate limiting"""
-    actual_delay = random.uniform(a, b) * delay_multiplier
-    debug_print(f"Sleeping for {actual_delay:.2f}s (base: {a}-{b}s, multiplier: {delay_multiplier}x)")
-    time.sleep(actual_delay)
-
 # Global rate limit multiplier (increases when rate-limited)
 RATE_LIMIT_MULTIPLIER = 1.0
 
@@ -479,40 +513,111 @@ def scrape_costco(item_number, item_name=None):
         debug_print(f"Knowledge base lookup failed for item_number: {item_number}")
         return None
 
+UPCITEMDB_LOOKUP_URL = "https://api.upcitemdb.com/prod/trial/lookup?upc={upc}"
+
+def _parse_upcitemdb_payload(upc, data):
+    """Build a result row from a UPCitemdb lookup response"""
+    if data.get('code') == 'OK' and data.get('total', 0) > 0:
+        item = data.get('items', [{}])[0]
+        title = item.get('title', '')
+        brand = item.get('brand', '')
+        
+        # Extract size from title or specs
+        size = item.get('size', '') or item.get('dimension', '')
+        
+        return {
+            "title": title,
+            "brand": brand,
+            "size": size,
+            "url": f"https://www.upcitemdb.com/upc/{upc}",
+            "specs_json": json.dumps(item, ensure_ascii=False),
+            "source_api": "upcitemdb_free"
+        }
+    return None
+
 def scrape_upcitemdb_free(upc):
     """Free UPC lookup using UPCitemdb.com API (no API key required)"""
     debug_print(f"Trying free UPCitemdb API for UPC: {upc}")
     try:
         import requests
-        url = f"https://api.upcitemdb.com/prod/trial/lookup?upc={upc}"
+        url = UPCITEMDB_LOOKUP_URL.format(upc=upc)
         debug_print(f"UPCitemdb API URL: {url}")
         
         response = requests.get(url, timeout=10)
         if response.status_code == 200:
             data = response.json()
             debug_print(f"UPCitemdb API response: {data}")
-            
-            if data.get('code') == 'OK' and data.get('total', 0) > 0:
-                item = data.get('items', [{}])[0]
-                title = item.get('title', '')
-                brand = item.get('brand', '')
-                
-                # Extract size from title or specs
-                size = item.get('size', '') or item.get('dimension', '')
-                
-                return {
-                    "title": title,
-                    "brand": brand,
-                    "size": size,
-                    "url": f"https://www.upcitemdb.com/upc/{upc}",
-                    "specs_json": json.dumps(item, ensure_ascii=False),
-                    "source_api": "upcitemdb_free"
-                }
+            return _parse_upcitemdb_payload(upc, data)
     except Exception as e:
         debug_print(f"UPCitemdb API error: {type(e).__name__}: {e}")
     
     return None
 
+def lookup_upcs_async(upcs, engine=None, url_template=UPCITEMDB_LOOKUP_URL):
+    """
+    Look up many UPCs concurrently through the enrichment engine.
+    
+    The URL cache (see _cache_lookup) is consulted first, including cached
+    "not found" entries; only uncached UPCs are requested, each at most once.
+    
+    Args:
+        upcs: Iterable of UPC strings (duplicates are looked up once)
+        engine: AsyncEnrichmentEngine (default: 1 request/second, 4 concurrent)
+        url_template: Lookup URL with an {upc} placeholder
+        
+    Returns:
+        Dictionary upc -> result row (None when not found)
+    """
+    urls = {}
+    for upc in upcs:
+        if upc and upc not in urls:
+            urls[upc] = url_template.format(upc=upc)
+    
+    cache = _get_url_cache()
+    results = {}
+    to_fetch = {}
+    for upc, url in urls.items():
+        found, cached_text = _cache_lookup(url)
+        if found:
+            try:
+                results[upc] = _parse_upcitemdb_payload(upc, json.loads(cached_text)) if cached_text else None
+                debug_print(f"Using cached UPC lookup for {upc}")
+                continue
+            except Exception as e:
+                debug_print(f"Cache read error for {upc}: {type(e).__name__}: {e}")
+        to_fetch[upc] = url
+    
+    if not to_fetch:
+        return results
+    
+    if engine is None:
+        engine = AsyncEnrichmentEngine(max_concurrency=4, requests_per_second=1.0, timeout=10.0)
+    print(f"  Fetching {len(to_fetch)} UPC lookups ({len(results)} cached)...")
+    responses = engine.fetch_all(to_fetch.values())
+    
+    for upc, url in to_fetch.items():
+        response = responses.get(url)
+        results[upc] = None
+        if response and response.status == 404:
+            cache.put_negative(url)
+            continue
+        if not response or not response.ok:
+            debug_print(f"UPC lookup failed for {upc}: {response.status if response else 'None'}")
+            continue
+        try:
+            results[upc] = _parse_upcitemdb_payload(upc, json.loads(response.text))
+        except ValueError as e:
+            debug_print(f"UPC lookup returned invalid JSON for {upc}: {e}")
+            continue
+        if results[upc]:
+            cache.put(url, response.text)
+        else:
+            cache.put_negative(url)
+    cache.flush()
+    
+    debug_print(f"Enrichment engine stats: {engine.get_stats()}")
+    return results
+
 def scrape_barcode_lookup(upc, use_free_first=True):
     """
     Look up UPC - tries free APIs first, then falls back to scraping
@@ -573,85 +678,97 @@ def scrape_barcode_lookup(upc, use_free_first=True):
         "source_api": "barcodelookup_scrape"
     }
 
-def process_records(records, out_csv, knowledge_base=None, limit=None, dry_run=False):
+def _knowledge_base_row(result, lookup_result, url):
+    result.update({
+        "title": lookup_result["title"],
+        "price": lookup_result["price"],
+        "size": lookup_result["spec"],
+        "url": url,
+        "specs_json": json.dumps({"Size": lookup_result["spec"], "Store": lookup_result["store"]}, ensure_ascii=False),
+        "source": "knowledge_base"
+    })
+    print(f"  ✅ Found: {lookup_result['title']} ({lookup_result['spec']}) - {lookup_result['price']}")
+
+def process_records(records, out_csv, knowledge_base=None, limit=None, dry_run=False,
+                    enrich_upc=False, engine=None, upc_url_template=UPCITEMDB_LOOKUP_URL):
+    """
+    Look up records and write the specs CSV (one row per record, input order).
+    
+    Knowledge base lookups run first; with enrich_upc=True, records still unresolved
+    that carry a UPC are then looked up concurrently via lookup_upcs_async.
+    """
     out_csv.parent.mkdir(parents=True, exist_ok=True)
     fields = ["vendor","item_name","upc","item_number","title","price","brand","size","url","specs_json","source"]
-    with out_csv.open('w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
-        count = 0
-        for rec in records:
-            if limit and count >= limit:
-                break
-            vendor = (rec.get('vendor') or '').strip()
-            item_name = (rec.get('item_name') or '').strip()
-            upc = (rec.get('upc') or '').strip()
-            item_number = (rec.get('item_number') or '').strip()
-
-            result = {
-                "vendor": vendor,
-                "item_name": item_name,
-                "upc": upc,
-                "item_number": item_number,
-                "title": "", "price": "", "brand": "", "size": "",
-                "url": "", "specs_json": "", "source": ""
-            }
+    rows = []
+    unresolved = []  # indexes into rows needing a UPC lookup
+    for rec in records:
+        if limit and len(rows) >= limit:
+            break
+        vendor = (rec.get('vendor') or '').strip()
+        item_name = (rec.get('item_name') or '').strip()
+        upc = (rec.get('upc') or '').strip()
+        item_number = (rec.get('item_number') or '').strip()
 
-            try:
-                if dry_run:
-                    w.writerow(result)
-                    count += 1
+        result = {
+            "vendor": vendor,
+            "item_name": item_name,
+            "upc": upc,
+            "item_number": item_number,
+            "title": "", "price": "", "brand": "", "size": "",
+            "url": "", "specs_json": "", "source": ""
+        }
+        rows.append(result)
+
+        if dry_run:
+            continue
+
+        try:
+            # Try knowledge base lookup for Costco
+            if vendor.lower().startswith('costco') and item_number:
+                print(f"  Looking up Costco item_number: {item_number} ({item_name})")
+                lookup_result = lookup_item_in_knowledge_base(item_number, knowledge_base)
+                if lookup_result:
+                    _knowledge_base_row(result, lookup_result, f"https://www.costco.com/.product.{item_number}.html")
                     continue
+                else:
+                    print(f"  ⚠️ Not found in knowledge base")
+            
+            # Try knowledge base lookup for RD by item_number
+            if ('restaurant' in vendor.lower() or 'rd' in vendor.lower()) and item_number:
+                print(f"  Looking up RD item_number: {item_number} ({item_name})")
+                lookup_result = lookup_item_in_knowledge_base(item_number, knowledge_base)
+                if lookup_result:
+                    _knowledge_base_row(result, lookup_result, "")
+                    continue
+                else:
+                    print(f"  ⚠️ Not found in knowledge base")
+            
+            # Row is still written if not found (for manual review)
+            if upc:
+                unresolved.append(len(rows) - 1)
 
-                # Try knowledge base lookup for Costco
-                if vendor.lower().startswith('costco') and item_number:
-                    print(f"  Looking up Costco item_number: {item_number} ({item_name})")
-                    lookup_result = lookup_item_in_knowledge_base(item_number, knowledge_base)
-                    if lookup_result:
-                        result.update({
-                            "title": lookup_result["title"],
-                            "price": lookup_result["price"],
-                            "size": lookup_result["spec"],
-                            "url": f"https://www.costco.com/.product.{item_number}.html",
-                            "specs_json": json.dumps({"Size": lookup_result["spec"], "Store": lookup_result["store"]}, ensure_ascii=False),
-                            "source": "knowledge_base"
-                        })
-                        print(f"  ✅ Found: {lookup_result['title']} ({lookup_result['spec']}) - {lookup_result['price']}")
-                        w.writerow(result)
-                        count += 1
-                        continue
-                    else:
-                        print(f"  ⚠️ Not found in knowledge base")
-                
-                # Try knowledge base lookup for RD by item_number
-                if ('restaurant' in vendor.lower() or 'rd' in vendor.lower()) and item_number:
-                    print(f"  Looking up RD item_number: {item_number} ({item_name})")
-                    lookup_result = lookup_item_in_knowledge_base(item_number, knowledge_base)
-                    if lookup_result:
-                        result.update({
-                            "title": lookup_result["title"],
-                            "price": lookup_result["price"],
-                            "size": lookup_result["spec"],
-                            "url": "",
-                            "specs_json": json.dumps({"Size": lookup_result["spec"], "Store": lookup_result["store"]}, ensure_ascii=False),
-                            "source": "knowledge_base"
-                        })
-                        print(f"  ✅ Found: {lookup_result['title']} ({lookup_result['spec']}) - {lookup_result['price']}")
-                        w.writerow(result)
-                        count += 1
-                        continue
-                    else:
-                        print(f"  ⚠️ Not found in knowledge base")
-                
-                # Write row even if not found (for manual review)
-                w.writerow(result)
-                count += 1
+        except Exception as e:
+            result["specs_json"] = json.dumps({"error": str(e)})
 
-            except Exception as e:
-                result["specs_json"] = json.dumps({"error": str(e)})
-                w.writerow(result)
-                count += 1
-                polite_sleep(min_delay * 0.5, max_delay * 0.5, RATE_LIMIT_MULTIPLIER)
+    if enrich_upc and unresolved:
+        upc_results = lookup_upcs_async((rows[i]["upc"] for i in unresolved), engine=engine,
+                                        url_template=upc_url_template)
+        for i in unresolved:
+            found = upc_results.get(rows[i]["upc"])
+            if found:
+                rows[i].update({
+                    "title": found["title"],
+                    "brand": found["brand"],
+                    "size": found["size"],
+                    "url": found["url"],
+                    "specs_json": found["specs_json"],
+                    "source": found["source_api"]
+                })
+
+    with out_csv.open('w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        w.writerows(rows)
 
 def main():
     import argparse
@@ -666,6 +783,10 @@ def main():
     ap.add_argument("--limit", type=int, default=None, help="Limit number of rows to query")
     ap.add_argument("--dry-run", action="store_true", help="Only parse report and write rows without lookups")
     ap.add_argument("--debug", action="store_true", help="Enable debug mode with verbose output")
+    ap.add_argument("--enrich-upc", action="store_true",
+                    help="Look up UPCs not found in the knowledge base via UPCitemdb (cached, rate-limited)")
+    ap.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent UPC lookups (default: 4)")
+    ap.add_argument("--rps", type=float, default=1.0, help="Maximum UPC lookups per second per host (default: 1.0)")
     args = ap.parse_args()
     
     # Set global debug flag
@@ -704,8 +825,13 @@ def main():
     if args.limit:
         print(f"Processing first {args.limit} items...")
     
+    engine = AsyncEnrichmentEngine(max_concurrency=args.concurrency, requests_per_second=args.rps)
     process_records(filtered, Path(args.out), knowledge_base=knowledge_base, 
-                    limit=args.limit, dry_run=args.dry_run)
+                    limit=args.limit, dry_run=args.dry_run,
+                    enrich_upc=args.enrich_upc, engine=engine)
+    if _URL_CACHE is not None:
+        _URL_CACHE.flush()
+        print(_URL_CACHE.summary())
     print(f"Done! Results written to: {args.out}")
 
 if __name__ == "__main__":
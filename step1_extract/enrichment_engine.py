@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Enrichment Engine - Async, rate-limited HTTP fetching for product lookups
+Used by WebstaurantStoreLookup and costco_rd_scraper to enrich many unknown items at once.
+
+Features:
+- Per-host token-bucket rate limiting (replaces time.sleep-based politeness)
+- Bounded concurrency across hosts
+- Connection reuse (one aiohttp session, or one pooled requests.Session fallback)
+- Retries with exponential backoff for errors, 429 and 5xx (honors Retry-After)
+- De-duplication: each URL is fetched at most once per engine, concurrent callers share it
+
+Callers consult their own caches first and only hand uncached URLs to the engine.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Prefer aiohttp for native async I/O; fall back to a pooled requests.Session in worker threads
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+# Status codes worth retrying; everything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchResponse:
+    """Result of a single URL fetch (status 0 means the request never succeeded)"""
+
+    __slots__ = ('url', 'status', 'content', 'error')
+
+    def __init__(self, url: str, status: int, content: bytes = b'', error: Optional[str] = None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='ignore')
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: float = 1.0, state: Optional[tuple] = None):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        # state = (tokens, monotonic timestamp) carried over from a previous run
+        self._tokens, self._last = state if state else (self.capacity, time.monotonic())
+        self._lock = asyncio.Lock()
+
+    def state(self) -> tuple:
+        return self._tokens, self._last
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class AsyncEnrichmentEngine:
+    """Fetch many URLs concurrently with per-host rate limits, retries and de-duplication"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        host_rates: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        timeout: float = 10.0,
+        headers: Optional[Dict[str, str]] = None,
+        use_aiohttp: Optional[bool] = None,
+    ):
+        """
+        Initialize enrichment engine
+
+        Args:
+            max_concurrency: Maximum in-flight requests across all hosts
+            requests_per_second: Default per-host request rate
+            burst: Token bucket capacity (requests allowed back-to-back)
+            host_rates: Per-host overrides of requests_per_second
+            max_retries: Attempts per URL (including the first)
+            backoff_base: Initial retry delay in seconds (doubles per attempt)
+            timeout: Per-request timeout in seconds
+            headers: HTTP headers (defaults to a desktop browser User-Agent)
+            use_aiohttp: Force/disable aiohttp backend (default: use it when installed)
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.host_rates = dict(host_rates or {})
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self.use_aiohttp = AIOHTTP_AVAILABLE if use_aiohttp is None else (use_aiohttp and AIOHTTP_AVAILABLE)
+
+        # Completed fetches and per-host bucket levels survive across fetch_all() calls
+        self._results: Dict[str, FetchResponse] = {}
+        self._bucket_state: Dict[str, tuple] = {}
+        self._stats = {'requests': 0, 'retries': 0, 'deduplicated': 0, 'failures': 0}
+
+    # ---------------- public API ----------------
+    def fetch_all(self, urls: Iterable[str]) -> Dict[str, FetchResponse]:
+        """
+        Fetch URLs concurrently (blocking wrapper around the async engine).
+
+        Returns:
+            Dictionary url -> FetchResponse, one entry per unique URL
+        """
+        unique: List[str] = []
+        seen = set()
+        for url in urls:
+            if not url:
+                continue
+            if url in seen or url in self._results:
+                self._stats['deduplicated'] += 1
+            if url not in seen:
+                seen.add(url)
+                unique.append(url)
+
+        pending = [u for u in unique if u not in self._results]
+        if pending:
+            asyncio.run(self._run(pending))
+        return {u: self._results[u] for u in unique if u in self._results}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get engine statistics for logging/monitoring"""
+        stats = dict(self._stats)
+        stats['backend'] = 'aiohttp' if self.use_aiohttp else 'requests'
+        return stats
+
+    # ---------------- async internals ----------------
+    async def _run(self, urls: List[str]) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        buckets: Dict[str, TokenBucket] = {}
+        inflight: Dict[str, asyncio.Future] = {}
+
+        if self.use_aiohttp:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as session:
+                await asyncio.gather(*(
+                    self._fetch(url, session, None, semaphore, buckets, inflight) for url in urls
+                ))
+        else:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=self.max_concurrency, pool_maxsize=self.max_concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            try:
+                await asyncio.gather(*(
+                    self._fetch(url, session, executor, semaphore, buckets, inflight) for url in urls
+                ))
+            finally:
+                executor.shutdown(wait=True)
+                session.close()
+
+        for host, bucket in buckets.items():
+            self._bucket_state[host] = bucket.state()
+
+    def _bucket_for(self, url: str, buckets: Dict[str, TokenBucket]) -> TokenBucket:
+        host = urlparse(url).netloc
+        bucket = buckets.get(host)
+        if bucket is None:
+            rate = self.host_rates.get(host, self.requests_per_second)
+            bucket = TokenBucket(rate, self.burst, self._bucket_state.get(host))
+            buckets[host] = bucket
+        return bucket
+
+    async def _fetch(self, url, session, executor, semaphore, buckets, inflight) -> FetchResponse:
+        if url in self._results:
+            return self._results[url]
+        if url in inflight:
+            self._stats['deduplicated'] += 1
+            return await inflight[url]
+
+        future = asyncio.get_running_loop().create_future()
+        inflight[url] = future
+        try:
+            response = await self._fetch_with_retries(url, session, executor, semaphore, buckets)
+        except Exception as e:  # pragma: no cover - defensive, _fetch_with_retries catches I/O errors
+            response = FetchResponse(url, 0, error=str(e))
+        self._results[url] = response
+        future.set_result(response)
+        del inflight[url]
+        return response
+
+    async def _fetch_with_retries(self, url, session, executor, semaphore, buckets) -> FetchResponse:
+        bucket = self._bucket_for(url, buckets)
+        delay = self.backoff_base
+        response = FetchResponse(url, 0, error='not attempted')
+
+        for attempt in range(1, self.max_retries + 1):
+            await bucket.acquire()
+            retry_after = None
+            async with semaphore:
+                self._stats['requests'] += 1
+                try:
+                    if executor is None:
+                        response, retry_after = await self._get_aiohttp(session, url)
+                    else:
+                        response, retry_after = await self._get_requests(session, executor, url)
+                except Exception as e:
+                    response = FetchResponse(url, 0, error=f"{type(e).__name__}: {e}")
+
+            if response.status and response.status not in RETRY_STATUSES:
+                return response
+            if attempt < self.max_retries:
+                self._stats['retries'] += 1
+                wait = retry_after if retry_after is not None else delay * (1 + random.random() * 0.25)
+                logger.debug(f"Retrying {url} in {wait:.2f}s (attempt {attempt}/{self.max_retries}, "
+                             f"status={response.status}, error={response.error})")
+                await asyncio.sleep(wait)
+                delay *= 2
+
+        self._stats['failures'] += 1
+        logger.debug(f"Giving up on {url} after {self.max_retries} attempts")
+        return response
+
+    async def _get_aiohttp(self, session, url: str):
+        async with session.get(url) as resp:
+            content = await resp.read()
+            return FetchResponse(url, resp.status, content), _parse_retry_after(resp.headers.get('Retry-After'))
+
+    async def _get_requests(self, session, executor, url: str):
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(executor, lambda: session.get(url, timeout=self.timeout))
+        return FetchResponse(url, resp.status_code, resp.content), _parse_retry_after(resp.headers.get('Retry-After'))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric Retry-After header (HTTP-date values are ignored)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -7,11 +7,20 @@ Outputs HTML report (can be printed to PDF or opened in Word)
 import json
 import logging
 from pathlib import Path
+import re
+import shutil
 from datetime import datetime
+from string import Template
 from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Number + unit in size strings ("3.0 lb", "64 fl oz", "1 Gallon / unit")
+_SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s+([a-zA-Z]+(?:\s+[a-zA-Z]+)?)')
+# Numeric pack spec ("20*1-kg", "18×4")
+_PACK_SPEC_PATTERN = re.compile(r'\d+\s*[*×]\s*\d+')
+_SLUG_PATTERN = re.compile(r'[^a-z0-9]+')
+
 
 def _load_picked_weight_rules() -> Dict:
     """Load rules for using picked weight for weight items"""
@@ -122,11 +131,10 @@ def _format_bbi_quantity_display(item: Dict) -> str:
         if baseline_pack_count and baseline_pack_count > 1 and qty_float > 0:
             packs = qty_float / baseline_pack_count
             # Check if spec is numeric (baseline_uom_raw contains numeric patterns like "20*1-kg")
-            import re
             spec_is_numeric = False
             if baseline_uom_raw:
                 # Check if it contains numeric patterns like "20*1", "18*4", etc.
-                spec_is_numeric = bool(re.search(r'\d+\s*[*×]\s*\d+', baseline_uom_raw))
+                spec_is_numeric = bool(_PACK_SPEC_PATTERN.search(baseline_uom_raw))
             
             if packs >= 2 and spec_is_numeric:
                 if packs == int(packs):
@@ -154,12 +162,8 @@ def _format_size_for_display(size_str: str) -> str:
     if not size_str or size_str == "N/A":
         return size_str
     
-    import re
-    
-    # Pattern: number (with optional decimal) followed by unit(s)
+    # Pattern: number (with optional decimal) followed by unit(s) - see _SIZE_PATTERN
     # Match patterns like "3.0 lb", "1 Gallon", "64 fl oz", "2 lbs bag"
-    # This handles cases like "64 fl oz", "10.0 lb", "1 Gallon / unit"
-    pattern = r'(\d+(?:\.\d+)?)\s+([a-zA-Z]+(?:\s+[a-zA-Z]+)?)'
     
     def replace_func(match):
         num_str = match.group(1)
@@ -185,7 +189,7 @@ def _format_size_for_display(size_str: str) -> str:
         return f"{num}-{unit}"
     
     # Replace number + unit patterns throughout the string
-    formatted = re.sub(pattern, replace_func, size_str)
+    formatted = _SIZE_PATTERN.sub(replace_func, size_str)
     return formatted
 
 
@@ -269,135 +273,88 @@ def _get_category_badge_html(item: Dict) -> str:
     '''
 
 
-def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
-    """
-    Generate HTML report from extracted receipt data
-    
-    Args:
-        extracted_data: Dictionary mapping receipt IDs to extracted data
-        output_path: Path to save HTML report
-        
-    Returns:
-        Path to generated HTML report
-    """
-    output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Load rules for picked weight display
-    picked_weight_rules = _load_picked_weight_rules()
-    
-    # Calculate summary statistics
-    total_receipts = len(extracted_data)
-    # Use items_sold (total purchased items) if available, otherwise count items
-    total_items = 0
-    for receipt in extracted_data.values():
-        items_sold = receipt.get('items_sold')
-        if items_sold is not None:
-            total_items += float(items_sold)
-        else:
-            total_items += len(receipt.get('items', []))
-    total_amount = sum(float(receipt.get('total', 0) or 0) for receipt in extracted_data.values())
-    
-    # Group by vendor
-    vendor_stats = {}
-    for receipt_id, receipt_data in extracted_data.items():
-        vendor = receipt_data.get('vendor') or 'Unknown'
-        if vendor not in vendor_stats:
-            vendor_stats[vendor] = {'count': 0, 'total': 0, 'items': 0.0}
-        vendor_stats[vendor]['count'] += 1
-        vendor_stats[vendor]['total'] += float(receipt_data.get('total', 0) or 0)
-        # Use items_sold (total purchased items) if available, otherwise count items
-        items_sold = receipt_data.get('items_sold')
-        if items_sold is not None:
-            vendor_stats[vendor]['items'] += float(items_sold)
-        else:
-            vendor_stats[vendor]['items'] += len(receipt_data.get('items', []))
-    
-    # Generate HTML
-    html_content = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Receipt Extraction Report - Step 1</title>
-    <style>
-        * {{
+# Receipts per vendor page when a report is split by vendor (split_by_vendor=True), so
+# no single HTML file has to hold a year of receipts
+RECEIPTS_PER_PAGE = 100
+
+_REPORT_CSS = """
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
-        body {{
+        }
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             line-height: 1.6;
             color: #333;
             background-color: #f5f5f5;
             padding: 20px;
-        }}
-        .container {{
+        }
+        .container {
             max-width: 1200px;
             margin: 0 auto;
             background: white;
             padding: 30px;
             box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
+        }
+        h1 {
             color: #2c3e50;
             border-bottom: 3px solid #3498db;
             padding-bottom: 10px;
             margin-bottom: 30px;
-        }}
-        h2 {{
+        }
+        h2 {
             color: #34495e;
             margin-top: 30px;
             margin-bottom: 15px;
             border-bottom: 2px solid #ecf0f1;
             padding-bottom: 5px;
-        }}
-        .summary {{
+        }
+        .summary {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             margin-bottom: 30px;
-        }}
-        .stat-card {{
+        }
+        .stat-card {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 20px;
             border-radius: 8px;
             text-align: center;
             box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        }}
-        .stat-card h3 {{
+        }
+        .stat-card h3 {
             font-size: 2em;
             margin-bottom: 5px;
-        }}
-        .stat-card p {{
+        }
+        .stat-card p {
             font-size: 0.9em;
             opacity: 0.9;
-        }}
-        .vendor-stats {{
+        }
+        .vendor-stats {
             margin-bottom: 30px;
-        }}
-        table {{
+        }
+        table {
             width: 100%;
             border-collapse: collapse;
             margin-bottom: 30px;
             background: white;
-        }}
-        th, td {{
+        }
+        th, td {
             padding: 12px;
             text-align: left;
             border-bottom: 1px solid #ddd;
-        }}
-        th {{
+        }
+        th {
             background-color: #3498db;
             color: white;
             font-weight: 600;
-        }}
-        tr:hover {{
+        }
+        tr:hover {
             background-color: #f5f5f5;
-        }}
-        .receipt-section {{
+        }
+        .receipt-section {
             margin-bottom: 30px;
             page-break-inside: avoid;
             border: 1px solid #ddd;
@@ -405,62 +362,62 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
             padding: 0;
             background: white;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .receipt-header {{
+        }
+        .receipt-header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 20px;
             border-radius: 8px 8px 0 0;
-        }}
-        .receipt-header h3 {{
+        }
+        .receipt-header h3 {
             margin: 0;
             font-size: 1.3em;
             font-weight: 600;
-        }}
-        .review-warning {{
+        }
+        .review-warning {
             margin: 15px;
             padding: 12px 15px;
             background-color: #fff3cd;
             border-left: 4px solid #ffc107;
             border-radius: 4px;
-        }}
-        .review-warning strong {{
+        }
+        .review-warning strong {
             color: #856404;
             display: block;
             margin-bottom: 8px;
-        }}
-        .review-warning ul {{
+        }
+        .review-warning ul {
             margin: 0;
             padding-left: 20px;
             color: #856404;
-        }}
-        .review-warning li {{
+        }
+        .review-warning li {
             margin-bottom: 4px;
-        }}
-        .item-row {{
+        }
+        .item-row {
             display: flex;
             justify-content: space-between;
             padding: 10px 0;
             border-bottom: 1px solid #eee;
             align-items: flex-start;
-        }}
-        .item-name {{
+        }
+        .item-name {
             flex: 2;
             font-weight: 500;
-        }}
-        .item-details {{
+        }
+        .item-details {
             flex: 1;
             text-align: right;
             color: #666;
             min-width: 150px;
-        }}
-        .unit-info {{
+        }
+        .unit-info {
             font-size: 0.85em;
             color: #666;
             margin-top: 3px;
             line-height: 1.4;
-        }}
-        .unit-badge {{
+        }
+        .unit-badge {
             display: inline-block;
             background: #ecf0f1;
             color: #34495e;
@@ -468,17 +425,17 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
             border-radius: 3px;
             font-size: 0.8em;
             margin-right: 5px;
-        }}
-        .confidence-high {{
+        }
+        .confidence-high {
             color: #27ae60;
-        }}
-        .confidence-medium {{
+        }
+        .confidence-medium {
             color: #f39c12;
-        }}
-        .confidence-low {{
+        }
+        .confidence-low {
             color: #e74c3c;
-        }}
-        .receipt-total {{
+        }
+        .receipt-total {
             margin-top: 15px;
             padding-top: 15px;
             border-top: 2px solid #3498db;
@@ -486,61 +443,72 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
             font-size: 1.2em;
             font-weight: bold;
             color: #2c3e50;
-        }}
-        .metadata {{
+        }
+        .metadata {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
             gap: 10px;
             margin-bottom: 15px;
             font-size: 0.9em;
             color: #666;
-        }}
-        .metadata-item {{
+        }
+        .metadata-item {
             display: flex;
             align-items: center;
-        }}
-        .metadata-label {{
+        }
+        .metadata-label {
             font-weight: 600;
             margin-right: 5px;
-        }}
-        .footer {{
+        }
+        .footer {
             margin-top: 40px;
             padding-top: 20px;
             border-top: 2px solid #ecf0f1;
             text-align: center;
             color: #666;
             font-size: 0.9em;
-        }}
-        @media print {{
-            body {{
+        }
+        @media print {
+            body {
                 background: white;
-            }}
-            .container {{
+            }
+            .container {
                 box-shadow: none;
-            }}
-            .receipt-section {{
+            }
+            .receipt-section {
                 page-break-inside: avoid;
-            }}
-        }}
-    </style>
+            }
+        }
+"""
+
+# Page templates ($-placeholders; receipt sections are rendered by _render_receipt_section)
+_PAGE_START = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>$title</title>
+    <style>$css    </style>
 </head>
 <body>
     <div class="container">
-        <h1>📋 Receipt Extraction Report - Step 1</h1>
-        <p style="color: #666; margin-bottom: 30px;">Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        
+        <h1>📋 $heading</h1>
+        <p style="color: #666; margin-bottom: 30px;">Generated on $generated</p>
+$nav""")
+
+_SUMMARY = Template("""        
         <h2>📊 Summary Statistics</h2>
         <div class="summary">
             <div class="stat-card">
-                <h3>{total_receipts}</h3>
+                <h3>$total_receipts</h3>
                 <p>Total Receipts</p>
             </div>
             <div class="stat-card">
-                <h3>{total_items}</h3>
+                <h3>$total_items</h3>
                 <p>Total Items</p>
             </div>
             <div class="stat-card">
-                <h3>${total_amount:,.2f}</h3>
+                <h3>$$$total_amount</h3>
                 <p>Total Amount</p>
             </div>
         </div>
@@ -557,67 +525,237 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
                     </tr>
                 </thead>
                 <tbody>
-"""
-    
-    # Add vendor statistics
-    for vendor, stats in sorted(vendor_stats.items(), key=lambda x: x[1]['count'], reverse=True):
-        html_content += f"""
+""")
+
+_VENDOR_ROW = Template("""
                     <tr>
-                        <td><strong>{vendor}</strong></td>
-                        <td>{stats['count']}</td>
-                        <td>{stats['items']:.0f}</td>
-                        <td>${stats['total']:,.2f}</td>
+                        <td><strong>$vendor</strong></td>
+                        <td>$count</td>
+                        <td>$items</td>
+                        <td>$$$total</td>
                     </tr>
-"""
-    
-    html_content += """
+""")
+
+_SUMMARY_END = """
                 </tbody>
             </table>
         </div>
-        
-        <h2>🧾 Receipt Details</h2>
 """
-    
-    # Add receipt details
-    for receipt_id, receipt_data in sorted(extracted_data.items()):
+
+_PAGE_NAV = Template("""        <p class="page-nav" style="margin-bottom: 20px;">$links</p>
+""")
+
+_PAGE_END = Template("""
+        <div class="footer">
+            <p>Report generated by Receipt Importer Workflow - Step 1</p>
+            <p>Total Receipts: $total_receipts | Total Items: $total_items | Total Amount: $$$total_amount</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+def _precompute_report_data(extracted_data: Dict) -> Dict:
+    """
+    Single pass over all receipts and items before rendering: derives the display
+    fields of every item once and collects the summary / per-vendor statistics
+
+    Returns:
+        Dict with total_receipts, total_items, total_amount and vendor_stats
+    """
+    total_items = 0
+    total_amount = 0.0
+    vendor_stats = {}
+    for receipt_data in extracted_data.values():
         items = receipt_data.get('items', [])
+        for item in items:
+            item.update(derive_display_fields(item))
+
+        receipt_total = float(receipt_data.get('total', 0) or 0)
+        # Use items_sold (total purchased items) if available, otherwise count items
+        items_sold = receipt_data.get('items_sold')
+        receipt_items = float(items_sold) if items_sold is not None else len(items)
+        total_items += receipt_items
+        total_amount += receipt_total
+
         vendor = receipt_data.get('vendor') or 'Unknown'
-        order_date = receipt_data.get('order_date') or receipt_data.get('date') or receipt_data.get('transaction_date') or 'N/A'
-        transaction_date = receipt_data.get('transaction_date') or receipt_data.get('date') or receipt_data.get('order_date')
-        filename = receipt_data.get('filename', receipt_id)
-        total = receipt_data.get('total', 0)
-        
-        # Quality flag for missing transaction date
-        missing_date_flag = ''
-        if not transaction_date or transaction_date == 'N/A':
-            missing_date_flag = '<span style="background:#dc3545;color:white;padding:4px 8px;border-radius:3px;font-size:0.85em;margin-left:10px;">⚠️ Missing Date</span>'
-        
-        # Get source type information
-        source_type = receipt_data.get('source_type', 'unknown')
-        source_info = []
-        
-        # Display source type if available
-        if source_type and source_type != 'unknown':
-            source_label = source_type.upper().replace('_', ' ')
-            source_info.append(f'<span style="background: #95a5a6; color: white; padding: 3px 8px; border-radius: 3px; font-size: 0.85em;">{source_label}</span>')
-        
-        # Check if vendor was detected from filename
-        vendor_from_filename = receipt_data.get('vendor_source') == 'filename'
-        # For Group 1 Excel files, if vendor_source is not set, check if vendor likely came from filename
-        # group1 deprecated - check for localgrocery vendors directly
-        if not vendor_from_filename and receipt_data.get('source_type') == 'localgrocery_based':
-            # Check if filename contains vendor identifier patterns
-            filename_lower = filename.lower()
-            vendor_lower = vendor.lower() if vendor else ''
-            # If vendor name or common identifiers appear in filename, likely from filename
-            vendor_from_filename = (
-                vendor_lower in filename_lower or
-                any(keyword in filename_lower for keyword in ['costco', 'rd_', 'restaurant', 'jewel', 'mariano', 'aldi', 'parktoshop'])
-            )
-        
-        vendor_attention = ' <span style="color: #ffc107; font-size: 0.9em;" title="Vendor detected from filename">⚠️</span>' if vendor_from_filename else ''
+        if vendor not in vendor_stats:
+            vendor_stats[vendor] = {'count': 0, 'total': 0, 'items': 0.0}
+        vendor_stats[vendor]['count'] += 1
+        vendor_stats[vendor]['total'] += receipt_total
+        vendor_stats[vendor]['items'] += receipt_items
+
+    return {
+        'total_receipts': len(extracted_data),
+        'total_items': total_items,
+        'total_amount': total_amount,
+        'vendor_stats': vendor_stats,
+    }
+
+
+def _vendor_page_name(vendor: str, page: int) -> str:
+    """File name of a vendor page: 'restaurant_depot.html', 'restaurant_depot_2.html', ..."""
+    slug = _SLUG_PATTERN.sub('_', vendor.lower()).strip('_') or 'unknown'
+    return f"{slug}.html" if page == 1 else f"{slug}_{page}.html"
+
+
+def _write_page_start(f, title: str, heading: str, nav: str = '') -> None:
+    f.write(_PAGE_START.substitute(
+        title=title,
+        heading=heading,
+        css=_REPORT_CSS,
+        generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        nav=_PAGE_NAV.substitute(links=nav) if nav else '',
+    ))
+
+
+def _write_summary(f, report: Dict, vendor_links: Optional[Dict[str, str]] = None) -> None:
+    f.write(_SUMMARY.substitute(
+        total_receipts=report['total_receipts'],
+        total_items=report['total_items'],
+        total_amount=f"{report['total_amount']:,.2f}",
+    ))
+    for vendor, stats in sorted(report['vendor_stats'].items(), key=lambda x: x[1]['count'], reverse=True):
+        label = vendor
+        if vendor_links and vendor in vendor_links:
+            label = f'<a href="{vendor_links[vendor]}">{vendor}</a>'
+        f.write(_VENDOR_ROW.substitute(
+            vendor=label,
+            count=stats['count'],
+            items=f"{stats['items']:.0f}",
+            total=f"{stats['total']:,.2f}",
+        ))
+    f.write(_SUMMARY_END)
+
+
+def _write_page_end(f, report: Dict) -> None:
+    f.write(_PAGE_END.substitute(
+        total_receipts=report['total_receipts'],
+        total_items=report['total_items'],
+        total_amount=f"{report['total_amount']:,.2f}",
+    ))
+
+
+def generate_html_report(extracted_data: Dict, output_path: Path, split_by_vendor: bool = False,
+                         receipts_per_page: int = RECEIPTS_PER_PAGE) -> Path:
+    """
+    Generate HTML report from extracted receipt data
+    
+    Receipt sections are rendered and written one at a time, so memory use does not
+    grow with the size of the report.
+    
+    Args:
+        extracted_data: Dictionary mapping receipt IDs to extracted data
+        output_path: Path to save HTML report (the index page when split by vendor)
+        split_by_vendor: Write receipts to per-vendor pages (receipts_per_page each) in
+            <stem>_pages/, linked from a summary-only index page at output_path
+        receipts_per_page: Receipts per vendor page
         
-        html_content += f"""
+    Returns:
+        Path to generated HTML report
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    # Derive display fields and summary statistics once
+    report = _precompute_report_data(extracted_data)
+    
+    # Vendor pages from an earlier run of this report would be stale (and picked up by the PDF step)
+    pages_dir = output_path.parent / f"{output_path.stem}_pages"
+    if pages_dir.is_dir():
+        shutil.rmtree(pages_dir)
+    
+    if not split_by_vendor:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            _write_page_start(f, 'Receipt Extraction Report - Step 1', 'Receipt Extraction Report - Step 1')
+            _write_summary(f, report)
+            f.write("        \n        <h2>🧾 Receipt Details</h2>\n")
+            for receipt_id, receipt_data in sorted(extracted_data.items()):
+                f.write(_render_receipt_section(receipt_id, receipt_data))
+            _write_page_end(f, report)
+        logger.info(f"Generated HTML report: {output_path}")
+        return output_path
+    
+    # Per-vendor pages (paginated) in a folder next to the index page
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    receipts_per_page = max(1, receipts_per_page)
+    
+    receipt_ids_by_vendor = {}
+    for receipt_id in sorted(extracted_data):
+        vendor = extracted_data[receipt_id].get('vendor') or 'Unknown'
+        receipt_ids_by_vendor.setdefault(vendor, []).append(receipt_id)
+    
+    vendor_links = {}
+    for vendor, receipt_ids in receipt_ids_by_vendor.items():
+        page_count = (len(receipt_ids) + receipts_per_page - 1) // receipts_per_page
+        vendor_links[vendor] = f"{pages_dir.name}/{_vendor_page_name(vendor, 1)}"
+        for page in range(1, page_count + 1):
+            nav = [f'<a href="../{output_path.name}">← Index</a>', f'Page {page} of {page_count}']
+            if page > 1:
+                nav.append(f'<a href="{_vendor_page_name(vendor, page - 1)}">← Previous</a>')
+            if page < page_count:
+                nav.append(f'<a href="{_vendor_page_name(vendor, page + 1)}">Next →</a>')
+            page_receipt_ids = receipt_ids[(page - 1) * receipts_per_page:page * receipts_per_page]
+            with open(pages_dir / _vendor_page_name(vendor, page), 'w', encoding='utf-8') as f:
+                _write_page_start(f, f'Receipt Extraction Report - {vendor}', f'{vendor} Receipts', ' | '.join(nav))
+                f.write("        \n        <h2>🧾 Receipt Details</h2>\n")
+                for receipt_id in page_receipt_ids:
+                    f.write(_render_receipt_section(receipt_id, extracted_data[receipt_id]))
+                _write_page_end(f, report)
+    
+    with open(output_path, 'w', encoding='utf-8') as f:
+        _write_page_start(f, 'Receipt Extraction Report - Step 1', 'Receipt Extraction Report - Step 1')
+        _write_summary(f, report, vendor_links)
+        _write_page_end(f, report)
+    
+    logger.info(f"Generated HTML report: {output_path} "
+                f"({len(vendor_links)} vendor page set(s) in {pages_dir.name}/)")
+    return output_path
+
+
+def _render_receipt_section(receipt_id: str, receipt_data: Dict) -> str:
+    """Render the HTML section of one receipt (header, metadata, items, totals)"""
+    html_content = ""
+    
+    items = receipt_data.get('items', [])
+    vendor = receipt_data.get('vendor') or 'Unknown'
+    order_date = receipt_data.get('order_date') or receipt_data.get('date') or receipt_data.get('transaction_date') or 'N/A'
+    transaction_date = receipt_data.get('transaction_date') or receipt_data.get('date') or receipt_data.get('order_date')
+    filename = receipt_data.get('filename', receipt_id)
+    total = receipt_data.get('total', 0)
+    
+    # Quality flag for missing transaction date
+    missing_date_flag = ''
+    if not transaction_date or transaction_date == 'N/A':
+        missing_date_flag = '<span style="background:#dc3545;color:white;padding:4px 8px;border-radius:3px;font-size:0.85em;margin-left:10px;">⚠️ Missing Date</span>'
+    
+    # Get source type information
+    source_type = receipt_data.get('source_type', 'unknown')
+    source_info = []
+    
+    # Display source type if available
+    if source_type and source_type != 'unknown':
+        source_label = source_type.upper().replace('_', ' ')
+        source_info.append(f'<span style="background: #95a5a6; color: white; padding: 3px 8px; border-radius: 3px; font-size: 0.85em;">{source_label}</span>')
+    
+    # Check if vendor was detected from filename
+    vendor_from_filename = receipt_data.get('vendor_source') == 'filename'
+    # For Group 1 Excel files, if vendor_source is not set, check if vendor likely came from filename
+    # group1 deprecated - check for localgrocery vendors directly
+    if not vendor_from_filename and receipt_data.get('source_type') == 'localgrocery_based':
+        # Check if filename contains vendor identifier patterns
+        filename_lower = filename.lower()
+        vendor_lower = vendor.lower() if vendor else ''
+        # If vendor name or common identifiers appear in filename, likely from filename
+        vendor_from_filename = (
+            vendor_lower in filename_lower or
+            any(keyword in filename_lower for keyword in ['costco', 'rd_', 'restaurant', 'jewel', 'mariano', 'aldi', 'parktoshop'])
+        )
+    
+    vendor_attention = ' <span style="color: #ffc107; font-size: 0.9em;" title="Vendor detected from filename">⚠️</span>' if vendor_from_filename else ''
+    
+    html_content += f"""
         <div class="receipt-section">
             <div class="receipt-header">
                 <h3>{receipt_id} {missing_date_flag}</h3>
@@ -641,234 +779,234 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
                     <span><strong>{receipt_data.get('items_sold', len(items))}</strong></span>
                 </div>
 """
-        
-        # Add source information if available
-        if source_info:
-            html_content += f"""
+    
+    # Add source information if available
+    if source_info:
+        html_content += f"""
                 <div class="metadata-item">
                     <span class="metadata-label">Source:</span>
                     <span>{' | '.join(source_info)}</span>
                 </div>
 """
-        
-        html_content += """
+    
+    html_content += """
             </div>
 """
-        
-        # Add review flags if needed (exclude "Vendor not confidently identified" as we show that with attention sign)
-        needs_review = receipt_data.get('needs_review', False)
-        review_reasons = receipt_data.get('review_reasons', [])
-        # Filter out "Vendor not confidently identified" from review reasons
-        filtered_review_reasons = [r for r in review_reasons if r != "Vendor not confidently identified"]
-        
-        if needs_review and filtered_review_reasons:
-            html_content += """
+    
+    # Add review flags if needed (exclude "Vendor not confidently identified" as we show that with attention sign)
+    needs_review = receipt_data.get('needs_review', False)
+    review_reasons = receipt_data.get('review_reasons', [])
+    # Filter out "Vendor not confidently identified" from review reasons
+    filtered_review_reasons = [r for r in review_reasons if r != "Vendor not confidently identified"]
+    
+    if needs_review and filtered_review_reasons:
+        html_content += """
                 <div class="review-warning">
                     <strong>⚠️ Needs Review:</strong>
                     <ul>
 """
-            for reason in filtered_review_reasons:
-                html_content += f"                        <li>{reason}</li>\n"
-            html_content += """                    </ul>
+        for reason in filtered_review_reasons:
+            html_content += f"                        <li>{reason}</li>\n"
+        html_content += """                    </ul>
                 </div>
 """
-        
-        html_content += f"""
+    
+    html_content += f"""
             <div style="margin-top: 15px;">
 """
+    
+    # Detect if this is Group 1 (Excel-based) receipt
+    source_group = receipt_data.get('source_group', '')
+    # group1 deprecated - check source_type instead
+    is_group1 = receipt_data.get('source_type') == 'localgrocery_based'
+    
+    # Add items
+    for item in items:
+        # Display fields (quantity, size, UoM) were derived once for all items in
+        # _precompute_report_data, use everywhere
         
-        # Detect if this is Group 1 (Excel-based) receipt
-        source_group = receipt_data.get('source_group', '')
-        # group1 deprecated - check source_type instead
-        is_group1 = receipt_data.get('source_type') == 'localgrocery_based'
+        # Use display_name or canonical_name or product_name for display (avoid blank rows)
+        product_name = item.get('display_name') or item.get('canonical_name') or item.get('product_name') or '(unnamed)'
+        quantity = item.get('quantity', 0)
+        # Use purchase_uom if available, otherwise fallback to raw_uom_text from Excel
+        purchase_uom = item.get('purchase_uom') or item.get('raw_uom_text') or 'unknown'
+        unit_price = item.get('unit_price', 0)
+        total_price = item.get('total_price', 0)
         
-        # Add items
-        for item in items:
-            # Derive display fields (quantity, size, UoM) once, use everywhere
-            item.update(derive_display_fields(item))
-            
-            # Use display_name or canonical_name or product_name for display (avoid blank rows)
-            product_name = item.get('display_name') or item.get('canonical_name') or item.get('product_name') or '(unnamed)'
-            quantity = item.get('quantity', 0)
-            # Use purchase_uom if available, otherwise fallback to raw_uom_text from Excel
-            purchase_uom = item.get('purchase_uom') or item.get('raw_uom_text') or 'unknown'
-            unit_price = item.get('unit_price', 0)
-            total_price = item.get('total_price', 0)
-            
-            # Item number and UPC (extracted from name hygiene)
-            item_number = item.get('item_number')
-            vendor_item_no = item.get('vendor_item_no')  # RD-specific vendor item number
-            item_code = item.get('item_code')
-            upc = item.get('upc')
-            
-            # Size/spec (from name hygiene)
-            size_spec = item.get('size_spec', '')
-            
-            # No Charge marker (from name hygiene)
-            is_no_charge = item.get('is_no_charge', False)
-            
-            # Unit details
-            size = item.get('size', '')
-            unit_confidence = item.get('unit_confidence')
-            count_per_package = item.get('count_per_package')
-            csv_linked = item.get('csv_linked', False)
-            
-            # Knowledge base information (for Costco and RD only)
-            kb_size = item.get('kb_size')  # Size/spec from knowledge base (e.g., "3-lbs bag", "6 × 32-fl oz")
-            kb_source = item.get('kb_source')  # "knowledge_base" if enriched
-            price_source = item.get('price_source')  # "knowledge_base" if unit_price is from KB
-            
-            # Legacy vendor information (backward compatibility)
-            vendor_size = item.get('vendor_size')
-            vendor_price = item.get('vendor_price')
-            
-            # Format sizes for display (view-friendly)
-            size = _format_size_for_display(size) if size else ''
-            kb_size_display = _format_size_for_display(kb_size) if kb_size else kb_size
-            vendor_size = _format_size_for_display(vendor_size) if vendor_size else ''
-            
-            # Check if this is Costco or RD receipt
-            vendor_name = receipt_data.get('vendor', '').lower()
-            is_costco_or_rd = 'costco' in vendor_name or 'restaurant' in vendor_name or 'rd' == vendor_name.strip().lower()
-            
-            # Build unit information display (for detailed unit info section only)
-            # Note: Main display uses display_quantity, display_size, display_uom from derive_display_fields
-            exclude_cogs_badge = '<span style="background:#f5c6cb;color:#721c24;padding:2px 6px;border-radius:3px;font-size:0.75em;margin-left:6px;">Excluded from COGS</span>' if item.get('exclude_from_cogs') else ''
-            no_charge_badge = '<span style="background:#fff3cd;color:#856404;padding:2px 6px;border-radius:3px;font-size:0.75em;margin-left:6px;">No Charge</span>' if is_no_charge else ''
-            
-            # Build detailed unit information
-            unit_info_parts = []
-            
-            # Display UPC, Vendor Item #, and Item Number as separate columns (hide if empty)
-            # For all receipts, show UPC, Vendor Item#, and Item# if available
-            if upc is not None and upc:
-                unit_info_parts.insert(0, f'<strong>UPC:</strong> {upc}')
-            if vendor_item_no is not None and vendor_item_no:
-                unit_info_parts.insert(1, f'<strong>Vendor Item #:</strong> {vendor_item_no}')
-            if item_number is not None and item_number:
-                # Only show Item # if vendor_item_no is not already shown (avoid duplication)
-                if not vendor_item_no:
-                    unit_info_parts.insert(1, f'<strong>Item #:</strong> {item_number}')
-                elif item_number != vendor_item_no:
-                    # Show both if they're different
-                    unit_info_parts.insert(2, f'<strong>Item #:</strong> {item_number}')
-            
-            # Display size_spec (from name hygiene) if available
-            if size_spec:
-                unit_info_parts.append(f'<strong>Size/Spec:</strong> {size_spec}')
-            
-            if size:
-                unit_info_parts.append(f'<strong>Size:</strong> {size}')
-            
-            # Display KB size and source for Costco and RD only
-            if is_costco_or_rd:
-                if kb_size:
-                    # Use green badge for KB-enriched items
-                    kb_badge = '<span style="background: #d4edda; color: #155724; padding: 2px 6px; border-radius: 3px; font-size: 0.8em; margin-left: 5px;">📚 KB</span>'
-                    unit_info_parts.append(f'<strong>KB Size/Spec:</strong> {kb_size_display} {kb_badge}')
-                elif vendor_size:
-                    # Fallback to legacy vendor_size if available
-                    unit_info_parts.append(f'<strong>Vendor Size:</strong> {vendor_size}')
-                
-                # Show if price was sourced from KB
-                if price_source == 'knowledge_base':
-                    unit_info_parts.append(f'<span style="background: #d4edda; color: #155724; padding: 2px 6px; border-radius: 3px; font-size: 0.8em;">💰 KB Price</span>')
-                elif vendor_price is not None:
-                    # Fallback to legacy vendor_price if available
-                    unit_info_parts.append(f'<strong>Vendor Price:</strong> ${vendor_price:.2f}')
-            
-            if count_per_package:
-                unit_info_parts.append(f'<strong>Count:</strong> {count_per_package} per package')
-            
-            if unit_confidence is not None:
-                confidence_pct = int(unit_confidence * 100)
-                confidence_class = 'confidence-high' if unit_confidence >= 0.8 else 'confidence-medium' if unit_confidence >= 0.5 else 'confidence-low'
-                unit_info_parts.append(f'<strong>Confidence:</strong> <span class="{confidence_class}">{confidence_pct}%</span>')
-            
-            if csv_linked:
-                unit_info_parts.append('<strong>Source:</strong> CSV')
+        # Item number and UPC (extracted from name hygiene)
+        item_number = item.get('item_number')
+        vendor_item_no = item.get('vendor_item_no')  # RD-specific vendor item number
+        item_code = item.get('item_code')
+        upc = item.get('upc')
+        
+        # Size/spec (from name hygiene)
+        size_spec = item.get('size_spec', '')
+        
+        # No Charge marker (from name hygiene)
+        is_no_charge = item.get('is_no_charge', False)
+        
+        # Unit details
+        size = item.get('size', '')
+        unit_confidence = item.get('unit_confidence')
+        count_per_package = item.get('count_per_package')
+        csv_linked = item.get('csv_linked', False)
+        
+        # Knowledge base information (for Costco and RD only)
+        kb_size = item.get('kb_size')  # Size/spec from knowledge base (e.g., "3-lbs bag", "6 × 32-fl oz")
+        kb_source = item.get('kb_source')  # "knowledge_base" if enriched
+        price_source = item.get('price_source')  # "knowledge_base" if unit_price is from KB
+        
+        # Legacy vendor information (backward compatibility)
+        vendor_size = item.get('vendor_size')
+        vendor_price = item.get('vendor_price')
+        
+        # Format sizes for display (view-friendly)
+        size = _format_size_for_display(size) if size else ''
+        kb_size_display = _format_size_for_display(kb_size) if kb_size else kb_size
+        vendor_size = _format_size_for_display(vendor_size) if vendor_size else ''
+        
+        # Check if this is Costco or RD receipt
+        vendor_name = receipt_data.get('vendor', '').lower()
+        is_costco_or_rd = 'costco' in vendor_name or 'restaurant' in vendor_name or 'rd' == vendor_name.strip().lower()
+        
+        # Build unit information display (for detailed unit info section only)
+        # Note: Main display uses display_quantity, display_size, display_uom from derive_display_fields
+        exclude_cogs_badge = '<span style="background:#f5c6cb;color:#721c24;padding:2px 6px;border-radius:3px;font-size:0.75em;margin-left:6px;">Excluded from COGS</span>' if item.get('exclude_from_cogs') else ''
+        no_charge_badge = '<span style="background:#fff3cd;color:#856404;padding:2px 6px;border-radius:3px;font-size:0.75em;margin-left:6px;">No Charge</span>' if is_no_charge else ''
+        
+        # Build detailed unit information
+        unit_info_parts = []
+        
+        # Display UPC, Vendor Item #, and Item Number as separate columns (hide if empty)
+        # For all receipts, show UPC, Vendor Item#, and Item# if available
+        if upc is not None and upc:
+            unit_info_parts.insert(0, f'<strong>UPC:</strong> {upc}')
+        if vendor_item_no is not None and vendor_item_no:
+            unit_info_parts.insert(1, f'<strong>Vendor Item #:</strong> {vendor_item_no}')
+        if item_number is not None and item_number:
+            # Only show Item # if vendor_item_no is not already shown (avoid duplication)
+            if not vendor_item_no:
+                unit_info_parts.insert(1, f'<strong>Item #:</strong> {item_number}')
+            elif item_number != vendor_item_no:
+                # Show both if they're different
+                unit_info_parts.insert(2, f'<strong>Item #:</strong> {item_number}')
+        
+        # Display size_spec (from name hygiene) if available
+        if size_spec:
+            unit_info_parts.append(f'<strong>Size/Spec:</strong> {size_spec}')
+        
+        if size:
+            unit_info_parts.append(f'<strong>Size:</strong> {size}')
+        
+        # Display KB size and source for Costco and RD only
+        if is_costco_or_rd:
+            if kb_size:
+                # Use green badge for KB-enriched items
+                kb_badge = '<span style="background: #d4edda; color: #155724; padding: 2px 6px; border-radius: 3px; font-size: 0.8em; margin-left: 5px;">📚 KB</span>'
+                unit_info_parts.append(f'<strong>KB Size/Spec:</strong> {kb_size_display} {kb_badge}')
+            elif vendor_size:
+                # Fallback to legacy vendor_size if available
+                unit_info_parts.append(f'<strong>Vendor Size:</strong> {vendor_size}')
             
-            # Build unit info HTML
-            unit_info_html = ""
-            if unit_info_parts:
-                unit_info_html = f'''
+            # Show if price was sourced from KB
+            if price_source == 'knowledge_base':
+                unit_info_parts.append(f'<span style="background: #d4edda; color: #155724; padding: 2px 6px; border-radius: 3px; font-size: 0.8em;">💰 KB Price</span>')
+            elif vendor_price is not None:
+                # Fallback to legacy vendor_price if available
+                unit_info_parts.append(f'<strong>Vendor Price:</strong> ${vendor_price:.2f}')
+        
+        if count_per_package:
+            unit_info_parts.append(f'<strong>Count:</strong> {count_per_package} per package')
+        
+        if unit_confidence is not None:
+            confidence_pct = int(unit_confidence * 100)
+            confidence_class = 'confidence-high' if unit_confidence >= 0.8 else 'confidence-medium' if unit_confidence >= 0.5 else 'confidence-low'
+            unit_info_parts.append(f'<strong>Confidence:</strong> <span class="{confidence_class}">{confidence_pct}%</span>')
+        
+        if csv_linked:
+            unit_info_parts.append('<strong>Source:</strong> CSV')
+        
+        # Build unit info HTML
+        unit_info_html = ""
+        if unit_info_parts:
+            unit_info_html = f'''
                 <div class="unit-info">
                     {', '.join(unit_info_parts)}
                 </div>'''
-            
-            # Validate: Check if unit_price × quantity equals total_price
-            # Convert to floats for comparison (handle None/0 values)
-            qty_float = float(quantity) if quantity else 0.0
-            unit_price_float = float(unit_price) if unit_price else 0.0
-            total_price_float = float(total_price) if total_price else 0.0
-            
-            # Get vendor code for vendor-specific validation
-            vendor_code = receipt_data.get('vendor') or receipt_data.get('detected_vendor_code') or ''
-            upper_vendor = (vendor_code or '').upper()
-            is_bbi = 'BBI' in upper_vendor
-            
-            # Get display fields (already derived above)
-            display_quantity = item.get('display_quantity')
-            display_size = item.get('display_size')
-            display_uom = item.get('display_uom', '')
-            
-            # Format display values for template
-            quantity_str = str(display_quantity) if display_quantity is not None else str(qty_float)
-            size_str = str(display_size) if display_size else '—'
-            uom_str = str(display_uom) if display_uom else '—'
-            
-            # Get vendor-specific flags (vendor_code and upper_vendor already set above for BBI check)
-            is_webstaurantstore = 'WEBSTAURANTSTORE' in upper_vendor
-            is_costco = 'COSTCO' in upper_vendor or 'COSTCO' in (receipt_data.get('vendor','').upper())
-            is_rd = 'RD' == upper_vendor or 'RESTAURANT_DEPOT' in upper_vendor or 'RESTAURANT DEPOT' in (receipt_data.get('vendor','').upper())
+        
+        # Validate: Check if unit_price × quantity equals total_price
+        # Convert to floats for comparison (handle None/0 values)
+        qty_float = float(quantity) if quantity else 0.0
+        unit_price_float = float(unit_price) if unit_price else 0.0
+        total_price_float = float(total_price) if total_price else 0.0
+        
+        # Get vendor code for vendor-specific validation
+        vendor_code = receipt_data.get('vendor') or receipt_data.get('detected_vendor_code') or ''
+        upper_vendor = (vendor_code or '').upper()
+        is_bbi = 'BBI' in upper_vendor
+        
+        # Get display fields (already derived above)
+        display_quantity = item.get('display_quantity')
+        display_size = item.get('display_size')
+        display_uom = item.get('display_uom', '')
+        
+        # Format display values for template
+        quantity_str = str(display_quantity) if display_quantity is not None else str(qty_float)
+        size_str = str(display_size) if display_size else '—'
+        uom_str = str(display_uom) if display_uom else '—'
+        
+        # Get vendor-specific flags (vendor_code and upper_vendor already set above for BBI check)
+        is_webstaurantstore = 'WEBSTAURANTSTORE' in upper_vendor
+        is_costco = 'COSTCO' in upper_vendor or 'COSTCO' in (receipt_data.get('vendor','').upper())
+        is_rd = 'RD' == upper_vendor or 'RESTAURANT_DEPOT' in upper_vendor or 'RESTAURANT DEPOT' in (receipt_data.get('vendor','').upper())
 
-            # Vendor-specific display rule for unit_price:
-            # - Costco: display unit_price computed from total_price / quantity (KB price is only for inference)
-            # - RD: display unit_price from receipt as-is
-            if is_costco and qty_float > 0 and total_price_float > 0:
-                unit_price_float = round(total_price_float / qty_float, 2)
-            
-            # Calculate expected total (vendor-specific logic)
-            if is_webstaurantstore:
-                # WEBSTAURANTSTORE-specific: total_price = (unit_price × quantity) + item_tax
-                item_tax = float(item.get('item_tax') or 0)
-                expected_total = (qty_float * unit_price_float) + item_tax if qty_float > 0 and unit_price_float > 0 else total_price_float
-                calculation_display = f"{qty_float:g} × ${unit_price_float:.2f} + ${item_tax:.2f} (tax) = ${expected_total:.2f}"
-            else:
-                # For other vendors: total_price = unit_price × quantity
-                expected_total = qty_float * unit_price_float if qty_float > 0 and unit_price_float > 0 else total_price_float
-                calculation_display = f"{qty_float:g} × ${unit_price_float:.2f} = ${expected_total:.2f}"
-            
-            # Check if they match (allow small rounding differences of 0.01)
-            price_match = abs(expected_total - total_price_float) < 0.01
-            
-            # Quality flags for BBI and all vendors
-            quality_flags = []
-            # Zero price warning
-            if unit_price_float == 0 or total_price_float == 0:
-                quality_flags.append('<span style="background:#fff3cd;color:#856404;padding:2px 6px;border-radius:3px;font-size:0.8em;margin-left:6px;">⚠️ Zero Price</span>')
-            # Inferred quantity warning (for BBI items)
-            if item.get('needs_quantity_review', False):
-                quality_flags.append('<span style="background:#d1ecf1;color:#0c5460;padding:2px 6px;border-radius:3px;font-size:0.8em;margin-left:6px;">ℹ️ Inferred Quantity</span>')
-            
-            # Missing transaction date warning (for receipt level, not item level)
-            # This will be checked at receipt level
-            
-            quality_flags_html = ' '.join(quality_flags) if quality_flags else ''
-            
-            # Apply highlighting if prices don't match
-            price_style = ""
-            price_warning = ""
-            if not price_match and qty_float > 0 and unit_price_float > 0 and total_price_float > 0:
-                price_style = 'background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin-top: 5px; border-radius: 4px;'
-                price_warning = f'<div style="color: #856404; font-weight: bold; font-size: 0.9em; margin-top: 5px;">⚠️ Price Mismatch: Expected ${expected_total:.2f} ({calculation_display}), Got ${total_price_float:.2f}, Difference: ${abs(expected_total - total_price_float):.2f}</div>'
-            
-            # Badge for missing codes (for manual attention)
-            missing_codes_badge = ''
-            if is_group1 and not item.get('has_codes', False):
-                missing_codes_badge = '<span style="background: #ffeeba; color: #856404; padding: 2px 6px; border-radius: 3px; font-size: 0.75em; margin-left: 6px;">No UPC/Item#</span>'
+        # Vendor-specific display rule for unit_price:
+        # - Costco: display unit_price computed from total_price / quantity (KB price is only for inference)
+        # - RD: display unit_price from receipt as-is
+        if is_costco and qty_float > 0 and total_price_float > 0:
+            unit_price_float = round(total_price_float / qty_float, 2)
+        
+        # Calculate expected total (vendor-specific logic)
+        if is_webstaurantstore:
+            # WEBSTAURANTSTORE-specific: total_price = (unit_price × quantity) + item_tax
+            item_tax = float(item.get('item_tax') or 0)
+            expected_total = (qty_float * unit_price_float) + item_tax if qty_float > 0 and unit_price_float > 0 else total_price_float
+            calculation_display = f"{qty_float:g} × ${unit_price_float:.2f} + ${item_tax:.2f} (tax) = ${expected_total:.2f}"
+        else:
+            # For other vendors: total_price = unit_price × quantity
+            expected_total = qty_float * unit_price_float if qty_float > 0 and unit_price_float > 0 else total_price_float
+            calculation_display = f"{qty_float:g} × ${unit_price_float:.2f} = ${expected_total:.2f}"
+        
+        # Check if they match (allow small rounding differences of 0.01)
+        price_match = abs(expected_total - total_price_float) < 0.01
+        
+        # Quality flags for BBI and all vendors
+        quality_flags = []
+        # Zero price warning
+        if unit_price_float == 0 or total_price_float == 0:
+            quality_flags.append('<span style="background:#fff3cd;color:#856404;padding:2px 6px;border-radius:3px;font-size:0.8em;margin-left:6px;">⚠️ Zero Price</span>')
+        # Inferred quantity warning (for BBI items)
+        if item.get('needs_quantity_review', False):
+            quality_flags.append('<span style="background:#d1ecf1;color:#0c5460;padding:2px 6px;border-radius:3px;font-size:0.8em;margin-left:6px;">ℹ️ Inferred Quantity</span>')
+        
+        # Missing transaction date warning (for receipt level, not item level)
+        # This will be checked at receipt level
+        
+        quality_flags_html = ' '.join(quality_flags) if quality_flags else ''
+        
+        # Apply highlighting if prices don't match
+        price_style = ""
+        price_warning = ""
+        if not price_match and qty_float > 0 and unit_price_float > 0 and total_price_float > 0:
+            price_style = 'background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin-top: 5px; border-radius: 4px;'
+            price_warning = f'<div style="color: #856404; font-weight: bold; font-size: 0.9em; margin-top: 5px;">⚠️ Price Mismatch: Expected ${expected_total:.2f} ({calculation_display}), Got ${total_price_float:.2f}, Difference: ${abs(expected_total - total_price_float):.2f}</div>'
+        
+        # Badge for missing codes (for manual attention)
+        missing_codes_badge = ''
+        if is_group1 and not item.get('has_codes', False):
+            missing_codes_badge = '<span style="background: #ffeeba; color: #856404; padding: 2px 6px; border-radius: 3px; font-size: 0.75em; margin-left: 6px;">No UPC/Item#</span>'
 
-            html_content += f"""
+        html_content += f"""
                 <div class="item-row" style="{price_style if not price_match else ''}">
                     <div style="flex: 2;">
                         <div class="item-name">{product_name}{missing_codes_badge}{no_charge_badge}</div>
@@ -890,109 +1028,109 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
                     </div>
                 </div>
 """
-        
-        # Get tax and other charges (always show, even if 0)
-        # Handle None values explicitly
-        tax_raw = receipt_data.get('tax')
-        tax = float(tax_raw) if tax_raw is not None else 0.0
-        
-        # Get shipping & handling (always show, even if 0)
-        shipping_raw = receipt_data.get('shipping')
-        shipping = float(shipping_raw) if shipping_raw is not None else 0.0
-        
-        # Calculate other_charges from fees (bag fee, tips, service fees) if not already set
-        # Other charges should include all fees except tax and shipping
-        other_charges_raw = receipt_data.get('other_charges')
-        other_charges = float(other_charges_raw) if other_charges_raw is not None else 0.0
-        
-        # Also sum fees from items (items with is_fee=True) and no-charge items if other_charges is not already calculated
-        # No-charge items are excluded from COGS but visible in "Other/Operational"
-        if other_charges == 0.0:
-            fee_items = [item for item in receipt_data.get('items', []) if item.get('is_fee', False)]
-            no_charge_items = [item for item in receipt_data.get('items', []) if item.get('is_no_charge', False)]
-            if fee_items or no_charge_items:
-                other_charges = sum(float(item.get('total_price') or 0) for item in fee_items + no_charge_items)
-        
-        subtotal_raw = receipt_data.get('subtotal')
-        subtotal = float(subtotal_raw) if subtotal_raw is not None else 0.0
-        
-        # Get vendor code to apply vendor-specific logic
-        vendor_code = receipt_data.get('vendor') or receipt_data.get('detected_vendor_code') or ''
-        upper_vendor = vendor_code.upper()
-        is_webstaurantstore = 'WEBSTAURANTSTORE' in upper_vendor
-        
-        # Verify calculated total against receipt total
-        # Exclude fees and no-charge items from COGS calculations
-        calculated_item_total = sum(
-            float(item.get('total_price') or 0) 
-            for item in items 
-            if not item.get('is_fee', False) and not item.get('is_no_charge', False)
-        )
-        
-        # Vendor-specific logic for subtotal calculation
-        if is_webstaurantstore:
-            # WEBSTAURANTSTORE-specific logic:
-            # - Subtotal (summary) is TAX EXCLUDED (sum of unit_price × quantity only)
-            # - Item total_price includes tax: total_price = (unit_price × quantity) + item_tax
-            # - So sum of item total_price ≠ subtotal (summary) because it includes tax
-            # - We MUST use the extracted subtotal (tax excluded) if provided
-            if subtotal > 0:
-                calculated_subtotal = subtotal
-            else:
-                # Fallback: calculate from items (unit_price × quantity, tax excluded)
-                # Exclude fees and no-charge items from COGS calculations
-                calculated_subtotal = sum(
-                    float(item.get('unit_price') or 0) * float(item.get('quantity') or 0)
-                    for item in items 
-                    if not item.get('is_fee', False) and not item.get('is_no_charge', False)
-                )
+    
+    # Get tax and other charges (always show, even if 0)
+    # Handle None values explicitly
+    tax_raw = receipt_data.get('tax')
+    tax = float(tax_raw) if tax_raw is not None else 0.0
+    
+    # Get shipping & handling (always show, even if 0)
+    shipping_raw = receipt_data.get('shipping')
+    shipping = float(shipping_raw) if shipping_raw is not None else 0.0
+    
+    # Calculate other_charges from fees (bag fee, tips, service fees) if not already set
+    # Other charges should include all fees except tax and shipping
+    other_charges_raw = receipt_data.get('other_charges')
+    other_charges = float(other_charges_raw) if other_charges_raw is not None else 0.0
+    
+    # Also sum fees from items (items with is_fee=True) and no-charge items if other_charges is not already calculated
+    # No-charge items are excluded from COGS but visible in "Other/Operational"
+    if other_charges == 0.0:
+        fee_items = [item for item in receipt_data.get('items', []) if item.get('is_fee', False)]
+        no_charge_items = [item for item in receipt_data.get('items', []) if item.get('is_no_charge', False)]
+        if fee_items or no_charge_items:
+            other_charges = sum(float(item.get('total_price') or 0) for item in fee_items + no_charge_items)
+    
+    subtotal_raw = receipt_data.get('subtotal')
+    subtotal = float(subtotal_raw) if subtotal_raw is not None else 0.0
+    
+    # Get vendor code to apply vendor-specific logic
+    vendor_code = receipt_data.get('vendor') or receipt_data.get('detected_vendor_code') or ''
+    upper_vendor = vendor_code.upper()
+    is_webstaurantstore = 'WEBSTAURANTSTORE' in upper_vendor
+    
+    # Verify calculated total against receipt total
+    # Exclude fees and no-charge items from COGS calculations
+    calculated_item_total = sum(
+        float(item.get('total_price') or 0) 
+        for item in items 
+        if not item.get('is_fee', False) and not item.get('is_no_charge', False)
+    )
+    
+    # Vendor-specific logic for subtotal calculation
+    if is_webstaurantstore:
+        # WEBSTAURANTSTORE-specific logic:
+        # - Subtotal (summary) is TAX EXCLUDED (sum of unit_price × quantity only)
+        # - Item total_price includes tax: total_price = (unit_price × quantity) + item_tax
+        # - So sum of item total_price ≠ subtotal (summary) because it includes tax
+        # - We MUST use the extracted subtotal (tax excluded) if provided
+        if subtotal > 0:
+            calculated_subtotal = subtotal
         else:
-            # For other vendors: use extracted subtotal if provided, otherwise use calculated from items
-            if subtotal > 0:
-                calculated_subtotal = subtotal
-            else:
-                calculated_subtotal = calculated_item_total
-        
-        calculated_total = calculated_subtotal + shipping + tax + other_charges
-        receipt_total = receipt_data.get('total', 0.0) or 0.0
-        
-        # Verify calculated items quantity against items_sold from receipt
-        # Exclude fees and no-charge items from quantity calculations
-        calculated_items_qty = sum(
-            float(item.get('quantity') or 0) 
-            for item in items 
-            if not item.get('is_fee', False) and not item.get('is_no_charge', False)
-        )
-        receipt_items_sold = receipt_data.get('items_sold')
-        
-        # Prepare validation messages and check marks
-        total_validation_warning = ""
-        items_validation_warning = ""
-        total_check = ""
-        items_check = ""
-        
-        if receipt_total > 0:
-            total_diff = abs(calculated_total - receipt_total)
-            if total_diff > 0.01:  # Allow 1 cent tolerance
-                total_validation_warning = f'<div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin: 10px 0; border-radius: 4px;"><strong>⚠️ Total Mismatch:</strong> Calculated ${calculated_total:.2f} (Subtotal: ${calculated_subtotal:.2f} + Shipping: ${shipping:.2f} + Tax: ${tax:.2f} + Other Charges: ${other_charges:.2f}) ≠ Receipt Total ${receipt_total:.2f}, Difference: ${total_diff:.2f}</div>'
-            else:
-                total_check = ' <span style="color: #28a745;">✅</span>'
-        
-        if receipt_items_sold is not None:
-            items_sold_float = float(receipt_items_sold)
-            items_diff = abs(calculated_items_qty - items_sold_float)
-            if items_diff > 0.5:  # Allow 0.5 tolerance for rounding
-                items_validation_warning = f'<div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin: 10px 0; border-radius: 4px;"><strong>⚠️ Items Quantity Mismatch:</strong> Calculated {calculated_items_qty:.1f} items ≠ Receipt Items Sold {items_sold_float:.1f}, Difference: {items_diff:.1f}</div>'
-            else:
-                items_check = ' <span style="color: #28a745;">✅</span>'
-        
-        # Get receipt total (use calculated if not available from receipt)
-        total = receipt_data.get('total', 0.0) or calculated_total or 0.0
-        
-        # RD-specific: label tax as "Total Tax"
-        tax_label = 'Total Tax' if ('RD' in upper_vendor or 'RESTAURANT_DEPOT' in upper_vendor) else 'Tax'
+            # Fallback: calculate from items (unit_price × quantity, tax excluded)
+            # Exclude fees and no-charge items from COGS calculations
+            calculated_subtotal = sum(
+                float(item.get('unit_price') or 0) * float(item.get('quantity') or 0)
+                for item in items 
+                if not item.get('is_fee', False) and not item.get('is_no_charge', False)
+            )
+    else:
+        # For other vendors: use extracted subtotal if provided, otherwise use calculated from items
+        if subtotal > 0:
+            calculated_subtotal = subtotal
+        else:
+            calculated_subtotal = calculated_item_total
+    
+    calculated_total = calculated_subtotal + shipping + tax + other_charges
+    receipt_total = receipt_data.get('total', 0.0) or 0.0
+    
+    # Verify calculated items quantity against items_sold from receipt
+    # Exclude fees and no-charge items from quantity calculations
+    calculated_items_qty = sum(
+        float(item.get('quantity') or 0) 
+        for item in items 
+        if not item.get('is_fee', False) and not item.get('is_no_charge', False)
+    )
+    receipt_items_sold = receipt_data.get('items_sold')
+    
+    # Prepare validation messages and check marks
+    total_validation_warning = ""
+    items_validation_warning = ""
+    total_check = ""
+    items_check = ""
+    
+    if receipt_total > 0:
+        total_diff = abs(calculated_total - receipt_total)
+        if total_diff > 0.01:  # Allow 1 cent tolerance
+            total_validation_warning = f'<div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin: 10px 0; border-radius: 4px;"><strong>⚠️ Total Mismatch:</strong> Calculated ${calculated_total:.2f} (Subtotal: ${calculated_subtotal:.2f} + Shipping: ${shipping:.2f} + Tax: ${tax:.2f} + Other Charges: ${other_charges:.2f}) ≠ Receipt Total ${receipt_total:.2f}, Difference: ${total_diff:.2f}</div>'
+        else:
+            total_check = ' <span style="color: #28a745;">✅</span>'
+    
+    if receipt_items_sold is not None:
+        items_sold_float = float(receipt_items_sold)
+        items_diff = abs(calculated_items_qty - items_sold_float)
+        if items_diff > 0.5:  # Allow 0.5 tolerance for rounding
+            items_validation_warning = f'<div style="background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 8px; margin: 10px 0; border-radius: 4px;"><strong>⚠️ Items Quantity Mismatch:</strong> Calculated {calculated_items_qty:.1f} items ≠ Receipt Items Sold {items_sold_float:.1f}, Difference: {items_diff:.1f}</div>'
+        else:
+            items_check = ' <span style="color: #28a745;">✅</span>'
+    
+    # Get receipt total (use calculated if not available from receipt)
+    total = receipt_data.get('total', 0.0) or calculated_total or 0.0
+    
+    # RD-specific: label tax as "Total Tax"
+    tax_label = 'Total Tax' if ('RD' in upper_vendor or 'RESTAURANT_DEPOT' in upper_vendor) else 'Tax'
 
-        html_content += f"""
+    html_content += f"""
             </div>
             <div class="receipt-total" style="padding: 0 20px 20px 20px;">
                 {total_validation_warning}
@@ -1032,22 +1170,7 @@ def generate_html_report(extracted_data: Dict, output_path: Path) -> Path:
         </div>
 """
     
-    html_content += f"""
-        <div class="footer">
-            <p>Report generated by Receipt Importer Workflow - Step 1</p>
-            <p>Total Receipts: {total_receipts} | Total Items: {total_items} | Total Amount: ${total_amount:,.2f}</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
-    
-    # Write HTML file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
-    logger.info(f"Generated HTML report: {output_path}")
-    return output_path
+    return html_content
 
 
 def main():
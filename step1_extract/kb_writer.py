@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Knowledge Base Writer - Write-behind buffer for knowledge_base.json
+Collects new KB entries from worker threads and flushes them atomically.
+
+Lookups go through a lock-protected in-memory view (on-disk entries + pending
+entries), so items added earlier in the run are visible to later receipts
+before anything is written to disk. Flushes re-read the file, merge pending
+entries that are still missing, and replace the file via temp file + rename.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# fcntl is POSIX-only; without it flushes are still atomic, just not serialized across processes
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+class KnowledgeBaseWriter:
+    """Thread-safe, write-behind view of a knowledge_base.json file"""
+
+    def __init__(self, kb_path: Path, flush_every: Optional[int] = None):
+        """
+        Initialize knowledge base writer
+
+        Args:
+            kb_path: Path to knowledge_base.json
+            flush_every: Flush after this many pending entries (0 = only on explicit flush).
+                         Defaults to RECEIPTS_KB_FLUSH_EVERY environment variable, or 0.
+        """
+        self.kb_path = Path(kb_path)
+        if flush_every is None:
+            try:
+                flush_every = int(os.getenv('RECEIPTS_KB_FLUSH_EVERY', '0'))
+            except ValueError:
+                flush_every = 0
+        self.flush_every = max(0, flush_every)
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Any] = self._read_file()
+        self._pending: Dict[str, Any] = {}
+        self._flush_count = 0
+        self._written_count = 0
+
+    # ---------------- read side ----------------
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look up an entry (pending entries included)"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            return self._entries.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._pending or key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries) + len(self._pending)
+
+    # ---------------- write side ----------------
+    def add_if_missing(self, key: str, entry: Any) -> bool:
+        """
+        Buffer a new entry unless the key is already known.
+
+        Returns:
+            True if the entry was buffered
+        """
+        with self._lock:
+            if key in self._pending or key in self._entries:
+                return False
+            self._pending[key] = entry
+            should_flush = self.flush_every and len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+        return True
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Merge pending entries into the on-disk file atomically.
+
+        Entries written by another process since we loaded the file win over ours,
+        matching the "only add missing items" semantics of the original updater.
+
+        Returns:
+            Number of entries written
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending = dict(self._pending)
+            try:
+                self.kb_path.parent.mkdir(parents=True, exist_ok=True)
+                with self._file_lock():
+                    merged = self._read_file()
+                    added = 0
+                    for key, entry in pending.items():
+                        if key not in merged:
+                            merged[key] = entry
+                            added += 1
+                    self._atomic_write(merged)
+            except Exception as e:
+                logger.warning(f"Knowledge base flush failed ({self.kb_path}): {e}")
+                return 0
+            self._entries = merged
+            for key in pending:
+                self._pending.pop(key, None)
+            self._flush_count += 1
+            self._written_count += added
+            logger.debug(f"Knowledge base flush: {added} new entries -> {self.kb_path}")
+            return added
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer statistics for logging/monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'pending': len(self._pending),
+                'flushes': self._flush_count,
+                'written': self._written_count,
+            }
+
+    # ---------------- helpers ----------------
+    def _read_file(self) -> Dict[str, Any]:
+        try:
+            with open(self.kb_path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Could not read knowledge base {self.kb_path}: {e}")
+            return {}
+
+    def _atomic_write(self, data: Dict[str, Any]) -> None:
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=f'.{self.kb_path.name}.', suffix='.tmp', dir=str(self.kb_path.parent)
+        )
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.kb_path)
+        except Exception:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serialize read-merge-write across processes via a sidecar lock file"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        lock_path = self.kb_path.with_name(self.kb_path.name + '.lock')
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -5,15 +5,21 @@ Applies vendor-specific Excel/PDF layout configurations to extract data.
 Supports multiple layouts per vendor with applies_to conditions.
 """
 
+from __future__ import annotations
+
 import re
 import logging
-import pandas as pd
 import hashlib
 import threading
 from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
 
+from .utils.lazy_import import lazy_module
+
+# pandas is only needed once an Excel/CSV layout is applied
+pd = lazy_module('pandas')
+
 logger = logging.getLogger(__name__)
 
 META_PATTERNS = (
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Lookup Cache - Persistent product lookup cache with negative entries and TTLs
+Shared by WebstaurantStoreLookup and costco_rd_scraper.
+
+Backed by a single SQLite file (stdlib, transactional), so saving a new entry is
+an incremental INSERT rather than a rewrite of the whole cache. Features:
+- Negative entries ("looked up, not found") so misses are not re-requested every run
+- Per-entry expiry (separate default TTLs for hits and negative entries)
+- Size bound with least-recently-used eviction
+- Namespaces, so several lookup sources can share one file
+- Hit / miss / negative-hit counters for the run summary
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+class LookupCache:
+    """Thread-safe persistent cache for product lookups"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        namespace: str = 'default',
+        default_ttl: Optional[float] = 90 * DAY,
+        negative_ttl: Optional[float] = 14 * DAY,
+        max_entries: int = 100000,
+        evict_every: int = 100,
+    ):
+        """
+        Initialize lookup cache
+
+        Args:
+            db_path: SQLite file path (created if missing)
+            namespace: Key namespace (e.g. 'webstaurantstore', 'url')
+            default_ttl: Seconds a positive entry stays valid (None = forever)
+            negative_ttl: Seconds a negative entry stays valid (None = forever)
+            max_entries: Maximum entries per namespace before LRU eviction
+            evict_every: Enforce the size bound after this many writes (flush() always does)
+        """
+        self.db_path = Path(db_path)
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_entries)
+        self.evict_every = max(1, evict_every)
+
+        self._lock = threading.RLock()
+        self._writes_since_evict = 0
+        # LRU access times are buffered and written on flush(), so reads never hold a write lock
+        self._touched: Dict[str, float] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'expired': 0, 'writes': 0, 'evictions': 0}
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit: every put is its own small transaction (cheap in WAL mode)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS lookup_cache ('
+            ' namespace TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' value TEXT,'
+            ' negative INTEGER NOT NULL DEFAULT 0,'
+            ' expires_at REAL,'
+            ' last_access REAL NOT NULL,'
+            ' PRIMARY KEY (namespace, key))'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_lookup_cache_lru ON lookup_cache (namespace, last_access)'
+        )
+
+    # ---------------- read side ----------------
+    def lookup(self, key: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Look up a key.
+
+        Returns:
+            (found, value): found is False on a miss or expired entry;
+            value is None for a negative entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, negative, expires_at FROM lookup_cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return False, None
+            value, negative, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                self._execute_write('DELETE FROM lookup_cache WHERE namespace = ? AND key = ?',
+                                    (self.namespace, key))
+                return False, None
+            self._touched[key] = now
+            if negative:
+                self._stats['negative_hits'] += 1
+                return True, None
+            self._stats['hits'] += 1
+            return True, json.loads(value)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT expires_at FROM lookup_cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key),
+            ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM lookup_cache WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0]
+
+    # ---------------- write side ----------------
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a positive entry (ttl defaults to default_ttl)"""
+        ttl = self.default_ttl if ttl is None else ttl
+        self._put(key, json.dumps(value, ensure_ascii=False), False, ttl)
+
+    def put_negative(self, key: str, ttl: Optional[float] = None) -> None:
+        """Remember that a key was looked up and not found (ttl defaults to negative_ttl)"""
+        ttl = self.negative_ttl if ttl is None else ttl
+        self._put(key, None, True, ttl)
+
+    def _put(self, key: str, value: Optional[str], negative: bool, ttl: Optional[float]) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._execute_write(
+                'INSERT OR REPLACE INTO lookup_cache (namespace, key, value, negative, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (self.namespace, key, value, int(negative), expires_at, now),
+            )
+            self._stats['writes'] += 1
+
+    def flush(self) -> None:
+        """Persist buffered access times and enforce the size bound"""
+        with self._lock:
+            self._write_touched()
+            self._evict()
+            self._writes_since_evict = 0
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for logging/monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['namespace'] = self.namespace
+        return stats
+
+    def summary(self) -> str:
+        """One-line summary for end-of-run logging"""
+        s = self.get_stats()
+        return (f"Lookup cache [{s['namespace']}]: {s['hits']} hits, {s['negative_hits']} negative hits, "
+                f"{s['misses']} misses, {s['writes']} writes, {s['evictions']} evictions")
+
+    # ---------------- helpers ----------------
+    def _execute_write(self, sql: str, params: tuple) -> None:
+        self._conn.execute(sql, params)
+        self._touched.pop(params[1], None)
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= self.evict_every:
+            self._write_touched()
+            self._evict()
+            self._writes_since_evict = 0
+
+    def _write_touched(self) -> None:
+        if not self._touched:
+            return
+        touched = [(ts, self.namespace, key) for key, ts in self._touched.items()]
+        self._touched.clear()
+        self._conn.execute('BEGIN')
+        try:
+            self._conn.executemany(
+                'UPDATE lookup_cache SET last_access = ? WHERE namespace = ? AND key = ?', touched
+            )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least-recently-used entries beyond max_entries"""
+        now = time.time()
+        cur = self._conn.execute(
+            'DELETE FROM lookup_cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (self.namespace, now),
+        )
+        self._stats['evictions'] += max(cur.rowcount, 0)
+        count = self._conn.execute(
+            'SELECT COUNT(*) FROM lookup_cache WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                'DELETE FROM lookup_cache WHERE rowid IN ('
+                ' SELECT rowid FROM lookup_cache WHERE namespace = ? ORDER BY last_access ASC LIMIT ?)',
+                (self.namespace, overflow),
+            )
+            self._stats['evictions'] += overflow
+            logger.debug(f"Lookup cache [{self.namespace}]: evicted {overflow} least-recently-used entries")
@@ -46,6 +46,33 @@ from .rule_loader import RuleLoader
 
 logger = logging.getLogger(__name__)
 
+REPORT_MODES = ('html', 'review', 'both')
+
+
+def _write_reports(data: Dict[str, Any], output_dir: Path, report_mode: str = 'html',
+                   split_report: bool = False) -> Path:
+    """
+    Write the report(s) for one output group
+
+    'html' is the full static report (report.html; with split_report a summary index plus
+    per-vendor pages in report_pages/), 'review' the virtualized table backed by a compact
+    data file (report_review.html), 'both' writes both.
+
+    Returns:
+        Path of the last report written
+    """
+    report_file = None
+    if report_mode in ('html', 'both'):
+        from .generate_report import generate_html_report
+        report_file = output_dir / 'report.html'
+        generate_html_report(data, report_file, split_by_vendor=split_report)
+    if report_mode in ('review', 'both'):
+        from .review_report import generate_review_report
+        report_file = generate_review_report(data, output_dir / 'report_review.html')
+    if report_file is None:
+        raise ValueError(f"Unknown report mode: {report_mode} (expected one of {', '.join(REPORT_MODES)})")
+    return report_file
+
 
 def detect_group(file_path: Path, input_dir: Path) -> str:
     """
@@ -114,7 +141,9 @@ def process_files(
     output_base_dir: Path,
     rules_dir: Path,
     use_threads: bool = True,
-    max_workers: int = 4
+    max_workers: int = 4,
+    report_mode: str = 'html',
+    split_report: bool = False
 ) -> Dict[str, Dict[str, Any]]:
     """
     Main processing function
@@ -125,6 +154,10 @@ def process_files(
         rules_dir: Directory containing rule YAML files
         use_threads: If True, process files in parallel using ThreadPoolExecutor (default: True)
         max_workers: Maximum number of parallel workers (default: 4, safe for most systems)
+        report_mode: 'html' (full static report), 'review' (virtualized table + compact data
+            file, for large runs) or 'both' (default: 'html')
+        split_report: Split report.html into a summary index plus per-vendor pages in
+            report_pages/ (default: False, one file with every receipt)
         
     Returns:
         Dictionary with 'localgrocery_based' and 'instacart_based' keys containing extracted data
@@ -304,7 +337,7 @@ def process_files(
         
         # Process files (sequential or parallel based on use_threads flag)
         # Note: ThreadPoolExecutor is used for file-level parallelism only.
-        # Each file is processed independently — no shared state or database writes occur.
+        # Each file is processed independently — shared KB updates go through a locked write-behind buffer.
         if use_threads and len(localgrocery_based_files) > 1:
             logger.info(f"Using parallel processing with {max_workers} workers for {len(localgrocery_based_files)} files")
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -321,7 +354,13 @@ def process_files(
                 receipt_id, receipt_data = process_localgrocery_file(file_path)
                 if receipt_data:
                     localgrocery_based_data[receipt_id] = receipt_data
-    
+
+        # Costco KB entries are buffered during processing; write them once per run
+        try:
+            UnifiedPDFProcessor.flush_knowledge_base()
+        except Exception as e:
+            logger.warning(f"Could not flush knowledge base: {e}")
+
     ### Process instacart-based files
     instacart_based_output_dir = output_base_dir / 'instacart_based'
     instacart_based_data: Dict[str, Any] = {}
@@ -743,7 +782,11 @@ def process_files(
             
             except Exception as e:
                 logger.error(f"Error processing {file_path.name}: {e}", exc_info=True)
-    
+
+        # Lookup cache summary (only when product lookup is enabled)
+        if webstaurantstore_processor.lookup:
+            logger.info(webstaurantstore_processor.lookup.cache.summary())
+
     ### Process Wismettac-based files (PDF invoices)
     wismettac_based_output_dir = output_base_dir / 'wismettac_based'
     wismettac_based_data: Dict[str, Any] = {}
@@ -829,12 +872,16 @@ def process_files(
         
         from difflib import SequenceMatcher
         
+        # Odoo rules (vendor metadata patterns, text engine) are the same for every file
+        odoo_rules = unified_pdf_processor._load_vendor_pdf_rules('ODOO')
+        
         for file_path in odoo_based_files:
             try:
                 logger.info(f"Processing [Odoo]: {file_path.name}")
                 
-                # Extract text from PDF to detect vendor
-                pdf_text = unified_pdf_processor._extract_pdf_text(file_path)
+                # Extract text from PDF to detect vendor (same text engine as the Odoo rules parse with)
+                pdf_text = unified_pdf_processor._extract_pdf_text(
+                    file_path, text_engine=odoo_rules.get('text_engine') if odoo_rules else None)
                 if not pdf_text:
                     logger.warning(f"Could not extract text from {file_path.name}, skipping")
                     continue
@@ -844,8 +891,7 @@ def process_files(
                 detected_vendor_name = 'Odoo'  # Default
                 vendor_match_score = 0.5
                 
-                # Load Odoo rules to extract vendor metadata
-                odoo_rules = unified_pdf_processor._load_vendor_pdf_rules('ODOO')
+                # Extract vendor metadata with the Odoo rules
                 if odoo_rules:
                     metadata_patterns = odoo_rules.get('metadata_patterns', {})
                     if metadata_patterns:
@@ -1041,9 +1087,7 @@ def process_files(
         
         # Generate vendor-based report (preserves existing report intelligence)
         try:
-            from .generate_report import generate_html_report
-            report_file = localgrocery_based_output_dir / 'report.html'
-            generate_html_report(localgrocery_based_data, report_file)
+            report_file = _write_reports(localgrocery_based_data, localgrocery_based_output_dir, report_mode, split_report)
             logger.info(f"Generated vendor-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate vendor-based report: {e}")
@@ -1058,9 +1102,7 @@ def process_files(
         
         # Generate instacart-based report (preserves ALL existing report intelligence including UoM match, validation summary, etc.)
         try:
-            from .generate_report import generate_html_report
-            report_file = instacart_based_output_dir / 'report.html'
-            generate_html_report(instacart_based_data, report_file)
+            report_file = _write_reports(instacart_based_data, instacart_based_output_dir, report_mode, split_report)
             logger.info(f"Generated instacart-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate instacart-based report: {e}")
@@ -1075,9 +1117,7 @@ def process_files(
         
         # Generate BBI-based report
         try:
-            from .generate_report import generate_html_report
-            report_file = bbi_based_output_dir / 'report.html'
-            generate_html_report(bbi_based_data, report_file)
+            report_file = _write_reports(bbi_based_data, bbi_based_output_dir, report_mode, split_report)
             logger.info(f"Generated BBI-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate BBI-based report: {e}")
@@ -1092,9 +1132,7 @@ def process_files(
         
         # Generate Amazon-based report
         try:
-            from .generate_report import generate_html_report
-            report_file = amazon_based_output_dir / 'report.html'
-            generate_html_report(amazon_based_data, report_file)
+            report_file = _write_reports(amazon_based_data, amazon_based_output_dir, report_mode, split_report)
             logger.info(f"Generated Amazon-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate Amazon-based report: {e}")
@@ -1109,9 +1147,7 @@ def process_files(
         
         # Generate WebstaurantStore-based report
         try:
-            from .generate_report import generate_html_report
-            report_file = webstaurantstore_based_output_dir / 'report.html'
-            generate_html_report(webstaurantstore_based_data, report_file)
+            report_file = _write_reports(webstaurantstore_based_data, webstaurantstore_based_output_dir, report_mode, split_report)
             logger.info(f"Generated WebstaurantStore-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate WebstaurantStore-based report: {e}")
@@ -1126,9 +1162,7 @@ def process_files(
         
         # Generate Wismettac-based report
         try:
-            from .generate_report import generate_html_report
-            report_file = wismettac_based_output_dir / 'report.html'
-            generate_html_report(wismettac_based_data, report_file)
+            report_file = _write_reports(wismettac_based_data, wismettac_based_output_dir, report_mode, split_report)
             logger.info(f"Generated Wismettac-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate Wismettac-based report: {e}")
@@ -1178,9 +1212,7 @@ def process_files(
         
         # Generate Odoo-based report
         try:
-            from .generate_report import generate_html_report
-            report_file = odoo_based_output_dir / 'report.html'
-            generate_html_report(odoo_based_data, report_file)
+            report_file = _write_reports(odoo_based_data, odoo_based_output_dir, report_mode, split_report)
             logger.info(f"Generated Odoo-based report: {report_file}")
         except Exception as e:
             logger.warning(f"Could not generate Odoo-based report: {e}")
@@ -1222,6 +1254,19 @@ def main() -> None:
         action='store_true',
         help='Process files in parallel using ThreadPoolExecutor (default: False)'
     )
+    parser.add_argument(
+        '--report-mode',
+        choices=REPORT_MODES,
+        default='html',
+        help='html: full static report; review: virtualized table backed by a compact data file '
+             '(fast for large runs); both (default: html)'
+    )
+    parser.add_argument(
+        '--split-report',
+        action='store_true',
+        help='Split report.html into a summary index plus paginated per-vendor pages in report_pages/ '
+             '(default: one file with every receipt)'
+    )
     
     args = parser.parse_args()
     
@@ -1234,7 +1279,8 @@ def main() -> None:
     logger.info(f"Rules directory: {rules_dir}")
     logger.info(f"Use threads: {args.use_threads}")
     
-    process_files(input_dir, output_dir, rules_dir, use_threads=args.use_threads)
+    process_files(input_dir, output_dir, rules_dir, use_threads=args.use_threads, report_mode=args.report_mode,
+                  split_report=args.split_report)
 
 
 if __name__ == "__main__":
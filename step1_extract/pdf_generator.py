@@ -1,41 +1,93 @@
 """
 PDF Generator for HTML Reports
 Provides utility functions to generate PDF versions of HTML reports
+
+Rendering backends (first available wins, see PDFRenderer):
+- playwright: one headless Chromium kept alive, reports rendered as concurrent pages
+- chrome: headless Chrome/Chromium/Edge CLI, one process per report, run concurrently
+- weasyprint: pure-Python renderer (no JavaScript, so charts are not drawn)
+
+Reports whose HTML is unchanged since their last PDF are skipped (hashes are kept in
+.pdf_hashes.json in the output directory).
 """
 
+import asyncio
+import hashlib
+import json
 import logging
-from pathlib import Path
+import os
+import shutil
 import subprocess
-import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+try:
+    import weasyprint
+    WEASYPRINT_AVAILABLE = True
+except (ImportError, OSError):  # OSError: native libraries (pango/cairo) missing
+    WEASYPRINT_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+RENDER_TIMEOUT = 30
+DEFAULT_WORKERS = 4
+PDF_HASH_MANIFEST = '.pdf_hashes.json'
+BACKENDS = ('playwright', 'chrome', 'weasyprint')
+
+# Checked in order after $CHROME_PATH
+CHROME_PATHS = [
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    '/Applications/Chromium.app/Contents/MacOS/Chromium',
+    '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge',
+]
+CHROME_COMMANDS = [
+    'google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser',
+    'microsoft-edge', 'microsoft-edge-stable',
+]
+
+
+@lru_cache(maxsize=1)
+def find_chrome() -> Optional[str]:
+    """Chrome/Chromium/Edge binary: $CHROME_PATH, macOS app bundles, then PATH (Linux)"""
+    env_path = os.environ.get('CHROME_PATH')
+    if env_path and Path(env_path).exists():
+        return env_path
+    for path in CHROME_PATHS:
+        if Path(path).exists():
+            return path
+    for command in CHROME_COMMANDS:
+        path = shutil.which(command)
+        if path:
+            return path
+    for path in ('/usr/bin/chromium', '/usr/bin/chromium-browser', '/snap/bin/chromium'):
+        if Path(path).exists():
+            return path
+    return None
+
 
-def html_to_pdf_chrome(html_path: Path, pdf_path: Path) -> bool:
+def html_to_pdf_chrome(html_path: Path, pdf_path: Path, timeout: int = RENDER_TIMEOUT) -> bool:
     """
     Convert HTML to PDF using Chrome/Chromium headless mode
     
     Args:
         html_path: Path to HTML file
         pdf_path: Path for output PDF
+        timeout: Seconds before the Chrome process is killed
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        # Try common Chrome/Chromium paths on macOS
-        chrome_paths = [
-            '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
-            '/Applications/Chromium.app/Contents/MacOS/Chromium',
-            '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge'
-        ]
-        
-        chrome_cmd = None
-        for path in chrome_paths:
-            if Path(path).exists():
-                chrome_cmd = path
-                break
-        
+        chrome_cmd = find_chrome()
         if not chrome_cmd:
             logger.warning("Chrome/Chromium not found, skipping PDF generation")
             return False
@@ -43,23 +95,26 @@ def html_to_pdf_chrome(html_path: Path, pdf_path: Path) -> bool:
         # Convert to absolute path and file:// URL
         html_file_url = f"file://{html_path.absolute()}"
         
-        # Run Chrome headless to generate PDF
-        cmd = [
-            chrome_cmd,
-            '--headless',
-            '--disable-gpu',
-            '--print-to-pdf=' + str(pdf_path.absolute()),
-            '--no-margins',  # Remove default margins for better use of space
-            '--print-to-pdf-no-header',  # Remove header/footer
-            html_file_url
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Separate profile per process so concurrent renders don't contend for the profile lock
+        with tempfile.TemporaryDirectory(prefix='pdf_chrome_') as profile_dir:
+            cmd = [
+                chrome_cmd,
+                '--headless',
+                '--disable-gpu',
+                '--no-first-run',
+                f'--user-data-dir={profile_dir}',
+                '--print-to-pdf=' + str(pdf_path.absolute()),
+                '--no-margins',  # Remove default margins for better use of space
+                '--print-to-pdf-no-header',  # Remove header/footer
+                html_file_url
+            ]
+            
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
         
         if result.returncode == 0 and pdf_path.exists():
             logger.info(f"Generated PDF: {pdf_path}")
@@ -76,6 +131,117 @@ def html_to_pdf_chrome(html_path: Path, pdf_path: Path) -> bool:
         return False
 
 
+class PDFRenderer:
+    """Render batches of HTML files to PDF concurrently with the best available backend"""
+
+    def __init__(self, backend: Optional[str] = None, workers: int = DEFAULT_WORKERS,
+                 timeout: int = RENDER_TIMEOUT):
+        """
+        Initialize renderer
+
+        Args:
+            backend: 'playwright', 'chrome' or 'weasyprint' (default: first available)
+            workers: Reports rendered at the same time
+            timeout: Seconds allowed per report
+        """
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.timeout = timeout
+
+    def available_backends(self) -> List[str]:
+        if self.backend:
+            return [self.backend]
+        backends = []
+        if PLAYWRIGHT_AVAILABLE:
+            backends.append('playwright')
+        if find_chrome():
+            backends.append('chrome')
+        if WEASYPRINT_AVAILABLE:
+            backends.append('weasyprint')
+        return backends
+
+    def render_many(self, jobs: Sequence[Tuple[Path, Path]]) -> Dict[Path, bool]:
+        """
+        Render (html_path, pdf_path) pairs
+
+        A backend that cannot start (e.g. Playwright without a browser) hands the
+        batch to the next one.
+
+        Returns:
+            Dictionary mapping html_path to True when its PDF was written
+        """
+        results = {html_path: False for html_path, _ in jobs}
+        if not jobs:
+            return results
+        for backend in self.available_backends():
+            try:
+                results.update(getattr(self, f'_render_{backend}')(jobs))
+                return results
+            except Exception as e:
+                logger.warning(f"PDF backend {backend} unavailable: {e}")
+        logger.warning("No PDF renderer available (install playwright, Chrome/Chromium or weasyprint)")
+        return results
+
+    def _render_playwright(self, jobs: Sequence[Tuple[Path, Path]]) -> Dict[Path, bool]:
+        return asyncio.run(self._render_playwright_async(jobs))
+
+    async def _render_playwright_async(self, jobs: Sequence[Tuple[Path, Path]]) -> Dict[Path, bool]:
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def render(browser, html_path: Path, pdf_path: Path) -> bool:
+            async with semaphore:
+                page = await browser.new_page()
+                try:
+                    await page.goto(f"file://{html_path.absolute()}", wait_until='load',
+                                    timeout=self.timeout * 1000)
+                    await page.pdf(path=str(pdf_path), print_background=True)
+                    logger.info(f"Generated PDF: {pdf_path}")
+                    return True
+                except Exception as e:
+                    logger.warning(f"PDF generation failed for {html_path.name}: {e}")
+                    return False
+                finally:
+                    await page.close()
+
+        async with async_playwright() as playwright:
+            # Prefer the bundled Chromium; fall back to a system browser when it isn't installed
+            try:
+                browser = await playwright.chromium.launch()
+            except Exception:
+                chrome_cmd = find_chrome()
+                if not chrome_cmd:
+                    raise
+                browser = await playwright.chromium.launch(executable_path=chrome_cmd)
+            try:
+                done = await asyncio.gather(*(render(browser, html_path, pdf_path) for html_path, pdf_path in jobs))
+            finally:
+                await browser.close()
+        return {html_path: ok for (html_path, _), ok in zip(jobs, done)}
+
+    def _render_chrome(self, jobs: Sequence[Tuple[Path, Path]]) -> Dict[Path, bool]:
+        if not find_chrome():
+            raise RuntimeError("Chrome/Chromium not found")
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+            done = list(executor.map(lambda job: html_to_pdf_chrome(job[0], job[1], self.timeout), jobs))
+        return {html_path: ok for (html_path, _), ok in zip(jobs, done)}
+
+    def _render_weasyprint(self, jobs: Sequence[Tuple[Path, Path]]) -> Dict[Path, bool]:
+        if not WEASYPRINT_AVAILABLE:
+            raise RuntimeError("weasyprint not installed")
+        results = {}
+        for html_path, pdf_path in jobs:
+            try:
+                weasyprint.HTML(filename=str(html_path)).write_pdf(str(pdf_path))
+                logger.info(f"Generated PDF: {pdf_path}")
+                results[html_path] = True
+            except Exception as e:
+                logger.warning(f"PDF generation failed for {html_path.name}: {e}")
+                results[html_path] = False
+        return results
+
+
 def generate_pdf_for_report(html_path: Path) -> Path:
     """
     Generate PDF version of an HTML report
@@ -88,24 +254,47 @@ def generate_pdf_for_report(html_path: Path) -> Path:
     """
     pdf_path = html_path.with_suffix('.pdf')
     
-    if html_to_pdf_chrome(html_path, pdf_path):
+    if PDFRenderer().render_many([(html_path, pdf_path)])[html_path]:
         logger.info(f"✅ PDF generated: {pdf_path.name}")
         return pdf_path
     else:
-        logger.info(f"⚠️  PDF generation skipped (Chrome not available)")
+        logger.info(f"⚠️  PDF generation skipped (no renderer available)")
         logger.info(f"   You can manually print {html_path.name} to PDF from your browser")
         return html_path
 
 
-def generate_pdfs_for_all_reports(output_dir: Path) -> dict:
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_hash_manifest(manifest_path: Path) -> Dict[str, str]:
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate_pdfs_for_all_reports(output_dir: Path, workers: int = DEFAULT_WORKERS,
+                                  backend: Optional[str] = None, force: bool = False) -> dict:
     """
     Generate PDF versions of all HTML reports in output directory
     
+    Vendor pages of split reports (<stem>_pages/*.html, see generate_html_report) are
+    rendered too, each to a PDF next to its page.
+    
     Args:
         output_dir: Base output directory
+        workers: Reports rendered at the same time
+        backend: PDF backend (default: first available, see PDFRenderer)
+        force: Re-render even when the HTML is unchanged since the last PDF
         
     Returns:
-        Dictionary mapping report names to PDF paths
+        Dictionary mapping report names ('<report>/<page>' for vendor pages) to PDF paths
     """
     pdfs = {}
     
@@ -119,18 +308,54 @@ def generate_pdfs_for_all_reports(output_dir: Path) -> dict:
         'amazon_report': output_dir / 'amazon_based' / 'report.html',
     }
     
+    # Reports split by vendor keep their receipts in <stem>_pages/ next to the index page
+    for name, html_path in list(html_reports.items()):
+        pages_dir = html_path.parent / f"{html_path.stem}_pages"
+        if pages_dir.is_dir():
+            for page_path in sorted(pages_dir.glob('*.html')):
+                html_reports[f"{name}/{page_path.stem}"] = page_path
+    
     logger.info("Generating PDF versions of reports...")
     
+    manifest_path = output_dir / PDF_HASH_MANIFEST
+    manifest = _load_hash_manifest(manifest_path)
+    hashes = {}
+    jobs = []
     for name, html_path in html_reports.items():
-        if html_path.exists():
-            pdf_path = generate_pdf_for_report(html_path)
+        if not html_path.exists():
+            logger.debug(f"Skipping {name} (file not found)")
+            continue
+        pdf_path = html_path.with_suffix('.pdf')
+        key = html_path.relative_to(output_dir).as_posix()
+        hashes[key] = _file_hash(html_path)
+        if not force and pdf_path.exists() and manifest.get(key) == hashes[key]:
+            logger.debug(f"Skipping {name} (PDF up to date)")
+            pdfs[name] = pdf_path
+            continue
+        jobs.append((name, key, html_path, pdf_path))
+    
+    unchanged = len(pdfs)
+    rendered = PDFRenderer(backend=backend, workers=workers).render_many(
+        [(html_path, pdf_path) for _, _, html_path, pdf_path in jobs]
+    )
+    for name, key, html_path, pdf_path in jobs:
+        if rendered[html_path]:
             pdfs[name] = pdf_path
+            manifest[key] = hashes[key]
         else:
-            logger.debug(f"Skipping {name} (file not found)")
+            pdfs[name] = html_path
+            manifest.pop(key, None)
+    
+    if jobs:
+        try:
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"Could not save PDF hash manifest: {e}")
     
     # Count successful PDFs
     pdf_count = sum(1 for path in pdfs.values() if path.suffix == '.pdf')
-    logger.info(f"PDF generation complete: {pdf_count}/{len(pdfs)} reports")
+    logger.info(f"PDF generation complete: {pdf_count}/{len(pdfs)} reports ({unchanged} unchanged)")
     
     return pdfs
 
@@ -7,37 +7,37 @@ This processor replaces all vendor-specific PDF processors (Costco, Jewel, Aldi,
 by reading parsing rules from YAML files in step1_rules/.
 """
 
+from __future__ import annotations
+
 import logging
 import re
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
+from .kb_writer import KnowledgeBaseWriter
+from .pdf_text_engines import REFERENCE_TEXT_ENGINE, extract_page_texts, resolve_text_engine
+from .utils.lazy_import import lazy_module, module_available
+
 logger = logging.getLogger(__name__)
 
-# Try to import pdfplumber
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+# PDF/OCR backends are imported on first use; only their presence is checked at import time
+pdfplumber = lazy_module('pdfplumber')
+PDFPLUMBER_AVAILABLE = module_available('pdfplumber')
+if not PDFPLUMBER_AVAILABLE:
     logger.warning("pdfplumber not available. Install with: pip install pdfplumber")
 
-# Try to import OCR libraries
-try:
-    import pytesseract
-    from PIL import Image
-    import fitz  # PyMuPDF
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+pytesseract = lazy_module('pytesseract')
+Image = lazy_module('PIL.Image')
+fitz = lazy_module('fitz')  # PyMuPDF
+OCR_AVAILABLE = all(module_available(name) for name in ('pytesseract', 'PIL', 'fitz'))
+if not OCR_AVAILABLE:
     logger.debug("OCR libraries not available. Install with: pip install pytesseract Pillow pymupdf")
 
-# Try to import EasyOCR (better for receipts)
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    EASYOCR_AVAILABLE = False
+# EasyOCR (better for receipts) pulls in torch - by far the slowest import
+easyocr = lazy_module('easyocr')
+EASYOCR_AVAILABLE = module_available('easyocr')
+if not EASYOCR_AVAILABLE:
     logger.debug("EasyOCR not available. Install with: pip install easyocr")
 
 
@@ -102,7 +102,8 @@ class UnifiedPDFProcessor:
             
             # Auto-detect if PDF is image-based (try text extraction first, fallback to OCR if no text)
             # Extract text from PDF
-            pdf_text = self._extract_pdf_text(file_path, use_ocr=(extraction_method == 'ocr'))
+            pdf_text = self._extract_pdf_text(file_path, use_ocr=(extraction_method == 'ocr'),
+                                              text_engine=pdf_rules.get('text_engine'))
             
             # If text extraction failed and extraction_method is 'text', try OCR as fallback
             if not pdf_text and extraction_method == 'text' and OCR_AVAILABLE:
@@ -294,20 +295,28 @@ class UnifiedPDFProcessor:
             logger.warning(f"Could not load PDF rules from {yaml_file}: {e}", exc_info=True)
             return None
     
-    def _extract_pdf_text(self, file_path: Path, use_ocr: bool = False) -> str:
-        """Extract text from PDF using pdfplumber or OCR"""
+    def _extract_pdf_text(self, file_path: Path, use_ocr: bool = False, text_engine: Optional[str] = None) -> str:
+        """
+        Extract text from PDF with the rule set's text engine or OCR
+        
+        Args:
+            file_path: Path to PDF file
+            use_ocr: Use OCR text when OCR is available
+            text_engine: Rule set's text_engine (pymupdf, pdfplumber_layout or pdfplumber_words;
+                default pymupdf, see pdf_text_engines.py)
+        """
         text = ""
         
-        # Try pdfplumber first (for text-based PDFs)
-        if PDFPLUMBER_AVAILABLE:
+        # Try the text engine first (for text-based PDFs), pdfplumber layout if it fails
+        engines = [resolve_text_engine(text_engine)]
+        if engines[0] not in (None, REFERENCE_TEXT_ENGINE) and PDFPLUMBER_AVAILABLE:
+            engines.append(REFERENCE_TEXT_ENGINE)
+        for engine in filter(None, engines):
             try:
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text(layout=True)
-                        if page_text:
-                            text += page_text + "\n"
+                text = "".join(page_text + "\n" for page_text in extract_page_texts(file_path, engine) if page_text)
+                break
             except Exception as e:
-                logger.debug(f"Text extraction failed: {e}")
+                logger.debug(f"Text extraction with {engine} failed: {e}")
         
         # If text extraction failed or OCR is required, try OCR
         if (not text or use_ocr) and OCR_AVAILABLE:
@@ -1561,28 +1570,44 @@ class UnifiedPDFProcessor:
         return totals
 
     # --- Costco quantity inference ---
-    _kb_cache = None
+    # Write-behind KB writers shared by all instances/threads, keyed by resolved KB path
+    _kb_writers: Dict[str, Any] = {}
+    _kb_writers_lock = threading.Lock()
 
-    def _load_knowledge_base(self) -> Dict[str, Any]:
-        """Load knowledge base JSON once (cached)."""
-        if UnifiedPDFProcessor._kb_cache is not None:
-            return UnifiedPDFProcessor._kb_cache
+    def _get_kb_path(self) -> Path:
+        """Resolve knowledge base path (legacy processor config, else default location)"""
+        kb_path = None
         try:
-            # Default KB path relative to input_dir if provided
-            kb_path = None
-            try:
-                # Attempt to use legacy processor config if available
-                kb_path = Path(self._legacy_processor.config.get('knowledge_base_file')) if getattr(self, '_legacy_processor', None) else None
-            except Exception:
-                kb_path = None
-            if not kb_path:
-                kb_path = Path('data/step1_input/knowledge_base.json')
-            import json
-            with open(kb_path, 'r') as f:
-                UnifiedPDFProcessor._kb_cache = json.load(f)
+            # Attempt to use legacy processor config if available
+            kb_path = Path(self._legacy_processor.config.get('knowledge_base_file')) if getattr(self, '_legacy_processor', None) else None
         except Exception:
-            UnifiedPDFProcessor._kb_cache = {}
-        return UnifiedPDFProcessor._kb_cache
+            kb_path = None
+        if not kb_path:
+            kb_path = Path('data/step1_input/knowledge_base.json')
+        return kb_path
+
+    def _load_knowledge_base(self) -> KnowledgeBaseWriter:
+        """Get the shared knowledge base view (loaded once, includes pending entries)."""
+        kb_path = self._get_kb_path()
+        key = str(kb_path.resolve())
+        with UnifiedPDFProcessor._kb_writers_lock:
+            writer = UnifiedPDFProcessor._kb_writers.get(key)
+            if writer is None:
+                writer = KnowledgeBaseWriter(kb_path)
+                UnifiedPDFProcessor._kb_writers[key] = writer
+        return writer
+
+    @classmethod
+    def flush_knowledge_base(cls) -> int:
+        """Flush all buffered KB entries to disk. Call once at the end of a run."""
+        with cls._kb_writers_lock:
+            writers = list(cls._kb_writers.values())
+        written = 0
+        for writer in writers:
+            written += writer.flush()
+        if written:
+            logger.info(f"Knowledge base: flushed {written} new entries")
+        return written
 
     def _infer_costco_quantities(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """For Costco items without explicit quantity, use KB unit price to infer integer quantity."""
@@ -1668,17 +1693,9 @@ class UnifiedPDFProcessor:
         return items
 
     def _update_knowledge_base_costco(self, items: List[Dict[str, Any]]) -> None:
-        """Append missing Costco items to KB with inferred unit price and optional size/spec."""
+        """Buffer missing Costco items for the KB with inferred unit price and optional size/spec."""
         try:
-            kb_path = None
-            try:
-                kb_path = Path(self._legacy_processor.config.get('knowledge_base_file')) if getattr(self, '_legacy_processor', None) else None
-            except Exception:
-                kb_path = None
-            if not kb_path:
-                kb_path = Path('data/step1_input/knowledge_base.json')
             kb = self._load_knowledge_base()
-            modified = False
             for item in items:
                 try:
                     item_number = str(item.get('item_number') or '').strip()
@@ -1692,16 +1709,10 @@ class UnifiedPDFProcessor:
                     product_name = (item.get('product_name') or '').strip()
                     size_text = (item.get('raw_uom_text') or '').strip()
                     entry = [product_name or item_number, 'Costco', size_text, unit_price]
-                    kb[item_number] = entry
-                    modified = True
+                    # Flushed later (end of run or every RECEIPTS_KB_FLUSH_EVERY entries)
+                    kb.add_if_missing(item_number, entry)
                 except Exception:
                     continue
-            if modified:
-                import json as _json
-                with open(kb_path, 'w') as f:
-                    _json.dump(kb, f, indent=2)
-                # Update cache
-                UnifiedPDFProcessor._kb_cache = kb
         except Exception as e:
             logger.debug(f"Knowledge base update skipped: {e}")
     
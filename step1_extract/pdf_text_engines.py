@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+PDF Text Engines - Pluggable text extraction for text-based PDF receipts
+Selected per vendor rule set with `text_engine:` in the step1_rules PDF YAML.
+
+Engines:
+- pymupdf: PyMuPDF words laid out on pdfplumber's layout grid (default, fastest)
+- pdfplumber_layout: pdfplumber extract_text(layout=True) (column-aligned, slowest)
+- pdfplumber_words: pdfplumber words joined per line with single spaces (no column alignment)
+
+The pymupdf engine rebuilds the page the way layout=True does: words are clustered into
+lines by their top, each line starts on its 13pt row (blank lines for vertical gaps) and
+each word at its x position in 7.25pt character columns (at least one space after the
+previous word), and lines / rows are padded to the page size. Word boundaries and tops
+still come from PyMuPDF, so rule sets whose patterns depend on pdfplumber's exact output
+(multi-line DOTALL patterns, line-count lookaheads) pin pdfplumber_layout.
+
+benchmark_pdf_text_engines.py diffs the items parsed with each engine and reports
+pages/sec.
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .utils.lazy_import import lazy_module, module_available
+
+logger = logging.getLogger(__name__)
+
+pdfplumber = lazy_module('pdfplumber')
+fitz = lazy_module('fitz')  # PyMuPDF
+
+TEXT_ENGINES = ('pymupdf', 'pdfplumber_layout', 'pdfplumber_words')
+DEFAULT_TEXT_ENGINE = 'pymupdf'
+# Reference engine (what _extract_pdf_text always used) and fallback when another engine fails
+REFERENCE_TEXT_ENGINE = 'pdfplumber_layout'
+
+ENGINE_BACKENDS = {
+    'pymupdf': 'fitz',
+    'pdfplumber_layout': 'pdfplumber',
+    'pdfplumber_words': 'pdfplumber',
+}
+
+# pdfplumber layout=True grid (points per character column / row) and line clustering tolerance
+LAYOUT_X_DENSITY = 7.25
+LAYOUT_Y_DENSITY = 13
+LINE_Y_TOLERANCE = 3
+
+# (x0, top, text)
+Word = Tuple[float, float, str]
+
+
+def engine_available(engine: str) -> bool:
+    return engine in ENGINE_BACKENDS and module_available(ENGINE_BACKENDS[engine])
+
+
+def resolve_text_engine(engine: Optional[str] = None) -> Optional[str]:
+    """
+    Engine to use for a rule set's text_engine setting
+
+    Unset means DEFAULT_TEXT_ENGINE; unknown or uninstalled engines fall back to the
+    first available one. Returns None if no PDF text backend is installed.
+    """
+    if engine and engine not in ENGINE_BACKENDS:
+        logger.warning(f"Unknown text_engine '{engine}' (expected one of {', '.join(TEXT_ENGINES)}), "
+                       f"using {DEFAULT_TEXT_ENGINE}")
+        engine = None
+    engine = engine or DEFAULT_TEXT_ENGINE
+    if engine_available(engine):
+        return engine
+    for candidate in (REFERENCE_TEXT_ENGINE,) + TEXT_ENGINES:
+        if engine_available(candidate):
+            logger.debug(f"text_engine {engine} not available, using {candidate}")
+            return candidate
+    return None
+
+
+def _cluster_lines(words: Iterable[Word], tolerance: float = LINE_Y_TOLERANCE) -> List[List[Word]]:
+    """Group words into lines by top (within tolerance of the previous word), each sorted by x"""
+    lines: List[List[Word]] = []
+    last_top = None
+    for word in sorted(words, key=lambda w: (w[1], w[0])):
+        if last_top is None or word[1] - last_top > tolerance:
+            lines.append([])
+        lines[-1].append(word)
+        last_top = word[1]
+    return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+
+def layout_text(words: Iterable[Word], x_origin: float = 0.0, y_origin: float = 0.0, width: float = 0.0,
+                height: float = 0.0, x_density: float = LAYOUT_X_DENSITY, y_density: float = LAYOUT_Y_DENSITY) -> str:
+    """
+    Lay words out on pdfplumber's layout=True character grid
+
+    Each line starts on the row of its top (at least one newline after the previous line)
+    and each word at its x column (at least one space after the previous word). With the
+    page width / height, lines are padded with spaces and blank rows fill the page.
+    """
+    width_chars = int(round(width / x_density))
+    height_chars = int(round(height / y_density))
+    blank_line = ' ' * width_chars
+    text = ''
+    newlines = 0
+    for index, line in enumerate(_cluster_lines(words)):
+        row = round((min(top for _, top, _ in line) - y_origin) / y_density)
+        for _ in range(max(int(index > 0), row - newlines)):
+            if not text or text.endswith('\n'):
+                text += blank_line
+            text += '\n'
+            newlines += 1
+        line_text = ''
+        for x0, _, word in line:
+            column = round((x0 - x_origin) / x_density)
+            line_text += ' ' * max(min(1, len(line_text)), column - len(line_text)) + word
+        text += line_text + ' ' * (width_chars - len(line_text))
+    for index in range(height_chars - (newlines + 1)):
+        if index > 0:
+            text += blank_line
+        text += '\n'
+    return text[:-1] if text.endswith('\n') else text
+
+
+def words_text(words: Iterable[Word]) -> str:
+    """Words joined per line with single spaces"""
+    return '\n'.join(' '.join(word for _, _, word in line) for line in _cluster_lines(words))
+
+
+def _pymupdf_pages(file_path: Path) -> List[str]:
+    # Glyph boxes one font size tall put word tops where pdfplumber (pdfminer) has them
+    small_glyph_heights = fitz.TOOLS.set_small_glyph_heights()
+    fitz.TOOLS.set_small_glyph_heights(True)
+    try:
+        with fitz.open(str(file_path)) as doc:
+            return [layout_text(((x0, y0, word) for x0, y0, _, _, word, *_ in page.get_text('words')),
+                                page.rect.x0, page.rect.y0, page.rect.width, page.rect.height)
+                    for page in doc]
+    finally:
+        fitz.TOOLS.set_small_glyph_heights(small_glyph_heights)
+
+
+def _pdfplumber_layout_pages(file_path: Path) -> List[str]:
+    with pdfplumber.open(file_path) as pdf:
+        return [page.extract_text(layout=True) or '' for page in pdf.pages]
+
+
+def _pdfplumber_words_pages(file_path: Path) -> List[str]:
+    with pdfplumber.open(file_path) as pdf:
+        return [words_text((word['x0'], word['top'], word['text']) for word in page.extract_words())
+                for page in pdf.pages]
+
+
+_ENGINE_PAGES: Dict[str, Callable[[Path], List[str]]] = {
+    'pymupdf': _pymupdf_pages,
+    'pdfplumber_layout': _pdfplumber_layout_pages,
+    'pdfplumber_words': _pdfplumber_words_pages,
+}
+
+
+def extract_page_texts(file_path: Path, engine: str = DEFAULT_TEXT_ENGINE) -> List[str]:
+    """
+    Text of each page of a PDF with the given engine
+
+    Raises:
+        ValueError: Unknown engine
+    """
+    if engine not in _ENGINE_PAGES:
+        raise ValueError(f"Unknown text engine: {engine}")
+    return _ENGINE_PAGES[engine](Path(file_path))
@@ -13,30 +13,30 @@ Processing Flow:
 See step1_rules/21_rd_pdf_layout.yaml for layout rules.
 """
 
+from __future__ import annotations
+
 import logging
 import re
 from pathlib import Path
 from typing import Dict, List, Optional, Any
-import pandas as pd
+
+from .utils.lazy_import import lazy_module, module_available
 
 logger = logging.getLogger(__name__)
 
-# Try to import pdfplumber
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+pd = lazy_module('pandas')
+
+# PDF/OCR backends are imported on first use; only their presence is checked at import time
+pdfplumber = lazy_module('pdfplumber')
+PDFPLUMBER_AVAILABLE = module_available('pdfplumber')
+if not PDFPLUMBER_AVAILABLE:
     logger.warning("pdfplumber not available. Install with: pip install pdfplumber")
 
-# Try to import OCR libraries
-try:
-    import pytesseract
-    from PIL import Image
-    import fitz  # PyMuPDF for PDF to image conversion
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+pytesseract = lazy_module('pytesseract')
+Image = lazy_module('PIL.Image')
+fitz = lazy_module('fitz')  # PyMuPDF for PDF to image conversion
+OCR_AVAILABLE = all(module_available(name) for name in ('pytesseract', 'PIL', 'fitz'))
+if not OCR_AVAILABLE:
     logger.debug("OCR libraries not available. Install with: pip install pytesseract Pillow pymupdf")
 
 
@@ -50,18 +50,16 @@ except ImportError:
     InstacartCSVMatcher = None
     VendorProfileHandler = None
 
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+from .utils.lazy_import import lazy_module, module_available
+
+# PDF backends are imported on first use (startup cost), only their presence is checked here
+PyPDF2 = lazy_module('PyPDF2')
+PDF_AVAILABLE = module_available('PyPDF2')
+if not PDF_AVAILABLE:
     logging.warning("PyPDF2 not available. Install with: pip install PyPDF2")
 
-try:
-    import fitz  # PyMuPDF
-    MUPDF_AVAILABLE = True
-except ImportError:
-    MUPDF_AVAILABLE = False
+fitz = lazy_module('fitz')  # PyMuPDF
+MUPDF_AVAILABLE = module_available('fitz')
 
 logger = logging.getLogger(__name__)
 
@@ -113,20 +111,8 @@ class ReceiptProcessor:
                 knowledge_base_file=kb_file
             ) if VendorProfileHandler else None
             
-            # Initialize AI line interpreter (optional fallback for parsing)
-            # Load AI interpreter rules from rule_loader (now uses shared.yaml)
-            try:
-                from step1_extract.ai_line_interpreter import AILineInterpreter, AI_AVAILABLE
-                if AI_AVAILABLE:
-                    # Pass rule_loader to AILineInterpreter so it can load rules from YAML
-                    self.ai_interpreter = AILineInterpreter(rule_loader=self.rule_loader)
-                    logger.info("AI line interpreter initialized with rules")
-                else:
-                    self.ai_interpreter = None
-                    logger.debug("AI line interpreter not available (no LLM backend found)")
-            except ImportError:
-                logger.debug("AI line interpreter module not available")
-                self.ai_interpreter = None
+            # AI line interpreter (optional fallback for parsing) is created on first use,
+            # see the ai_interpreter property - detecting a backend probes Ollama over HTTP
             
             # Fallback rules
             self.fallback_rules = self.rules.get('fallback_rules', {})
@@ -141,6 +127,28 @@ class ReceiptProcessor:
             self.vendor_profiles = None
             self.fallback_rules = {}
     
+    @property
+    def ai_interpreter(self):
+        """AI line interpreter, created on first use (None if no LLM backend is available)"""
+        if '_ai_interpreter' not in self.__dict__:
+            self._ai_interpreter = None
+            if self.rule_loader is not None:
+                try:
+                    from step1_extract.ai_line_interpreter import AILineInterpreter, AI_AVAILABLE
+                    if AI_AVAILABLE:
+                        # Pass rule_loader to AILineInterpreter so it can load rules from YAML
+                        self._ai_interpreter = AILineInterpreter(rule_loader=self.rule_loader)
+                        logger.info("AI line interpreter initialized with rules")
+                    else:
+                        logger.debug("AI line interpreter not available (no LLM backend found)")
+                except ImportError:
+                    logger.debug("AI line interpreter module not available")
+        return self._ai_interpreter
+    
+    @ai_interpreter.setter
+    def ai_interpreter(self, value):
+        self._ai_interpreter = value
+    
     def process_excel(self, excel_path: str) -> Dict:
         """
         Extract data from Excel receipt (for Costco receipts converted to Excel)
@@ -1762,35 +1770,31 @@ class ReceiptProcessor:
                     multiline_config = self.rule_loader.get_multiline_config(vendor_code if vendor_code else None, layout_name)
                 lines = self.item_parser.merge_multiline_items(lines, multiline_config=multiline_config)
             
-            # Parse each line
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Parse item line using rule-based parser
-                item = None
-                if self.item_parser:
-                    item = self.item_parser.parse_item_line(line)
-                
-                # If regex parsing failed, try AI interpreter
-                if not item and self.ai_interpreter:
-                    vendor_name = receipt.get('vendor', '') or receipt.get('vendor_name', '')
-                    # Get context from previously parsed items for better AI understanding
-                    context = None
-                    if items:
-                        # Provide sample of successfully parsed items as context
-                        sample_items = items[-3:] if len(items) >= 3 else items
-                        context = "\n".join([
-                            f"- {it.get('product_name', '')}: ${it.get('total_price', 0):.2f}"
-                            for it in sample_items
-                        ])
-                    
-                    ai_item = self.ai_interpreter.interpret_line(line, vendor=vendor_name, context=context)
+            # Parse item lines using rule-based parser
+            lines = [line.strip() for line in lines if line.strip()]
+            parsed_lines = [self.item_parser.parse_item_line(line) if self.item_parser else None for line in lines]
+            
+            # Lines regex parsing could not handle go to the AI interpreter in one batched,
+            # cached call (repeated abbreviations cost one LLM answer, not one per line)
+            unparsed = [i for i, item in enumerate(parsed_lines) if not item]
+            if unparsed and self.ai_interpreter:
+                vendor_name = receipt.get('vendor', '') or receipt.get('vendor_name', '')
+                # Provide sample of successfully parsed items as context
+                context = None
+                sample_items = [item for item in parsed_lines if item][:3]
+                if sample_items:
+                    context = "\n".join([
+                        f"- {it.get('product_name', '')}: ${it.get('total_price', 0) or 0:.2f}"
+                        for it in sample_items
+                    ])
+                ai_items = self.ai_interpreter.interpret_lines([lines[i] for i in unparsed],
+                                                               vendor=vendor_name, context=context)
+                for i, ai_item in zip(unparsed, ai_items):
                     if ai_item:
-                        item = ai_item
-                        logger.debug(f"AI interpreter parsed line: {line[:50]}...")
-                
+                        parsed_lines[i] = ai_item
+                        logger.debug(f"AI interpreter parsed line: {lines[i][:50]}...")
+            
+            for line, item in zip(lines, parsed_lines):
                 if item:
                     # Always run unit detection (will use existing if high confidence, otherwise improve)
                     if self.unit_detector:
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Review Report - Virtualized item table backed by a compact data file
+Alternative to generate_report.generate_html_report for large runs: item data is
+serialized once into a compact, dictionary-encoded data file and the page renders
+only the rows in view, with vendor / L1 / L2 / needs-review filters and text search.
+
+Outputs (next to each other):
+- report_review.html          - small static page (no per-item DOM)
+- report_review_data.js       - data as one JS assignment (opens straight from disk), or
+- report_review_data.json.gz  - gzip JSON (compress=True; the page must be served over
+                                HTTP, browsers do not fetch file:// URLs)
+"""
+
+import gzip
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from string import Template
+from typing import Any, Dict, List
+
+from .generate_report import derive_display_fields
+
+logger = logging.getLogger(__name__)
+
+ITEM_COLUMNS = ['receipt', 'product', 'quantity', 'uom', 'unit_price', 'total_price', 'l1', 'l2', 'needs_review']
+RECEIPT_COLUMNS = ['receipt_id', 'vendor', 'date', 'total']
+
+
+class _Dictionary:
+    """String -> index table (dictionary encoding for repeated values)"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def encode(self, value) -> int:
+        value = '' if value is None else str(value)
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else round(number, 4)
+
+
+def build_review_data(extracted_data: Dict) -> Dict[str, Any]:
+    """
+    Build the compact report payload
+
+    Returns:
+        {'columns', 'receipt_columns', 'dicts': {'vendor', 'l1', 'l2'}, 'receipts', 'rows', ...}
+        Receipt and item rows are arrays; vendor / L1 / L2 cells are indexes into dicts.
+    """
+    vendors, l1s, l2s = _Dictionary(), _Dictionary(), _Dictionary()
+    receipts = []
+    rows = []
+    for receipt_id, receipt_data in sorted(extracted_data.items()):
+        receipt_index = len(receipts)
+        receipts.append([
+            receipt_id,
+            vendors.encode(receipt_data.get('vendor') or 'Unknown'),
+            receipt_data.get('order_date') or receipt_data.get('date') or receipt_data.get('transaction_date') or '',
+            _number(receipt_data.get('total')),
+        ])
+        receipt_review = bool(receipt_data.get('needs_review'))
+        for item in receipt_data.get('items', []):
+            display = derive_display_fields(item)
+            l1 = f"{item['l1_category']} - {item.get('l1_category_name') or ''}" if item.get('l1_category') else ''
+            l2 = f"{item['l2_category']} - {item.get('l2_category_name') or ''}" if item.get('l2_category') else ''
+            needs_review = receipt_review or bool(item.get('needs_review') or item.get('needs_category_review'))
+            rows.append([
+                receipt_index,
+                item.get('display_name') or item.get('canonical_name') or item.get('product_name') or '(unnamed)',
+                display['display_quantity'],
+                display['display_uom'] or item.get('raw_uom_text') or '',
+                _number(item.get('unit_price')),
+                _number(item.get('total_price')),
+                l1s.encode(l1),
+                l2s.encode(l2),
+                1 if needs_review else 0,
+            ])
+    return {
+        'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'receipt_columns': RECEIPT_COLUMNS,
+        'columns': ITEM_COLUMNS,
+        'dicts': {'vendor': vendors.values, 'l1': l1s.values, 'l2': l2s.values},
+        'receipts': receipts,
+        'rows': rows,
+    }
+
+
+def generate_review_report(extracted_data: Dict, output_path: Path, compress: bool = False) -> Path:
+    """
+    Generate the virtualized review report
+
+    Args:
+        extracted_data: Dictionary mapping receipt IDs to extracted data
+        output_path: Path of the HTML page; the data file is written next to it
+        compress: Write gzip JSON instead of a JS data file (page must be served over HTTP)
+
+    Returns:
+        Path to the HTML page
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    payload = json.dumps(build_review_data(extracted_data), ensure_ascii=False, separators=(',', ':'),
+                         default=str)
+    if compress:
+        data_file = output_path.with_name(f"{output_path.stem}_data.json.gz")
+        with gzip.open(data_file, 'wt', encoding='utf-8') as f:
+            f.write(payload)
+        data_loader = f'<script>window.REPORT_DATA_URL = "{data_file.name}";</script>'
+    else:
+        data_file = output_path.with_name(f"{output_path.stem}_data.js")
+        with open(data_file, 'w', encoding='utf-8') as f:
+            f.write('window.REPORT_DATA=')
+            f.write(payload)
+            f.write(';\n')
+        data_loader = f'<script src="{data_file.name}"></script>'
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(_PAGE.substitute(data_loader=data_loader))
+
+    logger.info(f"Generated review report: {output_path} (data: {data_file.name}, "
+                f"{data_file.stat().st_size / 1024:.0f} KB)")
+    return output_path
+
+
+# Static page; $data_loader loads the data file. Rows are absolutely positioned inside a
+# spacer as tall as the filtered list, and only the rows in view (plus a margin) exist in the DOM.
+_PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Receipt Review Report - Step 1</title>
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #333; background: #f5f5f5; margin: 0; padding: 20px; }
+        .container { max-width: 1400px; margin: 0 auto; background: white; padding: 20px 30px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }
+        h1 { color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }
+        .filters { display: flex; flex-wrap: wrap; gap: 10px; align-items: center; margin: 15px 0; }
+        .filters select, .filters input[type=search] { padding: 5px; max-width: 260px; }
+        .count { color: #666; margin-left: auto; }
+        .grid-row { display: grid; grid-template-columns: 150px 140px 1fr 70px 60px 90px 90px 180px 180px; gap: 8px;
+                    align-items: center; height: 32px; padding: 0 8px; border-bottom: 1px solid #eee;
+                    white-space: nowrap; overflow: hidden; font-size: 0.9em; box-sizing: border-box; }
+        .grid-row > div { overflow: hidden; text-overflow: ellipsis; }
+        .grid-head { background: #3498db; color: white; font-weight: 600; }
+        .num { text-align: right; }
+        .review { background: #fff3cd; }
+        #viewport { height: 70vh; overflow-y: auto; position: relative; border: 1px solid #ddd; }
+        #spacer { position: relative; }
+        #spacer .grid-row { position: absolute; left: 0; right: 0; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>📋 Receipt Review Report - Step 1</h1>
+        <p id="generated" style="color: #666;"></p>
+        <div class="filters">
+            <select id="f-vendor"><option value="">All vendors</option></select>
+            <select id="f-l1"><option value="">All L1 categories</option></select>
+            <select id="f-l2"><option value="">All L2 categories</option></select>
+            <label><input type="checkbox" id="f-review"> Needs review only</label>
+            <input type="search" id="f-text" placeholder="Search product / receipt">
+            <span class="count" id="count">Loading…</span>
+        </div>
+        <div class="grid-row grid-head">
+            <div>Receipt</div><div>Vendor</div><div>Product</div><div class="num">Qty</div><div>UoM</div>
+            <div class="num">Unit Price</div><div class="num">Total</div><div>L1</div><div>L2</div>
+        </div>
+        <div id="viewport"><div id="spacer"></div></div>
+    </div>
+    $data_loader
+    <script>
+    (function () {
+        var ROW_HEIGHT = 32, OVERSCAN = 10;
+        var data, filtered = [];
+        var viewport = document.getElementById('viewport'), spacer = document.getElementById('spacer');
+
+        function money(v) { return v === null || v === undefined ? '' : '$$' + Number(v).toFixed(2); }
+        function text(v) { return v === null || v === undefined ? '' : String(v); }
+        function cell(value, cls) {
+            var div = document.createElement('div');
+            if (cls) { div.className = cls; }
+            div.textContent = value;
+            div.title = value;
+            return div;
+        }
+        function fillSelect(id, values) {
+            var select = document.getElementById(id);
+            values.forEach(function (value, index) {
+                if (!value) { return; }
+                var option = document.createElement('option');
+                option.value = String(index);
+                option.textContent = value;
+                select.appendChild(option);
+            });
+        }
+        function applyFilters() {
+            var vendor = document.getElementById('f-vendor').value;
+            var l1 = document.getElementById('f-l1').value;
+            var l2 = document.getElementById('f-l2').value;
+            var review = document.getElementById('f-review').checked;
+            var query = document.getElementById('f-text').value.trim().toLowerCase();
+            var rows = data.rows, receipts = data.receipts;
+            filtered = [];
+            for (var i = 0; i < rows.length; i++) {
+                var row = rows[i], receipt = receipts[row[0]];
+                if (vendor !== '' && receipt[1] !== +vendor) { continue; }
+                if (l1 !== '' && row[6] !== +l1) { continue; }
+                if (l2 !== '' && row[7] !== +l2) { continue; }
+                if (review && !row[8]) { continue; }
+                if (query && row[1].toLowerCase().indexOf(query) < 0 &&
+                    String(receipt[0]).toLowerCase().indexOf(query) < 0) { continue; }
+                filtered.push(i);
+            }
+            document.getElementById('count').textContent = filtered.length + ' of ' + rows.length + ' items';
+            spacer.style.height = (filtered.length * ROW_HEIGHT) + 'px';
+            viewport.scrollTop = 0;
+            render();
+        }
+        function render() {
+            var first = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+            var last = Math.min(filtered.length, Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+            var fragment = document.createDocumentFragment();
+            for (var i = first; i < last; i++) {
+                var row = data.rows[filtered[i]], receipt = data.receipts[row[0]];
+                var div = document.createElement('div');
+                div.className = 'grid-row' + (row[8] ? ' review' : '');
+                div.style.top = (i * ROW_HEIGHT) + 'px';
+                div.appendChild(cell(text(receipt[0])));
+                div.appendChild(cell(data.dicts.vendor[receipt[1]]));
+                div.appendChild(cell(text(row[1])));
+                div.appendChild(cell(text(row[2]), 'num'));
+                div.appendChild(cell(text(row[3])));
+                div.appendChild(cell(money(row[4]), 'num'));
+                div.appendChild(cell(money(row[5]), 'num'));
+                div.appendChild(cell(data.dicts.l1[row[6]]));
+                div.appendChild(cell(data.dicts.l2[row[7]]));
+                fragment.appendChild(div);
+            }
+            spacer.replaceChildren(fragment);
+        }
+        function start(payload) {
+            data = payload;
+            document.getElementById('generated').textContent = 'Generated on ' + data.generated + ' · ' +
+                data.receipts.length + ' receipts';
+            fillSelect('f-vendor', data.dicts.vendor);
+            fillSelect('f-l1', data.dicts.l1);
+            fillSelect('f-l2', data.dicts.l2);
+            ['f-vendor', 'f-l1', 'f-l2', 'f-review'].forEach(function (id) {
+                document.getElementById(id).addEventListener('change', applyFilters);
+            });
+            document.getElementById('f-text').addEventListener('input', applyFilters);
+            viewport.addEventListener('scroll', function () { window.requestAnimationFrame(render); });
+            window.addEventListener('resize', render);
+            applyFilters();
+        }
+        if (window.REPORT_DATA) {
+            start(window.REPORT_DATA);
+        } else {
+            fetch(window.REPORT_DATA_URL).then(function (response) {
+                return new Response(response.body.pipeThrough(new DecompressionStream('gzip'))).json();
+            }).then(start).catch(function (error) {
+                document.getElementById('count').textContent = 'Could not load report data: ' + error;
+            });
+        }
+    })();
+    </script>
+</body>
+</html>
+""")
@@ -4,6 +4,8 @@ Standardized Output Module for Step 1
 Creates timestamped folders and generates standardized CSV files
 """
 
+from __future__ import annotations
+
 import json
 import logging
 import re
@@ -12,7 +14,9 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 
-import pandas as pd
+from .utils.lazy_import import lazy_module
+
+pd = lazy_module('pandas')
 
 logger = logging.getLogger(__name__)
 
@@ -485,7 +489,7 @@ def create_standardized_output(receipts_data: Dict[str, Dict[str, Any]],
     
     # Generate Excel export for human review
     try:
-        excel_file = _create_excel_export(df, unmapped, low_confidence, upc_missing, tables_dir, input_dir)
+        excel_file = _create_excel_export(df, tables_dir, input_dir, low_confidence_threshold)
         logger.info(f"Created Excel export: {excel_file}")
     except Exception as e:
         logger.warning(f"Could not create Excel export: {e}", exc_info=True)
@@ -495,219 +499,149 @@ def create_standardized_output(receipts_data: Dict[str, Dict[str, Any]],
     return output_dir
 
 
-def _create_excel_export(df: pd.DataFrame, unmapped: pd.DataFrame, 
-                         low_confidence: pd.DataFrame, upc_missing: pd.DataFrame,
-                         tables_dir: Path, input_dir: Optional[Path] = None) -> Optional[Path]:
-    """Create Excel export with multiple sheets for comprehensive review"""
+def _find_input_base_dir(input_dir: Optional[Path], tables_dir: Path) -> Path:
+    """Directory the source_file hyperlinks are resolved against"""
+    base_input_dir = input_dir
+    if not base_input_dir or not base_input_dir.exists():
+        # Try relative to artifacts: ../../step1_input
+        artifacts_dir = tables_dir.parent
+        base_input_dir = artifacts_dir.parent.parent.parent / 'step1_input'
+        if not base_input_dir.exists():
+            # Try from project root
+            project_root = Path(__file__).parent.parent.parent
+            base_input_dir = project_root / 'data' / 'step1_input'
+    return base_input_dir
+
+
+def _resolve_source_file(base_input_dir: Path, source_file: str) -> Optional[Path]:
+    """Find a source file in the input directory (as given, by name, or in a subdirectory)"""
+    file_path = base_input_dir / source_file
+    if not file_path.exists():
+        # Try with just filename
+        file_path = base_input_dir / Path(source_file).name
+    
+    # Also try searching in subdirectories
+    if not file_path.exists() and base_input_dir.is_dir():
+        for subdir in base_input_dir.iterdir():
+            if subdir.is_dir():
+                test_path = subdir / Path(source_file).name
+                if test_path.exists():
+                    return test_path
+    return file_path if file_path.exists() else None
+
+
+def _create_excel_export(df: pd.DataFrame, tables_dir: Path, input_dir: Optional[Path] = None,
+                         low_confidence_threshold: float = 0.60) -> Optional[Path]:
+    """
+    Create Excel export with multiple sheets for comprehensive review
+    
+    Written with a streaming (write-only) workbook in one pass over df: each line goes
+    to All Lines and to whichever of Unmapped / Low Confidence / UPC Needed it belongs
+    in, so no filtered DataFrame copies are built.
+    """
     try:
-        import openpyxl
+        import openpyxl  # noqa: F401
     except ImportError:
         logger.warning("openpyxl not available, cannot create Excel export. Install with: pip install openpyxl")
         return None
     
+    from .utils.excel_writer import StreamingWorkbook
+    
     excel_file = tables_dir / 'step1_review.xlsx'
     
     try:
-        with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-            # Sheet 1: All Lines (main data)
-            df.to_excel(writer, sheet_name='All Lines', index=False)
-            
-            # Sheet 2: Unmapped Lines (L2='C99' or missing)
-            if len(unmapped) > 0:
-                unmapped.to_excel(writer, sheet_name='Unmapped', index=False)
-            else:
-                # Create empty sheet with same columns
-                pd.DataFrame(columns=df.columns).to_excel(writer, sheet_name='Unmapped', index=False)
-            
-            # Sheet 3: Low Confidence Lines
-            if len(low_confidence) > 0:
-                low_confidence.to_excel(writer, sheet_name='Low Confidence', index=False)
-            else:
-                pd.DataFrame(columns=df.columns).to_excel(writer, sheet_name='Low Confidence', index=False)
-            
-            # Sheet 4: UPC Backfill Queue
-            if len(upc_missing) > 0:
-                upc_missing.to_excel(writer, sheet_name='UPC Needed', index=False)
-            else:
-                pd.DataFrame(columns=df.columns).to_excel(writer, sheet_name='UPC Needed', index=False)
-            
-            # Sheet 5: Summary Statistics
-            summary_data = {
-                'Metric': [
-                    'Total Lines',
-                    'Classified Lines',
-                    'Unmapped Lines',
-                    'Low Confidence Lines',
-                    'Lines Needing UPC',
-                    'Total Receipts',
-                    'Unique Vendors',
-                    'Date Range'
-                ],
-                'Value': [
-                    len(df),
-                    len(df[df['L2'] != ''].dropna(subset=['L2'])),
-                    len(unmapped),
-                    len(low_confidence),
-                    len(upc_missing),
-                    df['source_file'].nunique() if 'source_file' in df.columns else 0,
-                    df['vendor'].nunique() if 'vendor' in df.columns else 0,
-                    f"{df['txn_date'].min() if 'txn_date' in df.columns and df['txn_date'].notna().any() else 'N/A'} to {df['txn_date'].max() if 'txn_date' in df.columns and df['txn_date'].notna().any() else 'N/A'}"
-                ]
-            }
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Sheet 6: Data Dictionary
-            data_dict_file = tables_dir / 'data_dictionary.csv'
-            if data_dict_file.exists():
-                data_dict_df = pd.read_csv(data_dict_file)
-                data_dict_df.to_excel(writer, sheet_name='Data Dictionary', index=False)
-            
-            # Sheet 7 & 8: Category Lists (for dropdowns)
-            # Load category information for dropdowns
-            # Find step1_rules directory (should be at project root, same level as step1_extract)
-            current_file = Path(__file__)
-            # From step1_extract/standardized_output.py -> receipt_importer/step1_rules
-            project_root = current_file.parent.parent  # receipt_importer/
-            rules_dir = project_root / 'step1_rules'
-            l1_options, l2_options = _load_category_options(rules_dir)
-            
+        # Category lists for dropdowns
+        # Find step1_rules directory (should be at project root, same level as step1_extract)
+        current_file = Path(__file__)
+        # From step1_extract/standardized_output.py -> receipt_importer/step1_rules
+        project_root = current_file.parent.parent  # receipt_importer/
+        rules_dir = project_root / 'step1_rules'
+        l1_options, l2_options = _load_category_options(rules_dir)
+        
+        columns = list(df.columns)
+        workbook = StreamingWorkbook(excel_file)
+        
+        # Sheets 1-4: All Lines, Unmapped (L2='C99' or missing), Low Confidence, UPC Backfill Queue
+        all_lines = workbook.add_sheet('All Lines', columns)
+        unmapped = workbook.add_sheet('Unmapped', columns)
+        low_confidence = workbook.add_sheet('Low Confidence', columns)
+        upc_missing = workbook.add_sheet('UPC Needed', columns)
+        data_sheets = [all_lines, unmapped, low_confidence, upc_missing]
+        
+        for sheet in data_sheets:
             if l1_options:
-                l1_df = pd.DataFrame({'L1 Categories': l1_options})
-                l1_df.to_excel(writer, sheet_name='L1_Categories', index=False)
-            
+                sheet.add_list_validation('L1', f'INDIRECT("L1_Categories!A2:A{len(l1_options) + 1}")')
             if l2_options:
-                l2_df = pd.DataFrame({'L2 Categories': l2_options})
-                l2_df.to_excel(writer, sheet_name='L2_Categories', index=False)
+                sheet.add_list_validation('L2', f'INDIRECT("L2_Categories!A2:A{len(l2_options) + 1}")')
         
-        # Apply Excel enhancements: dropdowns, hyperlinks, formatting
-        try:
-            from openpyxl import load_workbook
-            from openpyxl.worksheet.datavalidation import DataValidation
-            from openpyxl.utils import get_column_letter
-            
-            wb = load_workbook(excel_file)
-            
-            # Check if category sheets exist
-            has_l1_sheet = 'L1_Categories' in wb.sheetnames
-            has_l2_sheet = 'L2_Categories' in wb.sheetnames
-            
-            # Apply enhancements to data sheets (All Lines, Unmapped, Low Confidence, UPC Needed)
-            data_sheets = ['All Lines', 'Unmapped', 'Low Confidence', 'UPC Needed']
+        col = {name: idx for idx, name in enumerate(columns)}
+        source_idx = col.get('source_file')
+        base_input_dir = _find_input_base_dir(input_dir, tables_dir) if source_idx is not None else None
+        resolved_sources: Dict[str, Optional[Path]] = {}
+        classified = 0
+        
+        for values in df.itertuples(index=False, name=None):
+            l2 = values[col['L2']]
+            l2_blank = l2 is None or l2 == '' or (isinstance(l2, float) and l2 != l2)
+            if not l2_blank:
+                classified += 1
+            try:
+                is_low_confidence = float(values[col['confidence']]) < low_confidence_threshold
+            except (TypeError, ValueError):
+                is_low_confidence = False
             
-            for sheet_name in data_sheets:
-                if sheet_name not in wb.sheetnames:
-                    continue
-                
-                ws = wb[sheet_name]
-                
-                # Find column indices for L1, L2, and source_file
-                header_row = 1
-                l1_col = None
-                l2_col = None
-                source_file_col = None
-                
-                for col_idx, cell in enumerate(ws[header_row], 1):
-                    if cell.value and str(cell.value).upper() == 'L1':
-                        l1_col = col_idx
-                    elif cell.value and str(cell.value).upper() == 'L2':
-                        l2_col = col_idx
-                    elif cell.value and 'source_file' in str(cell.value).lower():
-                        source_file_col = col_idx
-                
-                # Add dropdown lists for L1 column
-                if l1_col and has_l1_sheet:
-                    l1_col_letter = get_column_letter(l1_col)
-                    # Use INDIRECT to reference the category sheet
-                    # Count rows in L1_Categories sheet
-                    l1_sheet = wb['L1_Categories']
-                    l1_max_row = l1_sheet.max_row
-                    l1_formula = f'INDIRECT("L1_Categories!A2:A{l1_max_row}")'
-                    dv = DataValidation(type="list", formula1=l1_formula, allow_blank=True)
-                    dv.error = 'Invalid category. Please select from the list.'
-                    dv.errorTitle = 'Invalid Entry'
-                    ws.add_data_validation(dv)
-                    dv.add(f"{l1_col_letter}2:{l1_col_letter}{ws.max_row}")
-                    logger.debug(f"Added L1 dropdown to {sheet_name} column {l1_col_letter}")
-                
-                # Add dropdown lists for L2 column
-                if l2_col and has_l2_sheet:
-                    l2_col_letter = get_column_letter(l2_col)
-                    # Use INDIRECT to reference the category sheet
-                    l2_sheet = wb['L2_Categories']
-                    l2_max_row = l2_sheet.max_row
-                    l2_formula = f'INDIRECT("L2_Categories!A2:A{l2_max_row}")'
-                    dv = DataValidation(type="list", formula1=l2_formula, allow_blank=True)
-                    dv.error = 'Invalid category. Please select from the list.'
-                    dv.errorTitle = 'Invalid Entry'
-                    ws.add_data_validation(dv)
-                    dv.add(f"{l2_col_letter}2:{l2_col_letter}{ws.max_row}")
-                    logger.debug(f"Added L2 dropdown to {sheet_name} column {l2_col_letter}")
-                
-                # Add hyperlinks for source_file column
-                if source_file_col:
-                    source_file_col_letter = get_column_letter(source_file_col)
-                    # Get base input directory - try multiple possible locations
-                    base_input_dir = input_dir
-                    if not base_input_dir or not base_input_dir.exists():
-                        # Try relative to artifacts: ../../step1_input
-                        artifacts_dir = tables_dir.parent
-                        base_input_dir = artifacts_dir.parent.parent.parent / 'step1_input'
-                        if not base_input_dir.exists():
-                            # Try from project root
-                            project_root = Path(__file__).parent.parent.parent
-                            base_input_dir = project_root / 'data' / 'step1_input'
-                    
-                    hyperlink_count = 0
-                    for row_idx in range(2, ws.max_row + 1):
-                        cell = ws[f"{source_file_col_letter}{row_idx}"]
-                        if cell.value:
-                            source_file = str(cell.value)
-                            # Try to find the file in the input directory
-                            file_path = base_input_dir / source_file
-                            if not file_path.exists():
-                                # Try with just filename
-                                file_path = base_input_dir / Path(source_file).name
-                            
-                            # Also try searching in subdirectories
-                            if not file_path.exists():
-                                for subdir in base_input_dir.iterdir():
-                                    if subdir.is_dir():
-                                        test_path = subdir / Path(source_file).name
-                                        if test_path.exists():
-                                            file_path = test_path
-                                            break
-                            
-                            if file_path.exists():
-                                try:
-                                    from openpyxl.styles import Font
-                                    cell.hyperlink = str(file_path.absolute())
-                                    cell.font = Font(color="0000FF", underline="single")
-                                    hyperlink_count += 1
-                                except Exception as e:
-                                    logger.debug(f"Could not create hyperlink for {source_file}: {e}")
-                    
-                    logger.debug(f"Added {hyperlink_count} hyperlinks for source_file in {sheet_name}")
+            targets = [all_lines]
+            if l2_blank or l2 == 'C99':
+                targets.append(unmapped)
+            if is_low_confidence:
+                targets.append(low_confidence)
+            if values[col['upc_status']] == 'missing' and values[col['fee_type']] == '':
+                targets.append(upc_missing)
             
-            # Auto-adjust column widths for all sheets
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
+            # Hyperlink source_file to the original receipt (resolved once per file)
+            link_target = None
+            if source_idx is not None and values[source_idx]:
+                source_file = str(values[source_idx])
+                if source_file not in resolved_sources:
+                    resolved_sources[source_file] = _resolve_source_file(base_input_dir, source_file)
+                link_target = resolved_sources[source_file]
             
-            wb.save(excel_file)
-            logger.info("Applied Excel enhancements: dropdowns for L1/L2, hyperlinks for source_file")
-        except Exception as e:
-            logger.warning(f"Could not apply Excel enhancements: {e}", exc_info=True)
+            for sheet in targets:
+                row = list(values)
+                if link_target is not None:
+                    row[source_idx] = workbook.link(sheet, row[source_idx], str(link_target.absolute()))
+                sheet.append(row)
+        
+        # Sheet 5: Summary Statistics
+        has_dates = 'txn_date' in df.columns and df['txn_date'].notna().any()
+        summary_rows = [
+            ('Total Lines', all_lines.row_count),
+            ('Classified Lines', classified),
+            ('Unmapped Lines', unmapped.row_count),
+            ('Low Confidence Lines', low_confidence.row_count),
+            ('Lines Needing UPC', upc_missing.row_count),
+            ('Total Receipts', df['source_file'].nunique() if 'source_file' in df.columns else 0),
+            ('Unique Vendors', df['vendor'].nunique() if 'vendor' in df.columns else 0),
+            ('Date Range', f"{df['txn_date'].min() if has_dates else 'N/A'} to {df['txn_date'].max() if has_dates else 'N/A'}"),
+        ]
+        workbook.write_sheet('Summary', ['Metric', 'Value'], summary_rows)
+        
+        # Sheet 6: Data Dictionary
+        data_dict_file = tables_dir / 'data_dictionary.csv'
+        if data_dict_file.exists():
+            data_dict_df = pd.read_csv(data_dict_file)
+            workbook.write_sheet('Data Dictionary', list(data_dict_df.columns),
+                                 data_dict_df.itertuples(index=False, name=None))
+        
+        # Sheet 7 & 8: Category Lists (for dropdowns)
+        if l1_options:
+            workbook.write_sheet('L1_Categories', ['L1 Categories'], ([option] for option in l1_options))
+        if l2_options:
+            workbook.write_sheet('L2_Categories', ['L2 Categories'], ([option] for option in l2_options))
+        
+        workbook.save()
+        logger.info("Applied Excel enhancements: dropdowns for L1/L2, hyperlinks for source_file "
+                    f"({sum(1 for path in resolved_sources.values() if path)} files linked)")
         
     except Exception as e:
         logger.error(f"Error creating Excel export: {e}", exc_info=True)
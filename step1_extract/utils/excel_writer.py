@@ -0,0 +1,135 @@
+"""
+Streaming Excel Writer
+
+Constant-memory .xlsx output on top of openpyxl's write-only workbook: rows are
+appended one at a time and flushed to disk, so exports don't need a DataFrame (or
+filtered copies of one) in memory. Several sheets can be fed in the same pass.
+
+Write-only sheets can't be edited after the fact, so:
+- Column widths are sized from the header plus the first WIDTH_SAMPLE_ROWS rows
+- Dropdown validations are registered up front and applied to the final row range
+- Hyperlinks / fonts are set on the cell when it is written (see StreamingWorkbook.link)
+"""
+
+import logging
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+WIDTH_SAMPLE_ROWS = 500
+MAX_COLUMN_WIDTH = 50
+
+
+def _excel_value(value: Any) -> Any:
+    """None for missing values (NaN / NaT / pd.NA), which pandas also writes as empty cells"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if type(value).__name__ in ('NAType', 'NaTType'):
+        return None
+    return value
+
+
+class StreamingSheet:
+    """One write-only worksheet with a fixed header"""
+
+    def __init__(self, worksheet, columns: Sequence[str], sample_rows: int = WIDTH_SAMPLE_ROWS):
+        self.worksheet = worksheet
+        self.columns = list(columns)
+        self.row_count = 0
+        self._sample_rows = sample_rows
+        self._buffer: Optional[List[List[Any]]] = []
+        self._validations = []
+
+    def append(self, values: Sequence[Any]) -> None:
+        """Append one data row (values in column order; openpyxl cells are written as-is)"""
+        row = [_excel_value(value) for value in values]
+        self.row_count += 1
+        if self._buffer is None:
+            self.worksheet.append(row)
+            return
+        self._buffer.append(row)
+        if len(self._buffer) >= self._sample_rows:
+            self._flush_buffer()
+
+    def add_list_validation(self, column: str, formula: str) -> None:
+        """Dropdown on a column's data rows (applied when the sheet is closed)"""
+        if column in self.columns:
+            self._validations.append((self.columns.index(column) + 1, formula))
+
+    def close(self) -> None:
+        if self._buffer is not None:
+            self._flush_buffer()
+        if not self._validations or not self.row_count:
+            return
+        from openpyxl.utils import get_column_letter
+        from openpyxl.worksheet.datavalidation import DataValidation
+
+        for col_idx, formula in self._validations:
+            letter = get_column_letter(col_idx)
+            dv = DataValidation(type="list", formula1=formula, allow_blank=True)
+            dv.error = 'Invalid category. Please select from the list.'
+            dv.errorTitle = 'Invalid Entry'
+            dv.add(f"{letter}2:{letter}{self.row_count + 1}")
+            self.worksheet.data_validations.append(dv)
+
+    def _flush_buffer(self) -> None:
+        """Size columns from the buffered sample, then write header and buffered rows"""
+        from openpyxl.utils import get_column_letter
+
+        widths = [len(str(column)) for column in self.columns]
+        for row in self._buffer:
+            for idx, value in enumerate(row[:len(widths)]):
+                text = getattr(value, 'value', value)
+                if text is not None:
+                    widths[idx] = max(widths[idx], len(str(text)))
+        for idx, width in enumerate(widths, 1):
+            self.worksheet.column_dimensions[get_column_letter(idx)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+        self.worksheet.append(self.columns)
+        for row in self._buffer:
+            self.worksheet.append(row)
+        self._buffer = None
+
+
+class StreamingWorkbook:
+    """Write-only workbook; sheets appear in the order they are added"""
+
+    def __init__(self, path: Path, sample_rows: int = WIDTH_SAMPLE_ROWS):
+        from openpyxl import Workbook
+
+        self.path = Path(path)
+        self.sample_rows = sample_rows
+        self._workbook = Workbook(write_only=True)
+        self._sheets: Dict[str, StreamingSheet] = {}
+
+    def add_sheet(self, title: str, columns: Sequence[str]) -> StreamingSheet:
+        sheet = StreamingSheet(self._workbook.create_sheet(title), columns, self.sample_rows)
+        self._sheets[title] = sheet
+        return sheet
+
+    def write_sheet(self, title: str, columns: Sequence[str], rows) -> StreamingSheet:
+        """Add a sheet and fill it from an iterable of rows"""
+        sheet = self.add_sheet(title, columns)
+        for row in rows:
+            sheet.append(row)
+        return sheet
+
+    def link(self, sheet: StreamingSheet, value: Any, target: str):
+        """Blue, underlined hyperlink cell for sheet.append"""
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        cell = WriteOnlyCell(sheet.worksheet, value=value)
+        cell.hyperlink = target
+        cell.font = Font(color="0000FF", underline="single")
+        return cell
+
+    def save(self) -> Path:
+        for sheet in self._sheets.values():
+            sheet.close()
+        self._workbook.save(self.path)
+        return self.path
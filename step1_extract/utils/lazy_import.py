@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Lazy Import Helpers
+Defer heavy optional backends (OCR, OpenCV, PyMuPDF, pdfplumber, LLM, psycopg2)
+until first use, so CLI startup and unrelated steps don't pay for them.
+"""
+
+import importlib
+import importlib.util
+import logging
+import threading
+from types import ModuleType
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+_available_cache: Dict[str, bool] = {}
+
+
+def module_available(name: str) -> bool:
+    """
+    Check whether a module can be imported, without importing it.
+
+    Args:
+        name: Dotted module name (e.g. 'fitz', 'PIL.Image')
+
+    Returns:
+        True if the module (and its parent packages) can be found
+    """
+    if name not in _available_cache:
+        try:
+            _available_cache[name] = importlib.util.find_spec(name) is not None
+        except (ImportError, ValueError):
+            _available_cache[name] = False
+    return _available_cache[name]
+
+
+class LazyModule(ModuleType):
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    logger.debug(f"Lazy import: {self.__name__}")
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """
+    Return a proxy for `name` that is imported on first attribute access.
+
+    Pair with module_available() for the *_AVAILABLE flags, e.g.:
+
+        fitz = lazy_module('fitz')
+        MUPDF_AVAILABLE = module_available('fitz')
+    """
+    return LazyModule(name)
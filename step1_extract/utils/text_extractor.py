@@ -8,22 +8,20 @@ import logging
 from pathlib import Path
 from typing import Optional
 
+from .lazy_import import lazy_module, module_available
+
 logger = logging.getLogger(__name__)
 
-# Try PyMuPDF (fitz) - best for structured PDFs
-try:
-    import fitz  # PyMuPDF
-    MUPDF_AVAILABLE = True
-except ImportError:
-    MUPDF_AVAILABLE = False
+# PyMuPDF (fitz) - best for structured PDFs; imported on first use
+fitz = lazy_module('fitz')  # PyMuPDF
+MUPDF_AVAILABLE = module_available('fitz')
+if not MUPDF_AVAILABLE:
     logger.warning("PyMuPDF not available. Install with: pip install pymupdf")
 
-# Try PyPDF2 - fallback for text extraction
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+# PyPDF2 - fallback for text extraction
+PyPDF2 = lazy_module('PyPDF2')
+PDF_AVAILABLE = module_available('PyPDF2')
+if not PDF_AVAILABLE:
     logger.warning("PyPDF2 not available. Install with: pip install PyPDF2")
 
 
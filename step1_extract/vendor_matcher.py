@@ -10,11 +10,10 @@ from pathlib import Path
 from typing import Dict, Optional, List
 from difflib import SequenceMatcher
 
-try:
-    from step3_mapping.query_database import connect_to_database
-    DB_AVAILABLE = True
-except ImportError:
-    DB_AVAILABLE = False
+import importlib.util
+
+# step3_mapping (and psycopg2) are imported only when vendors are actually loaded from the database
+DB_AVAILABLE = importlib.util.find_spec('step3_mapping') is not None
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +73,7 @@ class VendorMatcher:
             return
         
         try:
+            from step3_mapping.query_database import connect_to_database
             conn = connect_to_database()
             if not conn:
                 logger.debug("Could not connect to database for vendor list")
@@ -6,65 +6,73 @@ Searches WebstaurantStore website by item number to get product details for cate
 
 import re
 import logging
-import time
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any
+from pathlib import Path
 from urllib.parse import quote
 
+from .lookup_cache import LookupCache
+
 logger = logging.getLogger(__name__)
 
 
 class WebstaurantStoreLookup:
     """Lookup product information from WebstaurantStore by item number"""
     
-    def __init__(self, rule_loader=None, cache_file=None):
+    BASE_URL = 'https://www.webstaurantstore.com'
+    
+    def __init__(self, rule_loader=None, cache_file=None, engine=None, base_url=None):
         """
         Initialize WebstaurantStore lookup
         
         Args:
             rule_loader: RuleLoader instance (optional, for category hints)
             cache_file: Path to cache file for storing lookup results
+            engine: AsyncEnrichmentEngine to fetch with (default: 1 request/second, 4 concurrent)
+            base_url: Site root (overridable for tests against a local stub server)
         """
         self.rule_loader = rule_loader
         self.cache_file = cache_file
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self._load_cache()
+        self.cache = self._open_cache(cache_file)
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
         
-        # Rate limiting
-        self.last_request_time = 0
+        # Rate limiting (token bucket per host inside the engine)
         self.min_request_interval = 1.0  # 1 second between requests
+        if engine is None:
+            from .enrichment_engine import AsyncEnrichmentEngine
+            engine = AsyncEnrichmentEngine(
+                max_concurrency=4,
+                requests_per_second=1.0 / self.min_request_interval,
+                timeout=10.0,
+            )
+        self.engine = engine
     
-    def _load_cache(self):
-        """Load cached lookup results from file"""
-        if not self.cache_file:
-            return
+    def _open_cache(self, cache_file) -> LookupCache:
+        """
+        Open the lookup cache (negative entries + TTLs, incremental SQLite persistence).
         
-        try:
-            import json
-            from pathlib import Path
-            
-            cache_path = Path(self.cache_file)
-            if cache_path.exists():
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-                logger.debug(f"Loaded {len(self.cache)} cached WebstaurantStore lookups")
-        except Exception as e:
-            logger.debug(f"Could not load cache: {e}")
-    
-    def _save_cache(self):
-        """Save lookup results to cache file"""
-        if not self.cache_file:
-            return
+        A legacy JSON cache file is imported once into a sibling .sqlite file.
+        """
+        if not cache_file:
+            return LookupCache(Path(':memory:'), namespace='webstaurantstore')
         
-        try:
-            import json
-            from pathlib import Path
-            
-            cache_path = Path(self.cache_file)
-            cache_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.debug(f"Could not save cache: {e}")
+        cache_path = Path(cache_file)
+        db_path = cache_path.with_suffix('.sqlite') if cache_path.suffix == '.json' else cache_path
+        cache = LookupCache(db_path, namespace='webstaurantstore')
+        if cache_path != db_path and cache_path.exists() and len(cache) == 0:
+            try:
+                import json
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                for item_number, entry in legacy.items():
+                    if entry.get('found', True):
+                        cache.put(item_number, entry)
+                    else:
+                        cache.put_negative(item_number)
+                cache.flush()
+                logger.debug(f"Imported {len(legacy)} cached WebstaurantStore lookups from {cache_path}")
+            except Exception as e:
+                logger.debug(f"Could not import legacy cache: {e}")
+        return cache
     
     def lookup_item(self, item_number: str) -> Optional[Dict[str, Any]]:
         """
@@ -78,174 +86,187 @@ class WebstaurantStoreLookup:
         """
         if not item_number or item_number == 'UNKNOWN':
             return None
+        return self.lookup_items([item_number]).get(item_number)
+    
+    def lookup_items(self, item_numbers: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Lookup many item numbers at once (cache first, then concurrent fetches)
         
-        # Check cache first
-        if item_number in self.cache:
-            cached_result = self.cache[item_number]
-            logger.debug(f"Using cached lookup for {item_number}")
-            return cached_result
+        Args:
+            item_numbers: WebstaurantStore item numbers (duplicates are looked up once)
+            
+        Returns:
+            Dictionary item_number -> product info (None when not found)
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        to_fetch = []
+        for item_number in item_numbers:
+            if not item_number or item_number == 'UNKNOWN' or item_number in results:
+                continue
+            # Check cache first (negative entries return None without a request)
+            found, cached_result = self.cache.lookup(item_number)
+            if found:
+                logger.debug(f"Using cached lookup for {item_number}")
+                results[item_number] = cached_result
+                continue
+            results[item_number] = None
+            to_fetch.append(item_number)
         
-        # Rate limiting
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last)
+        if not to_fetch:
+            return results
         
-        try:
-            # Search WebstaurantStore by item number
-            product_info = self._search_webstaurantstore(item_number)
-            
+        # Try direct product pages first: {base_url}/{item_number}.html
+        product_urls = {item: f"{self.base_url}/{quote(item)}.html" for item in to_fetch}
+        responses = self.engine.fetch_all(product_urls.values())
+        
+        resolved: Dict[str, Optional[Dict[str, Any]]] = {}
+        needs_search = []
+        for item_number, url in product_urls.items():
+            response = responses.get(url)
+            if response is None or response.status == 0:
+                logger.warning(f"Error looking up item {item_number}: {response.error if response else 'no response'}")
+            elif response.status == 200:
+                resolved[item_number] = self._parse_product_page(item_number, url, response.content)
+            elif response.status == 404:
+                # If direct URL doesn't work, try search
+                logger.debug(f"Direct URL not found for {item_number}, trying search...")
+                needs_search.append(item_number)
+            elif response.status < 500 and response.status != 429:
+                logger.debug(f"HTTP {response.status} for {item_number}")
+                resolved[item_number] = None
+        
+        if needs_search:
+            search_urls = {item: f"{self.base_url}/search/{quote(item)}.html" for item in needs_search}
+            responses = self.engine.fetch_all(search_urls.values())
+            for item_number, url in search_urls.items():
+                response = responses.get(url)
+                if response is None or response.status == 0 or response.status >= 500 or response.status == 429:
+                    continue
+                resolved[item_number] = self._parse_search_page(item_number, response.content) if response.ok else None
+        
+        # Cache definitive outcomes (hits and misses); transient failures are retried next run
+        for item_number, product_info in resolved.items():
             if product_info:
-                # Cache the result
-                self.cache[item_number] = product_info
-                self._save_cache()
+                self.cache.put(item_number, product_info)
                 logger.info(f"Looked up {item_number}: {product_info.get('name', 'N/A')[:50]}...")
-                return product_info
             else:
                 # Cache negative result
-                self.cache[item_number] = {'found': False}
-                self._save_cache()
+                self.cache.put_negative(item_number)
                 logger.debug(f"No product found for item number {item_number}")
-                return None
-                
-        except Exception as e:
-            logger.warning(f"Error looking up item {item_number}: {e}")
-            return None
+            results[item_number] = product_info
+        if resolved:
+            self.cache.flush()
+        
+        return results
     
-    def _search_webstaurantstore(self, item_number: str) -> Optional[Dict[str, Any]]:
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get lookup cache statistics (hits, misses, negative hits) for the run summary"""
+        return self.cache.get_stats()
+    
+    def _parse_product_page(self, item_number: str, url: str, content: bytes) -> Optional[Dict[str, Any]]:
         """
-        Search WebstaurantStore website for product by item number
+        Parse a WebstaurantStore product page
         
         Args:
-            item_number: Item number to search
+            item_number: Item number that was looked up
+            url: Product page URL
+            content: Raw HTML
             
         Returns:
             Product information dictionary
         """
         try:
-            import requests
             from bs4 import BeautifulSoup
             
-            # WebstaurantStore search URL
-            # Try direct product page first: https://www.webstaurantstore.com/{item_number}.html
-            search_url = f"https://www.webstaurantstore.com/{item_number}.html"
+            soup = BeautifulSoup(content, 'html.parser')
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            product_info = {
+                'item_number': item_number,
+                'found': True,
+                'url': url
             }
             
-            response = requests.get(search_url, headers=headers, timeout=10)
+            # Extract product name
+            name_selectors = [
+                'h1.product-name',
+                'h1[itemprop="name"]',
+                '.product-name h1',
+                'h1'
+            ]
+            for selector in name_selectors:
+                name_elem = soup.select_one(selector)
+                if name_elem:
+                    product_info['name'] = name_elem.get_text(strip=True)
+                    break
             
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                product_info = {
-                    'item_number': item_number,
-                    'found': True,
-                    'url': search_url
-                }
-                
-                # Extract product name
-                name_selectors = [
-                    'h1.product-name',
-                    'h1[itemprop="name"]',
-                    '.product-name h1',
-                    'h1'
-                ]
-                for selector in name_selectors:
-                    name_elem = soup.select_one(selector)
-                    if name_elem:
-                        product_info['name'] = name_elem.get_text(strip=True)
-                        break
-                
-                # Extract category/breadcrumb
-                breadcrumb = soup.select_one('.breadcrumb, .breadcrumbs, nav[aria-label="breadcrumb"]')
-                if breadcrumb:
-                    breadcrumb_text = breadcrumb.get_text(' > ', strip=True)
-                    product_info['category_path'] = breadcrumb_text
-                    
-                    # Extract category keywords
-                    category_keywords = []
-                    for link in breadcrumb.select('a'):
-                        category_text = link.get_text(strip=True)
-                        if category_text and category_text.lower() not in ['home', 'webstaurantstore']:
-                            category_keywords.append(category_text)
-                    product_info['category_keywords'] = category_keywords
-                
-                # Extract description
-                desc_selectors = [
-                    '[itemprop="description"]',
-                    '.product-description',
-                    '.description',
-                    '#product-description'
-                ]
-                for selector in desc_selectors:
-                    desc_elem = soup.select_one(selector)
-                    if desc_elem:
-                        product_info['description'] = desc_elem.get_text(strip=True)
-                        break
+            # Extract category/breadcrumb
+            breadcrumb = soup.select_one('.breadcrumb, .breadcrumbs, nav[aria-label="breadcrumb"]')
+            if breadcrumb:
+                breadcrumb_text = breadcrumb.get_text(' > ', strip=True)
+                product_info['category_path'] = breadcrumb_text
                 
-                # Extract meta keywords/tags
-                meta_keywords = soup.find('meta', {'name': 'keywords'})
-                if meta_keywords and meta_keywords.get('content'):
-                    product_info['meta_keywords'] = meta_keywords['content'].split(',')
-                
-                return product_info if product_info.get('name') else None
+                # Extract category keywords
+                category_keywords = []
+                for link in breadcrumb.select('a'):
+                    category_text = link.get_text(strip=True)
+                    if category_text and category_text.lower() not in ['home', 'webstaurantstore']:
+                        category_keywords.append(category_text)
+                product_info['category_keywords'] = category_keywords
             
-            # If direct URL doesn't work, try search
-            elif response.status_code == 404:
-                logger.debug(f"Direct URL not found for {item_number}, trying search...")
-                return self._search_by_query(item_number)
-            else:
-                logger.debug(f"HTTP {response.status_code} for {item_number}")
-                return None
+            # Extract description
+            desc_selectors = [
+                '[itemprop="description"]',
+                '.product-description',
+                '.description',
+                '#product-description'
+            ]
+            for selector in desc_selectors:
+                desc_elem = soup.select_one(selector)
+                if desc_elem:
+                    product_info['description'] = desc_elem.get_text(strip=True)
+                    break
+            
+            # Extract meta keywords/tags
+            meta_keywords = soup.find('meta', {'name': 'keywords'})
+            if meta_keywords and meta_keywords.get('content'):
+                product_info['meta_keywords'] = meta_keywords['content'].split(',')
+            
+            return product_info if product_info.get('name') else None
                 
-        except requests.RequestException as e:
-            logger.debug(f"Request error for {item_number}: {e}")
-            return None
         except Exception as e:
             logger.debug(f"Parse error for {item_number}: {e}")
             return None
     
-    def _search_by_query(self, item_number: str) -> Optional[Dict[str, Any]]:
+    def _parse_search_page(self, item_number: str, content: bytes) -> Optional[Dict[str, Any]]:
         """
-        Search WebstaurantStore by query string
+        Parse a WebstaurantStore search results page
         
         Args:
-            item_number: Item number to search
+            item_number: Item number that was searched
+            content: Raw HTML
             
         Returns:
-            Product information dictionary
+            Product information dictionary for the first result
         """
         try:
-            import requests
             from bs4 import BeautifulSoup
             
-            search_url = f"https://www.webstaurantstore.com/search/{quote(item_number)}.html"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-            }
+            soup = BeautifulSoup(content, 'html.parser')
             
-            response = requests.get(search_url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Find first product result
-                product_link = soup.select_one('.product-box a, .product-tile a, a[href*="/product/"]')
-                if product_link:
-                    product_href = product_link.get('href')
-                    if product_href:
-                        # Extract product name
-                        product_name = product_link.get_text(strip=True)
-                        
-                        return {
-                            'item_number': item_number,
-                            'found': True,
-                            'name': product_name,
-                            'url': product_href if product_href.startswith('http') else f"https://www.webstaurantstore.com{product_href}"
-                        }
+            # Find first product result
+            product_link = soup.select_one('.product-box a, .product-tile a, a[href*="/product/"]')
+            if product_link:
+                product_href = product_link.get('href')
+                if product_href:
+                    # Extract product name
+                    product_name = product_link.get_text(strip=True)
+                    
+                    return {
+                        'item_number': item_number,
+                        'found': True,
+                        'name': product_name,
+                        'url': product_href if product_href.startswith('http') else f"{self.base_url}{product_href}"
+                    }
             
             return None
             
@@ -357,9 +378,28 @@ class WebstaurantStoreLookup:
         
         # Lookup product
         product_info = self.lookup_item(item_number)
+        return self._apply_lookup(item, product_info)
+    
+    def enrich_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Enrich many items, fetching all unknown item numbers concurrently
+        
+        Args:
+            items: Item dictionaries with item_number
+            
+        Returns:
+            Updated item dictionaries with category hints
+        """
+        lookups = self.lookup_items(item.get('item_number') for item in items if item.get('item_number'))
+        return [self._apply_lookup(item, lookups.get(item.get('item_number'))) for item in items]
+    
+    def _apply_lookup(self, item: Dict[str, Any], product_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add category hints from a lookup result to an item"""
         if not product_info:
             return item
         
+        item_number = item.get('item_number')
+        
         # Get category hints
         hints = self.get_category_hints(product_info)
         
@@ -377,4 +417,3 @@ class WebstaurantStoreLookup:
         )
         
         return item
-
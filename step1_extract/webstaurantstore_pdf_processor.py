@@ -60,12 +60,9 @@ class WebstaurantStorePDFProcessor:
                 receipt_data['review_reasons'] = []
                 
                 # Enrich items with product lookup (if enabled)
+                # (all unknown item numbers of the receipt are fetched concurrently)
                 if self.lookup and receipt_data.get('items'):
-                    enriched_items = []
-                    for item in receipt_data['items']:
-                        enriched_item = self.lookup.enrich_item_with_lookup(item)
-                        enriched_items.append(enriched_item)
-                    receipt_data['items'] = enriched_items
+                    receipt_data['items'] = self.lookup.enrich_items(receipt_data['items'])
             
             return receipt_data
             
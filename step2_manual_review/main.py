@@ -8,34 +8,20 @@ import json
 import logging
 from pathlib import Path
 from typing import Dict, List, Any, Optional
-import pandas as pd
 from datetime import datetime
 
+from step2_manual_review.review_merge import apply_reviewed_data, item_keys, load_reviewed_excel
+
 logger = logging.getLogger(__name__)
 
 
-def export_to_excel(
-    input_dir: Path,
-    output_dir: Path,
-    filename: str = "manual_review_export.xlsx"
-) -> Path:
+def _iter_review_rows(input_dir: Path):
     """
-    Export Step 1 extracted data to Excel for manual review.
+    Yield one manual-review row (dict) per item that needs review, in file order
     
     Args:
         input_dir: Step 1 output directory (contains extracted_data.json files)
-        output_dir: Output directory for Excel file
-        filename: Output Excel filename
-        
-    Returns:
-        Path to generated Excel file
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / filename
-    
-    # Load all Step 1 output files
-    all_items = []
-    
     # Source types to process
     source_types = [
         'localgrocery_based',
@@ -59,8 +45,9 @@ def export_to_excel(
             items = receipt_data.get('items', [])
             receipt_needs_review = receipt_data.get('needs_review', False)
             receipt_review_reasons = receipt_data.get('review_reasons', [])
+            keys = item_keys(receipt_id, items)
             
-            for item in items:
+            for item_index, item in enumerate(items):
                 item_needs_review = item.get('needs_review', False) or item.get('needs_category_review', False)
                 
                 # Include items that need review OR items from receipts that need review
@@ -76,7 +63,8 @@ def export_to_excel(
                         'receipt_review_reasons': '; '.join(receipt_review_reasons),
                         
                         # Item fields
-                        'item_index': items.index(item),
+                        'item_index': item_index,
+                        'item_key': keys[item_index],  # Stable ID used to merge the reviewed file back
                         'upc': item.get('upc', ''),
                         'item_number': item.get('item_number', ''),
                         'product_name': item.get('product_name', ''),
@@ -117,156 +105,57 @@ def export_to_excel(
                         'source_group': receipt_data.get('source_group', source_type),
                         'parsed_by': receipt_data.get('parsed_by', ''),
                     }
-                    all_items.append(row)
-    
-    if not all_items:
-        logger.info("No items found that need review")
-        return output_file
-    
-    # Create DataFrame
-    df = pd.DataFrame(all_items)
-    
-    # Sort by: receipt_needs_review (True first), then item_needs_review (True first), then receipt_id
-    df = df.sort_values(
-        by=['receipt_needs_review', 'item_needs_review', 'receipt_id'],
-        ascending=[False, False, True]
-    )
-    
-    # Reset index
-    df = df.reset_index(drop=True)
-    
-    # Write to Excel with formatting
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Manual Review', index=False)
-        
-        # Get worksheet for formatting
-        worksheet = writer.sheets['Manual Review']
-        
-        # Auto-adjust column widths
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).map(len).max(),
-                len(str(col))
-            )
-            # Cap at 50 characters for readability
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[chr(65 + idx)].width = adjusted_width
-    
-    logger.info(f"Exported {len(all_items)} items to {output_file}")
-    return output_file
+                    yield row
 
 
-def load_reviewed_excel(excel_path: Path) -> Dict[str, List[Dict[str, Any]]]:
+def export_to_excel(
+    input_dir: Path,
+    output_dir: Path,
+    filename: str = "manual_review_export.xlsx"
+) -> Path:
     """
-    Load reviewed Excel file and return updated items grouped by receipt.
+    Export Step 1 extracted data to Excel for manual review.
+    
+    Rows are kept as plain tuples (no DataFrame) and written with a streaming
+    (write-only) workbook.
     
     Args:
-        excel_path: Path to reviewed Excel file
+        input_dir: Step 1 output directory (contains extracted_data.json files)
+        output_dir: Output directory for Excel file
+        filename: Output Excel filename
         
     Returns:
-        Dictionary mapping receipt_id to list of reviewed items
+        Path to generated Excel file
     """
-    if not excel_path.exists():
-        logger.warning(f"Reviewed Excel file not found: {excel_path}")
-        return {}
-    
-    df = pd.read_excel(excel_path, sheet_name='Manual Review')
+    from step1_extract.utils.excel_writer import StreamingWorkbook
     
-    # Group by receipt_id
-    reviewed_data = {}
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / filename
     
-    for _, row in df.iterrows():
-        receipt_id = str(row.get('receipt_id', ''))
-        if not receipt_id:
-            continue
-        
-        if receipt_id not in reviewed_data:
-            reviewed_data[receipt_id] = []
-        
-        # Build reviewed item (only include fields that were edited)
-        reviewed_item = {
-            'item_index': int(row.get('item_index', -1)),
-        }
-        
-        # Use reviewed values if provided, otherwise keep original
-        for field in ['product_name', 'quantity', 'unit_price', 'total_price', 
-                     'l1_category', 'l2_category', 'purchase_uom']:
-            reviewed_field = f'reviewed_{field}'
-            if pd.notna(row.get(reviewed_field)) and str(row[reviewed_field]).strip():
-                # Convert to appropriate type
-                value = row[reviewed_field]
-                if field in ['quantity', 'unit_price', 'total_price']:
-                    try:
-                        value = float(value)
-                    except (ValueError, TypeError):
-                        continue
-                reviewed_item[field] = value
-        
-        # Add review notes and status
-        if pd.notna(row.get('review_notes')):
-            reviewed_item['review_notes'] = str(row['review_notes'])
-        if pd.notna(row.get('review_status')):
-            reviewed_item['review_status'] = str(row['review_status'])
-        
-        reviewed_data[receipt_id].append(reviewed_item)
+    columns = None
+    all_items = []
+    for row in _iter_review_rows(input_dir):
+        if columns is None:
+            columns = list(row)
+        all_items.append(tuple(row.values()))
     
-    logger.info(f"Loaded reviewed data for {len(reviewed_data)} receipts from {excel_path}")
-    return reviewed_data
-
-
-def apply_reviewed_data(
-    extracted_data: Dict[str, Dict[str, Any]],
-    reviewed_data: Dict[str, List[Dict[str, Any]]]
-) -> Dict[str, Dict[str, Any]]:
-    """
-    Apply reviewed data from Excel back to extracted data.
+    if not all_items:
+        logger.info("No items found that need review")
+        return output_file
     
-    Args:
-        extracted_data: Original Step 1 extracted data
-        reviewed_data: Reviewed items from Excel
-        
-    Returns:
-        Updated extracted data with reviewed values applied
-    """
-    updated_data = extracted_data.copy()
+    # Sort by: receipt_needs_review (True first), then item_needs_review (True first), then receipt_id
+    receipt_review_idx = columns.index('receipt_needs_review')
+    item_review_idx = columns.index('item_needs_review')
+    receipt_id_idx = columns.index('receipt_id')
+    all_items.sort(key=lambda row: (not row[receipt_review_idx], not row[item_review_idx], str(row[receipt_id_idx])))
     
-    for receipt_id, reviewed_items in reviewed_data.items():
-        if receipt_id not in updated_data:
-            logger.warning(f"Receipt {receipt_id} not found in extracted data")
-            continue
-        
-        receipt = updated_data[receipt_id]
-        items = receipt.get('items', [])
-        
-        # Create lookup by item_index
-        reviewed_lookup = {item['item_index']: item for item in reviewed_items}
-        
-        # Apply reviewed values to items
-        for idx, item in enumerate(items):
-            if idx in reviewed_lookup:
-                reviewed = reviewed_lookup[idx]
-                
-                # Update fields that were reviewed
-                for field in ['product_name', 'quantity', 'unit_price', 'total_price',
-                            'l1_category', 'l2_category', 'purchase_uom']:
-                    if field in reviewed:
-                        item[field] = reviewed[field]
-                        item[f'_reviewed_{field}'] = True  # Mark as reviewed
-                
-                # Add review metadata
-                if 'review_notes' in reviewed:
-                    item['review_notes'] = reviewed['review_notes']
-                if 'review_status' in reviewed:
-                    item['review_status'] = reviewed['review_status']
-                
-                # Mark item as reviewed
-                item['_manually_reviewed'] = True
-        
-        # Update receipt metadata
-        receipt['_manually_reviewed'] = True
-        receipt['_reviewed_at'] = datetime.now().isoformat()
+    # Write to Excel (streaming; column widths sized from the first rows)
+    workbook = StreamingWorkbook(output_file)
+    workbook.write_sheet('Manual Review', columns, all_items)
+    workbook.save()
     
-    return updated_data
+    logger.info(f"Exported {len(all_items)} items to {output_file}")
+    return output_file
 
 
 def generate_reports_from_artifacts(
@@ -384,7 +273,8 @@ def main():
                     all_extracted.update(extracted)
         
         # Apply reviewed data
-        updated_data = apply_reviewed_data(all_extracted, reviewed_data)
+        updated_data = apply_reviewed_data(all_extracted, reviewed_data,
+                                           change_log_path=args.output_dir / 'review_changes.csv')
         
         # Save updated data back
         output_file = args.output_dir / 'reviewed_extracted_data.json'
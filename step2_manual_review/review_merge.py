@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Step 2: Reviewed Excel Import
+Merges a reviewed manual-review workbook back into Step 1 extracted data.
+
+- Rows are joined to extracted items by item_key (a stable hash of the item written
+  by the export), so sorted, filtered or reordered review sheets still line up;
+  workbooks without item_key fall back to (receipt_id, item_index)
+- The join and the "did anything change" check are DataFrame operations: reviewed
+  values are overlaid on the current ones and rows whose value hash is unchanged
+  are skipped
+- Only changed items (and their receipts) are copied and updated; the input data is
+  left untouched
+- Every applied change is recorded in a compact change log (optionally saved as CSV)
+"""
+
+import csv
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REVIEW_FIELDS = ['product_name', 'quantity', 'unit_price', 'total_price',
+                 'l1_category', 'l2_category', 'purchase_uom']
+NUMERIC_FIELDS = {'quantity', 'unit_price', 'total_price'}
+META_FIELDS = ['review_notes', 'review_status']
+VALUE_FIELDS = REVIEW_FIELDS + META_FIELDS
+KEY_COLUMNS = ['receipt_id', 'item_index', 'item_key']
+CHANGE_LOG_COLUMNS = ['receipt_id', 'item_index', 'item_key', 'field', 'old_value', 'new_value']
+
+
+def item_keys(receipt_id: str, items: List[Dict[str, Any]]) -> List[str]:
+    """
+    Stable keys for a receipt's items (same input -> same keys, independent of row order)
+
+    Hash of receipt id + product name, item number, UPC and total; repeated identical
+    items get a -1, -2, ... suffix in order of appearance.
+    """
+    seen = Counter()
+    keys = []
+    for item in items:
+        basis = '|'.join(str(item.get(field) or '') for field in ('product_name', 'item_number', 'upc', 'total_price'))
+        digest = hashlib.sha1(f"{receipt_id}|{basis}".encode('utf-8')).hexdigest()[:16]
+        occurrence = seen[digest]
+        seen[digest] += 1
+        keys.append(digest if occurrence == 0 else f"{digest}-{occurrence}")
+    return keys
+
+
+def _empty_reviewed_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=KEY_COLUMNS + VALUE_FIELDS)
+
+
+def _normalize_reviewed(df: pd.DataFrame) -> pd.DataFrame:
+    """Blank cells -> NaN, numeric fields -> float (unparseable -> NaN), drop rows without edits"""
+    for column in KEY_COLUMNS + VALUE_FIELDS:
+        if column not in df.columns:
+            df[column] = pd.NA
+    for field in VALUE_FIELDS:
+        values = df[field].astype('string').str.strip()
+        values = values.mask(values == '')
+        if field in NUMERIC_FIELDS:
+            df[field] = pd.to_numeric(values, errors='coerce')
+        else:
+            df[field] = values.astype(object).where(values.notna(), None)
+    df['receipt_id'] = df['receipt_id'].astype('string').str.strip()
+    df['item_index'] = pd.to_numeric(df['item_index'], errors='coerce').astype('Int64')
+    df['item_key'] = df['item_key'].astype('string').str.strip().replace('', pd.NA)
+
+    df = df[df['receipt_id'].notna() & (df['receipt_id'] != '')]
+    df = df.dropna(subset=VALUE_FIELDS, how='all')
+    return df[KEY_COLUMNS + VALUE_FIELDS].reset_index(drop=True)
+
+
+def load_reviewed_excel(excel_path: Path) -> pd.DataFrame:
+    """
+    Load reviewed Excel file and return the rows that carry reviewer edits.
+
+    Args:
+        excel_path: Path to reviewed Excel file
+
+    Returns:
+        DataFrame with receipt_id, item_index, item_key and one column per reviewed
+        field (reviewed_ prefix removed; NaN/None where the reviewer left it blank)
+    """
+    if not excel_path.exists():
+        logger.warning(f"Reviewed Excel file not found: {excel_path}")
+        return _empty_reviewed_frame()
+
+    wanted = set(KEY_COLUMNS + META_FIELDS + [f'reviewed_{field}' for field in REVIEW_FIELDS])
+    df = pd.read_excel(excel_path, sheet_name='Manual Review', usecols=lambda column: column in wanted, dtype=str)
+    df = df.rename(columns={f'reviewed_{field}': field for field in REVIEW_FIELDS})
+    reviewed = _normalize_reviewed(df)
+
+    logger.info(f"Loaded {len(reviewed)} reviewed rows for {reviewed['receipt_id'].nunique()} receipts "
+                f"from {excel_path}")
+    return reviewed
+
+
+def _reviewed_frame_from_dict(reviewed_data: Dict[str, List[Dict[str, Any]]]) -> pd.DataFrame:
+    """Accept the older {receipt_id: [reviewed item, ...]} structure"""
+    rows = [{**item, 'receipt_id': receipt_id}
+            for receipt_id, items in reviewed_data.items() for item in items]
+    if not rows:
+        return _empty_reviewed_frame()
+    return _normalize_reviewed(pd.DataFrame(rows))
+
+
+def _current_items(extracted_data: Dict[str, Dict[str, Any]], receipt_ids) -> pd.DataFrame:
+    """Current values of the reviewable fields for the given receipts"""
+    records = []
+    for receipt_id in receipt_ids:
+        items = extracted_data[receipt_id].get('items', [])
+        for item_index, (item, key) in enumerate(zip(items, item_keys(receipt_id, items))):
+            records.append((receipt_id, item_index, key, *(item.get(field) for field in VALUE_FIELDS)))
+    current = pd.DataFrame.from_records(records, columns=KEY_COLUMNS + VALUE_FIELDS)
+    current['item_index'] = current['item_index'].astype('Int64')
+    current['receipt_id'] = current['receipt_id'].astype('string')
+    return current
+
+
+def _row_hashes(frame: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(frame.astype(str), index=False)
+
+
+def _python_value(value: Any) -> Any:
+    return value.item() if hasattr(value, 'item') else value
+
+
+def write_change_log(change_log: List[Dict[str, Any]], path: Path) -> Path:
+    """Save the change log as CSV"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CHANGE_LOG_COLUMNS)
+        writer.writeheader()
+        writer.writerows(change_log)
+    return path
+
+
+def apply_reviewed_data(
+    extracted_data: Dict[str, Dict[str, Any]],
+    reviewed: Union[pd.DataFrame, Dict[str, List[Dict[str, Any]]]],
+    change_log: Optional[List[Dict[str, Any]]] = None,
+    change_log_path: Optional[Path] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply reviewed data from Excel back to extracted data.
+
+    Args:
+        extracted_data: Original Step 1 extracted data (not modified)
+        reviewed: Reviewed rows from load_reviewed_excel (or the older dict structure)
+        change_log: Optional list that receives one entry per changed field
+        change_log_path: Optional CSV file for the change log
+
+    Returns:
+        Updated extracted data with reviewed values applied (unchanged receipts are
+        shared with the input, changed receipts and items are copies)
+    """
+    if isinstance(reviewed, dict):
+        reviewed = _reviewed_frame_from_dict(reviewed)
+    changes = change_log if change_log is not None else []
+    updated_data = dict(extracted_data)
+
+    reviewed_receipts = set(reviewed['receipt_id'].dropna())
+    missing = reviewed_receipts - extracted_data.keys()
+    if missing:
+        logger.warning(f"{len(missing)} reviewed receipts not found in extracted data: "
+                       f"{', '.join(sorted(missing)[:5])}{'...' if len(missing) > 5 else ''}")
+    receipt_ids = sorted(reviewed_receipts & extracted_data.keys())
+    if not receipt_ids:
+        logger.info("No reviewed changes to apply")
+        return updated_data
+
+    current = _current_items(extracted_data, receipt_ids)
+
+    # Join by item_key where the workbook has one, else by position
+    has_key = reviewed['item_key'].notna()
+    by_key = reviewed[has_key].drop(columns=['receipt_id', 'item_index']).merge(
+        current, on='item_key', how='inner', suffixes=('_new', ''))
+    by_position = reviewed[~has_key].drop(columns=['item_key']).merge(
+        current, on=['receipt_id', 'item_index'], how='inner', suffixes=('_new', ''))
+    merged = pd.concat([by_key, by_position], ignore_index=True)
+    merged = (merged.drop_duplicates(subset=['receipt_id', 'item_index'], keep='last')
+              .sort_values(['receipt_id', 'item_index']).reset_index(drop=True))
+    unmatched = len(reviewed) - len(by_key) - len(by_position)
+    if unmatched:
+        logger.warning(f"{unmatched} reviewed rows did not match an extracted item")
+    if merged.empty:
+        logger.info("No reviewed changes to apply")
+        return updated_data
+
+    # Overlay reviewed values on current ones; rows whose hash is unchanged are skipped
+    old = merged[VALUE_FIELDS].copy()
+    for field in NUMERIC_FIELDS:
+        old[field] = pd.to_numeric(old[field], errors='coerce')
+    new = old.copy()
+    for field in VALUE_FIELDS:
+        reviewed_values = merged[f'{field}_new']
+        new[field] = reviewed_values.where(reviewed_values.notna(), old[field])
+    changed = _row_hashes(new) != _row_hashes(old)
+
+    reviewed_at = datetime.now().isoformat()
+    copied_receipts = {}
+    for position in changed[changed].index:
+        receipt_id = merged.at[position, 'receipt_id']
+        item_index = int(merged.at[position, 'item_index'])
+
+        receipt = copied_receipts.get(receipt_id)
+        if receipt is None:
+            receipt = dict(extracted_data[receipt_id])
+            receipt['items'] = list(receipt.get('items', []))
+            receipt['_manually_reviewed'] = True
+            receipt['_reviewed_at'] = reviewed_at
+            updated_data[receipt_id] = copied_receipts[receipt_id] = receipt
+        item = receipt['items'][item_index] = dict(receipt['items'][item_index])
+
+        for field in VALUE_FIELDS:
+            old_value, new_value = old.at[position, field], new.at[position, field]
+            if str(old_value) == str(new_value):
+                continue
+            new_value = _python_value(new_value)
+            changes.append({
+                'receipt_id': receipt_id,
+                'item_index': item_index,
+                'item_key': merged.at[position, 'item_key'],
+                'field': field,
+                'old_value': item.get(field),
+                'new_value': new_value,
+            })
+            item[field] = new_value
+            if field in REVIEW_FIELDS:
+                item[f'_reviewed_{field}'] = True  # Mark as reviewed
+        item['_manually_reviewed'] = True
+
+    logger.info(f"Applied {len(changes)} reviewed changes to {int(changed.sum())} items in "
+                f"{len(copied_receipts)} receipts ({len(merged) - int(changed.sum())} reviewed rows unchanged)")
+    if change_log_path:
+        write_change_log(changes, change_log_path)
+        logger.info(f"Saved review change log to {change_log_path}")
+    return updated_data
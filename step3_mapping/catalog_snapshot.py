@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Catalog Snapshot - Compiled, memory-mapped form of products_uom_analysis.json
+Used by ProductMatcher (step 3 and step 4) instead of parsing the JSON dump and
+rebuilding its indexes on every run.
+
+The snapshot is a read-only SQLite file next to the JSON
+(products_uom_analysis.catalog.sqlite) holding:
+- The products / product_templates / uoms tables of the dump (one JSON row per entry)
+- ProductMatcher's prebuilt indexes (name index, id -> product, id -> template)
+
+Opening it reads no rows; lookups are indexed primary-key queries. The file is
+memory-mapped (PRAGMA mmap_size), so worker processes share its pages through the
+OS page cache instead of each holding a parsed copy of the catalog.
+
+A snapshot is only used while the JSON's size and mtime match the ones it was
+compiled from; ProductMatcher recompiles it after loading a changed dump.
+
+Receipt UoM matches (ProductMatcher.match_uom results) are kept in a small JSON
+sidecar next to it (products_uom_analysis.uom_matches.json), tied to the same
+dump signature, so later runs start with the UoM strings already resolved.
+
+Usage:
+    python -m step3_mapping.catalog_snapshot data/products_uom_analysis.json
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = '1'
+SNAPSHOT_SUFFIX = '.catalog.sqlite'
+UOM_MATCHES_VERSION = '1'
+UOM_MATCHES_SUFFIX = '.uom_matches.json'
+MMAP_SIZE = 1 << 30
+
+_encode = json.JSONEncoder(separators=(',', ':'), default=str).encode
+
+# Dump tables stored row-per-entry; other top-level keys are kept in meta
+DUMP_TABLES = ('products', 'product_templates', 'uoms')
+# Index tables keyed by integer id
+INT_KEY_TABLES = ('products_by_id', 'product_keys', 'templates_by_id')
+
+
+def snapshot_path_for(db_analysis_path: Path) -> Path:
+    """products_uom_analysis.json -> products_uom_analysis.catalog.sqlite"""
+    db_analysis_path = Path(db_analysis_path)
+    if db_analysis_path.name.endswith(SNAPSHOT_SUFFIX):
+        return db_analysis_path
+    return db_analysis_path.with_name(db_analysis_path.stem + SNAPSHOT_SUFFIX)
+
+
+def _source_signature(source_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        stat = source_path.stat()
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class SnapshotMapping(Mapping):
+    """Read-only dict view of one snapshot table (values decoded on access)"""
+
+    def __init__(self, snapshot: 'CatalogSnapshot', table: str, int_keys: bool = False):
+        self._snapshot = snapshot
+        self._table = table
+        self._int_keys = int_keys
+
+    def _valid_key(self, key) -> bool:
+        # Same key types the JSON-built dicts have, so `1 in templates` stays False for '1' keys
+        if self._int_keys:
+            return isinstance(key, int) and not isinstance(key, bool)
+        return isinstance(key, str)
+
+    def __getitem__(self, key):
+        if not self._valid_key(key):
+            raise KeyError(key)
+        row = self._snapshot._query_one(f'SELECT value FROM {self._table} WHERE key = ?', (key,))
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __contains__(self, key) -> bool:
+        if not self._valid_key(key):
+            return False
+        return self._snapshot._query_one(f'SELECT 1 FROM {self._table} WHERE key = ?', (key,)) is not None
+
+    def __iter__(self) -> Iterator:
+        return iter([row[0] for row in self._snapshot._query_all(f'SELECT key FROM {self._table} ORDER BY rowid')])
+
+    def __len__(self) -> int:
+        return self._snapshot._query_one(f'SELECT COUNT(*) FROM {self._table}')[0]
+
+    def items(self):
+        rows = self._snapshot._query_all(f'SELECT key, value FROM {self._table} ORDER BY rowid')
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+
+class CatalogSnapshot:
+    """Open (read-only) catalog snapshot"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        self.meta = {key: json.loads(value) for key, value in self._conn.execute('SELECT key, value FROM meta')}
+
+    def _query_one(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _query_all(self, sql: str, params=()) -> List:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def mapping(self, table: str) -> SnapshotMapping:
+        return SnapshotMapping(self, table, int_keys=table in INT_KEY_TABLES)
+
+    def db_data(self) -> Dict[str, Any]:
+        """db_data as ProductMatcher uses it: products / templates as table views, uoms loaded"""
+        db_data = dict(self.meta.get('extra', {}))
+        db_data['products'] = self.mapping('products')
+        db_data['product_templates'] = self.mapping('product_templates')
+        db_data['uoms'] = dict(self.mapping('uoms').items())
+        return db_data
+
+    def exact_product_names(self) -> List[str]:
+        """Full product names of the name index, in index order"""
+        return [row[0] for row in self._query_all('SELECT key FROM products_index WHERE exact = 1 ORDER BY rowid')]
+
+    def is_fresh(self, source_path: Path) -> bool:
+        if self.meta.get('version') != SNAPSHOT_VERSION:
+            return False
+        signature = _source_signature(Path(source_path))
+        # Snapshot without its JSON: nothing to compare against, use it as is
+        return signature is None or signature == self.meta.get('source')
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_catalog_snapshot(db_analysis_path: Path) -> Optional[CatalogSnapshot]:
+    """Snapshot for a dump if one exists and matches the dump, else None"""
+    db_analysis_path = Path(db_analysis_path)
+    snapshot_path = snapshot_path_for(db_analysis_path)
+    if not snapshot_path.exists():
+        return None
+    try:
+        snapshot = CatalogSnapshot(snapshot_path)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not open catalog snapshot {snapshot_path}: {e}")
+        return None
+    if snapshot_path != db_analysis_path and not snapshot.is_fresh(db_analysis_path):
+        logger.info(f"Catalog snapshot {snapshot_path.name} is out of date with {db_analysis_path.name}")
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def write_catalog_snapshot(
+    source_path: Path,
+    db_data: Dict[str, Any],
+    products_index: Dict[str, Dict],
+    products_by_id: Dict[int, Dict],
+    product_keys: Dict[int, str],
+    templates_by_id: Dict[int, Dict],
+    snapshot_path: Optional[Path] = None,
+) -> Path:
+    """
+    Write a snapshot from a loaded dump and ProductMatcher's indexes
+
+    Written to a temporary file and renamed into place, so concurrent runs never
+    see a partial snapshot.
+    """
+    source_path = Path(source_path)
+    snapshot_path = Path(snapshot_path) if snapshot_path else snapshot_path_for(source_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_name = tempfile.mkstemp(prefix=snapshot_path.name, suffix='.tmp', dir=str(snapshot_path.parent))
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_name)
+        try:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            for table in DUMP_TABLES:
+                conn.execute(f'CREATE TABLE {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            conn.execute('CREATE TABLE products_index (key TEXT PRIMARY KEY, value TEXT NOT NULL, exact INTEGER NOT NULL)')
+            for table in INT_KEY_TABLES:
+                conn.execute(f'CREATE TABLE {table} (key INTEGER PRIMARY KEY, value TEXT NOT NULL)')
+
+            for table in DUMP_TABLES:
+                conn.executemany(f'INSERT INTO {table} (key, value) VALUES (?, ?)',
+                                 ((str(key), _encode(value)) for key, value in db_data.get(table, {}).items()))
+            conn.executemany('INSERT INTO products_index (key, value, exact) VALUES (?, ?, ?)',
+                             ((name, _encode(entry), 1 if entry.get('exact_match') else 0)
+                              for name, entry in products_index.items()))
+            for table, index in zip(INT_KEY_TABLES, (products_by_id, product_keys, templates_by_id)):
+                conn.executemany(f'INSERT INTO {table} (key, value) VALUES (?, ?)',
+                                 ((key, _encode(value)) for key, value in index.items()))
+
+            meta = {
+                'version': SNAPSHOT_VERSION,
+                'source': _source_signature(source_path),
+                'source_name': source_path.name,
+                'extra': {key: value for key, value in db_data.items() if key not in DUMP_TABLES},
+            }
+            conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)',
+                             ((key, _encode(value)) for key, value in meta.items()))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_name, snapshot_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+    logger.info(f"Wrote catalog snapshot {snapshot_path} ({len(db_data.get('products', {}))} products)")
+    return snapshot_path
+
+
+def uom_matches_path_for(db_analysis_path: Path) -> Path:
+    """products_uom_analysis.json (or its snapshot) -> products_uom_analysis.uom_matches.json"""
+    snapshot_path = snapshot_path_for(db_analysis_path)
+    return snapshot_path.with_name(snapshot_path.name[:-len(SNAPSHOT_SUFFIX)] + UOM_MATCHES_SUFFIX)
+
+
+def load_uom_matches(db_analysis_path: Path) -> Dict[str, Optional[Dict]]:
+    """Persisted receipt UoM -> UoM matches for a dump ({} if missing or out of date)"""
+    matches_path = uom_matches_path_for(db_analysis_path)
+    try:
+        with open(matches_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read UoM matches {matches_path}: {e}")
+        return {}
+    if (not isinstance(data, dict) or data.get('version') != UOM_MATCHES_VERSION
+            or data.get('source') != _source_signature(Path(db_analysis_path))):
+        return {}
+    return data.get('matches', {})
+
+
+def save_uom_matches(db_analysis_path: Path, matches: Dict[str, Optional[Dict]]) -> Path:
+    """Persist receipt UoM -> UoM matches for a dump (written to a temporary file and renamed)"""
+    db_analysis_path = Path(db_analysis_path)
+    matches_path = uom_matches_path_for(db_analysis_path)
+    data = {
+        'version': UOM_MATCHES_VERSION,
+        'source': _source_signature(db_analysis_path),
+        'matches': matches,
+    }
+    fd, tmp_name = tempfile.mkstemp(prefix=matches_path.name, suffix='.tmp', dir=str(matches_path.parent))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_name, matches_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    logger.info(f"Saved {len(matches)} UoM matches to {matches_path}")
+    return matches_path
+
+
+def compile_catalog(db_analysis_path: Path, snapshot_path: Optional[Path] = None) -> Path:
+    """Compile a snapshot from a products_uom_analysis.json dump"""
+    from .product_matcher import ProductMatcher
+
+    matcher = ProductMatcher(str(db_analysis_path), use_snapshot=False)
+    return matcher.write_snapshot(snapshot_path)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compile products_uom_analysis.json into a catalog snapshot')
+    parser.add_argument('db_analysis', type=Path, help='Path to products_uom_analysis.json')
+    parser.add_argument('-o', '--output', type=Path, default=None,
+                        help='Snapshot path (default: <dump>.catalog.sqlite next to the dump)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    compile_catalog(args.db_analysis, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+DB Prefetch - Run the Step 3 stage queries concurrently on pooled connections
+Instead of each stage querying the database one after another on a single connection.
+
+Queries are dispatched in two phases, each on a thread pool with one pooled
+connection per query:
+- Before the stages run: queries that don't depend on the items (db_match products,
+  UoM categories, untargeted usage queries)
+- Once product IDs are matched: the usage_probe / bom_protection queries that take
+  %(product_ids)s (all stages of a fused segment at once)
+
+Rows land in context['prefetched'] keyed by (stage key, query name); a stage's
+prepare step takes its rows from there (stage_query_rows) and only queries its own
+connection for anything that was not prefetched. Per-query latency is logged and
+kept in context['prefetch_timings'].
+
+A sqlite3 connection (pool) can stand in for Postgres (tests / local trial runs).
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .query_database import UOM_CATEGORIES_QUERY
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_IDS_PLACEHOLDER = '%(product_ids)s'
+
+# (stage key, query name)
+PrefetchKey = Tuple[str, str]
+# (sql, params, windowed)
+QueryRequest = Tuple[str, Dict[str, Any], bool]
+
+
+def stage_queries(stage_key: str, stage_config: Dict[str, Any]) -> Dict[str, Tuple[str, bool]]:
+    """Queries a stage's prepare step runs: name -> (sql, windowed)"""
+    if stage_key == 'db_match':
+        queries = stage_config.get('queries', {})
+        return {'products': (queries['products'], False)} if 'products' in queries else {}
+    if stage_key == 'uom_mapping':
+        return {'uom_categories': (UOM_CATEGORIES_QUERY, False)}
+    if stage_key == 'usage_probe':
+        queries = stage_config.get('queries', {})
+        return {name: (queries[name], name != 'manufacturing_usage')
+                for name in ('sales_usage', 'inventory_usage', 'manufacturing_usage') if name in queries}
+    if stage_key == 'bom_protection':
+        queries = stage_config.get('db_queries', {})
+        return {'bom_lines': (queries['bom_lines'], False)} if 'bom_lines' in queries else {}
+    return {}
+
+
+def query_params(stage_config: Dict[str, Any], product_ids: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """Parameters for %(product_ids)s / %(days_back)s placeholders"""
+    return {
+        'product_ids': sorted(product_ids or ()),
+        'days_back': int(stage_config.get('time_window', {}).get('days_back', 180)),
+    }
+
+
+def _dict_rows(cur, rows: List[Any]) -> List[Dict[str, Any]]:
+    if not rows or isinstance(rows[0], Mapping):
+        return list(rows)
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def run_stage_query(cur, query: str, params: Dict[str, Any], windowed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Run a stage query and return its rows as dicts
+
+    Queries with %(product_ids)s / %(days_back)s placeholders are run with parameters
+    (and skipped when there are no product IDs); queries without placeholders are run
+    as-is, with the window of windowed ones given as a literal '180 day'.
+    """
+    if '%(' not in query:
+        cur.execute(query.replace('180', str(params.get('days_back', 180))) if windowed else query)
+    elif PRODUCT_IDS_PLACEHOLDER in query and not params.get('product_ids'):
+        return []
+    else:
+        cur.execute(query, params)
+    return _dict_rows(cur, cur.fetchall())
+
+
+def stage_query_rows(context: Dict[str, Any], stage_key: str, name: str, query: str,
+                     params: Dict[str, Any], windowed: bool = False) -> List[Dict[str, Any]]:
+    """Rows of a stage query: prefetched ones (used once) or queried on context['db_conn']"""
+    prefetched = context.get('prefetched')
+    if prefetched and (stage_key, name) in prefetched:
+        return prefetched.pop((stage_key, name))
+    cur = context['db_conn'].cursor()
+    try:
+        return run_stage_query(cur, query, params, windowed)
+    finally:
+        cur.close()
+
+
+class QueryPrefetcher:
+    """Run independent queries concurrently, each on its own pooled connection"""
+
+    def __init__(self, pool=None, connect: Optional[Callable[[], Any]] = None, workers: int = 4):
+        """
+        Initialize prefetcher
+
+        Args:
+            pool: Connection pool with getconn()/putconn() (e.g. psycopg2 ThreadedConnectionPool)
+            connect: Alternative to pool - callable returning a new connection (closed after use)
+            workers: Queries run concurrently (at most the pool's maxconn)
+        """
+        if pool is None and connect is None:
+            raise ValueError("QueryPrefetcher needs a connection pool or a connect callable")
+        self.pool = pool
+        self.connect = connect
+        self.workers = max(1, workers)
+        self.timings: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def run(self, requests: Dict[PrefetchKey, QueryRequest]) -> Dict[PrefetchKey, List[Dict[str, Any]]]:
+        """
+        Run queries concurrently
+
+        Returns:
+            Rows per request key (failed queries are logged and left out)
+        """
+        if not requests:
+            return {}
+        start = time.perf_counter()
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(requests))) as executor:
+            futures = {key: executor.submit(self._run_one, key, request) for key, request in requests.items()}
+            for key, future in futures.items():
+                rows = future.result()
+                if rows is not None:
+                    results[key] = rows
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Prefetched {len(results)}/{len(requests)} queries in {elapsed:.2f}s:")
+        for timing in self.timings[-len(requests):]:
+            status = f"{timing['rows']} rows" if timing['error'] is None else f"failed: {timing['error']}"
+            logger.info(f"  {timing['query']:<40} {timing['seconds']:7.3f}s  {status}")
+        return results
+
+    def _run_one(self, key: PrefetchKey, request: QueryRequest) -> Optional[List[Dict[str, Any]]]:
+        query, params, windowed = request
+        start = time.perf_counter()
+        rows, error = None, None
+        conn = self._getconn()
+        try:
+            cur = conn.cursor()
+            try:
+                rows = run_stage_query(cur, query, params, windowed)
+            finally:
+                cur.close()
+            conn.rollback()  # Read-only: end the transaction before the connection goes back
+        except Exception as e:
+            error = str(e)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            self._putconn(conn)
+
+        with self._lock:
+            self.timings.append({'query': '.'.join(key), 'seconds': round(time.perf_counter() - start, 4),
+                                 'rows': len(rows) if rows is not None else 0, 'error': error})
+        return rows
+
+    def _getconn(self):
+        return self.pool.getconn() if self.pool is not None else self.connect()
+
+    def _putconn(self, conn) -> None:
+        if self.pool is not None:
+            self.pool.putconn(conn)
+        else:
+            conn.close()
+
+
+def prefetch_stage_queries(stages: Iterable[Tuple[str, Dict[str, Any]]], context: Dict[str, Any],
+                           product_ids: Optional[Set[int]] = None) -> int:
+    """
+    Prefetch the queries of (stage key, stage config) pairs into context['prefetched']
+
+    Without product_ids, the queries that don't take %(product_ids)s; with product_ids,
+    the ones that do. Does nothing without context['db_prefetcher'].
+
+    Returns:
+        Number of queries prefetched
+    """
+    prefetcher: Optional[QueryPrefetcher] = context.get('db_prefetcher')
+    if prefetcher is None:
+        return 0
+    prefetched = context.setdefault('prefetched', {})
+    requests = {}
+    for stage_key, stage_config in stages:
+        for name, (query, windowed) in stage_queries(stage_key, stage_config).items():
+            takes_ids = PRODUCT_IDS_PLACEHOLDER in query
+            if takes_ids != (product_ids is not None) or (stage_key, name) in prefetched:
+                continue
+            if takes_ids and not product_ids:
+                continue
+            requests[(stage_key, name)] = (query, query_params(stage_config, product_ids), windowed)
+
+    results = prefetcher.run(requests)
+    prefetched.update(results)
+    context['prefetch_timings'] = prefetcher.timings
+    return len(results)
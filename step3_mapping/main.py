@@ -9,12 +9,19 @@ import logging
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 
+from .db_prefetch import QueryPrefetcher, prefetch_stage_queries
+from .query_database import create_connection_pool
 from .rule_loader import RuleLoader
-from .rule_executor import execute_stage
+from .rule_executor import execute_stage, get_stage_key
 from .product_matcher import ProductMatcher
+from .stage_engine import FusedStageEngine, SHARD_KEYS
 
 logger = logging.getLogger(__name__)
 
+# 'fused' runs the per-item stages in one pass (stage files only at segment ends);
+# 'staged' runs and saves every stage separately
+ENGINES = ('fused', 'staged')
+
 
 def load_step1_output(input_dir: Path, use_reviewed: bool = True) -> Dict[str, Any]:
     """
@@ -96,11 +103,69 @@ def combine_receipts(step1_data: Dict[str, Any]) -> Dict[str, Any]:
     return combined
 
 
+def _stage_output_path(rule_loader: RuleLoader, rule_file: str, output_dir: Path) -> Path:
+    """Stage file from the rule's `output` setting, else _stage_<rule>.json"""
+    rule_data = rule_loader.get_rule(rule_file)
+    if rule_data:
+        top_level_key = get_stage_key(rule_data)
+        if top_level_key:
+            output_path = rule_data[top_level_key].get('output')
+            if output_path:
+                # Extract filename from path (e.g., 'output/step2_output/_stage_vendor.json' -> '_stage_vendor.json')
+                return output_dir / Path(output_path).name
+    
+    # Fallback naming if not found in config
+    stage_key = rule_file.replace('.yaml', '').replace('_', '')
+    return output_dir / f'_stage_{stage_key}.json'
+
+
+def _save_stage_output(items: List[Dict[str, Any]], rule_loader: RuleLoader, rule_file: str, output_dir: Path) -> None:
+    stage_file = _stage_output_path(rule_loader, rule_file, output_dir)
+    with open(stage_file, 'w', encoding='utf-8') as f:
+        json.dump(items, f, indent=2, ensure_ascii=False, default=str)
+    logger.info(f"✓ Saved stage output to: {stage_file}")
+
+
+def _open_db_pool(rule_loader: RuleLoader, processing_order: List[str], context: Dict[str, Any],
+                  db_workers: int) -> Optional[object]:
+    """
+    Connection pool for the stages' DB queries; prefetches the queries that don't depend on items
+    
+    Returns:
+        The pool (context gets db_conn and db_prefetcher), or None if the stages should
+        connect on their own (db_workers <= 1, no stage uses the database, or no pool)
+    """
+    stages = []
+    for rule_file in processing_order:
+        rule_data = rule_loader.get_rule(rule_file) or {}
+        stage_key = get_stage_key(rule_data)
+        if stage_key:
+            stages.append((stage_key, rule_data[stage_key]))
+    if db_workers <= 1 or not any(isinstance(config, dict) and config.get('connection') == 'use_config'
+                                  for _, config in stages):
+        return None
+    
+    logger.info(f"Opening database connection pool ({db_workers} concurrent queries)...")
+    pool = create_connection_pool(1, db_workers + 1)
+    if pool is None:
+        logger.warning("No connection pool, stages query the database one after another")
+        return None
+    context['db_conn'] = pool.getconn()
+    context['db_prefetcher'] = QueryPrefetcher(pool=pool, workers=db_workers)
+    prefetch_stage_queries(stages, context)
+    return pool
+
+
 def process_rules(
     step1_input_dir: Path,
     output_dir: Path,
     rules_dir: Path,
-    use_reviewed: bool = True
+    use_reviewed: bool = True,
+    engine: str = 'fused',
+    audit: bool = False,
+    workers: int = 1,
+    shard_by: str = 'receipt',
+    db_workers: int = 4
 ) -> Dict[str, Any]:
     """
     Main processing function - executes Step 3 rules
@@ -110,6 +175,12 @@ def process_rules(
         output_dir: Step 3 output directory
         rules_dir: Directory containing rule YAML files
         use_reviewed: If True, prefer reviewed data from Step 2
+        engine: 'fused' (single pass, in place) or 'staged' (one pass and stage file per stage)
+        audit: With the fused engine, save the fields each stage changed to _stage_audit.json
+        workers: With the fused engine, worker processes for the per-item stages
+        shard_by: Shard items across workers by 'receipt' or 'vendor'
+        db_workers: Stage DB queries run concurrently on a pool of this many connections
+            (1 = one connection, queries run by each stage in turn)
         
     Returns:
         Dictionary with mapped items and processing results
@@ -189,47 +260,36 @@ def process_rules(
     processing_order = rule_loader.get_processing_order()
     logger.info(f"Processing {len(processing_order)} rule stages: {', '.join(processing_order)}")
     
-    # Execute each stage in order
-    current_items = all_items
-    
-    for i, rule_file in enumerate(processing_order):
-        logger.info("")
-        logger.info(f"[{i+1}/{len(processing_order)}] Processing stage: {rule_file}")
-        logger.info("=" * 80)
-        
-        # Execute stage
-        current_items = execute_stage(current_items, rule_file, rule_loader, context)
-        
-        # Save intermediate stage file
-        # Try to get output path from rule data
-        rule_data = rule_loader.get_rule(rule_file)
-        stage_file = None
+    db_pool = _open_db_pool(rule_loader, processing_order, context, db_workers)
+    
+    if engine != 'fused' and workers > 1:
+        logger.warning("--workers only applies to the fused engine, running stages in this process")
+    
+    if engine == 'fused':
+        stage_engine = FusedStageEngine(rule_loader, context, processing_order, audit=audit,
+                                        workers=workers, shard_by=shard_by)
+        current_items = stage_engine.run(
+            all_items,
+            on_segment=lambda rule_file, items: _save_stage_output(items, rule_loader, rule_file, output_dir))
+        if audit:
+            audit_file = output_dir / '_stage_audit.json'
+            with open(audit_file, 'w', encoding='utf-8') as f:
+                json.dump(stage_engine.audit_trail, f, ensure_ascii=False, default=str)
+            logger.info(f"✓ Saved {len(stage_engine.audit_trail)} audit entries to: {audit_file}")
+    else:
+        # Execute each stage in order
+        current_items = all_items
         
-        if rule_data:
-            # Find top-level key to get stage config
-            top_level_key = None
-            for key in rule_data.keys():
-                if key != 'meta' and not key.startswith('_'):
-                    top_level_key = key
-                    break
+        for i, rule_file in enumerate(processing_order):
+            logger.info("")
+            logger.info(f"[{i+1}/{len(processing_order)}] Processing stage: {rule_file}")
+            logger.info("=" * 80)
             
-            if top_level_key:
-                stage_config = rule_data[top_level_key]
-                output_path = stage_config.get('output')
-                if output_path:
-                    # Extract filename from path (e.g., 'output/step2_output/_stage_vendor.json' -> '_stage_vendor.json')
-                    stage_filename = Path(output_path).name
-                    stage_file = output_dir / stage_filename
-        
-        # Fallback naming if not found in config
-        if not stage_file:
-            stage_key = rule_file.replace('.yaml', '').replace('_', '')
-            stage_file = output_dir / f'_stage_{stage_key}.json'
-        
-        # Save stage output
-        with open(stage_file, 'w', encoding='utf-8') as f:
-            json.dump(current_items, f, indent=2, ensure_ascii=False, default=str)
-        logger.info(f"✓ Saved stage output to: {stage_file}")
+            # Execute stage
+            current_items = execute_stage(current_items, rule_file, rule_loader, context)
+            
+            # Save intermediate stage file
+            _save_stage_output(current_items, rule_loader, rule_file, output_dir)
     
     # Get final output path from meta or outputs stage
     meta = rule_loader.get_meta()
@@ -298,8 +358,22 @@ def process_rules(
         json.dump(current_items, f, indent=2, ensure_ascii=False, default=str)
     logger.info(f"✓ Saved mapped items: {len(current_items)} items")
     
+    # Keep resolved receipt UoMs for the next run (next to the catalog snapshot)
+    if product_matcher is not None:
+        try:
+            product_matcher.save_uom_matches()
+        except OSError as e:
+            logger.warning(f"Could not save UoM matches: {e}")
+    
     # Close database connection if opened
-    if 'db_conn' in context:
+    if db_pool is not None:
+        try:
+            db_pool.putconn(context.pop('db_conn'))
+            db_pool.closeall()
+            logger.info("✓ Database connection pool closed")
+        except Exception as e:
+            logger.warning(f"Error closing database connection pool: {e}")
+    elif 'db_conn' in context:
         try:
             context['db_conn'].close()
             logger.info("✓ Database connection closed")
@@ -316,7 +390,8 @@ def process_rules(
         'total_receipts': len(combined_receipts),
         'total_items': len(all_items),
         'matched_items': matched_count,
-        'needs_review': needs_review_count
+        'needs_review': needs_review_count,
+        'db_prefetch_timings': context.get('prefetch_timings', [])
     }
     
     logger.info("")
@@ -367,6 +442,36 @@ def main() -> None:
         action='store_true',
         help='Skip reviewed data from Step 2, use original Step 1 output only'
     )
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='fused',
+        help="Stage execution: 'fused' runs all per-item stages in one pass (default), "
+             "'staged' runs and saves each stage separately"
+    )
+    parser.add_argument(
+        '--audit',
+        action='store_true',
+        help='With --engine fused, save the fields each stage changed to _stage_audit.json'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='With --engine fused, worker processes for the per-item stages (default: 1)'
+    )
+    parser.add_argument(
+        '--shard-by',
+        choices=SHARD_KEYS,
+        default='receipt',
+        help='Keep items of the same receipt or vendor on one worker (default: receipt)'
+    )
+    parser.add_argument(
+        '--db-workers',
+        type=int,
+        default=4,
+        help='Concurrent stage DB queries on pooled connections (default: 4; 1 = one connection, no prefetch)'
+    )
     
     args = parser.parse_args()
     
@@ -387,7 +492,9 @@ def main() -> None:
         logger.error(f"Rules directory not found: {rules_dir}")
         return
     
-    process_rules(input_dir, output_dir, rules_dir, use_reviewed=not args.no_reviewed)
+    process_rules(input_dir, output_dir, rules_dir, use_reviewed=not args.no_reviewed,
+                  engine=args.engine, audit=args.audit, workers=args.workers, shard_by=args.shard_by,
+                  db_workers=args.db_workers)
 
 
 if __name__ == "__main__":
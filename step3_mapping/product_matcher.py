@@ -5,24 +5,40 @@ Product Matcher - Match receipt items to existing products and UoMs in database
 
 import json
 import logging
+import sqlite3
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from difflib import SequenceMatcher
 
+from .catalog_snapshot import load_uom_matches, open_catalog_snapshot, save_uom_matches, write_catalog_snapshot
+
 logger = logging.getLogger(__name__)
 
+# Receipt UoM spellings that resolve to the same database UoM
+UOM_VARIATIONS = {
+    'each': ['units', 'unit', 'each', 'piece', 'pieces'],
+    'lb': ['lb', 'lbs', 'pound', 'pounds', 'pound(s)'],
+    'kg': ['kg', 'kilogram', 'kilograms'],
+    'oz': ['oz', 'ounce', 'ounces'],
+    'g': ['g', 'gram', 'grams'],
+}
+
 
 class ProductMatcher:
     """Match receipt items to existing products and UoMs"""
     
-    def __init__(self, db_analysis_path: str, mapping_file: str = None, fruit_conversion_file: str = None):
+    def __init__(self, db_analysis_path: str, mapping_file: str = None, fruit_conversion_file: str = None,
+                 use_snapshot: bool = True):
         """
         Initialize product matcher with database analysis
         
         Args:
-            db_analysis_path: Path to products_uom_analysis.json
+            db_analysis_path: Path to products_uom_analysis.json (or a compiled .catalog.sqlite)
             mapping_file: Path to product_name_mapping.json (optional)
             fruit_conversion_file: Path to fruit_weight_conversion.json (optional)
+            use_snapshot: Use / refresh the compiled catalog snapshot next to the JSON
+                (see catalog_snapshot.py) instead of parsing the JSON every run, and start
+                with the UoM matches persisted by earlier runs (save_uom_matches)
         """
         self.db_analysis_path = Path(db_analysis_path)
         self.mapping_file = mapping_file
@@ -33,10 +49,58 @@ class ProductMatcher:
         self.fruit_conversions = {}
         self._load_mappings()
         
-        # Load database data
+        self._uom_match_cache: Dict[str, Optional[Dict]] = {}
+        self._uom_name_cache: Dict[str, Optional[Dict]] = {}
+        self._exact_names: Optional[List[str]] = None
+        if use_snapshot:
+            self._uom_match_cache.update(load_uom_matches(self.db_analysis_path))
+        self._persisted_uom_matches = len(self._uom_match_cache)
+        
+        # Load database data (compiled snapshot when available and current)
+        self.snapshot = open_catalog_snapshot(self.db_analysis_path) if use_snapshot else None
+        if self.snapshot:
+            self._load_snapshot()
+            return
+        
         self.db_data = self._load_db_analysis()
         self.products_index = self._build_products_index()
         self.uoms_index = self._build_uoms_index()
+        
+        # Hash indexes so per-line product / UoM lookups don't scan the name indexes
+        self._build_id_indexes()
+        
+        if use_snapshot:
+            try:
+                self.write_snapshot()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Could not write catalog snapshot: {e}")
+    
+    def _load_snapshot(self):
+        """Use the snapshot's table views and prebuilt indexes (nothing is parsed up front)"""
+        self.db_data = self.snapshot.db_data()
+        self.products_index = self.snapshot.mapping('products_index')
+        self.uoms_index = self._build_uoms_index()
+        self._products_by_id = self.snapshot.mapping('products_by_id')
+        self._db_product_keys = self.snapshot.mapping('product_keys')
+        self._templates_by_id = self.snapshot.mapping('templates_by_id')
+        self._build_uom_indexes()
+        logger.info(f"Loaded catalog snapshot {self.snapshot.path.name}: {len(self.db_data['products'])} products "
+                    f"and {len(self.db_data['uoms'])} UoMs")
+    
+    def write_snapshot(self, snapshot_path: Optional[Path] = None) -> Path:
+        """Compile the loaded dump and indexes into a catalog snapshot"""
+        return write_catalog_snapshot(
+            self.db_analysis_path, self.db_data, self.products_index, self._products_by_id,
+            self._db_product_keys, self._templates_by_id, snapshot_path
+        )
+    
+    def save_uom_matches(self) -> Optional[Path]:
+        """Persist the match_uom results next to the catalog snapshot (only if new ones were resolved)"""
+        if len(self._uom_match_cache) == self._persisted_uom_matches:
+            return None
+        path = save_uom_matches(self.db_analysis_path, self._uom_match_cache)
+        self._persisted_uom_matches = len(self._uom_match_cache)
+        return path
     
     def _load_mappings(self):
         """Load product name mappings and fruit weight conversions"""
@@ -126,6 +190,51 @@ class ProductMatcher:
         
         return uoms_index
     
+    def _build_id_indexes(self):
+        """
+        Build id -> product / template / UoM and alias -> UoM indexes
+        
+        The first entry per id (in name-index order) wins, which is what the linear
+        scans these replace returned.
+        """
+        self._products_by_id = {}
+        for product in self.products_index.values():
+            self._products_by_id.setdefault(product['product_id'], product)
+        
+        # Products not reachable through the name index (e.g. a later product with the same name)
+        self._db_product_keys = {}
+        for prod_id in self.db_data.get('products', {}):
+            try:
+                self._db_product_keys.setdefault(int(prod_id), prod_id)
+            except (TypeError, ValueError):
+                continue
+        
+        self._templates_by_id = {}
+        for template_id, template in self.db_data.get('product_templates', {}).items():
+            try:
+                self._templates_by_id[int(template_id)] = template
+            except (TypeError, ValueError):
+                continue
+        
+        self._build_uom_indexes()
+    
+    def _build_uom_indexes(self):
+        """Build id -> UoM and receipt alias -> UoM indexes (UoM tables are small)"""
+        self._uoms_by_id = {}
+        for uom_info in self.uoms_index.values():
+            self._uoms_by_id.setdefault(uom_info['id'], uom_info)
+        
+        # Receipt UoM alias -> first database UoM matching its variation group (None: no match)
+        self._uoms_by_alias = {}
+        for variations in UOM_VARIATIONS.values():
+            resolved = None
+            for name, uom_info in self.uoms_index.items():
+                if any(v in name for v in variations) or name in variations:
+                    resolved = uom_info
+                    break
+            for variation in variations:
+                self._uoms_by_alias.setdefault(variation, resolved)
+    
     def match_fee_product(self, product_name: str, fee_config: Dict) -> Optional[Dict]:
         """
         Match fee product name to existing products
@@ -223,31 +332,35 @@ class ProductMatcher:
         # Priority 1: Check odoo_uom (exact UoM name from database)
         odoo_uom = mapping_info.get('odoo_uom')
         if odoo_uom:
-            odoo_uom_lower = odoo_uom.lower()
-            # Try to find UoM by exact name match
-            for name, uom_info in self.uoms_index.items():
-                if name.lower() == odoo_uom_lower:
-                    logger.debug(f"UoM from mapping (odoo_uom): {receipt_uom} → {uom_info['name']} (ID: {uom_info.get('id')})")
-                    return uom_info
+            # Exact name match (uoms_index keys are lowercased names)
+            uom_info = self.uoms_index.get(odoo_uom.lower())
+            if uom_info:
+                logger.debug(f"UoM from mapping (odoo_uom): {receipt_uom} → {uom_info['name']} (ID: {uom_info.get('id')})")
+                return uom_info
         
         # Priority 2: Check if mapping specifies UoM ID
         uom_id = mapping_info.get('database_uom_id')
         if uom_id:
-            # Find UoM by ID
-            for uom_info in self.uoms_index.values():
-                if uom_info.get('id') == uom_id:
-                    logger.debug(f"UoM from mapping (ID): {receipt_uom} → {uom_info['name']} (ID: {uom_id})")
-                    return uom_info
+            uom_info = self._uoms_by_id.get(uom_id)
+            if uom_info:
+                logger.debug(f"UoM from mapping (ID): {receipt_uom} → {uom_info['name']} (ID: {uom_id})")
+                return uom_info
         
         # Priority 3: Check if mapping specifies UoM name
         uom_name = mapping_info.get('database_uom_name')
         if uom_name:
             uom_name_lower = uom_name.lower()
-            # Try to find UoM by name
-            for name, uom_info in self.uoms_index.items():
-                if name.lower() == uom_name_lower or name.startswith(uom_name_lower):
-                    logger.debug(f"UoM from mapping (name): {receipt_uom} → {uom_info['name']}")
-                    return uom_info
+            if uom_name_lower not in self._uom_name_cache:
+                # First UoM whose name is, or starts with, the mapped name
+                self._uom_name_cache[uom_name_lower] = next(
+                    (uom_info for name, uom_info in self.uoms_index.items()
+                     if name == uom_name_lower or name.startswith(uom_name_lower)),
+                    None
+                )
+            uom_info = self._uom_name_cache[uom_name_lower]
+            if uom_info:
+                logger.debug(f"UoM from mapping (name): {receipt_uom} → {uom_info['name']}")
+                return uom_info
         
         # Priority 4: Check if mapping specifies receipt UoM override
         uom_override = mapping_info.get('receipt_uom_override')
@@ -260,48 +373,43 @@ class ProductMatcher:
     
     def _get_product_by_id(self, product_id: int) -> Optional[Dict]:
         """Get product by ID from loaded data, including UoM information"""
-        if not hasattr(self, 'products_index'):
+        if not hasattr(self, '_products_by_id'):
             return None
         
         # Check products_index first
-        for name, product in self.products_index.items():
-            if product.get('product_id') == product_id:
-                # Also get UoM info from db_data
-                return self._enrich_product_with_uom(product)
+        product = self._products_by_id.get(product_id)
+        if product is not None:
+            # Also get UoM info from db_data
+            return self._enrich_product_with_uom(product)
         
         # Also check db_data for product templates
-        if hasattr(self, 'db_data'):
-            for prod_id, product in self.db_data.get('products', {}).items():
-                if int(prod_id) == product_id:
-                    template_id = product.get('product_tmpl_id')
-                    if template_id and template_id in self.db_data.get('product_templates', {}):
-                        template = self.db_data['product_templates'][template_id]
-                        product_info = {
-                            'product_id': int(prod_id),
-                            'template_id': int(template_id),
-                            'full_name': template.get('name'),
-                        }
-                        # Get UoM info from product and template
-                        uom_id = product.get('uom_id')
-                        uom_po_id = template.get('uom_po_id')  # Purchase UoM (preferred for PO)
-                        
-                        # Use purchase UoM if available, otherwise default UoM
-                        final_uom_id = uom_po_id if uom_po_id else uom_id
-                        
-                        if final_uom_id:
-                            # Find UoM in index
-                            uom_info = None
-                            for uom_name, uom_data in self.uoms_index.items():
-                                if uom_data.get('id') == final_uom_id:
-                                    uom_info = uom_data
-                                    break
-                            
-                            if uom_info:
-                                product_info['product_uom_id'] = final_uom_id
-                                product_info['product_uom_name'] = uom_info.get('name', '')
-                                product_info['product_uom_info'] = uom_info
-                        
-                        return product_info
+        prod_key = self._db_product_keys.get(product_id)
+        if prod_key is None:
+            return None
+        product = self.db_data['products'][prod_key]
+        template_id = product.get('product_tmpl_id')
+        if template_id and template_id in self.db_data.get('product_templates', {}):
+            template = self.db_data['product_templates'][template_id]
+            product_info = {
+                'product_id': int(prod_key),
+                'template_id': int(template_id),
+                'full_name': template.get('name'),
+            }
+            # Get UoM info from product and template
+            uom_id = product.get('uom_id')
+            uom_po_id = template.get('uom_po_id')  # Purchase UoM (preferred for PO)
+            
+            # Use purchase UoM if available, otherwise default UoM
+            final_uom_id = uom_po_id if uom_po_id else uom_id
+            
+            if final_uom_id:
+                uom_info = self._uoms_by_id.get(final_uom_id)
+                if uom_info:
+                    product_info['product_uom_id'] = final_uom_id
+                    product_info['product_uom_name'] = uom_info.get('name', '')
+                    product_info['product_uom_info'] = uom_info
+            
+            return product_info
         
         return None
     
@@ -323,7 +431,10 @@ class ProductMatcher:
         if not template_id:
             return product_info
         
-        template = self.db_data.get('product_templates', {}).get(str(template_id))
+        try:
+            template = self._templates_by_id.get(int(template_id))
+        except (TypeError, ValueError):
+            template = None
         if not template:
             return product_info
         
@@ -335,13 +446,7 @@ class ProductMatcher:
         final_uom_id = uom_po_id if uom_po_id else uom_id
         
         if final_uom_id:
-            # Find UoM in index
-            uom_info = None
-            for uom_name, uom_data in self.uoms_index.items():
-                if uom_data.get('id') == final_uom_id:
-                    uom_info = uom_data
-                    break
-            
+            uom_info = self._uoms_by_id.get(final_uom_id)
             if uom_info:
                 product_info['product_uom_id'] = final_uom_id
                 product_info['product_uom_name'] = uom_info.get('name', '')
@@ -370,21 +475,21 @@ class ProductMatcher:
                 return match
         
         # Try partial match (product name contains database product name or vice versa)
-        best_match = None
+        best_name = None
         best_score = 0.0
         
-        for db_name, product_info in self.products_index.items():
-            if product_info.get('exact_match'):  # Only check full product names
-                # Calculate similarity
-                score = SequenceMatcher(None, product_name_lower, db_name).ratio()
-                
-                # Check if one contains the other
-                if product_name_lower in db_name or db_name in product_name_lower:
-                    score = max(score, 0.8)  # Boost for substring match
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = product_info
+        for db_name in self._exact_product_names():  # Only check full product names
+            # Calculate similarity
+            score = SequenceMatcher(None, product_name_lower, db_name).ratio()
+            
+            # Check if one contains the other
+            if product_name_lower in db_name or db_name in product_name_lower:
+                score = max(score, 0.8)  # Boost for substring match
+            
+            if score > best_score:
+                best_score = score
+                best_name = db_name
+        best_match = self.products_index[best_name] if best_name is not None else None
         
         # Check if best match meets threshold
         if best_match and best_score >= min_similarity:
@@ -402,6 +507,15 @@ class ProductMatcher:
         logger.warning(f"No product match found for: {product_name}")
         return None
     
+    def _exact_product_names(self) -> List[str]:
+        """Full product names in the name index (loaded once)"""
+        if self._exact_names is None:
+            if self.snapshot:
+                self._exact_names = self.snapshot.exact_product_names()
+            else:
+                self._exact_names = [name for name, info in self.products_index.items() if info.get('exact_match')]
+        return self._exact_names
+    
     def match_uom(self, purchase_uom: str) -> Optional[Dict]:
         """
         Match receipt UoM to existing UoM
@@ -413,25 +527,21 @@ class ProductMatcher:
             Matched UoM dict or None
         """
         purchase_uom_lower = purchase_uom.lower()
-        
-        # UoM mapping variations
-        uom_variations = {
-            'each': ['units', 'unit', 'each', 'piece', 'pieces'],
-            'lb': ['lb', 'lbs', 'pound', 'pounds', 'pound(s)'],
-            'kg': ['kg', 'kilogram', 'kilograms'],
-            'oz': ['oz', 'ounce', 'ounces'],
-            'g': ['g', 'gram', 'grams'],
-        }
-        
-        # Find matching variation
-        for base, variations in uom_variations.items():
-            if purchase_uom_lower in variations:
-                # Try to match to database UoM
-                for name, uom_info in self.uoms_index.items():
-                    if any(v in name for v in variations) or name in variations:
-                        logger.debug(f"UoM match found: {purchase_uom} → {uom_info['name']}")
-                        return uom_info
-                break
+        if purchase_uom_lower not in self._uom_match_cache:
+            uom_info = self._match_uom_uncached(purchase_uom_lower)
+            if uom_info:
+                logger.debug(f"UoM match found: {purchase_uom} → {uom_info['name']}")
+            else:
+                logger.warning(f"No UoM match found for: {purchase_uom}")
+            self._uom_match_cache[purchase_uom_lower] = uom_info
+        return self._uom_match_cache[purchase_uom_lower]
+    
+    def _match_uom_uncached(self, purchase_uom_lower: str) -> Optional[Dict]:
+        """match_uom lookup chain (result is memoized per lowercased receipt UoM)"""
+        # Known variation (each / lb / kg / oz / g spellings)
+        uom_info = self._uoms_by_alias.get(purchase_uom_lower)
+        if uom_info:
+            return uom_info
         
         # Fallback: Direct match
         if purchase_uom_lower in self.uoms_index:
@@ -440,17 +550,14 @@ class ProductMatcher:
         # Try partial match
         for name, uom_info in self.uoms_index.items():
             if purchase_uom_lower in name or name in purchase_uom_lower:
-                logger.debug(f"UoM partial match: {purchase_uom} → {uom_info['name']}")
                 return uom_info
         
         # Special case: Match "4-pc" variations
         if '4-pc' in purchase_uom_lower or '4pc' in purchase_uom_lower:
             for name, uom_info in self.uoms_index.items():
                 if '4-pc' in name.lower() or '4pc' in name.lower() or '4-pc' in name:
-                    logger.debug(f"UoM 4-pc match: {purchase_uom} → {uom_info['name']}")
                     return uom_info
         
-        logger.warning(f"No UoM match found for: {purchase_uom}")
         return None
     
     def convert_fruit_weight_to_units(self, item: Dict, config: Dict = None) -> Dict:
@@ -531,6 +638,7 @@ class ProductMatcher:
             item['original_weight_lb'] = original_weight_lb
             item['original_unit_price_per_lb'] = original_unit_price_per_lb
             item['original_uom'] = original_uom
+            item['items_per_lb'] = items_per_lb
             item['converted'] = True
             
             logger.debug(f"Converted {original_weight_lb} lb to {qty_units} units using {items_per_lb} items/lb (using Units UoM)")
@@ -7,15 +7,14 @@ Uses database connection to get accurate product default UoMs and categories
 import json
 import os
 import getpass
+import importlib.util
 from pathlib import Path
 from typing import Dict, Optional
 
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    PSYCOPG2_AVAILABLE = True
-except ImportError:
-    PSYCOPG2_AVAILABLE = False
+# psycopg2 is imported where a connection is made/used (it costs noticeable startup time
+# for every step that merely imports this module)
+PSYCOPG2_AVAILABLE = importlib.util.find_spec('psycopg2') is not None
+if not PSYCOPG2_AVAILABLE:
     print("Warning: psycopg2 not available. Install with: pip install psycopg2-binary")
 
 
@@ -44,6 +43,48 @@ def get_db_password() -> str:
     return getpass.getpass("Enter Odoo database password: ")
 
 
+def get_connection_params() -> Dict:
+    """Get connection parameters from environment or .env file (password prompted if not set)"""
+    # Get connection details from environment or .env file
+    host = os.environ.get('ODOO_DB_HOST', 'uniuniuptown.shop')
+    user = os.environ.get('ODOO_DB_USER', 'odooreader')
+    database = os.environ.get('ODOO_DB_NAME', 'odoo')
+    port = int(os.environ.get('ODOO_DB_PORT', '5432'))
+    
+    # Load from .env if not in environment
+    env_file = Path('.env')
+    if env_file.exists():
+        try:
+            with open(env_file, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('#') or not line:
+                        continue
+                    if '=' in line:
+                        key, value = line.split('=', 1)
+                        key = key.strip()
+                        value = value.strip()
+                        if key == 'ODOO_DB_HOST' and not os.environ.get('ODOO_DB_HOST'):
+                            host = value
+                        elif key == 'ODOO_DB_USER' and not os.environ.get('ODOO_DB_USER'):
+                            user = value
+                        elif key == 'ODOO_DB_NAME' and not os.environ.get('ODOO_DB_NAME'):
+                            database = value
+                        elif key == 'ODOO_DB_PORT' and not os.environ.get('ODOO_DB_PORT'):
+                            port = int(value) if value.isdigit() else 5432
+        except Exception:
+            pass
+    
+    password = get_db_password()
+    return {
+        'host': host,
+        'user': user,
+        'password': password,
+        'database': database,
+        'port': port,
+    }
+
+
 def connect_to_database() -> Optional[object]:
     """Connect to Odoo database"""
     if not PSYCOPG2_AVAILABLE:
@@ -51,52 +92,33 @@ def connect_to_database() -> Optional[object]:
         return None
     
     try:
-        # Get connection details from environment or .env file
-        host = os.environ.get('ODOO_DB_HOST', 'uniuniuptown.shop')
-        user = os.environ.get('ODOO_DB_USER', 'odooreader')
-        database = os.environ.get('ODOO_DB_NAME', 'odoo')
-        port = int(os.environ.get('ODOO_DB_PORT', '5432'))
-        
-        # Load from .env if not in environment
-        env_file = Path('.env')
-        if env_file.exists():
-            try:
-                with open(env_file, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line.startswith('#') or not line:
-                            continue
-                        if '=' in line:
-                            key, value = line.split('=', 1)
-                            key = key.strip()
-                            value = value.strip()
-                            if key == 'ODOO_DB_HOST' and not os.environ.get('ODOO_DB_HOST'):
-                                host = value
-                            elif key == 'ODOO_DB_USER' and not os.environ.get('ODOO_DB_USER'):
-                                user = value
-                            elif key == 'ODOO_DB_NAME' and not os.environ.get('ODOO_DB_NAME'):
-                                database = value
-                            elif key == 'ODOO_DB_PORT' and not os.environ.get('ODOO_DB_PORT'):
-                                port = int(value) if value.isdigit() else 5432
-            except Exception:
-                pass
+        import psycopg2
         
-        password = get_db_password()
-        conn = psycopg2.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database,
-            port=port
-        )
+        conn = psycopg2.connect(**get_connection_params())
         return conn
     except Exception as e:
         print(f"ERROR: Failed to connect to database: {e}")
         return None
 
 
+def create_connection_pool(minconn: int = 1, maxconn: int = 4) -> Optional[object]:
+    """Create a thread-safe psycopg2 connection pool to the Odoo database"""
+    if not PSYCOPG2_AVAILABLE:
+        print("ERROR: psycopg2 not available. Please install: pip install psycopg2-binary")
+        return None
+    
+    try:
+        from psycopg2.pool import ThreadedConnectionPool
+        
+        return ThreadedConnectionPool(minconn, maxconn, **get_connection_params())
+    except Exception as e:
+        print(f"ERROR: Failed to create database connection pool: {e}")
+        return None
+
+
 def get_product_default_uoms(conn) -> Dict[int, Dict]:
     """Get all products with their default UoMs and categories"""
+    from psycopg2.extras import RealDictCursor
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         # Query product.product table for product ID, name, and default UoM
         query = """
@@ -131,10 +153,7 @@ def get_product_default_uoms(conn) -> Dict[int, Dict]:
         return products
 
 
-def get_uom_categories(conn) -> Dict[int, Dict]:
-    """Get all UoMs with their categories, keyed by UoM ID"""
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        query = """
+UOM_CATEGORIES_QUERY = """
         SELECT 
             uom.id as uom_id,
             uom.name as uom_name,
@@ -145,18 +164,26 @@ def get_uom_categories(conn) -> Dict[int, Dict]:
         WHERE uom.active = true
         ORDER BY uom.id
         """
-        
-        cur.execute(query)
-        uoms = {}  # Keyed by uom_id
-        
-        for row in cur.fetchall():
-            uom_id = row['uom_id']
-            uoms[uom_id] = {
-                    'category_id': row['category_id'],
-                    'category_name': row['category_name'] or ''
-                }
-        
-        return uoms
+
+
+def uom_categories_from_rows(rows) -> Dict[int, Dict]:
+    """UOM_CATEGORIES_QUERY rows -> {uom_id: {'category_id': ..., 'category_name': ...}}"""
+    uoms = {}  # Keyed by uom_id
+    for row in rows:
+        uom_id = row['uom_id']
+        uoms[uom_id] = {
+            'category_id': row['category_id'],
+            'category_name': row['category_name'] or ''
+        }
+    return uoms
+
+
+def get_uom_categories(conn) -> Dict[int, Dict]:
+    """Get all UoMs with their categories, keyed by UoM ID"""
+    from psycopg2.extras import RealDictCursor
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(UOM_CATEGORIES_QUERY)
+        return uom_categories_from_rows(cur.fetchall())
 
 
 def main():
@@ -2,335 +2,385 @@
 """
 Rule Executor - Execute Step 2 rule stages
 Transforms items through each stage in processing order
+
+Per-item stages are split into a prepare step (stage-wide state: config lookups,
+DB loads, BoM sets) and an apply step that updates one item in place. The
+execute_*_stage functions run them stage by stage on copied items;
+stage_engine.FusedStageEngine runs the same steps for all stages in one pass.
 """
 
 import json
 import logging
 import re
+from collections import namedtuple
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 from difflib import SequenceMatcher
 
-from .query_database import connect_to_database
+from .db_prefetch import prefetch_stage_queries, query_params, stage_query_rows
+from .query_database import UOM_CATEGORIES_QUERY, connect_to_database, uom_categories_from_rows
 
 logger = logging.getLogger(__name__)
 
 
+def prepare_inputs_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return {
+        'normalize_fields': stage_config.get('normalize_fields', {}),
+        'add_metadata': stage_config.get('add_metadata', {}),
+    }
+
+
+def apply_inputs_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    # Normalize field names
+    for old_field, new_field in state['normalize_fields'].items():
+        if old_field in item:
+            item[new_field] = item.pop(old_field)
+    
+    # Add metadata
+    for key, value in state['add_metadata'].items():
+        if key not in item:
+            item[key] = value
+    
+    return item
+
+
 def execute_inputs_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Execute 01_inputs.yaml stage - normalize fields and add metadata"""
     logger.info("Executing inputs stage...")
-    
-    stage_config = config.get('inputs', {})
-    normalize_fields = stage_config.get('normalize_fields', {})
-    add_metadata = stage_config.get('add_metadata', {})
-    
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy()
-        
-        # Normalize field names
-        for old_field, new_field in normalize_fields.items():
-            if old_field in new_item:
-                new_item[new_field] = new_item.pop(old_field)
-        
-        # Add metadata
-        for key, value in add_metadata.items():
-            if key not in new_item:
-                new_item[key] = value
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in inputs stage")
-    return transformed_items
+    return _execute_item_stage('inputs', items, config, context)
 
 
-def execute_vendor_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 02_vendor_match.yaml stage - normalize vendors"""
-    logger.info("Executing vendor_match stage...")
-    
-    stage_config = config.get('vendor_match', {})
-    rules = stage_config.get('rules', [])
-    
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy()
-        receipt_data = new_item.get('receipt_data', {})
-        source_type = new_item.get('source_type', receipt_data.get('source_type', ''))
-        
-        # Build searchable text
-        receipt_text = ' '.join([
-            receipt_data.get('vendor', ''),
-            receipt_data.get('filename', ''),
-            new_item.get('source_file', ''),
-            str(receipt_data.get('receipt_text', ''))
-        ]).lower()
-        
-        detected_vendor_name = receipt_data.get('vendor', '').lower()
-        source_file = new_item.get('source_file', '').lower()
-        
-        # Try rules in order
-        matched = False
-        for rule in rules:
-            rule_name = rule.get('name', '')
-            when_any = rule.get('when_any', [])
-            when = rule.get('when')
-            and_also = rule.get('and_also', [])
-            set_fields = rule.get('set', {})
-            
-            # Check conditions
-            matches = False
-            
-            if when_any:
-                # Match if ANY condition is true
-                for condition in when_any:
-                    if check_condition(condition, source_type, receipt_text, detected_vendor_name, source_file):
-                        matches = True
-                        break
-            elif when:
-                # Single condition
-                matches = check_condition(when, source_type, receipt_text, detected_vendor_name, source_file)
-            
-            # Check 'and_also' conditions
-            if matches and and_also:
-                for condition in and_also:
-                    if not check_condition(condition, source_type, receipt_text, detected_vendor_name, source_file):
-                        matches = False
-                        break
-            
-            if matches:
-                # Apply set fields
-                for key, value in set_fields.items():
-                    if key == 'review_reasons' and isinstance(value, list):
-                        if 'review_reasons' not in new_item:
-                            new_item['review_reasons'] = []
-                        new_item['review_reasons'].extend(value)
-                    else:
-                        new_item[key] = value
-                matched = True
-                logger.debug(f"Vendor match: {rule_name} → {set_fields.get('vendor_code', 'N/A')}")
-                break
-        
-        if not matched:
-            logger.warning(f"No vendor match for item: {new_item.get('product_name', 'unknown')}")
-        
-        # IC-OTHER vendor inference: try to infer actual vendor after initial matching
-        if new_item.get('vendor_code') == 'IC-OTHER':
-            # Check PDF header text for vendor names
-            receipt_text_lower = receipt_text.lower()
-            inferred_vendor = None
-            
-            # Check header text for vendor names
-            if 'jewel' in receipt_text_lower:
-                inferred_vendor = 'JEWEL'
-            elif 'aldi' in receipt_text_lower:
-                inferred_vendor = 'IC-ALDI'
-            elif 'mariano' in receipt_text_lower:
-                inferred_vendor = 'IC-MARIANOS'
-            elif 'costco' in receipt_text_lower:
-                inferred_vendor = 'IC-COSTCO'
-            
-            # Check item names for store-exclusive SKUs (Costco pack sizes, Aldi house brands, Jewel dairy)
-            if not inferred_vendor:
-                product_name_lower = new_item.get('product_name', '').lower()
-                canonical_key_lower = new_item.get('canonical_product_key', '').lower()
-                
-                # Costco indicators: pack sizes (e.g., "6-pack", large quantities)
-                if any(indicator in product_name_lower or indicator in canonical_key_lower 
-                       for indicator in ['6-pack', '12-pack', 'bulk', 'kirkland']):
-                    inferred_vendor = 'IC-COSTCO'
-                # Aldi indicators: house brands (e.g., "friendly farms", "specially selected", "simply nature")
-                elif any(brand in product_name_lower or brand in canonical_key_lower 
-                         for brand in ['friendly farms', 'specially selected', 'simply nature']):
-                    inferred_vendor = 'IC-ALDI'
-                # Jewel indicators: dairy section patterns
-                elif any(pattern in product_name_lower or pattern in canonical_key_lower 
-                         for pattern in ['jewel', 'mariano']):
-                    inferred_vendor = 'JEWEL'
-            
-            if inferred_vendor:
-                logger.info(f"Inferred vendor for IC-OTHER: {inferred_vendor} (from receipt: {receipt_data.get('filename', 'unknown')})")
-                new_item['vendor_code'] = inferred_vendor
-                # Update vendor_name based on inferred code
-                vendor_names = {
-                    'JEWEL': 'Jewel-Osco',
-                    'IC-ALDI': 'IC-Aldi',
-                    'IC-MARIANOS': 'IC-Mariano\'s',
-                    'IC-COSTCO': 'IC-Costco'
-                }
-                if inferred_vendor in vendor_names:
-                    new_item['vendor_name'] = vendor_names[inferred_vendor]
-                
-                # Clear review reasons if we successfully inferred
-                if 'review_reasons' in new_item:
-                    new_item['review_reasons'] = [
-                        r for r in new_item['review_reasons'] 
-                        if r != 'Instacart order without clear underlying store'
-                    ]
-                    if not new_item['review_reasons']:
-                        new_item.pop('review_reasons', None)
-                        new_item['needs_review'] = False
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in vendor_match stage")
-    return transformed_items
+# Parsed vendor_match condition: `field == "value"` (equals) or `field ILIKE "%value%"`
+VendorCondition = namedtuple('VendorCondition', 'field equals value')
+CONDITION_FIELDS = ('receipt_text', 'source_file', 'detected_vendor_name')
 
+# IC-OTHER inference: receipt header text, then store-exclusive SKUs in item names
+HEADER_VENDORS = [('jewel', 'JEWEL'), ('aldi', 'IC-ALDI'), ('mariano', 'IC-MARIANOS'), ('costco', 'IC-COSTCO')]
+SKU_VENDORS = [
+    # Costco indicators: pack sizes (e.g., "6-pack", large quantities)
+    (['6-pack', '12-pack', 'bulk', 'kirkland'], 'IC-COSTCO'),
+    # Aldi indicators: house brands (e.g., "friendly farms", "specially selected", "simply nature")
+    (['friendly farms', 'specially selected', 'simply nature'], 'IC-ALDI'),
+    # Jewel indicators: dairy section patterns
+    (['jewel', 'mariano'], 'JEWEL'),
+]
+INFERRED_VENDOR_NAMES = {
+    'JEWEL': 'Jewel-Osco',
+    'IC-ALDI': 'IC-Aldi',
+    'IC-MARIANOS': 'IC-Mariano\'s',
+    'IC-COSTCO': 'IC-Costco'
+}
 
-def check_condition(condition: str, source_type: str, receipt_text: str, detected_vendor_name: str, source_file: str) -> bool:
-    """Check if a condition string matches"""
+
+def parse_condition(condition: str) -> Optional[VendorCondition]:
+    """Parse a condition string (None if it can never match)"""
     if ' == ' in condition:
         left, right = condition.split(' == ', 1)
         left = left.strip().strip('"\'')
         right = right.strip().strip('"\'')
         
         if left == 'source_type':
-            return source_type.lower() == right.lower()
+            return VendorCondition('source_type', True, right.lower())
     
     if ' ILIKE ' in condition:
         left, pattern = condition.split(' ILIKE ', 1)
         left = left.strip()
         pattern = pattern.strip().strip('"\'%')
         
-        if left == 'receipt_text':
-            return pattern.lower() in receipt_text
-        elif left == 'source_file':
-            return pattern.lower() in source_file
-        elif left == 'detected_vendor_name':
-            return pattern.lower() in detected_vendor_name
-    
-    if ' ILIKE "%' in condition:
-        # Handle ILIKE patterns with wildcards
-        parts = condition.split(' ILIKE ', 1)
-        if len(parts) == 2:
-            field = parts[0].strip()
-            pattern = parts[1].strip().strip('"\'%')
-            
-            if field == 'receipt_text':
-                return pattern.lower() in receipt_text
-            elif field == 'source_file':
-                return pattern.lower() in source_file
-            elif field == 'detected_vendor_name':
-                return pattern.lower() in detected_vendor_name
+        if left in CONDITION_FIELDS:
+            return VendorCondition(left, False, pattern.lower())
     
-    return False
+    return None
 
 
-def execute_product_canonicalization_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 03_product_canonicalization.yaml stage - canonicalize product names"""
-    logger.info("Executing product_canonicalization stage...")
-    
-    stage_config = config.get('product_canonicalization', {})
-    normalize_config = stage_config.get('normalize', {})
-    category_rules = stage_config.get('category_rules', [])
-    size_rules = stage_config.get('size_rules', [])
-    compose_config = stage_config.get('compose', {})
-    
-    transformed_items = []
+def _condition_holds(condition: Optional[VendorCondition], facts: Dict[str, str]) -> bool:
+    """Evaluate a parsed condition against lowercased receipt facts"""
+    if condition is None:
+        return False
+    if condition.equals:
+        return facts[condition.field] == condition.value
+    return condition.value in facts[condition.field]
+
+
+def check_condition(condition: str, source_type: str, receipt_text: str, detected_vendor_name: str, source_file: str) -> bool:
+    """Check if a condition string matches"""
+    facts = {
+        'source_type': source_type.lower(),
+        'receipt_text': receipt_text,
+        'source_file': source_file,
+        'detected_vendor_name': detected_vendor_name,
+    }
+    return _condition_holds(parse_condition(condition), facts)
+
+
+def prepare_vendor_match_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    rules = []
+    for rule in stage_config.get('rules', []):
+        when_any = rule.get('when_any', [])
+        when = rule.get('when')
+        if when_any:
+            # Match if ANY condition is true
+            any_conditions = [parse_condition(condition) for condition in when_any]
+        elif when:
+            # Single condition
+            any_conditions = [parse_condition(when)]
+        else:
+            any_conditions = []
+        and_also = [parse_condition(condition) for condition in rule.get('and_also', [])]
+        rules.append((rule.get('name', ''), any_conditions, and_also, rule.get('set', {})))
+    # Receipt facts -> (matched rule, IC-OTHER vendor from the header text); all items of
+    # a receipt share them, so rules are evaluated once per receipt
+    return {'rules': rules, 'receipts': {}}
+
+
+def _match_receipt_vendor(source_type: str, vendor: str, filename: str, source_file: str, receipt_text: str,
+                          rules: List[tuple]) -> tuple:
+    # Build searchable text
+    receipt_text = ' '.join([vendor, filename, source_file, receipt_text]).lower()
+    facts = {
+        'source_type': source_type.lower(),
+        'receipt_text': receipt_text,
+        'source_file': source_file.lower(),
+        'detected_vendor_name': vendor.lower(),
+    }
+    
+    # Try rules in order
+    matched_rule = None
+    for rule in rules:
+        _, any_conditions, and_also, _ = rule
+        if (any(_condition_holds(condition, facts) for condition in any_conditions)
+                and all(_condition_holds(condition, facts) for condition in and_also)):
+            matched_rule = rule
+            break
     
-    for item in items:
-        new_item = item.copy()
-        product_name = new_item.get('product_name', '')
-        
-        # Normalize
-        normalized_name = product_name
-        if normalize_config.get('lowercase'):
-            normalized_name = normalized_name.lower()
-        
-        if normalize_config.get('strip_punctuation'):
-            normalized_name = re.sub(r'[^\w\s]', ' ', normalized_name)
-        
-        # Remove store words
-        for word in normalize_config.get('remove_store_words', []):
-            normalized_name = re.sub(r'\b' + re.escape(word.lower()) + r'\b', '', normalized_name, flags=re.IGNORECASE)
-        
-        # Remove brand words
-        for word in normalize_config.get('remove_brand_words', []):
-            normalized_name = re.sub(r'\b' + re.escape(word.lower()) + r'\b', '', normalized_name, flags=re.IGNORECASE)
-        
-        if normalize_config.get('collapse_spaces'):
-            normalized_name = re.sub(r'\s+', ' ', normalized_name).strip()
-        
-        # Apply category rules
-        canonical_name = None
-        for rule in category_rules:
-            keywords = rule.get('keywords', [])
-            for keyword in keywords:
-                if keyword.lower() in normalized_name:
-                    canonical_name = rule.get('canonical_name')
+    # Check header text for vendor names
+    header_vendor = next((vendor_code for name, vendor_code in HEADER_VENDORS if name in receipt_text), None)
+    return matched_rule, header_vendor
+
+
+def apply_vendor_match_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    receipt_data = item.get('receipt_data', {})
+    receipt_key = (
+        item.get('source_type', receipt_data.get('source_type', '')),
+        receipt_data.get('vendor', ''),
+        receipt_data.get('filename', ''),
+        item.get('source_file', ''),
+        str(receipt_data.get('receipt_text', '')),
+    )
+    outcome = state['receipts'].get(receipt_key)
+    if outcome is None:
+        outcome = state['receipts'][receipt_key] = _match_receipt_vendor(*receipt_key, state['rules'])
+    matched_rule, header_vendor = outcome
+    
+    if matched_rule:
+        rule_name, _, _, set_fields = matched_rule
+        # Apply set fields
+        for key, value in set_fields.items():
+            if key == 'review_reasons' and isinstance(value, list):
+                if 'review_reasons' not in item:
+                    item['review_reasons'] = []
+                item['review_reasons'].extend(value)
+            else:
+                item[key] = value
+        logger.debug(f"Vendor match: {rule_name} → {set_fields.get('vendor_code', 'N/A')}")
+    else:
+        logger.warning(f"No vendor match for item: {item.get('product_name', 'unknown')}")
+    
+    # IC-OTHER vendor inference: try to infer actual vendor after initial matching
+    if item.get('vendor_code') == 'IC-OTHER':
+        inferred_vendor = header_vendor
+        
+        # Check item names for store-exclusive SKUs (Costco pack sizes, Aldi house brands, Jewel dairy)
+        if not inferred_vendor:
+            product_name_lower = item.get('product_name', '').lower()
+            canonical_key_lower = item.get('canonical_product_key', '').lower()
+            for indicators, vendor_code in SKU_VENDORS:
+                if any(indicator in product_name_lower or indicator in canonical_key_lower
+                       for indicator in indicators):
+                    inferred_vendor = vendor_code
                     break
-            if canonical_name:
-                break
         
-        # Apply size rules
-        canonical_size = None
-        canonical_uom = None
-        for rule in size_rules:
-            matches = rule.get('match', [])
-            for match_pattern in matches:
-                if match_pattern.lower() in normalized_name:
-                    canonical_size = rule.get('canonical_size')
-                    canonical_uom = rule.get('canonical_uom')
-                    break
+        if inferred_vendor:
+            logger.info(f"Inferred vendor for IC-OTHER: {inferred_vendor} (from receipt: {receipt_data.get('filename', 'unknown')})")
+            item['vendor_code'] = inferred_vendor
+            # Update vendor_name based on inferred code
+            if inferred_vendor in INFERRED_VENDOR_NAMES:
+                item['vendor_name'] = INFERRED_VENDOR_NAMES[inferred_vendor]
+            
+            # Clear review reasons if we successfully inferred
+            if 'review_reasons' in item:
+                item['review_reasons'] = [
+                    r for r in item['review_reasons'] 
+                    if r != 'Instacart order without clear underlying store'
+                ]
+                if not item['review_reasons']:
+                    item.pop('review_reasons', None)
+                    item['needs_review'] = False
+    
+    return item
+
+
+def execute_vendor_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 02_vendor_match.yaml stage - normalize vendors"""
+    logger.info("Executing vendor_match stage...")
+    return _execute_item_stage('vendor_match', items, config, context)
+
+
+# Word removal: a word bounded by \b on both sides whose tokens are separated by single
+# non-word characters can only overlap another such word's match by sharing a token, and
+# removing it never joins its neighbours into a new match. Consecutive words sharing no
+# tokens are therefore removed in one alternation pass with the same result as one
+# re.sub per word; other words get a pass of their own.
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+_TOKEN_RE = re.compile(r'\w+')
+_GROUPABLE_WORD_RE = re.compile(r'\w+(?:\W\w+)*')
+
+
+def _compile_word_removal(words: List[str]) -> List[re.Pattern]:
+    """Removal patterns for remove_store_words / remove_brand_words, applied in order"""
+    groups = []
+    group_tokens = None
+    for word in words:
+        word = word.lower()
+        tokens = set(_TOKEN_RE.findall(word))
+        if not _GROUPABLE_WORD_RE.fullmatch(word):
+            groups.append([word])
+            group_tokens = None
+        elif group_tokens is not None and not tokens & group_tokens:
+            groups[-1].append(word)
+            group_tokens |= tokens
+        else:
+            groups.append([word])
+            group_tokens = tokens
+    return [re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in group) + r')\b', re.IGNORECASE)
+            for group in groups]
+
+
+def prepare_product_canonicalization_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    normalize_config = stage_config.get('normalize', {})
+    vendor_maps = {}
+    for vendor_code, vendor_map in stage_config.get('vendor_specific_canonical_map', {}).items():
+        # Match pattern (handle variations like "1/2" vs "1 2")
+        vendor_maps[vendor_code] = [
+            (_SPACES_RE.sub(' ', _PUNCTUATION_RE.sub(' ', pattern.lower()).strip()), pattern.lower(), mapped_value, pattern)
+            for pattern, mapped_value in vendor_map.items()
+        ]
+    return {
+        'lowercase': normalize_config.get('lowercase'),
+        'strip_punctuation': normalize_config.get('strip_punctuation'),
+        'collapse_spaces': normalize_config.get('collapse_spaces'),
+        'removals': (_compile_word_removal(normalize_config.get('remove_store_words', []))
+                     + _compile_word_removal(normalize_config.get('remove_brand_words', []))),
+        # Rules without a canonical name never set one, the first rule with a matching keyword wins
+        'category_rules': [(tuple(keyword.lower() for keyword in rule.get('keywords', [])), rule.get('canonical_name'))
+                           for rule in stage_config.get('category_rules', []) if rule.get('canonical_name')],
+        'size_rules': [(tuple(match.lower() for match in rule.get('match', [])),
+                        rule.get('canonical_size'), rule.get('canonical_uom'))
+                       for rule in stage_config.get('size_rules', [])],
+        'compose': stage_config.get('compose', {}),
+        'vendor_maps': vendor_maps,
+        # (vendor_code, product_name) -> canonical fields; receipts repeat the same names
+        'memo': {},
+    }
+
+
+def _canonicalize_product_name(product_name: str, vendor_code: Optional[str], state: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+    """(canonical_key, canonical_name, canonical_size, canonical_uom) for one product name"""
+    normalized_name = product_name
+    if state['lowercase']:
+        normalized_name = normalized_name.lower()
+    
+    if state['strip_punctuation']:
+        normalized_name = _PUNCTUATION_RE.sub(' ', normalized_name)
+    
+    # Remove store words, then brand words
+    for removal in state['removals']:
+        normalized_name = removal.sub('', normalized_name)
+    
+    if state['collapse_spaces']:
+        normalized_name = _SPACES_RE.sub(' ', normalized_name).strip()
+    
+    # Apply category rules
+    canonical_name = None
+    for keywords, rule_canonical_name in state['category_rules']:
+        if any(keyword in normalized_name for keyword in keywords):
+            canonical_name = rule_canonical_name
+            break
+    
+    # Apply size rules
+    canonical_size = None
+    canonical_uom = None
+    for matches, rule_size, rule_uom in state['size_rules']:
+        if any(match_pattern in normalized_name for match_pattern in matches):
+            canonical_size = rule_size
+            canonical_uom = rule_uom
             if canonical_size:
                 break
-        
-        # Check vendor-specific canonical mapping (e.g., RD short codes)
-        vendor_code = new_item.get('vendor_code', '')
-        vendor_specific_maps = stage_config.get('vendor_specific_canonical_map', {})
-        canonical_key = None
-        
-        if vendor_code and vendor_code in vendor_specific_maps:
-            vendor_map = vendor_specific_maps[vendor_code]
-            # Check if normalized_name matches any key in vendor map
-            for pattern, mapped_value in vendor_map.items():
-                # Match pattern (handle variations like "1/2" vs "1 2")
-                pattern_normalized = re.sub(r'[^\w\s]', ' ', pattern.lower()).strip()
-                pattern_normalized = re.sub(r'\s+', ' ', pattern_normalized)
-                if pattern_normalized == normalized_name or pattern.lower() in normalized_name:
-                    canonical_key = mapped_value
-                    logger.debug(f"Matched RD code: {pattern} → {canonical_key}")
-                    break
-        
-        # Compose canonical key if not set by vendor-specific mapping
-        if not canonical_key:
-            if compose_config and canonical_name:
-                pattern = compose_config.get('pattern', '{{ canonical_name }}')
-                if canonical_size and '{{ canonical_size }}' in pattern:
-                    canonical_key = pattern.replace('{{ canonical_name }}', canonical_name).replace('{{ canonical_size }}', canonical_size)
-                else:
-                    canonical_key = compose_config.get('fallback_pattern', '{{ canonical_name }}').replace('{{ canonical_name }}', canonical_name)
+    
+    # Check vendor-specific canonical mapping (e.g., RD short codes)
+    canonical_key = None
+    if vendor_code:
+        for pattern_normalized, pattern_lower, mapped_value, pattern in state['vendor_maps'][vendor_code]:
+            if pattern_normalized == normalized_name or pattern_lower in normalized_name:
+                canonical_key = mapped_value
+                logger.debug(f"Matched RD code: {pattern} → {canonical_key}")
+                break
+    
+    # Compose canonical key if not set by vendor-specific mapping
+    compose_config = state['compose']
+    if not canonical_key:
+        if compose_config and canonical_name:
+            pattern = compose_config.get('pattern', '{{ canonical_name }}')
+            if canonical_size and '{{ canonical_size }}' in pattern:
+                canonical_key = pattern.replace('{{ canonical_name }}', canonical_name).replace('{{ canonical_size }}', canonical_size)
             else:
-                canonical_key = canonical_name if canonical_name else normalized_name
-        
-        new_item['canonical_product_key'] = canonical_key
-        # Store raw name for Costco organic handling
-        if not new_item.get('raw_product_name'):
-            new_item['raw_product_name'] = product_name
-        if canonical_name:
-            new_item['canonical_name'] = canonical_name
-        if canonical_size:
-            new_item['canonical_size'] = canonical_size
-        if canonical_uom:
-            new_item['canonical_uom'] = canonical_uom
-        
-        transformed_items.append(new_item)
+                canonical_key = compose_config.get('fallback_pattern', '{{ canonical_name }}').replace('{{ canonical_name }}', canonical_name)
+        else:
+            canonical_key = canonical_name if canonical_name else normalized_name
     
-    logger.info(f"Processed {len(transformed_items)} items in product_canonicalization stage")
-    return transformed_items
+    return canonical_key, canonical_name, canonical_size, canonical_uom
 
 
-def execute_db_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 04_db_match.yaml stage - match products to database"""
-    logger.info("Executing db_match stage...")
-    
-    stage_config = config.get('db_match', {})
+def apply_product_canonicalization_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    product_name = item.get('product_name', '')
+    vendor_code = item.get('vendor_code', '')
+    # Only vendors with a canonical map make the result vendor-specific
+    if not vendor_code or vendor_code not in state['vendor_maps']:
+        vendor_code = None
+    
+    memo_key = (vendor_code, product_name)
+    result = state['memo'].get(memo_key)
+    if result is None:
+        result = state['memo'][memo_key] = _canonicalize_product_name(product_name, vendor_code, state)
+    canonical_key, canonical_name, canonical_size, canonical_uom = result
+    
+    item['canonical_product_key'] = canonical_key
+    # Store raw name for Costco organic handling
+    if not item.get('raw_product_name'):
+        item['raw_product_name'] = product_name
+    if canonical_name:
+        item['canonical_name'] = canonical_name
+    if canonical_size:
+        item['canonical_size'] = canonical_size
+    if canonical_uom:
+        item['canonical_uom'] = canonical_uom
+    
+    return item
+
+
+def execute_product_canonicalization_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 03_product_canonicalization.yaml stage - canonicalize product names"""
+    logger.info("Executing product_canonicalization stage...")
+    return _execute_item_stage('product_canonicalization', items, config, context)
+
+
+def prepare_db_match_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     product_matcher = context.get('product_matcher')
     
     if not product_matcher:
         logger.error("ProductMatcher not found in context")
-        return items
+        return None
     
     # Connect to database if needed
     db_conn = context.get('db_conn')
@@ -347,30 +397,27 @@ def execute_db_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any],
     db_products = {}
     if db_conn:
         try:
-            from psycopg2.extras import RealDictCursor
             queries = stage_config.get('queries', {})
             
-            with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-                if 'products' in queries:
-                    cur.execute(queries['products'])
-                    for row in cur.fetchall():
-                        product_id = row['product_id']
-                        # Handle JSON field for product_name
-                        product_name = row.get('product_name', '')
-                        if isinstance(product_name, dict):
-                            product_name = product_name.get('en_US', '') or product_name.get(list(product_name.keys())[0] if product_name else '', '')
-                        
-                        db_products[product_id] = {
-                            'product_id': product_id,
-                            'product_name': product_name,
-                            'default_code': row.get('default_code'),
-                            'barcode': row.get('barcode'),
-                            'default_uom_id': row.get('product_uom_id'),
-                            'purchase_ok': row.get('purchase_ok', False),
-                            'sale_ok': row.get('sale_ok', False),
-                            'product_type': row.get('product_type', ''),
-                            'product_categ_id': row.get('product_categ_id')
-                        }
+            if 'products' in queries:
+                for row in stage_query_rows(context, 'db_match', 'products', queries['products'], {}):
+                    product_id = row['product_id']
+                    # Handle JSON field for product_name
+                    product_name = row.get('product_name', '')
+                    if isinstance(product_name, dict):
+                        product_name = product_name.get('en_US', '') or product_name.get(list(product_name.keys())[0] if product_name else '', '')
+                    
+                    db_products[product_id] = {
+                        'product_id': product_id,
+                        'product_name': product_name,
+                        'default_code': row.get('default_code'),
+                        'barcode': row.get('barcode'),
+                        'default_uom_id': row.get('product_uom_id'),
+                        'purchase_ok': row.get('purchase_ok', False),
+                        'sale_ok': row.get('sale_ok', False),
+                        'product_type': row.get('product_type', ''),
+                        'product_categ_id': row.get('product_categ_id')
+                    }
             logger.info(f"Loaded {len(db_products)} products from database")
         except Exception as e:
             logger.error(f"Error querying database products: {e}", exc_info=True)
@@ -382,289 +429,305 @@ def execute_db_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any],
     ])
     similarity_threshold = stage_config.get('name_similarity_threshold', 0.80)
     
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy()
-        product_name = new_item.get('product_name', '')
-        canonical_key = new_item.get('canonical_product_key', product_name)
-        vendor_code = new_item.get('vendor_code', '')
-        raw_product_name = new_item.get('raw_product_name', product_name)
-        
-        # Store original matched product_id if exists
-        if 'product_id' in new_item and new_item['product_id']:
-            new_item['original_matched_product_id'] = new_item['product_id']
-        
-        # Costco organic abbreviation handling: strip "org" or "organic" prefix and re-run matching
-        # Pattern: ORG ..., ORGANIC ... from folder Costco/
-        stripped_name = None
-        stripped_canonical = None
-        if vendor_code == 'COSTCO' and not new_item.get('product_id'):
-            # Check if product_name or canonical_key starts with "org" or "organic"
-            if product_name.upper().startswith('ORG '):
-                stripped_name = product_name[4:].strip()
-            elif product_name.upper().startswith('ORGANIC '):
-                stripped_name = product_name[8:].strip()
-            
-            if canonical_key.lower().startswith('org '):
-                stripped_canonical = canonical_key[4:].strip()
-            elif canonical_key.lower().startswith('organic '):
-                stripped_canonical = canonical_key[8:].strip()
-            
-            if stripped_name:
-                logger.debug(f"Costco organic detected: {product_name} → {stripped_name}")
+    return {
+        'stage_config': stage_config,
+        'product_matcher': product_matcher,
+        'db_products': db_products,
+        'match_order': match_order,
+        'similarity_threshold': similarity_threshold,
+    }
+
+
+def apply_db_match_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    stage_config = state['stage_config']
+    product_matcher = state['product_matcher']
+    db_products = state['db_products']
+    match_order = state['match_order']
+    similarity_threshold = state['similarity_threshold']
+    
+    product_name = item.get('product_name', '')
+    canonical_key = item.get('canonical_product_key', product_name)
+    vendor_code = item.get('vendor_code', '')
+    raw_product_name = item.get('raw_product_name', product_name)
+    
+    # Store original matched product_id if exists
+    if 'product_id' in item and item['product_id']:
+        item['original_matched_product_id'] = item['product_id']
+    
+    # Costco organic abbreviation handling: strip "org" or "organic" prefix and re-run matching
+    # Pattern: ORG ..., ORGANIC ... from folder Costco/
+    stripped_name = None
+    stripped_canonical = None
+    if vendor_code == 'COSTCO' and not item.get('product_id'):
+        # Check if product_name or canonical_key starts with "org" or "organic"
+        if product_name.upper().startswith('ORG '):
+            stripped_name = product_name[4:].strip()
+        elif product_name.upper().startswith('ORGANIC '):
+            stripped_name = product_name[8:].strip()
+        
+        if canonical_key.lower().startswith('org '):
+            stripped_canonical = canonical_key[4:].strip()
+        elif canonical_key.lower().startswith('organic '):
+            stripped_canonical = canonical_key[8:].strip()
+        
+        if stripped_name:
+            logger.debug(f"Costco organic detected: {product_name} → {stripped_name}")
+    
+    # Try matching using ProductMatcher according to match_order
+    product_match = None
+    
+    for match_method in match_order:
+        if match_method == 'if_has_odoo_product_id_from_local':
+            # Check if item already has product_id from local data
+            if 'odoo_product_id' in item and item['odoo_product_id']:
+                product_id = item['odoo_product_id']
+                # Verify it exists in database
+                if product_id in db_products:
+                    product_match = {'product_id': product_id}
+                    break
         
-        # Try matching using ProductMatcher according to match_order
-        product_match = None
+        elif match_method == 'by_canonical_key':
+            # First try stripped canonical key for Costco organic items
+            if stripped_canonical:
+                product_match = product_matcher.match_product(stripped_canonical, min_similarity=similarity_threshold)
+                if product_match:
+                    logger.info(f"Matched Costco organic (stripped): {product_name} → {stripped_canonical} → product_id {product_match.get('product_id')}")
+                    break
+            # Then try original canonical key
+            if canonical_key and not product_match:
+                product_match = product_matcher.match_product(canonical_key, min_similarity=similarity_threshold)
+                if product_match:
+                    break
         
-        for match_method in match_order:
-            if match_method == 'if_has_odoo_product_id_from_local':
-                # Check if item already has product_id from local data
-                if 'odoo_product_id' in new_item and new_item['odoo_product_id']:
-                    product_id = new_item['odoo_product_id']
-                    # Verify it exists in database
-                    if product_id in db_products:
-                        product_match = {'product_id': product_id}
-                        break
-            
-            elif match_method == 'by_canonical_key':
-                # First try stripped canonical key for Costco organic items
-                if stripped_canonical:
-                    product_match = product_matcher.match_product(stripped_canonical, min_similarity=similarity_threshold)
-                    if product_match:
-                        logger.info(f"Matched Costco organic (stripped): {product_name} → {stripped_canonical} → product_id {product_match.get('product_id')}")
-                        break
-                # Then try original canonical key
-                if canonical_key and not product_match:
-                    product_match = product_matcher.match_product(canonical_key, min_similarity=similarity_threshold)
-                    if product_match:
-                        break
-            
-            elif match_method == 'by_barcode':
-                barcode = new_item.get('barcode')
-                if barcode:
-                    # Search in db_products by barcode
-                    for pid, db_prod in db_products.items():
-                        if db_prod.get('barcode') == barcode:
-                            product_match = {'product_id': pid}
-                            break
-                    if product_match:
+        elif match_method == 'by_barcode':
+            barcode = item.get('barcode')
+            if barcode:
+                # Search in db_products by barcode
+                for pid, db_prod in db_products.items():
+                    if db_prod.get('barcode') == barcode:
+                        product_match = {'product_id': pid}
                         break
-            
-            elif match_method == 'by_default_code':
-                default_code = new_item.get('default_code')
-                if default_code:
-                    # Search in db_products by default_code
-                    for pid, db_prod in db_products.items():
-                        if db_prod.get('default_code') == default_code:
-                            product_match = {'product_id': pid}
-                            break
-                    if product_match:
-                        break
-            
-            elif match_method == 'by_name_similarity':
-                # First try stripped name for Costco organic items
-                if stripped_name:
-                    product_match = product_matcher.match_product(stripped_name, min_similarity=similarity_threshold)
-                    if product_match:
-                        logger.info(f"Matched Costco organic (stripped name): {product_name} → {stripped_name} → product_id {product_match.get('product_id')}")
-                        break
-                # Then try original product_name
-                if product_name and product_name != canonical_key and not product_match:
-                    product_match = product_matcher.match_product(product_name, min_similarity=similarity_threshold)
-                    if product_match:
-                        break
-                elif product_name and not product_match:
-                    product_match = product_matcher.match_product(product_name, min_similarity=similarity_threshold)
-                    if product_match:
+                if product_match:
+                    break
+        
+        elif match_method == 'by_default_code':
+            default_code = item.get('default_code')
+            if default_code:
+                # Search in db_products by default_code
+                for pid, db_prod in db_products.items():
+                    if db_prod.get('default_code') == default_code:
+                        product_match = {'product_id': pid}
                         break
+                if product_match:
+                    break
         
-        if product_match:
-            product_id = product_match.get('product_id')
-            new_item['product_id'] = product_id
-            matched_name = product_match.get('full_name', product_match.get('name', product_name))
-            new_item['product_name'] = matched_name
-            
-            # For Costco organic items, if we matched after stripping, clear review reasons
-            if stripped_name or stripped_canonical:
-                # Remove "No product match found" review reason if it exists
-                if 'review_reasons' in new_item:
-                    new_item['review_reasons'] = [
-                        r for r in new_item['review_reasons'] 
-                        if not r.startswith('No product match found')
-                    ]
-                    if not new_item['review_reasons']:
-                        new_item['needs_review'] = False
-                        new_item.pop('review_reasons', None)
-                # Keep original text in raw_name field
-                if not new_item.get('raw_product_name'):
-                    new_item['raw_product_name'] = raw_product_name
-            
-            # Enrich with database product info if available
-            if product_id and product_id in db_products:
-                db_product = db_products[product_id]
-                new_item['product_categ_id'] = db_product.get('product_categ_id')
-                new_item['purchase_ok'] = db_product.get('purchase_ok')
-                new_item['sale_ok'] = db_product.get('sale_ok')
-                new_item['product_type'] = db_product.get('product_type')
-                if db_product.get('default_uom_id'):
-                    new_item['product_uom_id'] = db_product.get('default_uom_id')
-            
-            # Add UoM info from ProductMatcher
-            if 'product_uom_info' in product_match:
-                uom_info = product_match['product_uom_info']
-                if not new_item.get('product_uom_id'):
-                    new_item['product_uom_id'] = uom_info.get('id')
-                new_item['product_uom_name'] = uom_info.get('name')
+        elif match_method == 'by_name_similarity':
+            # First try stripped name for Costco organic items
+            if stripped_name:
+                product_match = product_matcher.match_product(stripped_name, min_similarity=similarity_threshold)
+                if product_match:
+                    logger.info(f"Matched Costco organic (stripped name): {product_name} → {stripped_name} → product_id {product_match.get('product_id')}")
+                    break
+            # Then try original product_name
+            if product_name and product_name != canonical_key and not product_match:
+                product_match = product_matcher.match_product(product_name, min_similarity=similarity_threshold)
+                if product_match:
+                    break
+            elif product_name and not product_match:
+                product_match = product_matcher.match_product(product_name, min_similarity=similarity_threshold)
+                if product_match:
+                    break
+    
+    if product_match:
+        product_id = product_match.get('product_id')
+        item['product_id'] = product_id
+        matched_name = product_match.get('full_name', product_match.get('name', product_name))
+        item['product_name'] = matched_name
+        
+        # For Costco organic items, if we matched after stripping, clear review reasons
+        if stripped_name or stripped_canonical:
+            # Remove "No product match found" review reason if it exists
+            if 'review_reasons' in item:
+                item['review_reasons'] = [
+                    r for r in item['review_reasons'] 
+                    if not r.startswith('No product match found')
+                ]
+                if not item['review_reasons']:
+                    item['needs_review'] = False
+                    item.pop('review_reasons', None)
+            # Keep original text in raw_name field
+            if not item.get('raw_product_name'):
+                item['raw_product_name'] = raw_product_name
+        
+        # Enrich with database product info if available
+        if product_id and product_id in db_products:
+            db_product = db_products[product_id]
+            item['product_categ_id'] = db_product.get('product_categ_id')
+            item['purchase_ok'] = db_product.get('purchase_ok')
+            item['sale_ok'] = db_product.get('sale_ok')
+            item['product_type'] = db_product.get('product_type')
+            if db_product.get('default_uom_id'):
+                item['product_uom_id'] = db_product.get('default_uom_id')
+        
+        # Add UoM info from ProductMatcher
+        if 'product_uom_info' in product_match:
+            uom_info = product_match['product_uom_info']
+            if not item.get('product_uom_id'):
+                item['product_uom_id'] = uom_info.get('id')
+            item['product_uom_name'] = uom_info.get('name')
+        
+        # Check purchase priority rules
+        purchase_priority = stage_config.get('purchase_priority', {})
+        if purchase_priority.get('enabled'):
+            purchase_ok = item.get('purchase_ok')
+            sale_ok = item.get('sale_ok')
             
-            # Check purchase priority rules
-            purchase_priority = stage_config.get('purchase_priority', {})
-            if purchase_priority.get('enabled'):
-                purchase_ok = new_item.get('purchase_ok')
-                sale_ok = new_item.get('sale_ok')
-                
-                rules = purchase_priority.get('rules', [])
-                for rule in rules:
-                    if rule.get('prefer_if') == 'purchase_ok = true':
-                        if purchase_ok:
-                            break  # OK, no review needed
-                    elif rule.get('else_if') == 'sale_ok = true':
-                        if sale_ok:
-                            if rule.get('set_flag'):
-                                new_item['needs_review'] = True
-                                if 'review_reasons' not in new_item:
-                                    new_item['review_reasons'] = []
-                                if rule.get('review_reason'):
-                                    new_item['review_reasons'].append(rule['review_reason'])
-                            break
-                    elif rule.get('else'):
-                        # Final fallback
+            rules = purchase_priority.get('rules', [])
+            for rule in rules:
+                if rule.get('prefer_if') == 'purchase_ok = true':
+                    if purchase_ok:
+                        break  # OK, no review needed
+                elif rule.get('else_if') == 'sale_ok = true':
+                    if sale_ok:
                         if rule.get('set_flag'):
-                            new_item['needs_review'] = True
-                            if 'review_reasons' not in new_item:
-                                new_item['review_reasons'] = []
+                            item['needs_review'] = True
+                            if 'review_reasons' not in item:
+                                item['review_reasons'] = []
                             if rule.get('review_reason'):
-                                new_item['review_reasons'].append(rule['review_reason'])
-            
-            # Post-match category check
-            category_check = stage_config.get('post_match_category_check', {})
-            if category_check.get('enabled'):
-                # Category checks would go here if we loaded category data
-                # For now, just log that we'd check categories
-                pass
-        else:
-            logger.warning(f"No product match for: {product_name} (canonical: {canonical_key})")
-            new_item['needs_review'] = True
-            if 'review_reasons' not in new_item:
-                new_item['review_reasons'] = []
-            new_item['review_reasons'].append(f"No product match found for: {product_name}")
-            
-            # For RD items, if vendor-specific mapping was used but still not found, add specific reason
-            if vendor_code == 'RD' and new_item.get('canonical_product_key', '').startswith('rd_'):
-                # Check if RD code was mapped but still not found in database
-                if not any(r.startswith('RD code not in') for r in new_item.get('review_reasons', [])):
-                    new_item['review_reasons'].append("RD code not in rd_item_map.csv")
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in db_match stage")
-    return transformed_items
+                                item['review_reasons'].append(rule['review_reason'])
+                        break
+                elif rule.get('else'):
+                    # Final fallback
+                    if rule.get('set_flag'):
+                        item['needs_review'] = True
+                        if 'review_reasons' not in item:
+                            item['review_reasons'] = []
+                        if rule.get('review_reason'):
+                            item['review_reasons'].append(rule['review_reason'])
+        
+        # Post-match category check
+        category_check = stage_config.get('post_match_category_check', {})
+        if category_check.get('enabled'):
+            # Category checks would go here if we loaded category data
+            # For now, just log that we'd check categories
+            pass
+    else:
+        logger.warning(f"No product match for: {product_name} (canonical: {canonical_key})")
+        item['needs_review'] = True
+        if 'review_reasons' not in item:
+            item['review_reasons'] = []
+        item['review_reasons'].append(f"No product match found for: {product_name}")
+        
+        # For RD items, if vendor-specific mapping was used but still not found, add specific reason
+        if vendor_code == 'RD' and item.get('canonical_product_key', '').startswith('rd_'):
+            # Check if RD code was mapped but still not found in database
+            if not any(r.startswith('RD code not in') for r in item.get('review_reasons', [])):
+                item['review_reasons'].append("RD code not in rd_item_map.csv")
+    
+    return item
 
 
-def execute_usage_probe_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 05_usage_probe.yaml stage - probe product usage in system"""
-    logger.info("Executing usage_probe stage...")
-    
-    stage_config = config.get('usage_probe', {})
+def execute_db_match_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 04_db_match.yaml stage - match products to database"""
+    logger.info("Executing db_match stage...")
+    return _execute_item_stage('db_match', items, config, context)
+
+
+def prepare_usage_probe_stage(stage_config: Dict[str, Any], context: Dict[str, Any],
+                              product_ids: Optional[Set[int]] = None) -> Optional[Dict[str, Any]]:
     db_conn = context.get('db_conn')
     
     if not db_conn:
         logger.warning("No database connection for usage_probe stage, skipping")
-        return items
+        return None
     
-    # Query usage data
+    # Query usage data for the products of the items reaching this stage
     usage_data = {}
     queries = stage_config.get('queries', {})
-    time_window = stage_config.get('time_window', {}).get('days_back', 180)
+    params = query_params(stage_config, product_ids)
     
     try:
-        from psycopg2.extras import RealDictCursor
-        with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Sales usage
-            if 'sales_usage' in queries:
-                query = queries['sales_usage'].replace('180', str(time_window))
-                cur.execute(query)
-                for row in cur.fetchall():
-                    product_id = row['product_id']
-                    if product_id not in usage_data:
-                        usage_data[product_id] = {}
-                    usage_data[product_id]['so_line_count'] = row['so_line_count']
-                    usage_data[product_id]['so_qty'] = float(row['so_qty']) if row['so_qty'] else 0
-            
-            # Inventory usage
-            if 'inventory_usage' in queries:
-                query = queries['inventory_usage'].replace('180', str(time_window))
-                cur.execute(query)
-                for row in cur.fetchall():
-                    product_id = row['product_id']
-                    if product_id not in usage_data:
-                        usage_data[product_id] = {}
-                    usage_data[product_id]['move_count'] = row['move_count']
-                    usage_data[product_id]['move_qty'] = float(row['move_qty']) if row['move_qty'] else 0
-            
-            # Manufacturing usage
-            if 'manufacturing_usage' in queries:
-                cur.execute(queries['manufacturing_usage'])
-                for row in cur.fetchall():
-                    product_id = row['product_id']
-                    if product_id not in usage_data:
-                        usage_data[product_id] = {}
-                    usage_data[product_id]['bom_line_count'] = row['bom_line_count']
+        # Sales usage
+        if 'sales_usage' in queries:
+            for row in stage_query_rows(context, 'usage_probe', 'sales_usage', queries['sales_usage'], params, windowed=True):
+                product_id = row['product_id']
+                if product_id not in usage_data:
+                    usage_data[product_id] = {}
+                usage_data[product_id]['so_line_count'] = row['so_line_count']
+                usage_data[product_id]['so_qty'] = float(row['so_qty']) if row['so_qty'] else 0
+        
+        # Inventory usage
+        if 'inventory_usage' in queries:
+            for row in stage_query_rows(context, 'usage_probe', 'inventory_usage', queries['inventory_usage'], params, windowed=True):
+                product_id = row['product_id']
+                if product_id not in usage_data:
+                    usage_data[product_id] = {}
+                usage_data[product_id]['move_count'] = row['move_count']
+                usage_data[product_id]['move_qty'] = float(row['move_qty']) if row['move_qty'] else 0
+        
+        # Manufacturing usage
+        if 'manufacturing_usage' in queries:
+            for row in stage_query_rows(context, 'usage_probe', 'manufacturing_usage', queries['manufacturing_usage'], params):
+                product_id = row['product_id']
+                if product_id not in usage_data:
+                    usage_data[product_id] = {}
+                usage_data[product_id]['bom_line_count'] = row['bom_line_count']
     except Exception as e:
         logger.error(f"Error querying usage data: {e}")
     
+    logger.info(f"Loaded usage for {len(usage_data)} of {len(params['product_ids'])} matched products")
+    
+    return {
+        'usage_data': usage_data,
+        'infer_rules': stage_config.get('infer_role', []),
+    }
+
+
+def apply_usage_probe_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    usage_data = state['usage_data']
     # Apply inference rules
-    infer_rules = stage_config.get('infer_role', [])
-    transformed_items = []
+    infer_rules = state['infer_rules']
+    product_id = item.get('product_id')
     
-    for item in items:
-        new_item = item.copy()
-        product_id = new_item.get('product_id')
+    if product_id and product_id in usage_data:
+        usage = usage_data[product_id]
         
-        if product_id and product_id in usage_data:
-            usage = usage_data[product_id]
+        # Apply inference rules
+        for rule in infer_rules:
+            rule_name = rule.get('name', '')
+            when = rule.get('when', {})
+            set_fields = rule.get('set', {})
             
-            # Apply inference rules
-            for rule in infer_rules:
-                rule_name = rule.get('name', '')
-                when = rule.get('when', {})
-                set_fields = rule.get('set', {})
-                
-                matches = True
-                for key, condition in when.items():
-                    if key in usage:
-                        value = usage[key]
-                        if '>' in condition:
-                            threshold = float(condition.split('>')[1].strip())
-                            if not (value > threshold):
-                                matches = False
-                                break
-                
-                if matches:
-                    for key, value in set_fields.items():
-                        new_item[key] = value
-        
-        transformed_items.append(new_item)
+            matches = True
+            for key, condition in when.items():
+                if key in usage:
+                    value = usage[key]
+                    if '>' in condition:
+                        threshold = float(condition.split('>')[1].strip())
+                        if not (value > threshold):
+                            matches = False
+                            break
+            
+            if matches:
+                for key, value in set_fields.items():
+                    item[key] = value
     
-    logger.info(f"Processed {len(transformed_items)} items in usage_probe stage")
-    return transformed_items
+    return item
 
 
-def execute_uom_mapping_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 06_uom.yaml stage - map UoMs and validate category consistency"""
-    logger.info("Executing uom_mapping stage...")
-    
-    stage_config = config.get('uom_mapping', {})
+def execute_usage_probe_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 05_usage_probe.yaml stage - probe product usage in system"""
+    logger.info("Executing usage_probe stage...")
+    return _execute_item_stage('usage_probe', items, config, context)
+
+
+# Resolution of one (receipt UoM, product default UoM) pair in the uom_mapping stage
+UomResolution = namedtuple('UomResolution', 'matched receipt_uom_id receipt_uom_name '
+                                            'receipt_uom_category_id receipt_uom_category_name '
+                                            'product_uom_category_id product_uom_category_name category_mismatch')
+
+
+def prepare_uom_mapping_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     product_matcher = context.get('product_matcher')
     db_conn = context.get('db_conn')
     
@@ -676,186 +739,205 @@ def execute_uom_mapping_stage(items: List[Dict[str, Any]], config: Dict[str, Any
     uom_categories = {}  # {uom_id: {'category_id': ..., 'category_name': ...}}
     if db_conn:
         try:
-            from psycopg2.extras import RealDictCursor
-            from .query_database import get_uom_categories
-            uom_categories = get_uom_categories(db_conn)
+            uom_categories = uom_categories_from_rows(
+                stage_query_rows(context, 'uom_mapping', 'uom_categories', UOM_CATEGORIES_QUERY, {}))
             logger.info(f"Loaded {len(uom_categories)} UoM category mappings from database")
         except Exception as e:
             logger.warning(f"Could not load UoM categories from database: {e}")
     
-    transformed_items = []
+    return {
+        'stage_config': stage_config,
+        'product_matcher': product_matcher,
+        'receipt_uom_field': receipt_uom_field,
+        'normalize_config': normalize_config,
+        'alias_config': alias_config,
+        'uom_categories': uom_categories,
+        # uom_id -> (category_id, category_name); UoMs are compatible when their category ids are equal
+        'uom_category': {uom_id: (category.get('category_id'), category.get('category_name'))
+                         for uom_id, category in uom_categories.items()},
+        'review_reason': stage_config.get('if_category_mismatch', {}).get('add_review_reason', 'UoM category mismatch'),
+        # (receipt UoM, product UoM id) -> UomResolution, filled as pairs are seen
+        'resolutions': {},
+    }
+
+
+def _normalize_receipt_uom(receipt_uom: str, normalize_config: Dict[str, Any], alias_config: Dict[str, Any]) -> str:
+    normalized_uom = receipt_uom
+    if normalize_config.get('lowercase'):
+        normalized_uom = normalized_uom.lower()
+    if normalize_config.get('strip_spaces'):
+        normalized_uom = normalized_uom.strip()
+    
+    # Apply aliases
+    for canonical, aliases in alias_config.items():
+        if normalized_uom in aliases:
+            return canonical
+    return normalized_uom
+
+
+def _resolve_uom(receipt_uom: str, product_uom_id, state: Dict[str, Any]) -> UomResolution:
+    """Match a receipt UoM and check its category against the product default UoM's"""
+    uom_category = state['uom_category']
+    normalized_uom = _normalize_receipt_uom(receipt_uom, state['normalize_config'], state['alias_config'])
+    
+    # Try to match UoM using ProductMatcher
+    uom_match = None
+    if state['product_matcher']:
+        uom_match = state['product_matcher'].match_uom(normalized_uom)
+    
+    receipt_uom_id = None
+    receipt_uom_name = None
+    receipt_category = (None, None)
+    if uom_match:
+        receipt_uom_id = uom_match.get('id')
+        receipt_uom_name = uom_match.get('name')
+        if receipt_uom_id and receipt_uom_id in uom_category:
+            receipt_category = uom_category[receipt_uom_id]
+    
+    product_category = (None, None)
+    if product_uom_id and product_uom_id in uom_category:
+        product_category = uom_category[product_uom_id]
+    
+    category_mismatch = None  # Unknown
+    if receipt_category[0] and product_category[0]:
+        category_mismatch = receipt_category[0] != product_category[0]
+    
+    return UomResolution(bool(uom_match), receipt_uom_id, receipt_uom_name, *receipt_category, *product_category,
+                         category_mismatch)
+
+
+def apply_uom_mapping_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    receipt_uom_field = state['receipt_uom_field']
+    
+    # Get receipt UoM from various possible fields
+    receipt_uom = ''
+    if receipt_uom_field in item:
+        receipt_uom = str(item.get(receipt_uom_field, ''))
+    else:
+        # Try common field names
+        receipt_uom = str(item.get('purchase_uom', item.get('uom', item.get('unit', ''))))
     
-    for item in items:
-        new_item = item.copy()
-        
-        # Get receipt UoM from various possible fields
-        receipt_uom = ''
-        if receipt_uom_field in new_item:
-            receipt_uom = str(new_item.get(receipt_uom_field, ''))
-        else:
-            # Try common field names
-            receipt_uom = str(new_item.get('purchase_uom', new_item.get('uom', new_item.get('unit', ''))))
-        
-        receipt_uom = receipt_uom.lower().strip() if receipt_uom else ''
-        
-        # Normalize receipt UoM
-        normalized_uom = receipt_uom
-        if normalize_config.get('lowercase'):
-            normalized_uom = normalized_uom.lower()
-        if normalize_config.get('strip_spaces'):
-            normalized_uom = normalized_uom.strip()
-        
-        # Apply aliases
-        for canonical, aliases in alias_config.items():
-            if normalized_uom in aliases:
-                normalized_uom = canonical
-                break
-        
-        # Get product UoM from product_match
-        product_uom_id = new_item.get('product_uom_id')
-        
-        # Store original receipt UoM (what we parsed from receipt)
-        receipt_uom_id = None
-        receipt_uom_category_id = None
-        receipt_uom_category_name = None
-        
-        # Try to match UoM using ProductMatcher
-        uom_match = None
-        if product_matcher:
-            uom_match = product_matcher.match_uom(normalized_uom)
-        
-        if uom_match:
-            receipt_uom_id = uom_match.get('id')
-            new_item['final_uom_id'] = receipt_uom_id
-            new_item['final_uom_name'] = uom_match.get('name')
-            # Get receipt UoM category from database
-            if receipt_uom_id and receipt_uom_id in uom_categories:
-                receipt_uom_category_id = uom_categories[receipt_uom_id].get('category_id')
-                receipt_uom_category_name = uom_categories[receipt_uom_id].get('category_name')
-        elif product_uom_id:
-            # Fallback to product default UoM
-            new_item['final_uom_id'] = product_uom_id
-            new_item['uom_conflict'] = True
-            new_item['needs_review'] = True
-            if 'review_reasons' not in new_item:
-                new_item['review_reasons'] = []
-            new_item['review_reasons'].append(stage_config.get('if_category_mismatch', {}).get('add_review_reason', 'UoM category mismatch'))
-        else:
-            new_item['needs_review'] = True
-            if 'review_reasons' not in new_item:
-                new_item['review_reasons'] = []
-            new_item['review_reasons'].append("No UoM could be mapped")
-        
-        # Get product UoM category
-        product_uom_category_id = None
-        product_uom_category_name = None
-        if product_uom_id and product_uom_id in uom_categories:
-            product_uom_category_id = uom_categories[product_uom_id].get('category_id')
-            product_uom_category_name = uom_categories[product_uom_id].get('category_name')
-        
-        # Add UoM category info to item
-        new_item['receipt_uom_id'] = receipt_uom_id
-        new_item['receipt_uom_category_id'] = receipt_uom_category_id
-        new_item['receipt_uom_category_name'] = receipt_uom_category_name
-        new_item['product_uom_category_id'] = product_uom_category_id
-        new_item['product_uom_category_name'] = product_uom_category_name
-        
-        # Check for UoM category mismatch
-        uom_category_mismatch = False
-        if receipt_uom_category_id and product_uom_category_id:
-            if receipt_uom_category_id != product_uom_category_id:
-                uom_category_mismatch = True
-                new_item['uom_category_mismatch'] = True
-                new_item['needs_review'] = True
-                if 'review_reasons' not in new_item:
-                    new_item['review_reasons'] = []
-                if not any('UoM category mismatch' in r for r in new_item['review_reasons']):
-                    new_item['review_reasons'].append("UoM category mismatch: receipt UoM category != product default UoM category")
-            else:
-                new_item['uom_category_mismatch'] = False
-        else:
-            new_item['uom_category_mismatch'] = None  # Unknown
-        
-        transformed_items.append(new_item)
+    receipt_uom = receipt_uom.lower().strip() if receipt_uom else ''
     
-    logger.info(f"Processed {len(transformed_items)} items in uom_mapping stage")
-    return transformed_items
+    # Get product UoM from product_match
+    product_uom_id = item.get('product_uom_id')
+    
+    # Resolve each distinct (receipt UoM, product UoM) pair once
+    key = (receipt_uom, product_uom_id)
+    try:
+        resolution = state['resolutions'][key]
+    except KeyError:
+        resolution = state['resolutions'][key] = _resolve_uom(receipt_uom, product_uom_id, state)
+    except TypeError:
+        resolution = _resolve_uom(receipt_uom, product_uom_id, state)
+    
+    if resolution.matched:
+        item['final_uom_id'] = resolution.receipt_uom_id
+        item['final_uom_name'] = resolution.receipt_uom_name
+    elif product_uom_id:
+        # Fallback to product default UoM
+        item['final_uom_id'] = product_uom_id
+        item['uom_conflict'] = True
+        item['needs_review'] = True
+        if 'review_reasons' not in item:
+            item['review_reasons'] = []
+        item['review_reasons'].append(state['review_reason'])
+    else:
+        item['needs_review'] = True
+        if 'review_reasons' not in item:
+            item['review_reasons'] = []
+        item['review_reasons'].append("No UoM could be mapped")
+    
+    # Add UoM category info to item
+    item['receipt_uom_id'] = resolution.receipt_uom_id
+    item['receipt_uom_category_id'] = resolution.receipt_uom_category_id
+    item['receipt_uom_category_name'] = resolution.receipt_uom_category_name
+    item['product_uom_category_id'] = resolution.product_uom_category_id
+    item['product_uom_category_name'] = resolution.product_uom_category_name
+    
+    # Check for UoM category mismatch
+    item['uom_category_mismatch'] = resolution.category_mismatch
+    if resolution.category_mismatch:
+        item['needs_review'] = True
+        if 'review_reasons' not in item:
+            item['review_reasons'] = []
+        if not any('UoM category mismatch' in r for r in item['review_reasons']):
+            item['review_reasons'].append("UoM category mismatch: receipt UoM category != product default UoM category")
+    
+    return item
+
+
+def execute_uom_mapping_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 06_uom.yaml stage - map UoMs and validate category consistency"""
+    logger.info("Executing uom_mapping stage...")
+    return _execute_item_stage('uom_mapping', items, config, context)
+
+
+def prepare_enrichment_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return {
+        'defaults': stage_config.get('defaults', {}),
+        'unit_price_prefer': stage_config.get('unit_price', {}).get('prefer_order', ['unit_price']),
+        'quantity_prefer': stage_config.get('quantity', {}).get('prefer_order', ['quantity']),
+        'line_total_config': stage_config.get('line_total', {}),
+    }
+
+
+def apply_enrichment_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    # Preferred fields are read from the item as it entered the stage
+    unit_price = _first_present(item, state['unit_price_prefer'])
+    quantity = _first_present(item, state['quantity_prefer'])
+    
+    # Set unit_price / quantity from preferred field
+    if unit_price is not None:
+        item['unit_price'] = unit_price
+    if quantity is not None:
+        item['quantity'] = quantity
+    
+    # Recompute line_total if missing
+    if state['line_total_config'].get('recompute_if_missing') and not item.get('line_total'):
+        unit_price = item.get('unit_price', 0)
+        quantity = item.get('quantity', 0)
+        if unit_price and quantity:
+            item['line_total'] = float(unit_price) * float(quantity)
+    
+    # Apply defaults
+    for key, value in state['defaults'].items():
+        if key not in item or item[key] is None:
+            item[key] = value
+    
+    return item
+
+
+def _first_present(item: Dict[str, Any], fields: List[str]) -> Any:
+    for field in fields:
+        if field in item and item[field] is not None:
+            return item[field]
+    return None
 
 
 def execute_enrichment_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Execute 07_enrichment.yaml stage - enrich items with additional data"""
     logger.info("Executing enrichment stage...")
-    
-    stage_config = config.get('enrichment', {})
-    defaults = stage_config.get('defaults', {})
-    unit_price_prefer = stage_config.get('unit_price', {}).get('prefer_order', ['unit_price'])
-    quantity_prefer = stage_config.get('quantity', {}).get('prefer_order', ['quantity'])
-    line_total_config = stage_config.get('line_total', {})
-    preserve_original = stage_config.get('preserve_original_fields', True)
-    
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy() if preserve_original else {}
-        if preserve_original:
-            # Already copied
-            pass
-        else:
-            # Copy only needed fields
-            new_item.update(item)
-        
-        # Set unit_price from preferred field
-        for field in unit_price_prefer:
-            if field in item and item[field] is not None:
-                new_item['unit_price'] = item[field]
-                break
-        
-        # Set quantity from preferred field
-        for field in quantity_prefer:
-            if field in item and item[field] is not None:
-                new_item['quantity'] = item[field]
-                break
-        
-        # Recompute line_total if missing
-        if line_total_config.get('recompute_if_missing') and not new_item.get('line_total'):
-            unit_price = new_item.get('unit_price', 0)
-            quantity = new_item.get('quantity', 0)
-            if unit_price and quantity:
-                new_item['line_total'] = float(unit_price) * float(quantity)
-        
-        # Apply defaults
-        for key, value in defaults.items():
-            if key not in new_item or new_item[key] is None:
-                new_item[key] = value
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in enrichment stage")
-    return transformed_items
+    return _execute_item_stage('enrichment', items, config, context)
 
 
-def execute_bom_protection_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Execute 08_bom_protection.yaml stage - check BoM protection"""
-    logger.info("Executing bom_protection stage...")
-    
-    stage_config = config.get('bom_protection', {})
+def prepare_bom_protection_stage(stage_config: Dict[str, Any], context: Dict[str, Any],
+                                 product_ids: Optional[Set[int]] = None) -> Optional[Dict[str, Any]]:
     db_conn = context.get('db_conn')
     
-    # Query BoM data
+    # Query BoM data (only lines using the products of the items reaching this stage)
     products_in_bom = set()
     if db_conn and 'db_queries' in stage_config:
         try:
-            from psycopg2.extras import RealDictCursor
             queries = stage_config.get('db_queries', {})
             
-            with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Get products used in BoMs
-                if 'bom_lines' in queries:
-                    cur.execute(queries['bom_lines'])
-                    for row in cur.fetchall():
-                        product_id = row['component_product_id']
-                        if product_id:
-                            products_in_bom.add(product_id)
+            # Get products used in BoMs
+            if 'bom_lines' in queries:
+                for row in stage_query_rows(context, 'bom_protection', 'bom_lines', queries['bom_lines'],
+                                            query_params(stage_config, product_ids)):
+                    product_id = row['component_product_id']
+                    if product_id:
+                        products_in_bom.add(product_id)
         except Exception as e:
             logger.error(f"Error querying BoM data: {e}")
     else:
@@ -863,143 +945,140 @@ def execute_bom_protection_stage(items: List[Dict[str, Any]], config: Dict[str,
     
     context['products_in_bom'] = products_in_bom
     
-    # Apply BoM protection rules
-    rules = stage_config.get('rules', [])
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy()
-        product_id = new_item.get('product_id')
-        original_product_id = new_item.get('original_matched_product_id', product_id)
-        
-        # Check if product is in BoM
-        if product_id and product_id in products_in_bom:
-            new_item['bom_protected'] = True
-        
-        # Apply rules
-        for rule in rules:
-            rule_name = rule.get('name', '')
-            when = rule.get('when', {})
-            action = rule.get('action', {})
-            
-            matches = True
-            if 'this.product_id IN (products_used_in_bom)' in str(when):
-                if product_id not in products_in_bom:
-                    matches = False
-            elif 'this.original_matched_product_id IN (products_used_in_bom)' in str(when):
-                if original_product_id not in products_in_bom:
-                    matches = False
-                if matches and product_id != original_product_id:
-                    # Force original product ID
-                    if 'force_product_id' in action:
-                        new_item['product_id'] = original_product_id
-                    if action.get('needs_review'):
-                        new_item['needs_review'] = True
-                        if 'review_reasons' not in new_item:
-                            new_item['review_reasons'] = []
-                        if action.get('add_reason'):
-                            new_item['review_reasons'].append(action['add_reason'])
-            
-            if matches:
-                for key, value in action.items():
-                    if key not in ['force_product_id', 'needs_review', 'add_reason']:
-                        new_item[key] = value
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in bom_protection stage")
-    return transformed_items
+    return {
+        'products_in_bom': products_in_bom,
+        'rules': stage_config.get('rules', []),
+    }
+
+
+def apply_bom_protection_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    products_in_bom = state['products_in_bom']
+    rules = state['rules']
+    product_id = item.get('product_id')
+    original_product_id = item.get('original_matched_product_id', product_id)
+    
+    # Check if product is in BoM
+    if product_id and product_id in products_in_bom:
+        item['bom_protected'] = True
+    
+    # Apply rules
+    for rule in rules:
+        rule_name = rule.get('name', '')
+        when = rule.get('when', {})
+        action = rule.get('action', {})
+        
+        matches = True
+        if 'this.product_id IN (products_used_in_bom)' in str(when):
+            if product_id not in products_in_bom:
+                matches = False
+        elif 'this.original_matched_product_id IN (products_used_in_bom)' in str(when):
+            if original_product_id not in products_in_bom:
+                matches = False
+            if matches and product_id != original_product_id:
+                # Force original product ID
+                if 'force_product_id' in action:
+                    item['product_id'] = original_product_id
+                if action.get('needs_review'):
+                    item['needs_review'] = True
+                    if 'review_reasons' not in item:
+                        item['review_reasons'] = []
+                    if action.get('add_reason'):
+                        item['review_reasons'].append(action['add_reason'])
+        
+        if matches:
+            for key, value in action.items():
+                if key not in ['force_product_id', 'needs_review', 'add_reason']:
+                    item[key] = value
+    return item
+
+
+def execute_bom_protection_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute 08_bom_protection.yaml stage - check BoM protection"""
+    logger.info("Executing bom_protection stage...")
+    return _execute_item_stage('bom_protection', items, config, context)
+
+
+def prepare_validation_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return {'checks': stage_config.get('checks', [])}
+
+
+def apply_validation_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    # Apply validation checks
+    for check in state['checks']:
+        condition = check.get('if', '')
+        mark_review = check.get('mark_review', False)
+        add_reason = check.get('add_reason', '')
+        
+        # Parse condition
+        if condition.endswith(' is null'):
+            field = condition.replace(' is null', '').strip()
+            if not item.get(field):
+                if mark_review:
+                    item['needs_review'] = True
+                    if 'review_reasons' not in item:
+                        item['review_reasons'] = []
+                    if add_reason:
+                        item['review_reasons'].append(add_reason)
+        
+        elif ' <= 0' in condition:
+            field = condition.replace(' <= 0', '').strip()
+            if item.get(field, 0) <= 0:
+                if mark_review:
+                    item['needs_review'] = True
+                    if 'review_reasons' not in item:
+                        item['review_reasons'] = []
+                    if add_reason:
+                        item['review_reasons'].append(add_reason)
+        
+        elif condition.endswith(' == true'):
+            field = condition.replace(' == true', '').strip()
+            if item.get(field) is True:
+                if mark_review:
+                    item['needs_review'] = True
+                    if 'review_reasons' not in item:
+                        item['review_reasons'] = []
+                    if add_reason:
+                        item['review_reasons'].append(add_reason)
+    return item
 
 
 def execute_validation_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Execute 09_validation.yaml stage - final validation checks"""
     logger.info("Executing validation stage...")
+    return _execute_item_stage('validation', items, config, context)
+
+
+def prepare_outputs_stage(stage_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    schema = stage_config.get('mapped_items', {}).get('schema', {})
+    return {
+        'required_fields': schema.get('required', []),
+        'optional_fields': schema.get('optional', []),
+    }
+
+
+def apply_outputs_stage(item: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter and format an item according to schema (returns a new item)"""
+    new_item = {}
+    
+    # Include required fields
+    for field in state['required_fields']:
+        if field in item:
+            new_item[field] = item[field]
+        else:
+            logger.warning(f"Required field {field} missing in item: {item.get('product_name', 'unknown')}")
     
-    stage_config = config.get('validation', {})
-    checks = stage_config.get('checks', [])
-    
-    transformed_items = []
-    
-    for item in items:
-        new_item = item.copy()
-        
-        # Apply validation checks
-        for check in checks:
-            condition = check.get('if', '')
-            mark_review = check.get('mark_review', False)
-            add_reason = check.get('add_reason', '')
-            
-            # Parse condition
-            if condition.endswith(' is null'):
-                field = condition.replace(' is null', '').strip()
-                if not new_item.get(field):
-                    if mark_review:
-                        new_item['needs_review'] = True
-                        if 'review_reasons' not in new_item:
-                            new_item['review_reasons'] = []
-                        if add_reason:
-                            new_item['review_reasons'].append(add_reason)
-            
-            elif ' <= 0' in condition:
-                field = condition.replace(' <= 0', '').strip()
-                if new_item.get(field, 0) <= 0:
-                    if mark_review:
-                        new_item['needs_review'] = True
-                        if 'review_reasons' not in new_item:
-                            new_item['review_reasons'] = []
-                        if add_reason:
-                            new_item['review_reasons'].append(add_reason)
-            
-            elif condition.endswith(' == true'):
-                field = condition.replace(' == true', '').strip()
-                if new_item.get(field) is True:
-                    if mark_review:
-                        new_item['needs_review'] = True
-                        if 'review_reasons' not in new_item:
-                            new_item['review_reasons'] = []
-                        if add_reason:
-                            new_item['review_reasons'].append(add_reason)
-        
-        transformed_items.append(new_item)
+    # Include optional fields if present
+    for field in state['optional_fields']:
+        if field in item:
+            new_item[field] = item[field]
     
-    logger.info(f"Processed {len(transformed_items)} items in validation stage")
-    return transformed_items
+    return new_item
 
 
 def execute_outputs_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Execute 10_outputs.yaml stage - prepare final output"""
     logger.info("Executing outputs stage...")
-    
-    stage_config = config.get('outputs', {})
-    mapped_items_config = stage_config.get('mapped_items', {})
-    schema = mapped_items_config.get('schema', {})
-    
-    # Filter and format items according to schema
-    required_fields = schema.get('required', [])
-    optional_fields = schema.get('optional', [])
-    all_fields = required_fields + optional_fields
-    
-    transformed_items = []
-    
-    for item in items:
-        new_item = {}
-        
-        # Include required fields
-        for field in required_fields:
-            if field in item:
-                new_item[field] = item[field]
-            else:
-                logger.warning(f"Required field {field} missing in item: {item.get('product_name', 'unknown')}")
-        
-        # Include optional fields if present
-        for field in optional_fields:
-            if field in item:
-                new_item[field] = item[field]
-        
-        transformed_items.append(new_item)
-    
-    logger.info(f"Processed {len(transformed_items)} items in outputs stage")
-    return transformed_items
+    return _execute_item_stage('outputs', items, config, context, copy_items=False)
 
 
 def execute_quality_report_stage(items: List[Dict[str, Any]], config: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -1140,6 +1219,40 @@ def generate_csv_quality_report(items: List[Dict[str, Any]], config: Dict[str, A
             writer.writerow(row)
 
 
+# Per-item stages: stage key -> (prepare, apply)
+# prepare(stage_config, context) returns the stage state, or None to skip the stage;
+# apply(item, state) updates the item in place and returns it (outputs returns a new item)
+ITEM_STAGES = {
+    'inputs': (prepare_inputs_stage, apply_inputs_stage),
+    'vendor_match': (prepare_vendor_match_stage, apply_vendor_match_stage),
+    'product_canonicalization': (prepare_product_canonicalization_stage, apply_product_canonicalization_stage),
+    'db_match': (prepare_db_match_stage, apply_db_match_stage),
+    'usage_probe': (prepare_usage_probe_stage, apply_usage_probe_stage),
+    'uom_mapping': (prepare_uom_mapping_stage, apply_uom_mapping_stage),
+    'enrichment': (prepare_enrichment_stage, apply_enrichment_stage),
+    'bom_protection': (prepare_bom_protection_stage, apply_bom_protection_stage),
+    'validation': (prepare_validation_stage, apply_validation_stage),
+    'outputs': (prepare_outputs_stage, apply_outputs_stage),
+}
+
+# Stages whose prepare step takes the product IDs of the items reaching them
+# (product_ids=...), so their DB queries only cover matched products
+PRODUCT_ID_STAGES = {'usage_probe', 'bom_protection'}
+# Stages that set item product IDs
+PRODUCT_ID_SETTERS = {'db_match', 'bom_protection'}
+
+
+def collect_product_ids(items: Iterable[Dict[str, Any]]) -> Set[int]:
+    """Matched (and originally matched) product IDs of the items"""
+    product_ids = set()
+    for item in items:
+        for field in ('product_id', 'original_matched_product_id'):
+            value = item.get(field)
+            if isinstance(value, int) and not isinstance(value, bool):
+                product_ids.add(value)
+    return product_ids
+
+
 # Mapping of stage keys to execution functions
 STAGE_EXECUTORS = {
     'inputs': execute_inputs_stage,
@@ -1156,6 +1269,36 @@ STAGE_EXECUTORS = {
 }
 
 
+def _execute_item_stage(stage_key: str, items: List[Dict[str, Any]], config: Dict[str, Any],
+                        context: Dict[str, Any], copy_items: bool = True) -> List[Dict[str, Any]]:
+    """Run one per-item stage over all items, each on a copy of the incoming item"""
+    prepare, apply = ITEM_STAGES[stage_key]
+    if stage_key in PRODUCT_ID_STAGES:
+        product_ids = collect_product_ids(items)
+        prefetch_stage_queries([(stage_key, config.get(stage_key, {}))], context, product_ids)
+        state = prepare(config.get(stage_key, {}), context, product_ids=product_ids)
+    else:
+        state = prepare(config.get(stage_key, {}), context)
+    if state is None:
+        return items
+    
+    if copy_items:
+        transformed_items = [apply(item.copy(), state) for item in items]
+    else:
+        transformed_items = [apply(item, state) for item in items]
+    
+    logger.info(f"Processed {len(transformed_items)} items in {stage_key} stage")
+    return transformed_items
+
+
+def get_stage_key(rule_data: Dict[str, Any]) -> Optional[str]:
+    """Top-level stage key of a rule file (skips meta and internal keys)"""
+    for key in rule_data.keys():
+        if key != 'meta' and not key.startswith('_'):
+            return key
+    return None
+
+
 def execute_stage(items: List[Dict[str, Any]], rule_file: str, rule_loader, context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Execute a single rule stage
@@ -1175,11 +1318,7 @@ def execute_stage(items: List[Dict[str, Any]], rule_file: str, rule_loader, cont
         return items
     
     # Detect top-level key (skip meta and internal keys)
-    top_level_key = None
-    for key in rule_data.keys():
-        if key != 'meta' and not key.startswith('_'):
-            top_level_key = key
-            break
+    top_level_key = get_stage_key(rule_data)
     
     if not top_level_key:
         logger.warning(f"No top-level key found in {rule_file}, available keys: {list(rule_data.keys())}")
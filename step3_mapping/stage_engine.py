@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Stage Engine - Fused single-pass execution of the Step 3 rule stages
+Runs the processing order without copying and re-traversing the item list per stage.
+
+The processing order is compiled into segments:
+- Per-item stages (rule_executor.ITEM_STAGES) are fused: their prepare steps (config
+  lookups, DB loads, BoM sets) run once up front, then every item goes through all
+  apply steps in one pass and is updated in place
+- A stage that queries the DB for the items' product IDs (PRODUCT_ID_STAGES) starts a
+  new segment when an earlier stage of the segment sets product IDs, so its prepare
+  step sees the matched IDs
+- Stages that need the whole item list (quality_report) run between segments with
+  their regular executor
+
+Items are mutated in place; pass copies if the caller still needs the originals.
+With audit=True, the fields each stage changed are recorded per item.
+
+With workers > 1, the per-item pass of a fused segment is sharded across a process
+pool. Items are grouped by receipt (or vendor) so a group never spans shards; each
+worker loads its own ProductMatcher once (from the memory-mapped catalog snapshot
+when available) and receives the prepared stage state once, at pool start-up.
+Results are put back by item index, so the output is the same for any worker count.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .db_prefetch import prefetch_stage_queries
+from .rule_executor import (ITEM_STAGES, PRODUCT_ID_SETTERS, PRODUCT_ID_STAGES, STAGE_EXECUTORS,
+                            collect_product_ids, get_stage_key)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+SHARD_KEYS = ('receipt', 'vendor')
+# Shards per worker (smaller shards even out uneven receipts / vendors)
+SHARDS_PER_WORKER = 4
+# Fewer items than this are not worth starting a pool for
+MIN_PARALLEL_ITEMS = 500
+
+# Placeholder for the ProductMatcher in stage state sent to workers
+_MATCHER_PLACEHOLDER = '__product_matcher__'
+
+# Per worker process: (steps, audit) set by _init_worker
+_worker_steps = None
+_worker_audit = False
+
+
+def _snapshot(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Shallow copy that also copies list values (stages extend review_reasons in place)"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in item.items()}
+
+
+def _diff(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    changes = {}
+    for key, value in after.items():
+        old = before.get(key, _MISSING)
+        if old is _MISSING:
+            changes[key] = [None, value]
+        elif old is not value and old != value:
+            changes[key] = [old, value]
+    removed = [key for key in before if key not in after]
+    entry = {'changes': changes} if changes else {}
+    if removed:
+        entry['removed'] = removed
+    return entry
+
+
+class FusedStageEngine:
+    """Compiled processing order for one rule set"""
+
+    def __init__(self, rule_loader, context: Dict[str, Any], processing_order: Optional[List[str]] = None,
+                 audit: bool = False, workers: int = 1, shard_by: str = 'receipt'):
+        """
+        Args:
+            rule_loader: RuleLoader instance
+            context: Shared context dictionary (product_matcher, db_conn, output_dir, ...)
+            processing_order: Rule files to run (default: rule_loader.get_processing_order())
+            audit: Record the fields each stage changed (see audit_trail)
+            workers: Worker processes for the per-item pass (1 = run in this process)
+            shard_by: Keep items of the same 'receipt' or 'vendor' in one shard
+        """
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"shard_by must be one of {SHARD_KEYS}, got {shard_by!r}")
+        self.rule_loader = rule_loader
+        self.context = context
+        self.audit = audit
+        self.workers = max(1, workers or 1)
+        self.shard_by = shard_by
+        self.audit_trail: List[Dict[str, Any]] = []
+        order = processing_order if processing_order is not None else rule_loader.get_processing_order()
+        self.segments = self._compile(order)
+
+    def _compile(self, processing_order: List[str]) -> List[Dict[str, Any]]:
+        """Group consecutive per-item stages into fused segments"""
+        segments = []
+        for rule_file in processing_order:
+            rule_data = self.rule_loader.get_rule(rule_file)
+            if not rule_data:
+                logger.warning(f"Rule file {rule_file} not found")
+                continue
+            stage_key = get_stage_key(rule_data)
+            if not stage_key:
+                logger.warning(f"No top-level key found in {rule_file}, available keys: {list(rule_data.keys())}")
+                continue
+            stage = {'rule_file': rule_file, 'key': stage_key, 'config': rule_data[stage_key]}
+
+            if stage_key in ITEM_STAGES:
+                if (not segments or segments[-1]['kind'] != 'fused'
+                        or (stage_key in PRODUCT_ID_STAGES
+                            and any(prior['key'] in PRODUCT_ID_SETTERS for prior in segments[-1]['stages']))):
+                    segments.append({'kind': 'fused', 'stages': []})
+                segments[-1]['stages'].append(stage)
+            elif stage_key in STAGE_EXECUTORS:
+                segments.append({'kind': 'barrier', 'stages': [stage]})
+            else:
+                logger.warning(f"No executor found for stage: {stage_key}")
+        return segments
+
+    def describe(self) -> str:
+        """One line per segment, e.g. 'fused: inputs -> vendor_match | barrier: quality_report'"""
+        return ' | '.join(f"{segment['kind']}: {' -> '.join(stage['key'] for stage in segment['stages'])}"
+                          for segment in self.segments)
+
+    def run(self, items: List[Dict[str, Any]],
+            on_segment: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Run all segments over items
+
+        Args:
+            items: Items to process (updated in place)
+            on_segment: Called with (last rule file, items) after each segment, e.g. to save stage output
+
+        Returns:
+            Processed items (the outputs stage replaces each item with its schema-filtered copy)
+        """
+        logger.info(f"Stage plan: {self.describe()}")
+        for segment in self.segments:
+            if segment['kind'] == 'fused':
+                items = self._run_fused(segment['stages'], items)
+            else:
+                items = self._run_barrier(segment['stages'][0], items)
+            if on_segment:
+                on_segment(segment['stages'][-1]['rule_file'], items)
+        return items
+
+    def _run_barrier(self, stage: Dict[str, Any], items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        executor = STAGE_EXECUTORS[stage['key']]
+        try:
+            return executor(items, {stage['key']: stage['config']}, self.context)
+        except Exception as e:
+            logger.error(f"Error executing stage {stage['key']} from {stage['rule_file']}: {e}", exc_info=True)
+            return items
+
+    def _prepare(self, stages: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> List[tuple]:
+        """Pre-pass: stage-wide state for each stage, in order (stages that fail or opt out are dropped)"""
+        steps = []
+        product_ids = None
+        if any(stage['key'] in PRODUCT_ID_STAGES for stage in stages):
+            # The segment's product-ID queries run concurrently when a prefetcher is set up
+            product_ids = collect_product_ids(items)
+            prefetch_stage_queries([(stage['key'], stage['config']) for stage in stages], self.context, product_ids)
+        for stage in stages:
+            prepare, apply = ITEM_STAGES[stage['key']]
+            try:
+                if stage['key'] in PRODUCT_ID_STAGES:
+                    state = prepare(stage['config'], self.context, product_ids=product_ids)
+                else:
+                    state = prepare(stage['config'], self.context)
+            except Exception as e:
+                logger.error(f"Error preparing stage {stage['key']} from {stage['rule_file']}: {e}", exc_info=True)
+                continue
+            if state is not None:
+                steps.append((stage, apply, state))
+        return steps
+
+    def _run_fused(self, stages: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        steps = self._prepare(stages, items)
+        if not steps:
+            return items
+        logger.info(f"Running {len(steps)} fused stages over {len(items)} items: "
+                    f"{', '.join(stage['key'] for stage, _, _ in steps)}")
+
+        start = time.perf_counter()
+        shards = None
+        if self.workers > 1 and len(items) >= MIN_PARALLEL_ITEMS:
+            shards = shard_items(items, self.shard_by, self.workers * SHARDS_PER_WORKER)
+        if shards and len(shards) > 1:
+            errors = self._run_parallel(steps, items, shards)
+        else:
+            errors = _apply_steps(steps, items, range(len(items)), self.audit_trail if self.audit else None)
+
+        elapsed = time.perf_counter() - start
+        for stage_key, count in errors.items():
+            logger.warning(f"Stage {stage_key} failed on {count} items")
+        rate = f" ({len(items) / elapsed:.0f} items/sec)" if elapsed > 0 else ''
+        logger.info(f"Processed {len(items)} items in {elapsed:.2f}s{rate}")
+        return items
+
+    def _run_parallel(self, steps: List[tuple], items: List[Dict[str, Any]],
+                      shards: List[List[int]]) -> Dict[str, int]:
+        """Run the apply steps for each shard on a process pool; results are written back by index"""
+        matcher = self.context.get('product_matcher')
+        worker_steps = [(stage, _strip_matcher(state, matcher)) for stage, _, state in steps]
+        workers = min(self.workers, len(shards))
+        logger.info(f"Sharding {len(items)} items by {self.shard_by} into {len(shards)} shard(s) "
+                    f"on {workers} worker process(es)")
+
+        errors: Dict[str, int] = {}
+        audit_entries = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(_matcher_spec(matcher), worker_steps, self.audit)) as executor:
+            futures = [executor.submit(_run_shard, [(index, items[index]) for index in shard]) for shard in shards]
+            for future in futures:
+                results, shard_errors, shard_audit = future.result()
+                for index, item in results:
+                    items[index] = item
+                for stage_key, count in shard_errors.items():
+                    errors[stage_key] = errors.get(stage_key, 0) + count
+                audit_entries.extend(shard_audit)
+
+        if self.audit:
+            audit_entries.sort(key=lambda entry: entry['item'])
+            self.audit_trail.extend(audit_entries)
+        return errors
+
+
+def _apply_steps(steps: List[tuple], items, indexes,
+                 audit_trail: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+    """Run every apply step on items[index] for each index (items: list or index -> item dict); returns failure counts per stage"""
+    errors: Dict[str, int] = {}
+    for index in indexes:
+        item = items[index]
+        for stage, apply, state in steps:
+            before = _snapshot(item) if audit_trail is not None else None
+            try:
+                item = apply(item, state)
+            except Exception as e:
+                # The item keeps whatever the stage changed before failing and moves on
+                if stage['key'] not in errors:
+                    logger.error(f"Error executing stage {stage['key']} from {stage['rule_file']} "
+                                 f"on item {index}: {e}", exc_info=True)
+                errors[stage['key']] = errors.get(stage['key'], 0) + 1
+            if before is not None:
+                entry = _diff(before, item)
+                if entry:
+                    audit_trail.append({'item': index, 'receipt_id': before.get('receipt_id'),
+                                        'stage': stage['rule_file'], **entry})
+        items[index] = item
+    return errors
+
+
+def _shard_key(item: Dict[str, Any], shard_by: str):
+    if shard_by == 'vendor':
+        receipt_data = item.get('receipt_data') or {}
+        return item.get('vendor_code') or receipt_data.get('vendor') or ''
+    return item.get('receipt_id') or ''
+
+
+def shard_items(items: List[Dict[str, Any]], shard_by: str = 'receipt', shard_count: int = 1) -> List[List[int]]:
+    """
+    Split item indexes into about shard_count shards without splitting a receipt / vendor
+
+    Groups are taken in order of first appearance and packed into shards of roughly
+    equal item counts; a group larger than the target size becomes its own shard.
+    """
+    groups: Dict[Any, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(_shard_key(item, shard_by), []).append(index)
+
+    target = max(1, math.ceil(len(items) / max(1, shard_count)))
+    shards: List[List[int]] = []
+    current: List[int] = []
+    for indexes in groups.values():
+        if current and len(current) + len(indexes) > target:
+            shards.append(current)
+            current = []
+        current.extend(indexes)
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _strip_matcher(state: Dict[str, Any], matcher) -> Dict[str, Any]:
+    """Stage state with the ProductMatcher replaced by a placeholder (workers build their own)"""
+    if matcher is None:
+        return state
+    return {key: _MATCHER_PLACEHOLDER if value is matcher else value for key, value in state.items()}
+
+
+def _restore_matcher(state: Dict[str, Any], matcher) -> Dict[str, Any]:
+    return {key: matcher if isinstance(value, str) and value == _MATCHER_PLACEHOLDER else value
+            for key, value in state.items()}
+
+
+def _matcher_spec(matcher) -> Optional[Tuple]:
+    """Arguments to rebuild the ProductMatcher in a worker"""
+    if matcher is None:
+        return None
+    return (str(matcher.db_analysis_path), matcher.mapping_file, matcher.fruit_conversion_file,
+            matcher.snapshot is not None)
+
+
+def _init_worker(matcher_spec: Optional[Tuple], worker_steps: List[tuple], audit: bool) -> None:
+    """Pool initializer: load the ProductMatcher once and resolve the stage steps"""
+    global _worker_steps, _worker_audit
+    matcher = None
+    if matcher_spec is not None:
+        from .product_matcher import ProductMatcher
+        db_analysis_path, mapping_file, fruit_conversion_file, use_snapshot = matcher_spec
+        matcher = ProductMatcher(db_analysis_path, mapping_file, fruit_conversion_file, use_snapshot=use_snapshot)
+
+    _worker_steps = [(stage, ITEM_STAGES[stage['key']][1], _restore_matcher(state, matcher))
+                     for stage, state in worker_steps]
+    _worker_audit = audit
+
+
+def _run_shard(shard: List[Tuple[int, Dict[str, Any]]]):
+    """Work unit: run the fused stages on (index, item) pairs; returns (results, errors, audit entries)"""
+    indexes = [index for index, _ in shard]
+    items = {index: item for index, item in shard}
+    audit_trail = [] if _worker_audit else None
+    errors = _apply_steps(_worker_steps, items, indexes, audit_trail)
+    return [(index, items[index]) for index in indexes], errors, audit_trail or []
@@ -3,7 +3,22 @@ Step 3: Generate SQL
 Creates SQL INSERT statements for purchase orders and lines from mapped receipt data.
 """
 
-from .generate_receipt_sql import ReceiptSQLGenerator
+import importlib
 
-__all__ = ['ReceiptSQLGenerator']
+# Resolved on first access (PEP 562): generate_receipt_sql needs config.py, while
+# helpers such as bulk_sql can be imported on their own
+_EXPORTS = {
+    'ReceiptSQLGenerator': '.generate_receipt_sql',
+    'BulkSQLWriter': '.bulk_sql',
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Bulk SQL Writer - One load script for a whole step 4 run
+Instead of one file (and one transaction) per receipt, all purchase_order and
+purchase_order_line rows are staged into temp tables - as multi-row VALUES batches
+or Postgres COPY ... FROM STDIN blocks - and moved into the real tables with one
+INSERT ... SELECT each, inside a single transaction.
+
+Partner IDs are resolved once per distinct vendor name into a temp mapping table and
+joined, instead of a res_partner subquery per order and per line. Product and UoM IDs
+are already resolved by the product matcher and are written as plain values.
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Column order of the generated INSERTs (partner_id is resolved from vendor_name)
+PURCHASE_ORDER_COLUMNS = [
+    'id', 'partner_id', 'dest_address_id', 'currency_id', 'invoice_count', 'fiscal_position_id',
+    'payment_term_id', 'incoterm_id', 'user_id', 'company_id', 'create_uid', 'write_uid', 'access_token',
+    'name', 'priority', 'origin', 'partner_ref', 'state', 'invoice_status', 'notes', 'amount_untaxed',
+    'amount_tax', 'amount_total', 'amount_total_cc', 'currency_rate', 'mail_reminder_confirmed',
+    'mail_reception_confirmed', 'mail_reception_declined', 'date_order', 'date_approve', 'date_planned',
+    'date_calendar_start', 'create_date', 'write_date', 'picking_type_id', 'group_id', 'incoterm_location',
+    'receipt_status', 'effective_date',
+]
+
+PURCHASE_ORDER_LINE_COLUMNS = [
+    'id', 'sequence', 'product_uom', 'product_id', 'order_id', 'company_id', 'partner_id', 'currency_id',
+    'product_packaging_id', 'create_uid', 'write_uid', 'state', 'qty_received_method', 'display_type',
+    'analytic_distribution', 'name', 'product_qty', 'discount', 'price_unit', 'price_subtotal', 'price_total',
+    'qty_invoiced', 'qty_received', 'qty_received_manual', 'qty_to_invoice', 'is_downpayment', 'date_planned',
+    'create_date', 'write_date', 'product_uom_qty', 'price_tax', 'product_packaging_qty', 'orderpoint_id',
+    'location_final_id', 'group_id', 'product_description_variants', 'propagate_cancel',
+]
+
+BULK_FORMATS = ('values', 'copy')
+
+# Rows are inserted with explicit IDs (see id_allocator), which does not advance the
+# id sequences; move them past the inserted rows so Odoo's own inserts do not collide
+SEQUENCE_SYNC_SQL = [
+    "SELECT setval('purchase_order_id_seq', GREATEST((SELECT MAX(id) FROM purchase_order), 1));",
+    "SELECT setval('purchase_order_line_id_seq', GREATEST((SELECT MAX(id) FROM purchase_order_line), 1));",
+]
+
+
+def format_sql_value(value) -> str:
+    """Format a value as a SQL literal"""
+    if value is None or value == '' or value == '\\N':
+        return 'NULL'
+    elif isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    elif isinstance(value, (int, float)):
+        return str(value)
+    else:
+        # Escape single quotes
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
+
+
+def format_copy_value(value) -> str:
+    """Format a value for COPY ... FROM STDIN (text format)"""
+    if value is None or value == '' or value == '\\N':
+        return '\\N'
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    elif isinstance(value, (int, float)):
+        return str(value)
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class BulkSQLWriter:
+    """Collect purchase order rows for a run and write them as one bulk load script"""
+
+    def __init__(self, fmt: str = 'copy', batch_size: int = 500):
+        """
+        Initialize bulk writer
+
+        Args:
+            fmt: 'copy' (COPY ... FROM STDIN blocks, for psql) or 'values' (multi-row INSERTs)
+            batch_size: Rows per multi-row VALUES statement
+        """
+        if fmt not in BULK_FORMATS:
+            raise ValueError(f"Unknown bulk format '{fmt}' (expected one of {BULK_FORMATS})")
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.orders: List[Dict[str, Any]] = []
+        self.lines: List[Dict[str, Any]] = []
+        self.sources: List[str] = []
+
+    def add_receipt(self, order_row: Dict[str, Any], line_rows: Iterable[Dict[str, Any]],
+                    source: Optional[str] = None) -> None:
+        """
+        Add one purchase order with its lines
+
+        Rows are dicts keyed by column name plus 'vendor_name' (partner_id is ignored).
+        """
+        self.orders.append(order_row)
+        self.lines.extend(line_rows)
+        if source:
+            self.sources.append(source)
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def render(self) -> str:
+        """Render the whole load script"""
+        vendors = sorted({row['vendor_name'] for row in self.orders if row.get('vendor_name')})
+        order_cols = [c for c in PURCHASE_ORDER_COLUMNS if c != 'partner_id']
+        line_cols = [c for c in PURCHASE_ORDER_LINE_COLUMNS if c != 'partner_id']
+
+        out = [
+            "-- ============================================================================",
+            "-- Bulk SQL load for Purchase Orders",
+            "-- ============================================================================",
+            f"-- Receipts: {len(self.orders)}",
+            f"-- Purchase order lines: {len(self.lines)}",
+            f"-- Format: {self.fmt}",
+            f"-- Generated: {datetime.now().isoformat()}",
+        ]
+        out.extend(f"--   {source}" for source in self.sources)
+        out += [
+            "",
+            "BEGIN;",
+            "",
+            "-- Resolve partner IDs once per vendor name",
+            "CREATE TEMP TABLE tmp_receipt_vendor (vendor_name text PRIMARY KEY) ON COMMIT DROP;",
+        ]
+        out += self._rows_block('tmp_receipt_vendor', ['vendor_name'], [{'vendor_name': v} for v in vendors])
+        out += [
+            "CREATE TEMP TABLE tmp_partner_map ON COMMIT DROP AS",
+            "SELECT DISTINCT ON (v.vendor_name) v.vendor_name, rp.id AS partner_id",
+            "FROM tmp_receipt_vendor v JOIN res_partner rp ON rp.name = v.vendor_name",
+            "ORDER BY v.vendor_name, rp.id;",
+            "",
+            "-- Vendors without a res_partner row (their orders are skipped)",
+            "SELECT v.vendor_name AS missing_partner FROM tmp_receipt_vendor v",
+            "LEFT JOIN tmp_partner_map m USING (vendor_name) WHERE m.partner_id IS NULL;",
+            "",
+            "-- Stage purchase orders and lines",
+        ]
+        for table, staging, rows, cols in (
+            ('purchase_order', 'tmp_purchase_order', self.orders, order_cols),
+            ('purchase_order_line', 'tmp_purchase_order_line', self.lines, line_cols),
+        ):
+            out += [
+                f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;",
+                f"ALTER TABLE {staging} ALTER COLUMN partner_id DROP NOT NULL;",
+                f"ALTER TABLE {staging} ADD COLUMN vendor_name text;",
+            ]
+            out += self._rows_block(staging, cols + ['vendor_name'], rows)
+
+        select_orders = ', '.join('m.partner_id' if c == 'partner_id' else f't.{c}' for c in PURCHASE_ORDER_COLUMNS)
+        select_lines = ', '.join('m.partner_id' if c == 'partner_id' else f't.{c}' for c in PURCHASE_ORDER_LINE_COLUMNS)
+        out += [
+            "-- Move staged rows into the real tables (orders/lines of unknown vendors are skipped)",
+            f"INSERT INTO purchase_order ({', '.join(PURCHASE_ORDER_COLUMNS)})",
+            f"SELECT {select_orders}",
+            "FROM tmp_purchase_order t JOIN tmp_partner_map m USING (vendor_name);",
+            "",
+            f"INSERT INTO purchase_order_line ({', '.join(PURCHASE_ORDER_LINE_COLUMNS)})",
+            f"SELECT {select_lines}",
+            "FROM tmp_purchase_order_line t JOIN tmp_partner_map m USING (vendor_name);",
+            "",
+            "-- Validate Totals: Compare SQL Totals with Original Receipt Totals",
+            "SELECT po.id, po.name, po.amount_total, SUM(pol.price_subtotal) AS calculated_total",
+            "FROM purchase_order po JOIN tmp_purchase_order t ON t.id = po.id",
+            "LEFT JOIN purchase_order_line pol ON pol.order_id = po.id",
+            "GROUP BY po.id, po.name, po.amount_total",
+            "HAVING ABS(po.amount_total - COALESCE(SUM(pol.price_subtotal), 0)) >= 0.01",
+            "ORDER BY po.id;",
+            "",
+            "-- Keep id sequences ahead of the explicit IDs",
+            *SEQUENCE_SYNC_SQL,
+            "",
+            "-- Commit transaction (or ROLLBACK to undo)",
+            "COMMIT;",
+            "-- ROLLBACK;  -- Uncomment to undo all changes",
+            "",
+        ]
+        return '\n'.join(out)
+
+    def write(self, output_path: Path) -> Path:
+        """Write the load script to output_path"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w') as f:
+            f.write(self.render())
+        logger.info(f"✓ Generated bulk SQL file: {output_path.name} "
+                    f"({len(self.orders)} orders, {len(self.lines)} lines, {self.fmt})")
+        return output_path
+
+    def _rows_block(self, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> List[str]:
+        """Load rows into a table as a COPY block or multi-row INSERTs"""
+        if not rows:
+            return [""]
+        col_list = ', '.join(columns)
+        if self.fmt == 'copy':
+            block = [f"COPY {table} ({col_list}) FROM STDIN;"]
+            block += ['\t'.join(format_copy_value(row.get(c)) for c in columns) for row in rows]
+            block += ["\\.", ""]
+            return block
+        block = []
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            values = ',\n'.join('(' + ', '.join(format_sql_value(row.get(c)) for c in columns) + ')' for row in chunk)
+            block.append(f"INSERT INTO {table} ({col_list}) VALUES\n{values};")
+        block.append("")
+        return block
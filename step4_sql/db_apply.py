@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Database Apply - Execute step 4 purchase orders directly against the database
+Alternative to writing .sql files and piping them into psql one by one.
+
+- Connections come from a pool (psycopg2 ThreadedConnectionPool), so chunks can be
+  applied concurrently
+- Rows are inserted in batches (psycopg2 execute_values; executemany on SQLite)
+- Receipts are applied in chunked transactions with one SAVEPOINT per receipt, so a
+  bad receipt is rolled back on its own instead of failing the whole chunk
+- Dry run executes everything in a single transaction that is rolled back at the end
+- A sqlite3 connection can stand in for Postgres (tests / local trial runs)
+"""
+
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from step4_sql.bulk_sql import PURCHASE_ORDER_COLUMNS, PURCHASE_ORDER_LINE_COLUMNS, SEQUENCE_SYNC_SQL
+
+logger = logging.getLogger(__name__)
+
+# (order_row, line_rows) as built by ReceiptSQLGenerator.build_receipt_rows
+ReceiptRows = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+class PurchaseOrderApplier:
+    """Apply purchase order rows to the database in batched, savepointed transactions"""
+
+    def __init__(
+        self,
+        pool=None,
+        connect: Optional[Callable[[], Any]] = None,
+        chunk_size: int = 50,
+        workers: int = 1,
+        dry_run: bool = False,
+        page_size: int = 500,
+    ):
+        """
+        Initialize applier
+
+        Args:
+            pool: Connection pool with getconn()/putconn() (e.g. psycopg2 ThreadedConnectionPool)
+            connect: Alternative to pool - callable returning a new connection (closed after use)
+            chunk_size: Receipts per transaction
+            workers: Chunks applied concurrently (each on its own pooled connection);
+                ignored in dry run, which needs a single transaction
+            dry_run: Execute everything, then roll back
+            page_size: Rows per execute_values page
+        """
+        if pool is None and connect is None:
+            raise ValueError("PurchaseOrderApplier needs a connection pool or a connect callable")
+        self.pool = pool
+        self.connect = connect
+        self.chunk_size = max(1, chunk_size)
+        self.workers = 1 if dry_run else max(1, workers)
+        self.dry_run = dry_run
+        self.page_size = max(1, page_size)
+        self._lock = threading.Lock()
+        self._stats = {'applied': 0, 'failed': 0, 'skipped_no_partner': 0, 'orders': 0, 'lines': 0,
+                       'transactions': 0}
+        self.errors: List[Dict[str, Any]] = []
+
+    # ---------------- public API ----------------
+    def apply(self, receipts: Sequence[ReceiptRows]) -> Dict[str, Any]:
+        """
+        Apply receipts
+
+        Args:
+            receipts: (order_row, line_rows) per receipt
+
+        Returns:
+            Statistics dict (applied / failed / skipped_no_partner counts, orders, lines, errors)
+        """
+        receipts = list(receipts)
+        if not receipts:
+            return self.get_stats()
+
+        chunks = [receipts[i:i + self.chunk_size] for i in range(0, len(receipts), self.chunk_size)]
+        if self.dry_run:
+            # One transaction for everything, rolled back at the end
+            conn = self._getconn()
+            tried = 0
+            try:
+                for chunk in chunks:
+                    tried += len(chunk)
+                    self._merge(self._apply_chunk(conn, chunk))
+                conn.rollback()
+                logger.info(f"Dry run: rolled back {len(receipts)} receipt(s)")
+            except Exception as e:
+                # The transaction is aborted: the failing chunk and the ones after it are not applied
+                conn.rollback()
+                not_applied = len(receipts) - tried + len(chunk)
+                logger.error(f"Dry run rolled back, {not_applied} receipt(s) not applied: {e}")
+                with self._lock:
+                    self._stats['failed'] += not_applied
+                    self.errors.append({'receipt': None, 'error': f"dry run rolled back: {e}"})
+            finally:
+                self._putconn(conn)
+        elif self.workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+                list(executor.map(self._apply_chunk_with_connection, chunks))
+        else:
+            for chunk in chunks:
+                self._apply_chunk_with_connection(chunk)
+        if not self.dry_run and self._stats['applied']:
+            self._sync_sequences()
+
+        stats = self.get_stats()
+        logger.info(f"Applied {stats['applied']} receipt(s), {stats['failed']} failed, "
+                    f"{stats['skipped_no_partner']} skipped (no partner) in {stats['transactions']} "
+                    f"transaction(s){' [dry run - rolled back]' if self.dry_run else ''}")
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['errors'] = list(self.errors)
+        stats['dry_run'] = self.dry_run
+        return stats
+
+    # ---------------- transactions ----------------
+    def _apply_chunk_with_connection(self, chunk: List[ReceiptRows]) -> None:
+        conn = self._getconn()
+        try:
+            result = self._apply_chunk(conn, chunk)
+            conn.commit()
+            self._merge(result)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Chunk of {len(chunk)} receipt(s) rolled back: {e}")
+            with self._lock:
+                self._stats['failed'] += len(chunk)
+                self.errors.append({'receipt': None, 'error': f"chunk rolled back: {e}"})
+        finally:
+            self._putconn(conn)
+
+    def _apply_chunk(self, conn, chunk: List[ReceiptRows]) -> Dict[str, Any]:
+        """
+        Apply one chunk inside the connection's current transaction, one savepoint per receipt
+
+        Returns:
+            Counts for the chunk (merged into the run stats once the chunk is committed)
+        """
+        result = {'applied': 0, 'failed': 0, 'skipped_no_partner': 0, 'orders': 0, 'lines': 0,
+                  'transactions': 1, 'errors': []}
+        self._begin(conn)
+        cur = conn.cursor()
+        try:
+            partner_ids = self._resolve_partners(cur, {order['vendor_name'] for order, _ in chunk
+                                                        if order.get('vendor_name')})
+            for index, (order, lines) in enumerate(chunk):
+                label = order.get('name') or order.get('id')
+                partner_id = partner_ids.get(order.get('vendor_name'))
+                if partner_id is None:
+                    logger.warning(f"No res_partner named {order.get('vendor_name')!r}, skipping {label}")
+                    result['skipped_no_partner'] += 1
+                    continue
+
+                savepoint = f"receipt_{index}"
+                cur.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    self._insert_rows(cur, 'purchase_order', PURCHASE_ORDER_COLUMNS, [order], partner_id)
+                    self._insert_rows(cur, 'purchase_order_line', PURCHASE_ORDER_LINE_COLUMNS, lines, partner_id)
+                    cur.execute(f"RELEASE SAVEPOINT {savepoint}")
+                except Exception as e:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    cur.execute(f"RELEASE SAVEPOINT {savepoint}")
+                    logger.error(f"Receipt {label} rolled back: {e}")
+                    result['failed'] += 1
+                    result['errors'].append({'receipt': label, 'error': str(e)})
+                    continue
+
+                result['applied'] += 1
+                result['orders'] += 1
+                result['lines'] += len(lines)
+        finally:
+            cur.close()
+        return result
+
+    def _merge(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            for key, value in result.items():
+                if key == 'errors':
+                    self.errors.extend(value)
+                else:
+                    self._stats[key] += value
+
+    # ---------------- statements ----------------
+    def _resolve_partners(self, cur, vendor_names: Iterable[str]) -> Dict[str, int]:
+        """Look up partner IDs for all vendor names of a chunk in one query"""
+        names = sorted(vendor_names)
+        if not names:
+            return {}
+        if self._is_sqlite(cur):
+            placeholders = ', '.join('?' for _ in names)
+            cur.execute(f"SELECT name, MIN(id) FROM res_partner WHERE name IN ({placeholders}) GROUP BY name", names)
+        else:
+            cur.execute("SELECT name, MIN(id) FROM res_partner WHERE name = ANY(%s) GROUP BY name", (names,))
+        return {name: partner_id for name, partner_id in cur.fetchall()}
+
+    def _insert_rows(self, cur, table: str, columns: List[str], rows: List[Dict[str, Any]], partner_id: int) -> None:
+        if not rows:
+            return
+        values = [tuple(partner_id if col == 'partner_id' else row.get(col) for col in columns) for row in rows]
+        col_list = ', '.join(columns)
+        if self._is_sqlite(cur):
+            placeholders = ', '.join('?' for _ in columns)
+            cur.executemany(f"INSERT INTO {table} ({col_list}) VALUES ({placeholders})", values)
+        else:
+            from psycopg2.extras import execute_values
+            execute_values(cur, f"INSERT INTO {table} ({col_list}) VALUES %s", values, page_size=self.page_size)
+
+    def _sync_sequences(self) -> None:
+        """Move the id sequences past the explicitly inserted IDs (Postgres only)"""
+        conn = self._getconn()
+        try:
+            if isinstance(conn, sqlite3.Connection):
+                return
+            cur = conn.cursor()
+            try:
+                for statement in SEQUENCE_SYNC_SQL:
+                    cur.execute(statement)
+            finally:
+                cur.close()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Could not sync id sequences: {e}")
+        finally:
+            self._putconn(conn)
+
+    # ---------------- connections ----------------
+    def _getconn(self):
+        return self.pool.getconn() if self.pool is not None else self.connect()
+
+    def _putconn(self, conn) -> None:
+        if self.pool is not None:
+            self.pool.putconn(conn)
+        else:
+            conn.close()
+
+    @staticmethod
+    def _begin(conn) -> None:
+        # psycopg2 opens a transaction on the first statement; sqlite3 would let the first
+        # SAVEPOINT start (and its RELEASE commit) the transaction, so begin explicitly.
+        # IMMEDIATE takes the write lock up front, so concurrent chunks wait (busy timeout)
+        # instead of failing on a read-to-write lock upgrade
+        if isinstance(conn, sqlite3.Connection) and not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+
+    @staticmethod
+    def _is_sqlite(cur) -> bool:
+        return isinstance(cur, sqlite3.Cursor)
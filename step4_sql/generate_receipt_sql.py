@@ -2,68 +2,171 @@
 """
 Generate SQL INSERT commands for all receipts
 Creates one SQL file per receipt with purchase_order and purchase_order_line INSERT statements
+
+Receipts and matched items are read from step 3 output (see mapped_input.py); re-extracting
+the receipt PDFs and re-running the product matcher is only done with --from-pdfs.
 """
 
 import json
 import logging
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from step1_extract.receipt_processor import ReceiptProcessor
-from step3_mapping.product_matcher import ProductMatcher
 from config import *
+from step4_sql.bulk_sql import (
+    BulkSQLWriter,
+    BULK_FORMATS,
+    PURCHASE_ORDER_COLUMNS,
+    PURCHASE_ORDER_LINE_COLUMNS,
+    SEQUENCE_SYNC_SQL,
+    format_sql_value,
+)
+from step4_sql.id_allocator import DEFAULT_LEDGER, POIdAllocator, receipt_key
+from step4_sql.mapped_input import MAPPED_INPUT_FILES, find_mapped_input, iter_mapped_receipts
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Per-process generator for process pool workers (see _generate_shard)
+_worker_generator = None
+
+
+@lru_cache(maxsize=None)
+def _load_fruit_conversions(fruit_conversion_file: str) -> Dict[str, Dict]:
+    """Fruit weight conversions by database product name (metadata keys dropped); {} if unavailable"""
+    try:
+        with open(fruit_conversion_file, 'r', encoding='utf-8') as f:
+            conversions = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Could not load fruit conversions from {fruit_conversion_file}: {e}")
+        return {}
+    return {k: v for k, v in conversions.items() if not k.startswith('_')}
+
 
 class ReceiptSQLGenerator:
     """Generate SQL INSERT statements for receipts"""
     
     def __init__(self, config: Dict):
         self.config = config
-        self.receipt_processor = ReceiptProcessor(config)
-        
-        # Load product matcher with mapping files
-        db_dump_json = config.get('DB_DUMP_JSON', DB_DUMP_JSON)
-        mapping_file = config.get('PRODUCT_MAPPING_FILE', PRODUCT_MAPPING_FILE)
-        fruit_conversion_file = config.get('FRUIT_CONVERSION_FILE', FRUIT_CONVERSION_FILE)
-        
-        if Path(db_dump_json).exists():
-            self.product_matcher = ProductMatcher(
-                db_dump_json,
-                mapping_file=mapping_file,
-                fruit_conversion_file=fruit_conversion_file
-            )
-        else:
-            logger.error(f"Database dump JSON not found: {db_dump_json}")
-            self.product_matcher = None
+        # Only needed to re-extract PDFs; built on first use (step 3 output already
+        # carries extracted receipts and matched items)
+        self._receipt_processor = None
+        self._product_matcher = None
+        self._product_matcher_loaded = False
+        self._id_allocator = None
+    
+    @property
+    def id_allocator(self) -> POIdAllocator:
+        if self._id_allocator is None:
+            self._id_allocator = POIdAllocator(self.config.get('PO_ID_LEDGER', DEFAULT_LEDGER),
+                                               require_sync=not self.config.get('PO_ID_ALLOW_UNSYNCED', False))
+        return self._id_allocator
+    
+    @id_allocator.setter
+    def id_allocator(self, value: POIdAllocator):
+        self._id_allocator = value
+    
+    def sync_ids_with_database(self, conn=None) -> bool:
+        """
+        Raise the PO ID ledger counters above the IDs already in the database
+        
+        Args:
+            conn: Database connection (default: a new connection, closed afterwards)
+            
+        Returns:
+            False if no database connection could be made
+        """
+        if conn is not None:
+            self.id_allocator.sync_with_database(conn)
+            return True
+        
+        from step3_mapping.query_database import connect_to_database
+        
+        conn = connect_to_database()
+        if conn is None:
+            return False
+        try:
+            self.id_allocator.sync_with_database(conn)
+        finally:
+            conn.close()
+        return True
+    
+    @property
+    def receipt_processor(self):
+        if self._receipt_processor is None:
+            from step1_extract.receipt_processor import ReceiptProcessor
+            self._receipt_processor = ReceiptProcessor(self.config)
+        return self._receipt_processor
+    
+    @receipt_processor.setter
+    def receipt_processor(self, value):
+        self._receipt_processor = value
+    
+    @property
+    def product_matcher(self):
+        if not self._product_matcher_loaded:
+            self._product_matcher_loaded = True
+            from step3_mapping.product_matcher import ProductMatcher
+            
+            # Load product matcher with mapping files
+            db_dump_json = self.config.get('DB_DUMP_JSON', DB_DUMP_JSON)
+            mapping_file = self.config.get('PRODUCT_MAPPING_FILE', PRODUCT_MAPPING_FILE)
+            fruit_conversion_file = self.config.get('FRUIT_CONVERSION_FILE', FRUIT_CONVERSION_FILE)
+            
+            if Path(db_dump_json).exists():
+                self._product_matcher = ProductMatcher(
+                    db_dump_json,
+                    mapping_file=mapping_file,
+                    fruit_conversion_file=fruit_conversion_file
+                )
+            else:
+                logger.error(f"Database dump JSON not found: {db_dump_json}")
+        return self._product_matcher
+    
+    @product_matcher.setter
+    def product_matcher(self, value):
+        self._product_matcher = value
+        self._product_matcher_loaded = True
     
     def format_sql_value(self, value) -> str:
         """Format a value for SQL INSERT"""
-        if value is None or value == '' or value == '\\N':
-            return 'NULL'
-        elif isinstance(value, bool):
-            return 'TRUE' if value else 'FALSE'
-        elif isinstance(value, (int, float)):
-            return str(value)
-        elif isinstance(value, str):
-            # Escape single quotes
-            escaped = value.replace("'", "''")
-            return f"'{escaped}'"
-        else:
-            # Convert to string and escape
-            escaped = str(value).replace("'", "''")
-            return f"'{escaped}'"
+        return format_sql_value(value)
     
     def generate_purchase_order_sql(self, receipt_data: Dict, po_id: int) -> str:
         """Generate SQL INSERT statement for purchase_order"""
+        row = self.build_purchase_order_row(receipt_data, po_id)
+        vendor_name = row['vendor_name']
+        values = ', '.join('id' if col == 'partner_id' else self.format_sql_value(row[col])
+                           for col in PURCHASE_ORDER_COLUMNS)
         
+        # Look up vendor/partner ID using the SELECT ... FROM res_partner below
+        # This ensures the vendor exists in the database before insertion
+        sql = f"""-- Look up vendor/partner ID by name
+-- Vendor Name: {vendor_name}
+INSERT INTO purchase_order ({', '.join(PURCHASE_ORDER_COLUMNS)})
+SELECT {values}
+FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1;"""
+        
+        return sql, vendor_name
+    
+    def build_purchase_order_row(self, receipt_data: Dict, po_id: int) -> Dict:
+        """
+        Build the purchase_order column values for a receipt
+        
+        Returns:
+            Dict keyed by PURCHASE_ORDER_COLUMNS (partner_id None - resolved from
+            'vendor_name' at load time) plus 'vendor_name'
+        """
         # Get vendor/partner ID from receipt data
         # For Instacart receipts: IC-{store_name}
         # For other receipts: use vendor name as-is
@@ -78,10 +181,7 @@ class ReceiptSQLGenerator:
             # Format as IC-{store_name}
             vendor_name = f"IC-{store_name}"
         
-        # Look up vendor in database (we'll use a subquery in SQL to get partner_id)
-        # For now, we'll generate SQL that looks up the partner_id by name
-        partner_id_sql = f"(SELECT id FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1)"
-        partner_id = None  # Will be determined at SQL execution time
+        # partner_id is looked up by vendor name when the SQL is executed
         
         # Get order date
         order_date = receipt_data.get('order_date') or receipt_data.get('delivery_date')
@@ -112,55 +212,38 @@ class ReceiptSQLGenerator:
         order_name = receipt_data.get('order_id') or f"P{po_id:05d}"
         partner_ref = receipt_data.get('order_id') or receipt_data.get('vendor_ref')
         
-        # Look up vendor/partner ID using SQL subquery
-        # This ensures the vendor exists in the database before insertion
-        partner_id_subquery = f"(SELECT id FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1)"
-        
         # Purchase Order columns (from actual Odoo structure)
-        sql = f"""-- Look up vendor/partner ID by name
--- Vendor Name: {vendor_name}
-INSERT INTO purchase_order (id, partner_id, dest_address_id, currency_id, invoice_count, fiscal_position_id, payment_term_id, incoterm_id, user_id, company_id, create_uid, write_uid, access_token, name, priority, origin, partner_ref, state, invoice_status, notes, amount_untaxed, amount_tax, amount_total, amount_total_cc, currency_rate, mail_reminder_confirmed, mail_reception_confirmed, mail_reception_declined, date_order, date_approve, date_planned, date_calendar_start, create_date, write_date, picking_type_id, group_id, incoterm_location, receipt_status, effective_date)
-SELECT {po_id}, id, NULL, 1, 0, NULL, NULL, NULL, 2, 1, 2, 2, NULL, {self.format_sql_value(order_name)}, 0, NULL, {self.format_sql_value(partner_ref)}, 'draft', 'no', NULL, {amount_untaxed}, {amount_tax}, {amount_total}, {amount_total}, 1.0, FALSE, FALSE, NULL, {self.format_sql_value(date_order)}, NULL, {self.format_sql_value(date_planned)}, {self.format_sql_value(date_planned)}, {self.format_sql_value(create_date)}, {self.format_sql_value(write_date)}, 1, NULL, NULL, NULL, NULL
-FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1;"""
-        
-        return sql, vendor_name
+        values = [
+            po_id, None, None, 1, 0, None, None, None, 2, 1, 2, 2, None, order_name, 0, None, partner_ref,
+            'draft', 'no', None, amount_untaxed, amount_tax, amount_total, amount_total, 1.0, False, False, None,
+            date_order, None, date_planned, date_planned, create_date, write_date, 1, None, None, None, None,
+        ]
+        row = dict(zip(PURCHASE_ORDER_COLUMNS, values))
+        row['vendor_name'] = vendor_name
+        return row
     
     def generate_purchase_order_line_sql(self, line_item: Dict, po_line_id: int, po_id: int, sequence: int, vendor_name: str) -> str:
         """Generate SQL INSERT statement for purchase_order_line"""
+        row = self.build_purchase_order_line_row(line_item, po_line_id, po_id, sequence, vendor_name)
+        if row is None:
+            return None
         
         # Get matched product and UoM
-        product_id = None
-        product_uom_id = None
+        product_id = row['product_id']
+        product_uom_id = row['product_uom']
         db_product_name = None
-        db_uom_name = None
-        
-        if 'product_match' in line_item and line_item['product_match']:
-            product_id = line_item['product_match']['product_id']
+        db_uom_name = 'Units'  # Default UoM (ID 1) when there is no UoM match
+        if line_item.get('product_match'):
             db_product_name = line_item['product_match'].get('name', '')
-        
-        if 'uom_match' in line_item and line_item['uom_match']:
-            product_uom_id = line_item['uom_match']['id']
+        if line_item.get('uom_match'):
             db_uom_name = line_item['uom_match'].get('name', '')
-            logger.debug(f"Using matched UoM ID {product_uom_id} ({db_uom_name})")
-        else:
-            # Default to Units (UoM ID 1)
-            product_uom_id = 1
-            db_uom_name = 'Units'
-            logger.warning(f"No UoM match found, using default Units (ID 1)")
-        
-        if not product_id:
-            logger.warning(f"No product match for: {line_item.get('product_name', 'Unknown')}")
-            # Use a placeholder or skip
-            return None
         
         # Get item data
         receipt_item = line_item.get('receipt_item', {})
-        original_product_name = receipt_item.get('product_name', '')
-        product_qty = receipt_item.get('quantity', 1.0)
-        price_unit = receipt_item.get('unit_price', 0.0)
-        price_subtotal = receipt_item.get('total_price', 0.0)
-        price_total = price_subtotal
-        product_uom_qty = product_qty  # Default to same as product_qty
+        original_product_name = row['name']
+        product_qty = row['product_qty']
+        price_unit = row['price_unit']
+        price_subtotal = row['price_subtotal']
         
         # Get original receipt values (before conversion)
         original_qty = receipt_item.get('original_weight_lb')
@@ -211,11 +294,7 @@ FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1;"""
             comment_lines.append(f"--   Converted Total: ${price_subtotal:.2f}")
             
             # Show conversion calculation
-            items_per_lb = None
-            if hasattr(self.product_matcher, 'fruit_conversions') and db_product_name:
-                fruit_conv = self.product_matcher.fruit_conversions.get(db_product_name)
-                if fruit_conv:
-                    items_per_lb = fruit_conv.get('items_per_lb')
+            items_per_lb = self._items_per_lb(receipt_item, db_product_name)
             
             if items_per_lb:
                 comment_lines.append(f"--   Conversion Logic: {original_qty} {original_uom} × {items_per_lb} items/{original_uom} = {product_qty} {db_uom_name or 'units'}")
@@ -235,6 +314,72 @@ FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1;"""
             comment_lines.append(f"--   Total: ${price_subtotal:.2f}")
         
         comment = '\n'.join(comment_lines)
+        values = ', '.join('rp.id' if col == 'partner_id' else self.format_sql_value(row[col])
+                           for col in PURCHASE_ORDER_LINE_COLUMNS)
+        
+        # Purchase Order Line columns (from actual Odoo structure)
+        # Look up partner_id from vendor_name (same as in PO insert)
+        sql = f"""{comment}
+INSERT INTO purchase_order_line ({', '.join(PURCHASE_ORDER_LINE_COLUMNS)})
+SELECT {values}
+FROM res_partner rp 
+WHERE rp.name = {self.format_sql_value(vendor_name)} 
+LIMIT 1;"""
+        
+        return sql
+    
+    def _items_per_lb(self, receipt_item: Dict, db_product_name: Optional[str]) -> Optional[float]:
+        """Fruit conversion rate: from step 3 (items_per_lb on the item), else the fruit conversion file"""
+        items_per_lb = receipt_item.get('items_per_lb')
+        if items_per_lb or not db_product_name:
+            return items_per_lb
+        
+        # Older step 3 output: look the product up without loading the catalog
+        if self._product_matcher is not None:
+            fruit_conversions = self._product_matcher.fruit_conversions
+        else:
+            fruit_conversions = _load_fruit_conversions(
+                str(self.config.get('FRUIT_CONVERSION_FILE', FRUIT_CONVERSION_FILE)))
+        fruit_conv = fruit_conversions.get(db_product_name)
+        return fruit_conv.get('items_per_lb') if fruit_conv else None
+    
+    def build_purchase_order_line_row(self, line_item: Dict, po_line_id: int, po_id: int, sequence: int,
+                                      vendor_name: str) -> Optional[Dict]:
+        """
+        Build the purchase_order_line column values for a matched receipt item
+        
+        Returns:
+            Dict keyed by PURCHASE_ORDER_LINE_COLUMNS (partner_id None - resolved from
+            'vendor_name' at load time) plus 'vendor_name', or None if the item has no product match
+        """
+        # Get matched product and UoM
+        product_id = None
+        product_uom_id = None
+        
+        if 'product_match' in line_item and line_item['product_match']:
+            product_id = line_item['product_match']['product_id']
+        
+        if 'uom_match' in line_item and line_item['uom_match']:
+            product_uom_id = line_item['uom_match']['id']
+            logger.debug(f"Using matched UoM ID {product_uom_id} ({line_item['uom_match'].get('name', '')})")
+        else:
+            # Default to Units (UoM ID 1)
+            product_uom_id = 1
+            logger.warning(f"No UoM match found, using default Units (ID 1)")
+        
+        if not product_id:
+            logger.warning(f"No product match for: {line_item.get('product_name', 'Unknown')}")
+            # Use a placeholder or skip
+            return None
+        
+        # Get item data
+        receipt_item = line_item.get('receipt_item', {})
+        original_product_name = receipt_item.get('product_name', '')
+        product_qty = receipt_item.get('quantity', 1.0)
+        price_unit = receipt_item.get('unit_price', 0.0)
+        price_subtotal = receipt_item.get('total_price', 0.0)
+        price_total = price_subtotal
+        product_uom_qty = product_qty  # Default to same as product_qty
         
         # Get dates
         order_date = receipt_item.get('order_date')
@@ -250,213 +395,299 @@ FROM res_partner WHERE name = {self.format_sql_value(vendor_name)} LIMIT 1;"""
         create_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         write_date = create_date
         
-        # Purchase Order Line columns (from actual Odoo structure)
-        # Look up partner_id from vendor_name (same as in PO insert)
-        sql = f"""{comment}
-INSERT INTO purchase_order_line (id, sequence, product_uom, product_id, order_id, company_id, partner_id, currency_id, product_packaging_id, create_uid, write_uid, state, qty_received_method, display_type, analytic_distribution, name, product_qty, discount, price_unit, price_subtotal, price_total, qty_invoiced, qty_received, qty_received_manual, qty_to_invoice, is_downpayment, date_planned, create_date, write_date, product_uom_qty, price_tax, product_packaging_qty, orderpoint_id, location_final_id, group_id, product_description_variants, propagate_cancel)
-SELECT {po_line_id}, {sequence}, {product_uom_id}, {product_id}, {po_id}, 1, rp.id, 1, NULL, 2, 2, 'draft', 'stock_moves', NULL, NULL, {self.format_sql_value(original_product_name)}, {product_qty}, 0.00, {price_unit}, {price_subtotal}, {price_total}, 0.00, 0.00, 0.00, 0.00, NULL, {self.format_sql_value(date_planned)}, {self.format_sql_value(create_date)}, {self.format_sql_value(write_date)}, {product_uom_qty}, 0, 0, NULL, NULL, NULL, NULL, TRUE
-FROM res_partner rp 
-WHERE rp.name = {self.format_sql_value(vendor_name)} 
-LIMIT 1;"""
+        values = [
+            po_line_id, sequence, product_uom_id, product_id, po_id, 1, None, 1, None, 2, 2, 'draft',
+            'stock_moves', None, None, original_product_name, product_qty, 0.00, price_unit, price_subtotal,
+            price_total, 0.00, 0.00, 0.00, 0.00, None, date_planned, create_date, write_date, product_uom_qty,
+            0, 0, None, None, None, None, True,
+        ]
+        row = dict(zip(PURCHASE_ORDER_LINE_COLUMNS, values))
+        row['vendor_name'] = vendor_name
+        return row
+    
+    def _allocate_ids(self, receipt_data: Dict, source_name: str, line_count: int) -> Tuple[int, int]:
+        """(po_id, first_line_id) from the PO ID ledger - stable across reruns for the same receipt"""
+        return self.id_allocator.allocate(receipt_key(receipt_data, source_name), line_count)
+    
+    def _prepare_receipt(self, receipt_path: Path) -> Optional[Tuple[Dict, List[Dict], int, int]]:
+        """Extract and match a receipt PDF; returns (receipt_data, matched_items, po_id, first_line_id) or None"""
+        # Process receipt
+        receipt_data = self.receipt_processor.process_pdf(str(receipt_path))
         
-        return sql
+        if not receipt_data or not receipt_data.get('items'):
+            logger.warning(f"No items found in receipt: {receipt_path.name}")
+            return None
+        
+        # Match products and UoMs
+        if not self.product_matcher:
+            logger.error("Product matcher not available")
+            return None
+        
+        receipt_items = receipt_data.get('items', [])
+        matched_items = self.product_matcher.match_receipt_items(receipt_items, config=self.config)
+        return self._prepare_matched(receipt_data, matched_items, receipt_path.name)
     
-    def process_receipt(self, receipt_path: Path, output_dir: Path) -> Optional[str]:
-        """Process a single receipt and generate SQL"""
+    def _prepare_matched(self, receipt_data: Dict, matched_items: List[Dict],
+                         source_name: str) -> Optional[Tuple[Dict, List[Dict], int, int]]:
+        """
+        Keep matched items only and allocate IDs
+        
+        Returns:
+            (receipt_data, matched_items, po_id, first_line_id) or None
+        """
+        # Filter out unmatched items
+        matched_items = [item for item in matched_items if item.get('matched', False)]
+        
+        if not matched_items:
+            logger.warning(f"No matched items for receipt: {source_name}")
+            return None
+        
+        po_id, first_line_id = self._allocate_ids(receipt_data, source_name, len(matched_items))
+        return receipt_data, matched_items, po_id, first_line_id
+    
+    def _iter_pdf_receipts(self, pdf_paths: List[Path]) -> Iterator[Tuple[str, Optional[Tuple[Dict, List[Dict], int, int]]]]:
+        """Yield (source_name, prepared receipt or None) by re-extracting and matching receipt PDFs"""
+        for pdf_file in pdf_paths:
+            logger.info(f"Processing receipt: {pdf_file.name}")
+            try:
+                yield pdf_file.name, self._prepare_receipt(pdf_file)
+            except Exception as e:
+                logger.error(f"Error processing receipt {pdf_file.name}: {e}", exc_info=True)
+                yield pdf_file.name, None
+    
+    def _iter_mapped_receipts(self, input_path: Path) -> Iterator[Tuple[str, Optional[Tuple[Dict, List[Dict], int, int]]]]:
+        """Yield (source_name, prepared receipt or None) from step 3 output (no PDF parsing)"""
+        for receipt_id, receipt_data, matched_items in iter_mapped_receipts(input_path):
+            # Same source name as PDF mode, so receipts without order_id keep their PO ID
+            source_name = Path(receipt_data.get('source_file') or receipt_id).name
+            yield source_name, self._prepare_matched(receipt_data, matched_items, source_name)
+    
+    def _rows_for_receipt(self, receipt_data: Dict, matched_items: List[Dict], po_id: int,
+                          first_line_id: int) -> Tuple[Dict, List[Dict]]:
+        """Build (order_row, line_rows) for a prepared receipt"""
+        order_row = self.build_purchase_order_row(receipt_data, po_id)
+        line_rows = []
+        po_line_id = first_line_id
+        sequence = 10  # Start sequence at 10
+        for item in matched_items:
+            row = self.build_purchase_order_line_row(item, po_line_id, po_id, sequence, order_row['vendor_name'])
+            if row:
+                line_rows.append(row)
+                po_line_id += 1
+                sequence += 1
+        return order_row, line_rows
+    
+    def build_receipt_rows(self, receipt_path: Path) -> Optional[Tuple[Dict, List[Dict]]]:
+        """
+        Build purchase_order / purchase_order_line rows for one receipt PDF (bulk mode)
         
+        Returns:
+            (order_row, line_rows) or None if the receipt yields no matched lines
+        """
         logger.info(f"Processing receipt: {receipt_path.name}")
         
         try:
-            # Process receipt
-            receipt_data = self.receipt_processor.process_pdf(str(receipt_path))
-            
-            if not receipt_data or not receipt_data.get('items'):
-                logger.warning(f"No items found in receipt: {receipt_path.name}")
-                return None
-            
-            # Match products and UoMs
-            if not self.product_matcher:
-                logger.error("Product matcher not available")
-                return None
-            
-            receipt_items = receipt_data.get('items', [])
-            matched_items = self.product_matcher.match_receipt_items(receipt_items, config=self.config)
-            
-            # Filter out unmatched items
-            matched_items = [item for item in matched_items if item.get('matched', False)]
-            
-            if not matched_items:
-                logger.warning(f"No matched items for receipt: {receipt_path.name}")
+            prepared = self._prepare_receipt(receipt_path)
+            if not prepared:
                 return None
-            
-            # Generate SQL
-            # Use receipt order_id or filename to determine PO ID
-            receipt_order_id = receipt_data.get('order_id')
-            if receipt_order_id:
-                # Extract numeric part for ID
-                try:
-                    po_id = int(receipt_order_id[-6:]) % 1000000  # Use last 6 digits
-                except:
-                    po_id = hash(receipt_path.name) % 1000000
-            else:
-                po_id = hash(receipt_path.name) % 1000000
-            
-            # Get original receipt total
-            original_receipt_total = receipt_data.get('total', 0.0)
-            original_subtotal = receipt_data.get('subtotal', 0.0)
-            
-            # Generate SQL statements
-            sql_lines = []
-            sql_lines.append("-- ============================================================================")
-            sql_lines.append("-- SQL INSERT Statements for Purchase Order")
-            sql_lines.append("-- ============================================================================")
-            sql_lines.append(f"-- Receipt File: {receipt_path.name}")
-            sql_lines.append(f"-- Order ID: {receipt_order_id or 'N/A'}")
-            sql_lines.append(f"-- Receipt Date: {receipt_data.get('order_date') or receipt_data.get('delivery_date') or 'N/A'}")
-            sql_lines.append(f"-- Vendor: {receipt_data.get('vendor') or receipt_data.get('store_name') or 'N/A'}")
-            sql_lines.append(f"-- Original Receipt Total: ${original_receipt_total:.2f}")
-            sql_lines.append(f"-- Generated: {datetime.now().isoformat()}")
-            sql_lines.append("")
-            sql_lines.append("-- Wrap in transaction to view all output")
-            sql_lines.append("BEGIN;")
-            sql_lines.append("")
-            
-            # Get vendor name for this receipt
-            vendor_name = receipt_data.get('vendor') or receipt_data.get('store_name')
-            if receipt_data.get('store_name'):
-                # Instacart order: use IC-{store_name} format
-                vendor_name = f"IC-{receipt_data.get('store_name', '')}"
-            
-            # Purchase Order
-            sql_lines.append("-- Purchase Order")
-            sql_lines.append("-- ===============")
-            sql_lines.append(f"-- Vendor Name: {vendor_name}")
-            po_sql, vendor_name_returned = self.generate_purchase_order_sql(receipt_data, po_id)
-            if vendor_name_returned:
-                vendor_name = vendor_name_returned
-            sql_lines.append(po_sql)
-            sql_lines.append("")
-            
-            # Purchase Order Lines
-            sql_lines.append("-- Purchase Order Lines")
-            sql_lines.append("-- ====================")
-            sql_lines.append("")
-            
-            po_line_id = po_id * 100  # Start line IDs from PO ID * 100
-            sequence = 10  # Start sequence at 10
-            sql_line_totals = []
-            
-            for item in matched_items:
-                line_sql = self.generate_purchase_order_line_sql(item, po_line_id, po_id, sequence, vendor_name)
-                if line_sql:
-                    sql_lines.append(line_sql)
-                    sql_lines.append("")
-                    
-                    # Get line total for validation
-                    receipt_item = item.get('receipt_item', {})
-                    line_total = receipt_item.get('total_price', 0.0)
-                    sql_line_totals.append(line_total)
-                    
-                    po_line_id += 1
-                    sequence += 1
-            
-            # Calculate SQL total
-            sql_total = sum(sql_line_totals)
-            
-            # Add SELECT queries to view inserted data with product/UoM names
-            sql_lines.append("-- View inserted Purchase Order with Product and UoM Names")
-            sql_lines.append("-- ===========================================================")
-            sql_lines.append(f"SELECT po.id, po.name, po.partner_id, rp.name as partner_name,")
-            sql_lines.append(f"       po.amount_total, po.state, po.date_order")
-            sql_lines.append(f"FROM purchase_order po")
-            sql_lines.append(f"LEFT JOIN res_partner rp ON po.partner_id = rp.id")
-            sql_lines.append(f"WHERE po.id = {po_id};")
-            sql_lines.append("")
-            sql_lines.append("-- View inserted Purchase Order Lines with Product and UoM Names")
-            sql_lines.append("-- ==================================================================")
-            sql_lines.append(f"SELECT pol.id, pol.sequence, pol.name as receipt_product_name,")
-            sql_lines.append(f"       pol.product_id, pt.name->>'en_US' as odoo_product_name,")
-            sql_lines.append(f"       pol.product_qty, pol.product_uom_qty,")
-            sql_lines.append(f"       pol.product_uom, uom.name->>'en_US' as odoo_uom_name,")
-            sql_lines.append(f"       pol.price_unit, pol.price_subtotal, pol.price_total")
-            sql_lines.append(f"FROM purchase_order_line pol")
-            sql_lines.append(f"LEFT JOIN product_product pp ON pol.product_id = pp.id")
-            sql_lines.append(f"LEFT JOIN product_template pt ON pp.product_tmpl_id = pt.id")
-            sql_lines.append(f"LEFT JOIN uom_uom uom ON pol.product_uom = uom.id")
-            sql_lines.append(f"WHERE pol.order_id = {po_id}")
-            sql_lines.append(f"ORDER BY pol.sequence;")
-            sql_lines.append("")
-            
-            # Add total validation query
-            sql_lines.append("-- Validate Total: Compare SQL Total with Original Receipt Total")
-            sql_lines.append("-- ==================================================================")
-            sql_lines.append(f"SELECT ")
-            sql_lines.append(f"    po.amount_total as sql_total,")
-            sql_lines.append(f"    {self.format_sql_value(original_receipt_total)} as original_receipt_total,")
-            sql_lines.append(f"    po.amount_total - {original_receipt_total} as difference,")
-            sql_lines.append(f"    CASE ")
-            sql_lines.append(f"        WHEN ABS(po.amount_total - {original_receipt_total}) < 0.01 THEN 'MATCH'")
-            sql_lines.append(f"        ELSE 'MISMATCH'")
-            sql_lines.append(f"    END as validation_status")
-            sql_lines.append(f"FROM purchase_order po")
-            sql_lines.append(f"WHERE po.id = {po_id};")
-            sql_lines.append("")
-            
-            # Add summary with line-by-line totals
-            sql_lines.append("-- Summary: Line-by-Line Totals")
-            sql_lines.append("-- ===========================================================")
-            sql_lines.append(f"SELECT ")
-            sql_lines.append(f"    pol.sequence,")
-            sql_lines.append(f"    pol.name as receipt_product_name,")
-            sql_lines.append(f"    pt.name->>'en_US' as odoo_product_name,")
-            sql_lines.append(f"    pol.product_qty || ' ' || COALESCE(uom.name->>'en_US', 'N/A') as quantity_uom,")
-            sql_lines.append(f"    pol.price_unit as unit_price,")
-            sql_lines.append(f"    pol.price_subtotal as line_total")
-            sql_lines.append(f"FROM purchase_order_line pol")
-            sql_lines.append(f"LEFT JOIN product_product pp ON pol.product_id = pp.id")
-            sql_lines.append(f"LEFT JOIN product_template pt ON pp.product_tmpl_id = pt.id")
-            sql_lines.append(f"LEFT JOIN uom_uom uom ON pol.product_uom = uom.id")
-            sql_lines.append(f"WHERE pol.order_id = {po_id}")
-            sql_lines.append(f"ORDER BY pol.sequence;")
-            sql_lines.append("")
-            sql_lines.append(f"-- Calculate sum of all line totals")
-            sql_lines.append(f"SELECT ")
-            sql_lines.append(f"    SUM(pol.price_subtotal) as calculated_total,")
-            sql_lines.append(f"    po.amount_total as po_total,")
-            sql_lines.append(f"    {self.format_sql_value(original_receipt_total)} as original_receipt_total")
-            sql_lines.append(f"FROM purchase_order_line pol")
-            sql_lines.append(f"JOIN purchase_order po ON pol.order_id = po.id")
-            sql_lines.append(f"WHERE pol.order_id = {po_id};")
-            sql_lines.append("")
-            sql_lines.append("-- Commit transaction (or ROLLBACK to undo)")
-            sql_lines.append("COMMIT;")
-            sql_lines.append("-- ROLLBACK;  -- Uncomment to undo all changes")
-            
-            # Generate output filename
-            receipt_stem = receipt_path.stem
-            if receipt_order_id:
-                sql_filename = f"purchase_order_{receipt_order_id}.sql"
-            else:
-                sql_filename = f"purchase_order_{receipt_stem}.sql"
-            
-            output_path = output_dir / sql_filename
-            
-            # Save SQL file
-            with open(output_path, 'w') as f:
-                f.write('\n'.join(sql_lines))
-            
-            logger.info(f"✓ Generated SQL file: {output_path.name} ({len(matched_items)} lines)")
-            return str(output_path)
+            return self._rows_for_receipt(*prepared)
+        except Exception as e:
+            logger.error(f"Error processing receipt {receipt_path.name}: {e}", exc_info=True)
+            return None
+    
+    def process_receipt(self, receipt_path: Path, output_dir: Path) -> Optional[str]:
+        """Process a single receipt PDF and generate SQL"""
         
+        logger.info(f"Processing receipt: {receipt_path.name}")
+        
+        try:
+            prepared = self._prepare_receipt(receipt_path)
+            if not prepared:
+                return None
+            return self._write_receipt_sql(*prepared, receipt_path.name, Path(output_dir))
         except Exception as e:
             logger.error(f"Error processing receipt {receipt_path.name}: {e}", exc_info=True)
             return None
     
-    def process_all_receipts(self, receipts_dir: Path, output_dir: Path):
-        """Process all receipts in a directory"""
+    def generate_sql_for_receipt(self, receipt_data: Dict, matched_items: List[Dict], output_dir: str,
+                                 source_name: Optional[str] = None) -> Optional[str]:
+        """
+        Generate the SQL file for a receipt that step 3 already extracted and matched
         
-        output_dir.mkdir(parents=True, exist_ok=True)
+        Args:
+            receipt_data: Receipt data (step 1 / step 3 output)
+            matched_items: Matched items for this receipt (ProductMatcher.match_receipt_items shape)
+            output_dir: Output directory for the SQL file
+            source_name: Receipt file name (defaults to receipt_data['source_file'])
+            
+        Returns:
+            Path of the generated SQL file, or None if the receipt has no matched items
+        """
+        source_name = source_name or Path(receipt_data.get('source_file') or 'receipt').name
+        prepared = self._prepare_matched(receipt_data, matched_items, source_name)
+        if not prepared:
+            return None
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        return self._write_receipt_sql(*prepared, source_name, output_path)
+    
+    def _write_receipt_sql(self, receipt_data: Dict, matched_items: List[Dict], po_id: int, first_line_id: int,
+                           source_name: str, output_dir: Path) -> str:
+        """Write the per-receipt SQL file and return its path"""
+        receipt_order_id = receipt_data.get('order_id')
         
+        # Generate SQL
+        # Get original receipt total
+        original_receipt_total = receipt_data.get('total', 0.0)
+        original_subtotal = receipt_data.get('subtotal', 0.0)
+        
+        # Generate SQL statements
+        sql_lines = []
+        sql_lines.append("-- ============================================================================")
+        sql_lines.append("-- SQL INSERT Statements for Purchase Order")
+        sql_lines.append("-- ============================================================================")
+        sql_lines.append(f"-- Receipt File: {source_name}")
+        sql_lines.append(f"-- Order ID: {receipt_order_id or 'N/A'}")
+        sql_lines.append(f"-- Receipt Date: {receipt_data.get('order_date') or receipt_data.get('delivery_date') or 'N/A'}")
+        sql_lines.append(f"-- Vendor: {receipt_data.get('vendor') or receipt_data.get('store_name') or 'N/A'}")
+        sql_lines.append(f"-- Original Receipt Total: ${original_receipt_total:.2f}")
+        sql_lines.append(f"-- Generated: {datetime.now().isoformat()}")
+        sql_lines.append("")
+        sql_lines.append("-- Wrap in transaction to view all output")
+        sql_lines.append("BEGIN;")
+        sql_lines.append("")
+        
+        # Get vendor name for this receipt
+        vendor_name = receipt_data.get('vendor') or receipt_data.get('store_name')
+        if receipt_data.get('store_name'):
+            # Instacart order: use IC-{store_name} format
+            vendor_name = f"IC-{receipt_data.get('store_name', '')}"
+        
+        # Purchase Order
+        sql_lines.append("-- Purchase Order")
+        sql_lines.append("-- ===============")
+        sql_lines.append(f"-- Vendor Name: {vendor_name}")
+        po_sql, vendor_name_returned = self.generate_purchase_order_sql(receipt_data, po_id)
+        if vendor_name_returned:
+            vendor_name = vendor_name_returned
+        sql_lines.append(po_sql)
+        sql_lines.append("")
+        
+        # Purchase Order Lines
+        sql_lines.append("-- Purchase Order Lines")
+        sql_lines.append("-- ====================")
+        sql_lines.append("")
+        
+        po_line_id = first_line_id  # Contiguous block reserved in the PO ID ledger
+        sequence = 10  # Start sequence at 10
+        sql_line_totals = []
+        
+        for item in matched_items:
+            line_sql = self.generate_purchase_order_line_sql(item, po_line_id, po_id, sequence, vendor_name)
+            if line_sql:
+                sql_lines.append(line_sql)
+                sql_lines.append("")
+                
+                # Get line total for validation
+                receipt_item = item.get('receipt_item', {})
+                line_total = receipt_item.get('total_price', 0.0)
+                sql_line_totals.append(line_total)
+                
+                po_line_id += 1
+                sequence += 1
+        
+        # Calculate SQL total
+        sql_total = sum(sql_line_totals)
+        
+        # Add SELECT queries to view inserted data with product/UoM names
+        sql_lines.append("-- View inserted Purchase Order with Product and UoM Names")
+        sql_lines.append("-- ===========================================================")
+        sql_lines.append(f"SELECT po.id, po.name, po.partner_id, rp.name as partner_name,")
+        sql_lines.append(f"       po.amount_total, po.state, po.date_order")
+        sql_lines.append(f"FROM purchase_order po")
+        sql_lines.append(f"LEFT JOIN res_partner rp ON po.partner_id = rp.id")
+        sql_lines.append(f"WHERE po.id = {po_id};")
+        sql_lines.append("")
+        sql_lines.append("-- View inserted Purchase Order Lines with Product and UoM Names")
+        sql_lines.append("-- ==================================================================")
+        sql_lines.append(f"SELECT pol.id, pol.sequence, pol.name as receipt_product_name,")
+        sql_lines.append(f"       pol.product_id, pt.name->>'en_US' as odoo_product_name,")
+        sql_lines.append(f"       pol.product_qty, pol.product_uom_qty,")
+        sql_lines.append(f"       pol.product_uom, uom.name->>'en_US' as odoo_uom_name,")
+        sql_lines.append(f"       pol.price_unit, pol.price_subtotal, pol.price_total")
+        sql_lines.append(f"FROM purchase_order_line pol")
+        sql_lines.append(f"LEFT JOIN product_product pp ON pol.product_id = pp.id")
+        sql_lines.append(f"LEFT JOIN product_template pt ON pp.product_tmpl_id = pt.id")
+        sql_lines.append(f"LEFT JOIN uom_uom uom ON pol.product_uom = uom.id")
+        sql_lines.append(f"WHERE pol.order_id = {po_id}")
+        sql_lines.append(f"ORDER BY pol.sequence;")
+        sql_lines.append("")
+        
+        # Add total validation query
+        sql_lines.append("-- Validate Total: Compare SQL Total with Original Receipt Total")
+        sql_lines.append("-- ==================================================================")
+        sql_lines.append(f"SELECT ")
+        sql_lines.append(f"    po.amount_total as sql_total,")
+        sql_lines.append(f"    {self.format_sql_value(original_receipt_total)} as original_receipt_total,")
+        sql_lines.append(f"    po.amount_total - {original_receipt_total} as difference,")
+        sql_lines.append(f"    CASE ")
+        sql_lines.append(f"        WHEN ABS(po.amount_total - {original_receipt_total}) < 0.01 THEN 'MATCH'")
+        sql_lines.append(f"        ELSE 'MISMATCH'")
+        sql_lines.append(f"    END as validation_status")
+        sql_lines.append(f"FROM purchase_order po")
+        sql_lines.append(f"WHERE po.id = {po_id};")
+        sql_lines.append("")
+        
+        # Add summary with line-by-line totals
+        sql_lines.append("-- Summary: Line-by-Line Totals")
+        sql_lines.append("-- ===========================================================")
+        sql_lines.append(f"SELECT ")
+        sql_lines.append(f"    pol.sequence,")
+        sql_lines.append(f"    pol.name as receipt_product_name,")
+        sql_lines.append(f"    pt.name->>'en_US' as odoo_product_name,")
+        sql_lines.append(f"    pol.product_qty || ' ' || COALESCE(uom.name->>'en_US', 'N/A') as quantity_uom,")
+        sql_lines.append(f"    pol.price_unit as unit_price,")
+        sql_lines.append(f"    pol.price_subtotal as line_total")
+        sql_lines.append(f"FROM purchase_order_line pol")
+        sql_lines.append(f"LEFT JOIN product_product pp ON pol.product_id = pp.id")
+        sql_lines.append(f"LEFT JOIN product_template pt ON pp.product_tmpl_id = pt.id")
+        sql_lines.append(f"LEFT JOIN uom_uom uom ON pol.product_uom = uom.id")
+        sql_lines.append(f"WHERE pol.order_id = {po_id}")
+        sql_lines.append(f"ORDER BY pol.sequence;")
+        sql_lines.append("")
+        sql_lines.append(f"-- Calculate sum of all line totals")
+        sql_lines.append(f"SELECT ")
+        sql_lines.append(f"    SUM(pol.price_subtotal) as calculated_total,")
+        sql_lines.append(f"    po.amount_total as po_total,")
+        sql_lines.append(f"    {self.format_sql_value(original_receipt_total)} as original_receipt_total")
+        sql_lines.append(f"FROM purchase_order_line pol")
+        sql_lines.append(f"JOIN purchase_order po ON pol.order_id = po.id")
+        sql_lines.append(f"WHERE pol.order_id = {po_id};")
+        sql_lines.append("")
+        sql_lines.append("-- Keep id sequences ahead of the explicit IDs")
+        sql_lines.extend(SEQUENCE_SYNC_SQL)
+        sql_lines.append("")
+        sql_lines.append("-- Commit transaction (or ROLLBACK to undo)")
+        sql_lines.append("COMMIT;")
+        sql_lines.append("-- ROLLBACK;  -- Uncomment to undo all changes")
+        
+        # Generate output filename
+        if receipt_order_id:
+            sql_filename = f"purchase_order_{receipt_order_id}.sql"
+        else:
+            sql_filename = f"purchase_order_{Path(source_name).stem}.sql"
+        
+        output_path = output_dir / sql_filename
+        
+        # Save SQL file
+        with open(output_path, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+            f.write('\n'.join(sql_lines))
+        
+        logger.info(f"✓ Generated SQL file: {output_path.name} ({len(matched_items)} lines)")
+        return str(output_path)
+    
+    def _find_receipt_pdfs(self, receipts_dir: Path) -> List[Path]:
+        """List receipt PDFs: PDFs in receipt folders (Instacart), then individual PDFs"""
         # Find all PDF receipts
         receipt_folders = [d for d in receipts_dir.iterdir() if d.is_dir()]
         
@@ -465,16 +696,12 @@ LIMIT 1;"""
         
         if not receipt_folders and not individual_pdfs:
             logger.warning(f"No receipt folders or PDF files found in: {receipts_dir}")
-            return
+            return []
         
-        total_receipts = len(receipt_folders) + len(individual_pdfs)
         logger.info(f"Found {len(receipt_folders)} receipt folder(s) and {len(individual_pdfs)} individual PDF file(s)")
-        logger.info("="*60)
-        
-        success_count = 0
-        failed_count = 0
         
-        # Process PDFs in folders (Instacart receipts)
+        pdf_paths = []
+        # PDFs in folders (Instacart receipts)
         for folder in receipt_folders:
             # Find PDF files in folder
             pdf_files = list(folder.glob('*.pdf'))
@@ -483,22 +710,102 @@ LIMIT 1;"""
                 logger.warning(f"No PDF files found in: {folder.name}")
                 continue
             
-            # Process each PDF (usually one per folder)
-            for pdf_file in pdf_files:
-                result = self.process_receipt(pdf_file, output_dir)
-                if result:
-                    success_count += 1
-                else:
-                    failed_count += 1
-        
-        # Process individual PDF files in receipts directory (non-Instacart receipts)
-        for pdf_file in individual_pdfs:
-            result = self.process_receipt(pdf_file, output_dir)
+            # Usually one per folder
+            pdf_paths.extend(pdf_files)
+        
+        pdf_paths.extend(individual_pdfs)
+        return pdf_paths
+    
+    def apply_all_receipts(self, receipts_dir: Path, applier) -> Dict:
+        """
+        Apply all receipt PDFs in a directory directly to the database (re-extracts the PDFs)
+        
+        Args:
+            receipts_dir: Directory containing receipt folders / PDFs
+            applier: db_apply.PurchaseOrderApplier (pooled connection, chunk size, dry run)
+            
+        Returns:
+            Applier statistics plus 'not_generated' (receipts without matched lines)
+        """
+        return self._apply_receipts(self._iter_pdf_receipts(self._find_receipt_pdfs(receipts_dir)), applier)
+    
+    def apply_mapped_receipts(self, input_path: Path, applier) -> Dict:
+        """Apply receipts from step 3 output directly to the database (see apply_all_receipts)"""
+        return self._apply_receipts(self._iter_mapped_receipts(input_path), applier)
+    
+    def _apply_receipts(self, prepared_receipts, applier) -> Dict:
+        receipts = []
+        not_generated = 0
+        for source_name, prepared in prepared_receipts:
+            if prepared:
+                receipts.append(self._rows_for_receipt(*prepared))
+            else:
+                not_generated += 1
+        
+        logger.info("="*60)
+        stats = applier.apply(receipts)
+        stats['not_generated'] = not_generated
+        logger.info(f"  Applied: {stats['applied']}")
+        logger.info(f"  Failed: {stats['failed']}")
+        logger.info(f"  Skipped (no partner): {stats['skipped_no_partner']}")
+        logger.info(f"  Not generated (no matched items): {not_generated}")
+        return stats
+    
+    def process_all_receipts(self, receipts_dir: Path, output_dir: Path, bulk_format: Optional[str] = None):
+        """
+        Process all receipt PDFs in a directory (re-extracts and re-matches every PDF)
+        
+        Args:
+            receipts_dir: Directory containing receipt folders / PDFs
+            output_dir: Output directory for SQL files
+            bulk_format: None for one .sql file per receipt; 'values' or 'copy' to write
+                all receipts into a single bulk load script (see bulk_sql.BulkSQLWriter)
+        """
+        pdf_paths = self._find_receipt_pdfs(receipts_dir)
+        if not pdf_paths:
+            return
+        return self._generate(self._iter_pdf_receipts(pdf_paths), output_dir, bulk_format)
+    
+    def process_mapped_receipts(self, input_path: Path, output_dir: Path, bulk_format: Optional[str] = None):
+        """
+        Generate SQL from step 3 output - no PDF parsing or product matching
+        
+        Args:
+            input_path: Step 3 output directory, or a mapped_data.json / mapped_items.json file
+            output_dir: Output directory for SQL files
+            bulk_format: See process_all_receipts
+        """
+        return self._generate(self._iter_mapped_receipts(input_path), output_dir, bulk_format)
+    
+    def _generate(self, prepared_receipts, output_dir: Path, bulk_format: Optional[str] = None) -> Dict:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("="*60)
+        
+        success_count = 0
+        failed_count = 0
+        bulk_writer = BulkSQLWriter(bulk_format) if bulk_format else None
+        
+        for source_name, prepared in prepared_receipts:
+            result = None
+            if prepared:
+                try:
+                    if bulk_writer is not None:
+                        result = self._rows_for_receipt(*prepared)
+                        bulk_writer.add_receipt(*result, source=source_name)
+                    else:
+                        result = self._write_receipt_sql(*prepared, source_name, output_dir)
+                except Exception as e:
+                    logger.error(f"Error generating SQL for receipt {source_name}: {e}", exc_info=True)
+                    result = None
             if result:
                 success_count += 1
             else:
                 failed_count += 1
         
+        bulk_file = None
+        if bulk_writer is not None and len(bulk_writer):
+            bulk_file = bulk_writer.write(output_dir / f"purchase_orders_bulk_{datetime.now():%Y%m%d_%H%M%S}.sql")
+        
         logger.info("="*60)
         logger.info(f"Processing complete!")
         logger.info(f"  Success: {success_count}")
@@ -509,59 +816,233 @@ LIMIT 1;"""
             'success': success_count,
             'failed': failed_count,
             'output_dir': str(output_dir),
+            'bulk_file': str(bulk_file) if bulk_file else None,
+        }
+
+    def generate_sql_parallel(self, receipts: Iterable[Tuple[str, Dict, List[Dict]]], output_dir: Path,
+                              workers: int = 1, shard_size: int = 50,
+                              consolidated_file: Optional[Path] = None) -> Dict:
+        """
+        Generate per-receipt SQL files for already extracted and matched receipts on a process pool
+        
+        IDs are allocated up front in receipt order (one ledger transaction), so the output
+        does not depend on which worker finishes first.
+        
+        Args:
+            receipts: (receipt_id, receipt_data, matched_items) per receipt (see mapped_input.iter_mapped_receipts)
+            output_dir: Output directory for SQL files
+            workers: Worker processes (1 = generate in this process)
+            shard_size: Receipts per work unit
+            consolidated_file: Also concatenate all SQL files, in receipt order, into this file
+            
+        Returns:
+            Dict with 'sql_files' (in receipt order), 'skipped' (no matched items), 'failed'
+            and 'consolidated_file'
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        prepared = []
+        skipped = 0
+        for receipt_id, receipt_data, matched_items in receipts:
+            source_name = Path(receipt_data.get('source_file') or receipt_id).name
+            matched_items = [item for item in matched_items if item.get('matched', False)]
+            if not matched_items:
+                logger.warning(f"No matched items for receipt: {source_name}")
+                skipped += 1
+                continue
+            prepared.append((receipt_data, matched_items, source_name))
+        
+        id_ranges = self.id_allocator.allocate_many(
+            [(receipt_key(receipt_data, source_name), len(matched_items))
+             for receipt_data, matched_items, source_name in prepared])
+        units = [(index, receipt_data, matched_items, po_id, first_line_id, source_name)
+                 for index, ((receipt_data, matched_items, source_name), (po_id, first_line_id))
+                 in enumerate(zip(prepared, id_ranges))]
+        shards = [units[i:i + max(1, shard_size)] for i in range(0, len(units), max(1, shard_size))]
+        
+        results = []
+        if workers > 1 and len(shards) > 1:
+            logger.info(f"Generating SQL for {len(units)} receipt(s) in {len(shards)} shard(s) "
+                        f"on {min(workers, len(shards))} worker process(es)")
+            with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+                futures = [executor.submit(_generate_shard, self.config, shard, str(output_dir)) for shard in shards]
+                for future in futures:
+                    results.extend(future.result())
+        else:
+            for shard in shards:
+                results.extend(_generate_shard(self.config, shard, str(output_dir), generator=self))
+        
+        results.sort(key=lambda result: result[0])
+        sql_files = [path for _, path in results if path]
+        failed = sum(1 for _, path in results if not path)
+        
+        if consolidated_file and sql_files:
+            consolidated_file = Path(consolidated_file)
+            with open(consolidated_file, 'w', buffering=WRITE_BUFFER_SIZE) as out:
+                out.write(f"-- Consolidated SQL for {len(sql_files)} purchase order(s)\n")
+                out.write(f"-- Generated: {datetime.now().isoformat()}\n")
+                for path in sql_files:
+                    out.write(f"\n-- >>> {Path(path).name}\n")
+                    with open(path, 'r') as f:
+                        shutil.copyfileobj(f, out, WRITE_BUFFER_SIZE)
+                    out.write("\n")
+            logger.info(f"✓ Generated consolidated SQL file: {consolidated_file.name} ({len(sql_files)} receipts)")
+        else:
+            consolidated_file = None
+        
+        return {
+            'sql_files': sql_files,
+            'skipped': skipped,
+            'failed': failed,
+            'consolidated_file': str(consolidated_file) if consolidated_file else None,
         }
 
 
+def _generate_shard(config: Dict, shard: List[Tuple], output_dir: str,
+                    generator: Optional[ReceiptSQLGenerator] = None) -> List[Tuple[int, Optional[str]]]:
+    """Work unit: write the SQL files for a shard of receipts with pre-allocated IDs; returns (index, path or None)"""
+    global _worker_generator
+    if generator is None:
+        if _worker_generator is None:
+            _worker_generator = ReceiptSQLGenerator(config)
+        generator = _worker_generator
+    
+    results = []
+    for index, receipt_data, matched_items, po_id, first_line_id, source_name in shard:
+        try:
+            path = generator._write_receipt_sql(receipt_data, matched_items, po_id, first_line_id,
+                                                source_name, Path(output_dir))
+        except Exception as e:
+            logger.error(f"Error generating SQL for receipt {source_name}: {e}", exc_info=True)
+            path = None
+        results.append((index, path))
+    return results
+
+
 def main():
     """Main function"""
     import argparse
     
     parser = argparse.ArgumentParser(description='Generate SQL INSERT statements for all receipts')
+    parser.add_argument('--input-dir', type=str, default=STEP4_INPUT_DIR,
+                       help='Step 3 output directory, or a mapped_data.json / mapped_items.json file '
+                            f'(default: {STEP4_INPUT_DIR})')
+    parser.add_argument('--from-pdfs', action='store_true',
+                       help='Re-extract and re-match the receipt PDFs in --receipts-dir instead of '
+                            'reading step 3 output (slow)')
     parser.add_argument('--receipts-dir', type=str, 
                        default='../odoo_data/receipts',
-                       help='Directory containing receipt folders')
+                       help='Directory containing receipt folders (--from-pdfs only)')
     parser.add_argument('--output-dir', type=str,
                        default='../odoo_data/analysis/receipt_sql',
                        help='Output directory for SQL files')
     parser.add_argument('--dry-run', action='store_true',
-                       help='Dry run mode (show what would be processed)')
+                       help='Dry run mode (show what would be processed; with --apply: execute '
+                            'everything in a transaction that is rolled back)')
+    parser.add_argument('--apply', action='store_true',
+                       help='Insert purchase orders directly into the database instead of writing SQL files')
+    parser.add_argument('--chunk-size', type=int, default=50,
+                       help='Receipts per transaction in --apply mode (default: 50)')
+    parser.add_argument('--pool-size', type=int, default=4,
+                       help='Pooled database connections / concurrent chunks in --apply mode (default: 4)')
+    parser.add_argument('--id-ledger', type=str, default=DEFAULT_LEDGER,
+                       help=f'PO ID ledger file - keeps PO / line IDs stable across reruns (default: {DEFAULT_LEDGER})')
+    parser.add_argument('--no-sync-ids', action='store_true',
+                       help='Do not raise the PO ID ledger counters above the IDs already in the database '
+                            'and allow allocating from a ledger that was never synced (offline runs; '
+                            'generated IDs may collide with existing rows)')
+    parser.add_argument('--bulk', choices=BULK_FORMATS, default=None,
+                       help='Write one bulk load script for all receipts (multi-row VALUES or COPY) '
+                            'instead of one file per receipt')
     
     args = parser.parse_args()
     
     receipts_dir = Path(args.receipts_dir)
+    input_path = Path(args.input_dir)
     output_dir = Path(args.output_dir)
     
-    if not receipts_dir.exists():
-        logger.error(f"Receipts directory not found: {receipts_dir}")
+    if args.from_pdfs:
+        if not receipts_dir.exists():
+            logger.error(f"Receipts directory not found: {receipts_dir}")
+            sys.exit(1)
+    elif find_mapped_input(input_path) is None:
+        logger.error(f"No step 3 output ({', '.join(MAPPED_INPUT_FILES)}) found at: {input_path}")
+        logger.error("Run step 3 first, or use --from-pdfs to re-extract the receipt PDFs.")
         sys.exit(1)
     
     # Setup config
     config = {
         'DB_DUMP_JSON': DB_DUMP_JSON,
         'FEE_PRODUCTS': FEE_PRODUCTS,
-        'FRUIT_WEIGHT_CONVERSION': FRUIT_WEIGHT_CONVERSION,
-        'BANANA_CONVERSION': BANANA_CONVERSION,
         'PRODUCT_MAPPING_FILE': PRODUCT_MAPPING_FILE,
         'FRUIT_CONVERSION_FILE': FRUIT_CONVERSION_FILE,
+        'PO_ID_LEDGER': args.id_ledger,
+        'PO_ID_ALLOW_UNSYNCED': args.no_sync_ids,
     }
-    
+    # Optional (not in config.py.example); the product matcher falls back to FRUIT_CONVERSION_FILE
+    for name in ('FRUIT_WEIGHT_CONVERSION', 'BANANA_CONVERSION'):
+        if name in globals():
+            config[name] = globals()[name]
+
     # Create generator
     generator = ReceiptSQLGenerator(config)
     
-    if args.dry_run:
+    # Seed the PO ID ledger from the database so fresh IDs don't collide with existing rows
+    # (--apply syncs on its pooled connection below)
+    if not args.apply and not args.dry_run and not args.no_sync_ids:
+        if not generator.sync_ids_with_database():
+            logger.error("Could not sync the PO ID ledger with the database. "
+                         "Use --no-sync-ids to generate SQL with the ledger as is.")
+            sys.exit(1)
+    
+    if args.apply:
+        from step3_mapping.query_database import create_connection_pool
+        from step4_sql.db_apply import PurchaseOrderApplier
+        
+        pool = create_connection_pool(minconn=1, maxconn=max(1, args.pool_size))
+        if pool is None:
+            sys.exit(1)
+        try:
+            conn = pool.getconn()
+            try:
+                generator.id_allocator.sync_with_database(conn)
+                conn.rollback()
+            finally:
+                pool.putconn(conn)
+            applier = PurchaseOrderApplier(pool=pool, chunk_size=args.chunk_size,
+                                           workers=args.pool_size, dry_run=args.dry_run)
+            if args.from_pdfs:
+                stats = generator.apply_all_receipts(receipts_dir, applier)
+            else:
+                stats = generator.apply_mapped_receipts(input_path, applier)
+        finally:
+            pool.closeall()
+        if stats['failed']:
+            sys.exit(1)
+    elif args.dry_run:
         logger.info("DRY RUN MODE - No files will be created")
-        logger.info(f"Would process receipts from: {receipts_dir}")
         logger.info(f"Would output SQL files to: {output_dir}")
         
-        # List receipt folders
-        receipt_folders = [d for d in receipts_dir.iterdir() if d.is_dir()]
-        logger.info(f"Found {len(receipt_folders)} receipt folder(s):")
-        for folder in receipt_folders:
-            pdf_files = list(folder.glob('*.pdf'))
-            logger.info(f"  {folder.name}: {len(pdf_files)} PDF file(s)")
+        if args.from_pdfs:
+            logger.info(f"Would process receipts from: {receipts_dir}")
+            
+            # List receipt folders
+            receipt_folders = [d for d in receipts_dir.iterdir() if d.is_dir()]
+            logger.info(f"Found {len(receipt_folders)} receipt folder(s):")
+            for folder in receipt_folders:
+                pdf_files = list(folder.glob('*.pdf'))
+                logger.info(f"  {folder.name}: {len(pdf_files)} PDF file(s)")
+        else:
+            logger.info(f"Would process receipts from: {find_mapped_input(input_path)}")
+            for receipt_id, receipt_data, matched_items in iter_mapped_receipts(input_path):
+                matched = sum(1 for item in matched_items if item.get('matched'))
+                logger.info(f"  {receipt_id}: {matched}/{len(matched_items)} matched item(s)")
+    elif args.from_pdfs:
+        # Re-extract and match all receipt PDFs
+        generator.process_all_receipts(receipts_dir, output_dir, bulk_format=args.bulk)
     else:
-        # Process all receipts
-        generator.process_all_receipts(receipts_dir, output_dir)
+        generator.process_mapped_receipts(input_path, output_dir, bulk_format=args.bulk)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+PO ID Allocator - Deterministic, collision-free purchase order / line IDs for step 4
+Replaces deriving po_id from the last 6 digits of the order id or hash(file name)
+(which changes between Python processes) and line IDs from po_id * 100 + n.
+
+Allocations are kept in a SQLite ledger file:
+- A receipt gets the same PO ID and line ID range on every rerun (keyed by vendor +
+  order id, or by source file name when there is no order id)
+- New receipts get the next free PO ID and a contiguous block of line IDs
+- Counters are seeded from the database's current MAX(id) / sequence value
+  (sync_with_database), so fresh IDs never collide with existing rows; a ledger that
+  was never synced refuses to allocate (LedgerNotSyncedError) unless created with
+  require_sync=False
+- Every allocation is one BEGIN IMMEDIATE transaction, so threads sharing an allocator
+  and separate worker processes sharing the ledger file never hand out the same ID
+"""
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER = 'cache/po_id_ledger.sqlite'
+
+# (po_id, first_line_id)
+IdRange = Tuple[int, int]
+
+
+class LedgerNotSyncedError(RuntimeError):
+    """Allocation from a ledger whose counters were never synced with the database"""
+
+
+def receipt_key(receipt_data: Dict, source_name: str) -> str:
+    """Stable ledger key for a receipt: vendor + order id, else the source file name"""
+    order_id = receipt_data.get('order_id')
+    if order_id:
+        vendor = receipt_data.get('store_name') or receipt_data.get('vendor') or ''
+        return f"order:{vendor}:{order_id}"
+    return f"file:{Path(source_name).name}"
+
+
+class POIdAllocator:
+    """Allocate purchase_order / purchase_order_line IDs from a persistent ledger"""
+
+    def __init__(self, ledger_path: Path = DEFAULT_LEDGER, po_start: int = 1, line_start: int = 1,
+                 timeout: float = 30.0, require_sync: bool = True):
+        """
+        Initialize allocator
+
+        Args:
+            ledger_path: SQLite ledger file (created if missing)
+            po_start: First purchase_order ID handed out by a new ledger
+            line_start: First purchase_order_line ID handed out by a new ledger
+            timeout: Seconds to wait for another process holding the ledger lock
+            require_sync: Refuse to allocate until the ledger has been synced with the
+                database (sync_with_database) at least once
+        """
+        self.ledger_path = Path(ledger_path)
+        self.require_sync = require_sync
+        self._lock = threading.Lock()
+        self._stats = {'reused': 0, 'allocated': 0, 'extended': 0}
+
+        self.ledger_path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly (BEGIN IMMEDIATE ... COMMIT)
+        self._conn = sqlite3.connect(str(self.ledger_path), check_same_thread=False,
+                                     isolation_level=None, timeout=timeout)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS id_counter ('
+            ' name TEXT PRIMARY KEY,'
+            ' next_id INTEGER NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS id_allocation ('
+            ' receipt_key TEXT PRIMARY KEY,'
+            ' po_id INTEGER NOT NULL,'
+            ' first_line_id INTEGER NOT NULL,'
+            ' line_count INTEGER NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ledger_meta ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL)'
+        )
+        self._conn.execute("INSERT OR IGNORE INTO id_counter (name, next_id) VALUES ('purchase_order', ?)",
+                           (max(1, po_start),))
+        self._conn.execute("INSERT OR IGNORE INTO id_counter (name, next_id) VALUES ('purchase_order_line', ?)",
+                           (max(1, line_start),))
+
+    # ---------------- allocation ----------------
+    def allocate(self, key: str, line_count: int) -> IdRange:
+        """
+        PO ID and first line ID for a receipt with line_count lines
+
+        The same key always gets the same PO ID; its line block is reused while it is
+        large enough and replaced by a fresh contiguous block when the receipt grew.
+        """
+        return self.allocate_many([(key, line_count)])[0]
+
+    def allocate_many(self, requests: Sequence[Tuple[str, int]]) -> List[IdRange]:
+        """
+        Allocate several receipts in one ledger transaction (new receipts get contiguous IDs)
+
+        Raises:
+            LedgerNotSyncedError: require_sync is set and the ledger was never synced
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self.require_sync and self._synced_at() is None:
+                    raise LedgerNotSyncedError(
+                        f"PO ID ledger {self.ledger_path} was never synced with the database; sync it "
+                        f"(sync_with_database) or opt out of the check to allocate from it as is")
+                counters = dict(self._conn.execute('SELECT name, next_id FROM id_counter'))
+                next_po = counters['purchase_order']
+                next_line = counters['purchase_order_line']
+                results = []
+                for key, line_count in requests:
+                    line_count = max(0, line_count)
+                    row = self._conn.execute(
+                        'SELECT po_id, first_line_id, line_count FROM id_allocation WHERE receipt_key = ?', (key,)
+                    ).fetchone()
+                    if row and row[2] >= line_count:
+                        self._stats['reused'] += 1
+                        results.append((row[0], row[1]))
+                        continue
+                    if row:
+                        po_id = row[0]
+                        self._stats['extended'] += 1
+                    else:
+                        po_id = next_po
+                        next_po += 1
+                        self._stats['allocated'] += 1
+                    first_line_id = next_line
+                    next_line += line_count
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO id_allocation (receipt_key, po_id, first_line_id, line_count) '
+                        'VALUES (?, ?, ?, ?)', (key, po_id, first_line_id, line_count)
+                    )
+                    results.append((po_id, first_line_id))
+                self._set_counters(next_po, next_line)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return results
+
+    def lookup(self, key: str) -> Optional[IdRange]:
+        """Existing allocation for a key, without allocating"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT po_id, first_line_id FROM id_allocation WHERE receipt_key = ?', (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    # ---------------- counters ----------------
+    def reserve_floor(self, po_next: int, line_next: int, synced: bool = False) -> None:
+        """Raise the counters so the next fresh IDs are at least po_next / line_next (synced: mark the ledger synced)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                counters = dict(self._conn.execute('SELECT name, next_id FROM id_counter'))
+                self._set_counters(max(counters['purchase_order'], po_next),
+                                   max(counters['purchase_order_line'], line_next))
+                if synced:
+                    self._conn.execute("INSERT OR REPLACE INTO ledger_meta (key, value) VALUES ('synced_at', ?)",
+                                       (datetime.now().isoformat(timespec='seconds'),))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def sync_with_database(self, conn) -> IdRange:
+        """
+        Raise the counters above the IDs already used in the database
+
+        Args:
+            conn: psycopg2 connection (MAX(id) and the table's id sequence) or sqlite3
+                connection (MAX(id) only)
+
+        Returns:
+            (next_po_id, next_line_id) after the sync
+        """
+        floors = []
+        cur = conn.cursor()
+        try:
+            for table in ('purchase_order', 'purchase_order_line'):
+                if isinstance(conn, sqlite3.Connection):
+                    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                else:
+                    cur.execute(f"SELECT GREATEST(COALESCE((SELECT MAX(id) FROM {table}), 0), "
+                                f"(SELECT last_value FROM {table}_id_seq))")
+                floors.append(cur.fetchone()[0] + 1)
+        finally:
+            cur.close()
+        self.reserve_floor(*floors, synced=True)
+        logger.info(f"PO ID ledger synced with database: next PO ID >= {floors[0]}, next line ID >= {floors[1]}")
+        return self.next_ids()
+
+    def is_synced(self) -> bool:
+        """Whether the counters were ever synced with the database"""
+        with self._lock:
+            return self._synced_at() is not None
+
+    def next_ids(self) -> IdRange:
+        with self._lock:
+            counters = dict(self._conn.execute('SELECT name, next_id FROM id_counter'))
+        return counters['purchase_order'], counters['purchase_order_line']
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _synced_at(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM ledger_meta WHERE key = 'synced_at'").fetchone()
+        return row[0] if row else None
+
+    def _set_counters(self, next_po: int, next_line: int) -> None:
+        self._conn.execute("UPDATE id_counter SET next_id = ? WHERE name = 'purchase_order'", (next_po,))
+        self._conn.execute("UPDATE id_counter SET next_id = ? WHERE name = 'purchase_order_line'", (next_line,))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Mapped Input - Read step 3 output as step 4 input
+Step 4 builds its SQL from the receipts and matched items step 3 already produced,
+instead of re-extracting every PDF and re-running the product matcher.
+
+Supported inputs (a file, or a step 3 output directory containing one of them):
+- mapped_data.json  - workflow format: {'receipts': {...}, 'matched_items': [...]}
+- mapped_items.json - rule-engine items (step3_mapping/main.py) as one JSON list
+
+Receipts are yielded one at a time as (receipt_id, receipt_data, matched_items), with
+matched_items in the ProductMatcher.match_receipt_items shape
+({'receipt_item', 'product_match', 'uom_match', 'matched'}).
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Looked up in this order when a directory is given
+MAPPED_INPUT_FILES = ('mapped_data.json', 'mapped_items.json')
+
+MappedReceipt = Tuple[str, Dict[str, Any], List[Dict[str, Any]]]
+
+
+def find_mapped_input(input_path: Path) -> Optional[Path]:
+    """Resolve a step 3 output file from a file or directory path (None if not found)"""
+    input_path = Path(input_path)
+    if input_path.is_file():
+        return input_path
+    if input_path.is_dir():
+        for name in MAPPED_INPUT_FILES:
+            candidate = input_path / name
+            if candidate.exists():
+                return candidate
+    return None
+
+
+def matched_item_from_mapped(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a rule-engine mapped item (flat product_id / product_uom_id fields) into
+    the matched item shape used by the SQL generator
+    """
+    receipt_item = {k: v for k, v in item.items() if k != 'receipt_data'}
+    product_id = item.get('product_id')
+    uom_id = item.get('product_uom_id')
+    return {
+        'receipt_item': receipt_item,
+        'product_match': {'product_id': product_id} if product_id else None,
+        'uom_match': {'id': uom_id, 'name': item.get('product_uom_name', '')} if uom_id else None,
+        'matched': bool(product_id),
+    }
+
+
+def iter_mapped_receipts(input_path: Path) -> Iterator[MappedReceipt]:
+    """
+    Yield (receipt_id, receipt_data, matched_items) per receipt from step 3 output
+
+    Args:
+        input_path: mapped_data.json / mapped_items.json file, or a directory containing one
+
+    Raises:
+        FileNotFoundError: If no step 3 output is found
+    """
+    path = find_mapped_input(input_path)
+    if path is None:
+        raise FileNotFoundError(f"No step 3 output ({', '.join(MAPPED_INPUT_FILES)}) found at: {input_path}")
+    logger.info(f"Reading mapped receipts from: {path}")
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        yield from _iter_mapped_data(data)
+    else:
+        yield from _group_mapped_items(data)
+
+
+def _iter_mapped_data(mapped_data: Dict[str, Any]) -> Iterator[MappedReceipt]:
+    """Workflow format: matched items carry receipt_item.receipt_id"""
+    items_by_receipt: Dict[str, List[Dict[str, Any]]] = {}
+    for item in mapped_data.get('matched_items', []):
+        receipt_id = (item.get('receipt_item') or {}).get('receipt_id') or 'unknown'
+        items_by_receipt.setdefault(receipt_id, []).append(item)
+
+    for receipt_id, receipt_data in mapped_data.get('receipts', {}).items():
+        yield receipt_id, receipt_data, items_by_receipt.get(receipt_id, [])
+
+
+def _group_mapped_items(items) -> Iterator[MappedReceipt]:
+    """Rule-engine format: flat items carry receipt_id and the receipt context in receipt_data"""
+    receipts: Dict[str, Dict[str, Any]] = {}
+    items_by_receipt: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        receipt_id = item.get('receipt_id') or 'unknown'
+        if receipt_id not in receipts:
+            receipts[receipt_id] = item.get('receipt_data') or {}
+        items_by_receipt.setdefault(receipt_id, []).append(matched_item_from_mapped(item))
+
+    for receipt_id, receipt_data in receipts.items():
+        yield receipt_id, receipt_data, items_by_receipt[receipt_id]
+
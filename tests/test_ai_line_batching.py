@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+AI Line Batching Tests
+Tests batched, cached AI line interpretation using the local stub backend.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.ai_line_interpreter import AILineInterpreter, stub_llm_response
+
+
+class TestAILineBatching(unittest.TestCase):
+    """Test AILineInterpreter batching, de-duplication and persistent cache"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = Path(self.tmp.name) / 'ai_cache.sqlite'
+        self.prompts = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _interpreter(self, **config):
+        def responder(prompt):
+            self.prompts.append(prompt)
+            return stub_llm_response(prompt)
+        params = {
+            'backend': 'stub',
+            'model_name': 'stub-model',
+            'use_for_vendors': ['Restaurant Depot'],
+            'cache_file': str(self.cache_file),
+            'batch_size': 3,
+            'stub_responder': responder,
+        }
+        params.update(config)
+        return AILineInterpreter(params)
+
+    def test_duplicates_cost_one_answer(self):
+        """Repeated lines (case/whitespace variants) are sent once, results map back to every line"""
+        ai = self._interpreter()
+        lines = ['CHKN BRST 40LB 2', 'chkn  brst 40lb 2', 'ONION YEL 50LB 1', 'CHKN BRST 40LB 2']
+        results = ai.interpret_lines(lines, vendor='Restaurant Depot')
+
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual([r['product_name'] for r in results],
+                         ['CHKN BRST 40LB', 'CHKN BRST 40LB', 'ONION YEL 50LB', 'CHKN BRST 40LB'])
+        self.assertEqual(results[1]['line_text'], 'chkn  brst 40lb 2')
+        self.assertEqual(ai.get_stats()['deduplicated'], 2)
+
+    def test_unique_lines_are_batched(self):
+        """Unique lines are packed batch_size per prompt"""
+        ai = self._interpreter(max_concurrency=2)
+        lines = [f'ITEM{i} ABC {i + 1}' for i in range(7)]
+        results = ai.interpret_lines(lines, vendor='Restaurant Depot')
+
+        self.assertEqual(len(self.prompts), 3)  # 3 + 3 + 1
+        self.assertEqual([r['total_price'] for r in results], [float(i + 1) for i in range(7)])
+        self.assertTrue(all(r['ai_interpreted'] for r in results))
+
+    def test_persistent_cache_across_instances(self):
+        """A second interpreter answers from the cache; model change invalidates it"""
+        ai = self._interpreter()
+        ai.interpret_lines(['CHKN BRST 40LB 2', 'ONION YEL 50LB 1'], vendor='Restaurant Depot')
+        ai.close()
+        self.assertEqual(len(self.prompts), 1)
+
+        ai2 = self._interpreter()
+        results = ai2.interpret_lines(['ONION YEL 50LB 1'], vendor='Restaurant Depot')
+        self.assertEqual(results[0]['product_name'], 'ONION YEL 50LB')
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual(ai2.get_stats()['cache_hits'], 1)
+        ai2.close()
+
+        ai3 = self._interpreter(model_name='other-model')
+        ai3.interpret_lines(['ONION YEL 50LB 1'], vendor='Restaurant Depot')
+        self.assertEqual(len(self.prompts), 2)
+        ai3.close()
+
+    def test_missing_answers_are_failures_and_cached(self):
+        """Lines missing from the batch answer get a failure marker and are not re-asked"""
+        ai = self._interpreter(stub_responder=lambda prompt: self.prompts.append(prompt) or '{"items": []}')
+        lines = ['MYSTERY 12X', 'OTHER 9Z']
+        results = ai.interpret_lines(lines, vendor='Restaurant Depot')
+        self.assertEqual([r['parsed_by'] for r in results], ['ai_fallback_failed'] * 2)
+
+        ai.interpret_lines(lines, vendor='Restaurant Depot')
+        self.assertEqual(len(self.prompts), 1)
+
+    def test_backend_error_is_not_cached(self):
+        """Backend errors return failure markers but are retried on the next call"""
+        def broken(prompt):
+            self.prompts.append(prompt)
+            raise ConnectionError('backend down')
+        ai = self._interpreter(stub_responder=broken)
+        self.assertEqual(ai.interpret_line('CHKN BRST 40LB 2', vendor='Restaurant Depot')['parsed_by'],
+                         'ai_fallback_failed')
+        ai.interpret_line('CHKN BRST 40LB 2', vendor='Restaurant Depot')
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_interpret_batch_skips_ignored_lines(self):
+        """interpret_batch keeps its list-of-items contract"""
+        ai = self._interpreter()
+        items = ai.interpret_batch(['CHKN BRST 40LB 2', '   ', 'ONION YEL 50LB 1'], vendor='Restaurant Depot')
+        self.assertEqual([it['product_name'] for it in items], ['CHKN BRST 40LB', 'ONION YEL 50LB'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Bulk SQL Writer Tests
+Tests the single-transaction bulk load script emitted by step 4.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step4_sql.bulk_sql import (
+    BulkSQLWriter,
+    PURCHASE_ORDER_COLUMNS,
+    PURCHASE_ORDER_LINE_COLUMNS,
+    format_copy_value,
+    format_sql_value,
+)
+
+
+def _order(po_id, vendor):
+    row = {col: None for col in PURCHASE_ORDER_COLUMNS}
+    row.update({'id': po_id, 'name': f'P{po_id:05d}', 'state': 'draft', 'amount_total': 10.0,
+                'mail_reminder_confirmed': False, 'vendor_name': vendor})
+    return row
+
+
+def _line(line_id, po_id, vendor, name):
+    row = {col: None for col in PURCHASE_ORDER_LINE_COLUMNS}
+    row.update({'id': line_id, 'order_id': po_id, 'product_id': 42, 'name': name, 'price_subtotal': 10.0,
+                'propagate_cancel': True, 'vendor_name': vendor})
+    return row
+
+
+class TestBulkSQLWriter(unittest.TestCase):
+    """Test BulkSQLWriter output"""
+
+    def _writer(self, fmt, receipts=3, **kwargs):
+        writer = BulkSQLWriter(fmt, **kwargs)
+        for i in range(1, receipts + 1):
+            vendor = 'IC-Jewel-Osco' if i % 2 else "Joe's Market"
+            writer.add_receipt(_order(i, vendor), [_line(i * 100, i, vendor, f'ITEM {i}')], source=f'r{i}.pdf')
+        return writer
+
+    def test_value_formatting(self):
+        """SQL literals and COPY text fields are escaped"""
+        self.assertEqual(format_sql_value("Joe's"), "'Joe''s'")
+        self.assertEqual(format_sql_value(None), 'NULL')
+        self.assertEqual(format_sql_value(False), 'FALSE')
+        self.assertEqual(format_copy_value('a\tb\\c\nd'), 'a\\tb\\\\c\\nd')
+        self.assertEqual(format_copy_value(None), '\\N')
+        self.assertEqual(format_copy_value(True), 't')
+
+    def test_copy_format_single_transaction(self):
+        """All receipts load inside one BEGIN/COMMIT with one COPY block per table"""
+        sql = self._writer('copy').render()
+        self.assertEqual(sql.count('BEGIN;'), 1)
+        self.assertEqual(sql.count('\nCOMMIT;'), 1)
+        self.assertEqual(sql.count('FROM STDIN;'), 3)
+        self.assertIn("Joe's Market\n", sql)
+        self.assertNotIn('WHERE name =', sql)
+        # Each distinct vendor is listed once for partner resolution
+        vendor_block = sql.split('COPY tmp_receipt_vendor (vendor_name) FROM STDIN;\n')[1].split('\\.')[0]
+        self.assertEqual(vendor_block.splitlines(), ['IC-Jewel-Osco', "Joe's Market"])
+
+    def test_values_format_batches(self):
+        """Multi-row VALUES statements hold at most batch_size rows"""
+        sql = self._writer('values', receipts=5, batch_size=2).render()
+        self.assertEqual(sql.count('INSERT INTO tmp_purchase_order ('), 3)
+        self.assertEqual(sql.count('INSERT INTO tmp_purchase_order_line ('), 3)
+        self.assertIn("'Joe''s Market'", sql)
+        self.assertIn('JOIN tmp_partner_map m USING (vendor_name)', sql)
+
+    def test_write_and_invalid_format(self):
+        """write() creates the file; unknown formats are rejected"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self._writer('copy').write(Path(tmp) / 'out' / 'bulk.sql')
+            self.assertTrue(path.exists())
+        with self.assertRaises(ValueError):
+            BulkSQLWriter('csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Catalog Snapshot Tests
+Tests compiling, reusing and invalidating the ProductMatcher catalog snapshot.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.catalog_snapshot import open_catalog_snapshot, snapshot_path_for, uom_matches_path_for
+from step3_mapping.product_matcher import ProductMatcher
+
+DB_ANALYSIS = {
+    'uoms': {'1': {'name': 'Units'}, '2': {'name': 'lb'}, '3': {'name': 'Case of 12'}},
+    'product_templates': {
+        '10': {'name': 'Whole Milk', 'uom_po_id': 3},
+        '11': {'name': 'Organic Lime'},
+    },
+    'products': {
+        '100': {'product_tmpl_id': '10', 'uom_id': 1},
+        '101': {'product_tmpl_id': '11', 'uom_id': 2},
+    },
+}
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+    """Test the compiled catalog snapshot against the JSON dump"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'products_uom_analysis.json'
+        self.path.write_text(json.dumps(DB_ANALYSIS))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot_written_then_used(self):
+        """First load compiles the snapshot, the next one reads from it with the same results"""
+        from_json = ProductMatcher(str(self.path))
+        self.assertTrue(snapshot_path_for(self.path).exists())
+        from_snapshot = ProductMatcher(str(self.path))
+        self.assertIsNotNone(from_snapshot.snapshot)
+
+        for name in ('Whole Milk', 'organic lime', 'lime organic', 'Nothing Like It'):
+            self.assertEqual(from_snapshot.match_product(name), from_json.match_product(name), name)
+        for product_id in (100, 101, 999):
+            self.assertEqual(from_snapshot._get_product_by_id(product_id),
+                             from_json._get_product_by_id(product_id))
+        self.assertEqual(from_snapshot.match_uom('LBS'), from_json.match_uom('LBS'))
+
+    def test_stale_snapshot_is_ignored(self):
+        """Changing the JSON invalidates the snapshot"""
+        ProductMatcher(str(self.path))
+        data = dict(DB_ANALYSIS, product_templates={**DB_ANALYSIS['product_templates'], '12': {'name': 'Basil'}},
+                    products={**DB_ANALYSIS['products'], '102': {'product_tmpl_id': '12', 'uom_id': 1}})
+        self.path.write_text(json.dumps(data))
+        self.assertIsNone(open_catalog_snapshot(self.path))
+
+        matcher = ProductMatcher(str(self.path))
+        self.assertEqual(matcher.match_product('Basil')['product_id'], 102)
+        self.assertIsNotNone(open_catalog_snapshot(self.path))
+
+    def test_uom_matches_persisted_with_snapshot(self):
+        """Resolved UoMs are reused by the next run until the JSON changes"""
+        matcher = ProductMatcher(str(self.path))
+        lb = matcher.match_uom('pounds')
+        self.assertIsNone(matcher.match_uom('bushel'))
+        self.assertEqual(matcher.save_uom_matches(), uom_matches_path_for(self.path))
+        self.assertIsNone(matcher.save_uom_matches())
+
+        reloaded = ProductMatcher(str(self.path))
+        self.assertEqual(reloaded._uom_match_cache, {'pounds': lb, 'bushel': None})
+        self.assertEqual(reloaded.match_uom('Pounds'), lb)
+
+        self.path.write_text(json.dumps(dict(DB_ANALYSIS, uoms={'1': {'name': 'Units'}})))
+        self.assertEqual(ProductMatcher(str(self.path))._uom_match_cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
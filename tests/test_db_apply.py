@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Database Apply Tests
+Tests step 4 --apply mode against a SQLite stand-in for the Odoo database.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step4_sql.bulk_sql import PURCHASE_ORDER_COLUMNS, PURCHASE_ORDER_LINE_COLUMNS
+from step4_sql.db_apply import PurchaseOrderApplier
+
+
+def _receipt(po_id, vendor, n_lines=2, bad=False):
+    order = {col: None for col in PURCHASE_ORDER_COLUMNS}
+    order.update({'id': po_id, 'name': f'P{po_id:05d}', 'state': 'draft', 'amount_total': 10.0 * n_lines,
+                  'vendor_name': vendor})
+    lines = []
+    for i in range(n_lines):
+        line = {col: None for col in PURCHASE_ORDER_LINE_COLUMNS}
+        line.update({'id': po_id * 100 + i, 'order_id': po_id, 'product_id': 42, 'name': f'ITEM {i}',
+                     'price_subtotal': 10.0, 'vendor_name': vendor})
+        lines.append(line)
+    if bad:
+        # Duplicate line ID -> primary key violation inside this receipt
+        lines.append(dict(lines[0]))
+    return order, lines
+
+
+class _Pool:
+    """Minimal getconn/putconn pool over one SQLite file"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.checked_out = 0
+
+        self.returned_in_transaction = 0
+
+    def getconn(self):
+        self.checked_out += 1
+        return sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+
+    def putconn(self, conn):
+        self.checked_out -= 1
+        self.returned_in_transaction += conn.in_transaction
+        conn.close()
+
+
+class TestDatabaseApply(unittest.TestCase):
+    """Test PurchaseOrderApplier chunking, savepoints and dry run"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self.tmp.name) / 'odoo.sqlite')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE res_partner (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.executemany('INSERT INTO res_partner (id, name) VALUES (?, ?)',
+                         [(7, 'IC-Jewel-Osco'), (9, 'Restaurant Depot'), (3, 'Restaurant Depot')])
+        order_cols = ', '.join(f'{c} PRIMARY KEY' if c == 'id' else c for c in PURCHASE_ORDER_COLUMNS)
+        line_cols = ', '.join(f'{c} PRIMARY KEY' if c == 'id' else c for c in PURCHASE_ORDER_LINE_COLUMNS)
+        conn.execute(f'CREATE TABLE purchase_order ({order_cols})')
+        conn.execute(f'CREATE TABLE purchase_order_line ({line_cols})')
+        conn.commit()
+        conn.close()
+        self.pool = _Pool(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _count(self, table, where=''):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f'SELECT COUNT(*) FROM {table} {where}').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_apply_resolves_partners(self):
+        """Orders and lines are inserted with the lowest matching partner ID"""
+        applier = PurchaseOrderApplier(pool=self.pool, chunk_size=2)
+        stats = applier.apply([_receipt(1, 'IC-Jewel-Osco'), _receipt(2, 'Restaurant Depot'),
+                               _receipt(3, 'IC-Jewel-Osco')])
+        self.assertEqual((stats['applied'], stats['failed'], stats['transactions']), (3, 0, 2))
+        self.assertEqual(self._count('purchase_order'), 3)
+        self.assertEqual(self._count('purchase_order_line', 'WHERE partner_id = 3'), 2)
+        self.assertEqual(self.pool.checked_out, 0)
+
+    def test_bad_receipt_rolls_back_alone(self):
+        """A failing receipt is rolled back to its savepoint; the rest of the chunk commits"""
+        applier = PurchaseOrderApplier(pool=self.pool, chunk_size=10)
+        stats = applier.apply([_receipt(1, 'IC-Jewel-Osco'), _receipt(2, 'IC-Jewel-Osco', bad=True),
+                               _receipt(3, 'Unknown Vendor'), _receipt(4, 'Restaurant Depot')])
+        self.assertEqual(stats['applied'], 2)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['skipped_no_partner'], 1)
+        self.assertEqual(stats['errors'][0]['receipt'], 'P00002')
+        self.assertEqual(self._count('purchase_order'), 2)
+        self.assertEqual(self._count('purchase_order_line', 'WHERE order_id = 2'), 0)
+
+    def test_dry_run_rolls_back(self):
+        """Dry run executes everything and leaves the database unchanged"""
+        applier = PurchaseOrderApplier(pool=self.pool, chunk_size=1, workers=4, dry_run=True)
+        stats = applier.apply([_receipt(1, 'IC-Jewel-Osco'), _receipt(2, 'Restaurant Depot')])
+        self.assertEqual(stats['applied'], 2)
+        self.assertTrue(stats['dry_run'])
+        self.assertEqual(self._count('purchase_order'), 0)
+        self.assertEqual(self._count('purchase_order_line'), 0)
+
+    def test_dry_run_chunk_failure(self):
+        """A chunk that fails outside its savepoints rolls back and counts the rest as failed"""
+        applier = PurchaseOrderApplier(pool=self.pool, chunk_size=1, dry_run=True)
+        resolve_partners = applier._resolve_partners
+        calls = []
+
+        def fail_second_chunk(cur, vendor_names):
+            calls.append(vendor_names)
+            if len(calls) == 2:
+                raise sqlite3.OperationalError('connection lost')
+            return resolve_partners(cur, vendor_names)
+
+        applier._resolve_partners = fail_second_chunk
+        stats = applier.apply([_receipt(1, 'IC-Jewel-Osco'), _receipt(2, 'Restaurant Depot'),
+                               _receipt(3, 'Restaurant Depot')])
+        self.assertEqual((stats['applied'], stats['failed']), (1, 2))
+        self.assertIn('connection lost', stats['errors'][0]['error'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((self.pool.checked_out, self.pool.returned_in_transaction), (0, 0))
+        self.assertEqual(self._count('purchase_order'), 0)
+
+    def test_concurrent_chunks(self):
+        """Chunks applied on several pooled connections all commit"""
+        applier = PurchaseOrderApplier(pool=self.pool, chunk_size=2, workers=3)
+        stats = applier.apply([_receipt(i, 'Restaurant Depot', n_lines=3) for i in range(1, 10)])
+        self.assertEqual(stats['applied'], 9)
+        self.assertEqual(self._count('purchase_order_line'), 27)
+
+    def test_requires_connection_source(self):
+        with self.assertRaises(ValueError):
+            PurchaseOrderApplier()
+
+
+if __name__ == '__main__':
+    unittest.main()
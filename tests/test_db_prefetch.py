@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+DB Prefetch Tests
+Tests concurrent step 3 stage queries against a SQLite stand-in for the Odoo database.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.db_prefetch import QueryPrefetcher, prefetch_stage_queries
+from step3_mapping.rule_executor import prepare_db_match_stage, prepare_uom_mapping_stage
+from step3_mapping.rule_loader import RuleLoader
+
+SCHEMA = """
+CREATE TABLE uom_category (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE uom_uom (id INTEGER PRIMARY KEY, name TEXT, category_id INTEGER, active BOOLEAN,
+                      factor REAL, uom_type TEXT);
+CREATE TABLE product_template (id INTEGER PRIMARY KEY, name TEXT, uom_id INTEGER, purchase_ok BOOLEAN,
+                               sale_ok BOOLEAN, type TEXT, categ_id INTEGER);
+CREATE TABLE product_product (id INTEGER PRIMARY KEY, product_tmpl_id INTEGER, default_code TEXT, barcode TEXT);
+INSERT INTO uom_category VALUES (1, 'Unit'), (2, 'Weight');
+INSERT INTO uom_uom VALUES (1, 'Units', 1, 1, 1, 'reference'), (2, 'lb', 2, 1, 1, 'reference'),
+                           (3, 'Old', 2, 0, 1, 'smaller');
+INSERT INTO product_template VALUES (10, 'Whole Milk', 1, 1, 0, 'product', 5), (11, 'Sugar', 2, 1, 1, 'product', 5);
+INSERT INTO product_product VALUES (100, 10, 'MILK', '0001'), (101, 11, NULL, NULL);
+"""
+
+
+class _Pool:
+    """Minimal getconn/putconn pool over one SQLite file"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.checked_out = 0
+
+    def getconn(self):
+        self.checked_out += 1
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def putconn(self, conn):
+        self.checked_out -= 1
+        conn.close()
+
+
+class _NoQueryConnection:
+    """db_conn for stages whose rows were all prefetched"""
+
+    def cursor(self):
+        raise AssertionError("stage queried the database instead of using prefetched rows")
+
+
+class _RecordingConnection:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def cursor(self):
+        return _RecordingCursor(self.executed)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _RecordingCursor:
+    description = [('product_id',), ('so_line_count',), ('so_qty',)]
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return [(7, 1, 2.0)]
+
+    def close(self):
+        pass
+
+
+class TestDatabasePrefetch(unittest.TestCase):
+    """Test QueryPrefetcher and prefetch_stage_queries"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db_path = str(Path(self.tmp.name) / 'odoo.sqlite')
+        conn = sqlite3.connect(db_path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.pool = _Pool(db_path)
+        loader = RuleLoader(PROJECT_ROOT / 'step3_rules')
+        self.stages = [('db_match', loader.get_rule('04_db_match.yaml')['db_match']),
+                       ('uom_mapping', loader.get_rule('06_uom.yaml')['uom_mapping'])]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stages_use_prefetched_rows(self):
+        prefetcher = QueryPrefetcher(pool=self.pool, workers=2)
+        context = {'db_conn': _NoQueryConnection(), 'db_prefetcher': prefetcher, 'product_matcher': object()}
+
+        self.assertEqual(prefetch_stage_queries(self.stages, context), 2)
+        self.assertEqual(self.pool.checked_out, 0)
+        self.assertEqual(sorted(timing['query'] for timing in context['prefetch_timings']),
+                         ['db_match.products', 'uom_mapping.uom_categories'])
+
+        db_state = prepare_db_match_stage(self.stages[0][1], context)
+        uom_state = prepare_uom_mapping_stage(self.stages[1][1], context)
+        self.assertEqual(db_state['db_products'][100]['product_name'], 'Whole Milk')
+        self.assertEqual(db_state['db_products'][101]['default_uom_id'], 2)
+        self.assertEqual(uom_state['uom_categories'], {1: {'category_id': 1, 'category_name': 'Unit'},
+                                                       2: {'category_id': 2, 'category_name': 'Weight'}})
+        self.assertEqual(context['prefetched'], {})
+
+    def test_failed_query_is_left_to_the_stage(self):
+        prefetcher = QueryPrefetcher(pool=self.pool)
+        results = prefetcher.run({('db_match', 'products'): ('SELECT * FROM missing_table', {}, False),
+                                  ('uom_mapping', 'uom_categories'): ('SELECT 1 AS uom_id', {}, False)})
+
+        self.assertEqual(list(results), [('uom_mapping', 'uom_categories')])
+        failed = [timing for timing in prefetcher.timings if timing['error']]
+        self.assertEqual([timing['query'] for timing in failed], ['db_match.products'])
+        self.assertEqual(self.pool.checked_out, 0)
+
+    def test_product_id_queries_wait_for_product_ids(self):
+        executed = []
+        prefetcher = QueryPrefetcher(connect=lambda: _RecordingConnection(executed))
+        usage_config = {'time_window': {'days_back': 30}, 'queries': {
+            'sales_usage': 'SELECT ... WHERE product_id = ANY(%(product_ids)s)',
+            'manufacturing_usage': 'SELECT product_id, COUNT(*) AS bom_line_count FROM mrp_bom_line GROUP BY 1'}}
+        context = {'db_prefetcher': prefetcher}
+
+        prefetch_stage_queries([('usage_probe', usage_config)], context)
+        self.assertEqual(list(context['prefetched']), [('usage_probe', 'manufacturing_usage')])
+
+        prefetch_stage_queries([('usage_probe', usage_config)], context, product_ids={9, 7})
+        self.assertIn(('usage_probe', 'sales_usage'), context['prefetched'])
+        self.assertEqual(executed[-1][1]['product_ids'], [7, 9])
+        self.assertEqual(context['prefetched'][('usage_probe', 'sales_usage')],
+                         [{'product_id': 7, 'so_line_count': 1, 'so_qty': 2.0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Enrichment Engine Tests
+Tests the async, rate-limited lookup engine against a local HTTP stub server.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.enrichment_engine import AsyncEnrichmentEngine, AIOHTTP_AVAILABLE
+from step1_extract.webstaurantstore_lookup import WebstaurantStoreLookup
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Serves canned pages; /flaky fails once with 503, /slow sleeps briefly"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+            hits = server.hits[self.path]
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.05)
+            if self.path == '/flaky' and hits == 1:
+                self._send(503, b'busy')
+            elif self.path == '/100.html':
+                self._send(200, b'<html><h1 class="product-name">Nitrile Glove Large</h1>'
+                                b'<div class="breadcrumb"><a>Home</a><a>Food Service Gloves</a></div></html>')
+            elif self.path == '/search/200.html':
+                self._send(200, b'<html><div class="product-box"><a href="/product/200">Paper Napkin</a></div></html>')
+            elif self.path in ('/flaky', '/ok') or self.path.startswith('/slow'):
+                self._send(200, b'ok')
+            else:
+                self._send(404, b'not found')
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestEnrichmentEngine(unittest.TestCase):
+    """Test async enrichment engine and WebstaurantStore batch lookups"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.hits = Counter()
+        cls.server.active = 0
+        cls.server.max_active = 0
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        with self.server.lock:
+            self.server.hits.clear()
+            self.server.max_active = 0
+
+    def _engine(self, **kwargs):
+        params = dict(max_concurrency=4, requests_per_second=1000.0, burst=10,
+                      backoff_base=0.01, timeout=5.0, use_aiohttp=False)
+        params.update(kwargs)
+        return AsyncEnrichmentEngine(**params)
+
+    def test_duplicate_urls_fetched_once(self):
+        """Duplicate URLs (within and across calls) hit the server once"""
+        engine = self._engine()
+        url = f"{self.base_url}/ok"
+        results = engine.fetch_all([url, url, url])
+        self.assertTrue(results[url].ok)
+        engine.fetch_all([url])
+        self.assertEqual(self.server.hits['/ok'], 1)
+        self.assertGreaterEqual(engine.get_stats()['deduplicated'], 3)
+
+    def test_retry_with_backoff(self):
+        """Transient 503 is retried and succeeds"""
+        engine = self._engine()
+        url = f"{self.base_url}/flaky"
+        results = engine.fetch_all([url])
+        self.assertEqual(results[url].status, 200)
+        self.assertEqual(self.server.hits['/flaky'], 2)
+        self.assertEqual(engine.get_stats()['retries'], 1)
+
+    def test_not_found_is_not_retried(self):
+        """404 is returned immediately"""
+        engine = self._engine()
+        url = f"{self.base_url}/missing"
+        self.assertEqual(engine.fetch_all([url])[url].status, 404)
+        self.assertEqual(self.server.hits['/missing'], 1)
+
+    def test_bounded_concurrency(self):
+        """No more than max_concurrency requests are in flight"""
+        engine = self._engine(max_concurrency=2)
+        urls = [f"{self.base_url}/slow{i}" for i in range(8)]
+        results = engine.fetch_all(urls)
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(self.server.max_active, 2)
+
+    def test_per_host_rate_limit(self):
+        """Token bucket spaces requests to the configured rate"""
+        engine = self._engine(requests_per_second=20.0, burst=1)
+        urls = [f"{self.base_url}/slow-rate{i}" for i in range(5)]
+        start = time.monotonic()
+        engine.fetch_all(urls)
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 4 / 20.0 * 0.9)
+
+    @unittest.skipUnless(AIOHTTP_AVAILABLE, "aiohttp not installed")
+    def test_aiohttp_backend(self):
+        """aiohttp backend behaves like the requests backend"""
+        engine = self._engine(use_aiohttp=True)
+        urls = [f"{self.base_url}/ok", f"{self.base_url}/flaky", f"{self.base_url}/missing"]
+        results = engine.fetch_all(urls)
+        self.assertEqual([results[u].status for u in urls], [200, 200, 404])
+        self.assertEqual(engine.get_stats()['backend'], 'aiohttp')
+
+    def test_webstaurantstore_batch_lookup(self):
+        """Batch lookup: product page, search fallback, negatives cached, cache consulted first"""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_file = Path(tmp) / 'wss_cache.json'
+            with open(cache_file, 'w') as f:
+                json.dump({'900': {'item_number': '900', 'found': True, 'name': 'Cached Cup'}}, f)
+
+            lookup = WebstaurantStoreLookup(cache_file=str(cache_file), engine=self._engine(),
+                                            base_url=self.base_url)
+            results = lookup.lookup_items(['100', '200', '300', '900', '100'])
+
+            self.assertEqual(results['100']['name'], 'Nitrile Glove Large')
+            self.assertEqual(results['200']['name'], 'Paper Napkin')
+            self.assertIsNone(results['300'])
+            self.assertEqual(results['900']['name'], 'Cached Cup')
+            self.assertEqual(self.server.hits['/100.html'], 1)
+            self.assertEqual(self.server.hits['/900.html'], 0)
+
+            # Negative result is cached, so the miss is not re-requested
+            self.assertEqual(lookup.lookup_items(['300']), {'300': None})
+            self.assertEqual(lookup.get_cache_stats()['negative_hits'], 1)
+
+            # Second lookup instance is served entirely from the cache file
+            lookup2 = WebstaurantStoreLookup(cache_file=str(cache_file), engine=self._engine(),
+                                             base_url=self.base_url)
+            items = lookup2.enrich_items([{'item_number': '100'}, {'item_number': '300'}])
+            self.assertEqual(items[0]['_webstaurantstore_l2_hint'], 'C31')
+            self.assertEqual(self.server.hits['/100.html'], 1)
+            self.assertEqual(self.server.hits['/300.html'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
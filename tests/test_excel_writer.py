@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Streaming Excel Writer Tests
+Tests the write-only workbook used by the step 1 / step 2 Excel exports.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from openpyxl import load_workbook
+
+from step1_extract.utils.excel_writer import StreamingWorkbook
+
+
+class TestStreamingWorkbook(unittest.TestCase):
+    """Test StreamingWorkbook sheets, widths, validations and links"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'out.xlsx'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_interleaved_sheets_in_one_pass(self):
+        """Rows routed to several sheets in one pass; missing values become empty cells"""
+        workbook = StreamingWorkbook(self.path, sample_rows=3)
+        everything = workbook.add_sheet('All', ['name', 'L2'])
+        unmapped = workbook.add_sheet('Unmapped', ['name', 'L2'])
+        everything.add_list_validation('L2', '"C10,C99"')
+        for i in range(10):
+            row = [f'item {i}', 'C99' if i % 4 == 0 else float('nan')]
+            everything.append(row)
+            if i % 4 == 0:
+                unmapped.append([workbook.link(unmapped, row[0], '/tmp/receipt.pdf'), row[1]])
+        workbook.save()
+
+        wb = load_workbook(self.path)
+        self.assertEqual(wb.sheetnames, ['All', 'Unmapped'])
+        self.assertEqual(wb['All'].max_row, 11)
+        self.assertIsNone(wb['All']['B3'].value)
+        self.assertEqual(wb['Unmapped'].max_row, 4)
+        self.assertEqual(wb['Unmapped']['A2'].hyperlink.target, '/tmp/receipt.pdf')
+        self.assertEqual(wb['All'].column_dimensions['A'].width, len('item 0') + 2)
+        self.assertEqual(str(wb['All'].data_validations.dataValidation[0].sqref), 'B2:B11')
+
+    def test_header_only_sheet(self):
+        workbook = StreamingWorkbook(self.path)
+        workbook.write_sheet('Empty', ['a', 'b'], [])
+        workbook.save()
+        self.assertEqual([c.value for c in load_workbook(self.path)['Empty'][1]], ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Step 4 SQL Generation Tests
+Tests generating purchase order SQL from step 3 output (mapped path, sharded process pool)
+without a database.
+"""
+
+import importlib.machinery
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+sys.path.insert(0, str(PROJECT_ROOT))
+
+if importlib.util.find_spec('config') is None:
+    # config.py is gitignored - use the template it is copied from
+    _loader = importlib.machinery.SourceFileLoader('config', str(PROJECT_ROOT / 'config.py.example'))
+    _spec = importlib.util.spec_from_loader('config', _loader)
+    sys.modules['config'] = importlib.util.module_from_spec(_spec)
+    _loader.exec_module(sys.modules['config'])
+
+from step4_sql import generate_receipt_sql
+from step4_sql.generate_receipt_sql import ReceiptSQLGenerator
+from step4_sql.id_allocator import POIdAllocator
+from step4_sql.mapped_input import iter_mapped_receipts
+
+# Process pool workers inherit the patched clock and the config module only when forked
+FORK = multiprocessing.get_start_method() == 'fork'
+
+
+class FrozenDatetime(datetime):
+    """datetime with a fixed now() so generated files can be compared byte for byte"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 2, 1, 12, 0, 0)
+
+
+def _matched_item(receipt_id, name, product_id, total, **extra):
+    receipt_item = {'receipt_id': receipt_id, 'product_name': name, 'quantity': 1.0, 'unit_price': total,
+                    'total_price': total, 'order_date': '2025-01-15T10:00:00'}
+    receipt_item.update(extra)
+    return {'receipt_item': receipt_item, 'matched': bool(product_id),
+            'product_match': {'product_id': product_id, 'name': name.title()} if product_id else None,
+            'uom_match': {'id': 1, 'name': 'Units'}}
+
+
+def mapped_data(receipt_count=3, order_ids=None):
+    """Workflow mapped_data.json content: receipt i has i + 1 matched lines and one unmatched line"""
+    receipts = {}
+    items = []
+    for number in range(receipt_count):
+        receipt_id = f"r{number}"
+        order_id = order_ids[number] if order_ids else f"RD{number:03d}"
+        receipts[receipt_id] = {'vendor': 'Restaurant Depot', 'order_id': order_id,
+                                'order_date': '2025-01-15T10:00:00', 'total': 10.0 * (number + 1)}
+        for line in range(number + 1):
+            items.append(_matched_item(receipt_id, f"item {number}-{line}", 100 + line, 10.0))
+        items.append(_matched_item(receipt_id, 'unknown item', None, 1.0))
+    return {'receipts': receipts, 'matched_items': items}
+
+
+class Step4TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.input_dir = self.dir / 'step3_output'
+        self.input_dir.mkdir()
+        self.output_dir = self.dir / 'sql'
+        self.ledger = self.dir / 'po_ids.sqlite3'
+        POIdAllocator(self.ledger, require_sync=False).reserve_floor(500, 9000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_mapped_data(self, data):
+        with open(self.input_dir / 'mapped_data.json', 'w') as f:
+            json.dump(data, f)
+
+    def generator(self, **config):
+        config.setdefault('PO_ID_LEDGER', str(self.ledger))
+        config.setdefault('PO_ID_ALLOW_UNSYNCED', True)
+        config.setdefault('FRUIT_CONVERSION_FILE', str(self.dir / 'fruit_weight_conversion.json'))
+        return ReceiptSQLGenerator(config)
+
+
+class TestMappedReceipts(Step4TestCase):
+    """process_mapped_receipts and the default (mapped input) CLI path"""
+
+    def test_process_mapped_receipts(self):
+        self.write_mapped_data(mapped_data())
+        generator = self.generator()
+
+        stats = generator.process_mapped_receipts(self.input_dir, self.output_dir)
+
+        self.assertEqual((stats['success'], stats['failed']), (3, 0))
+        sql = (self.output_dir / 'purchase_order_RD002.sql').read_text()
+        self.assertIn('-- Order ID: RD002', sql)
+        self.assertEqual(sql.count('INSERT INTO purchase_order_line'), 3)
+        self.assertNotIn('unknown item', sql)
+        # IDs come from the ledger in receipt order (r0: 1 line, r1: 2 lines, r2: 3 lines)
+        self.assertIn('WHERE po.id = 502;', sql)
+        self.assertIn('SELECT 9003, 10, ', sql)
+        self.assertFalse(generator._product_matcher_loaded)
+
+        # Reruns keep the IDs
+        self.generator().process_mapped_receipts(self.input_dir, self.output_dir)
+        self.assertIn('WHERE po.id = 502;', (self.output_dir / 'purchase_order_RD002.sql').read_text())
+
+    def test_fruit_conversion_comment_without_catalog(self):
+        """The conversion rate comes from the item (step 3) or the fruit conversion file, never the catalog"""
+        fruit = dict(converted=True, original_weight_lb=2.0, original_uom='lb', original_unit_price_per_lb=0.5)
+        data = {'receipts': {'r0': {'vendor': 'Costco', 'order_id': 'C1', 'total': 2.0}},
+                'matched_items': [_matched_item('r0', 'bananas', 7, 1.0, items_per_lb=3.0, **fruit),
+                                  _matched_item('r0', 'limes', 8, 1.0, **fruit)]}
+        self.write_mapped_data(data)
+        with open(self.dir / 'fruit_weight_conversion.json', 'w') as f:
+            json.dump({'_comment': 'items per lb', 'Limes': {'items_per_lb': 8.0}}, f)
+        generator = self.generator()
+
+        generator.process_mapped_receipts(self.input_dir, self.output_dir)
+
+        sql = (self.output_dir / 'purchase_order_C1.sql').read_text()
+        self.assertIn('Conversion Logic: 2.0 lb × 3.0 items/lb', sql)
+        self.assertIn('Conversion Logic: 2.0 lb × 8.0 items/lb', sql)
+        self.assertFalse(generator._product_matcher_loaded)
+
+    def test_cli_mapped_input(self):
+        self.write_mapped_data(mapped_data(2))
+        argv = ['generate_receipt_sql.py', '--input-dir', str(self.input_dir), '--output-dir', str(self.output_dir),
+                '--id-ledger', str(self.ledger), '--no-sync-ids']
+        with mock.patch.object(sys, 'argv', argv):
+            generate_receipt_sql.main()
+
+        self.assertEqual(sorted(p.name for p in self.output_dir.glob('*.sql')),
+                         ['purchase_order_RD000.sql', 'purchase_order_RD001.sql'])
+        self.assertIn('WHERE po.id = 501;', (self.output_dir / 'purchase_order_RD001.sql').read_text())
+
+    def test_cli_refuses_unsynced_ledger_without_database(self):
+        """Without --no-sync-ids the ledger must be synced with the database first"""
+        self.write_mapped_data(mapped_data(1))
+        argv = ['generate_receipt_sql.py', '--input-dir', str(self.input_dir), '--output-dir', str(self.output_dir),
+                '--id-ledger', str(self.ledger)]
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(ReceiptSQLGenerator, 'sync_ids_with_database', return_value=False):
+            with self.assertRaises(SystemExit):
+                generate_receipt_sql.main()
+        self.assertFalse(self.output_dir.exists())
+
+
+class TestParallelGeneration(Step4TestCase):
+    """generate_sql_parallel shards and the step 4 workflow that drives it"""
+
+    def receipts(self, receipt_count=5, order_ids=None):
+        data = mapped_data(receipt_count, order_ids)
+        data['receipts']['empty'] = {'vendor': 'Costco', 'order_id': 'EMPTY'}
+        self.write_mapped_data(data)
+        return iter_mapped_receipts(self.input_dir)
+
+    def test_shard_assignment(self):
+        """Receipts with matched items are cut into shard_size slices in input order, IDs allocated up front"""
+        with mock.patch.object(generate_receipt_sql, '_generate_shard',
+                               wraps=generate_receipt_sql._generate_shard) as generate_shard:
+            result = self.generator().generate_sql_parallel(self.receipts(5), self.output_dir, shard_size=2)
+
+        shards = [call.args[1] for call in generate_shard.call_args_list]
+        self.assertEqual([[unit[0] for unit in shard] for shard in shards], [[0, 1], [2, 3], [4]])
+        self.assertEqual([unit[5] for shard in shards for unit in shard], ['r0', 'r1', 'r2', 'r3', 'r4'])
+        # (po_id, first_line_id): receipt i has i + 1 lines
+        self.assertEqual([unit[3:5] for shard in shards for unit in shard],
+                         [(500, 9000), (501, 9001), (502, 9003), (503, 9006), (504, 9010)])
+        self.assertEqual((len(result['sql_files']), result['skipped'], result['failed']), (5, 1, 0))
+
+    @unittest.skipUnless(FORK, 'worker processes must be forked')
+    def test_consolidated_file_keeps_input_order(self):
+        order_ids = ['Z9', 'A1', 'M5', 'B2', 'Y8']
+        consolidated = self.dir / 'all.sql'
+        result = self.generator().generate_sql_parallel(self.receipts(5, order_ids), self.output_dir,
+                                                        workers=3, shard_size=1, consolidated_file=consolidated)
+
+        expected = [f"purchase_order_{order_id}.sql" for order_id in order_ids]
+        self.assertEqual([Path(path).name for path in result['sql_files']], expected)
+        text = consolidated.read_text()
+        markers = [line[len('-- >>> '):] for line in text.split('\n') if line.startswith('-- >>> ')]
+        self.assertEqual(markers, expected)
+        self.assertTrue(text.startswith('-- Consolidated SQL for 5 purchase order(s)'))
+        for path in result['sql_files']:
+            self.assertIn(Path(path).read_text(), text)
+
+    @unittest.skipUnless(FORK, 'worker processes must be forked')
+    def test_workers_match_single_process_output(self):
+        """workers > 1 writes the same bytes (IDs included) as workers=1"""
+        outputs = []
+        for workers in (1, 3):
+            ledger = self.dir / f"po_ids_{workers}.sqlite3"
+            POIdAllocator(ledger, require_sync=False).reserve_floor(500, 9000)
+            output_dir = self.dir / f"sql_{workers}"
+            with mock.patch.object(generate_receipt_sql, 'datetime', FrozenDatetime):
+                result = self.generator(PO_ID_LEDGER=str(ledger)).generate_sql_parallel(
+                    self.receipts(7), output_dir, workers=workers, shard_size=2,
+                    consolidated_file=output_dir / 'all.sql')
+            self.assertEqual(result['failed'], 0)
+            outputs.append({path.name: path.read_bytes() for path in sorted(output_dir.iterdir())})
+
+        self.assertEqual(len(outputs[0]), 8)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn(b'WHERE po.id = 506;', outputs[1]['purchase_order_RD006.sql'])
+
+    @unittest.skipUnless(FORK, 'worker processes must be forked')
+    def test_workflow_step4(self):
+        from workflow import ReceiptWorkflow
+
+        self.receipts(4)
+        (self.input_dir / 'product_name_mapping.json').write_text('{}')
+        workflow = ReceiptWorkflow({'PO_ID_LEDGER': str(self.ledger), 'PO_ID_ALLOW_UNSYNCED': True,
+                                    'STEP4_WORKERS': 2, 'STEP4_SHARD_SIZE': 1, 'STEP4_CONSOLIDATED_SQL': True})
+        try:
+            sql_files = workflow.step4_generate_sql(str(self.input_dir), str(self.output_dir))
+        finally:
+            for handlers in workflow.step_loggers.values():
+                for handler in handlers:
+                    workflow.logger.removeHandler(handler)
+                    handler.close()
+
+        self.assertEqual([Path(path).name for path in sql_files],
+                         [f"purchase_order_RD{number:03d}.sql" for number in range(4)])
+        self.assertTrue((self.output_dir / 'purchase_orders_all.sql').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+PO ID Allocator Tests
+Tests stable, collision-free purchase order / line ID allocation for step 4.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step4_sql.id_allocator import LedgerNotSyncedError, POIdAllocator, receipt_key
+
+
+class TestPOIdAllocator(unittest.TestCase):
+    """Test POIdAllocator ledger behaviour"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = Path(self.tmp.name) / 'ledger.sqlite'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_contiguous_and_stable_across_instances(self):
+        """New receipts get consecutive PO IDs and line blocks; a new run reuses them"""
+        allocator = POIdAllocator(self.ledger, po_start=100, line_start=5000, require_sync=False)
+        self.assertEqual(allocator.allocate_many([('a', 3), ('b', 2)]), [(100, 5000), (101, 5003)])
+        allocator.close()
+
+        rerun = POIdAllocator(self.ledger, require_sync=False)
+        self.assertEqual(rerun.allocate('b', 2), (101, 5003))
+        self.assertEqual(rerun.allocate('c', 1), (102, 5005))
+        self.assertEqual(rerun.get_stats(), {'reused': 1, 'allocated': 1, 'extended': 0})
+        rerun.close()
+
+    def test_grown_receipt_gets_new_line_block(self):
+        """A receipt with more lines than reserved keeps its PO ID and moves to a fresh block"""
+        allocator = POIdAllocator(self.ledger, require_sync=False)
+        allocator.allocate_many([('a', 2), ('b', 2)])
+        self.assertEqual(allocator.allocate('a', 4), (1, 5))
+        self.assertEqual(allocator.allocate('a', 1), (1, 5))
+        self.assertEqual(allocator.next_ids(), (3, 9))
+
+    def test_concurrent_workers_do_not_collide(self):
+        """Threads sharing one allocator and separate allocators on one ledger hand out unique IDs"""
+        shared = POIdAllocator(self.ledger, require_sync=False)
+        other = POIdAllocator(self.ledger, require_sync=False)
+
+        def work(i):
+            allocator = shared if i % 2 else other
+            return allocator.allocate(f'r{i}', 3)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(work, range(40)))
+        self.assertEqual(len({po_id for po_id, _ in results}), 40)
+        line_ids = [first + n for _, first in results for n in range(3)]
+        self.assertEqual(len(set(line_ids)), 120)
+
+    def test_sync_with_database(self):
+        """Counters are raised above the IDs already in the database, never lowered"""
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE purchase_order (id INTEGER)')
+        conn.execute('CREATE TABLE purchase_order_line (id INTEGER)')
+        conn.execute('INSERT INTO purchase_order VALUES (41)')
+        conn.execute('INSERT INTO purchase_order_line VALUES (900)')
+        allocator = POIdAllocator(self.ledger, line_start=2000)
+        self.assertEqual(allocator.sync_with_database(conn), (42, 2000))
+        self.assertEqual(allocator.allocate('a', 1), (42, 2000))
+        self.assertTrue(POIdAllocator(self.ledger).is_synced())
+
+    def test_unsynced_ledger_refuses_to_allocate(self):
+        """A ledger that was never synced hands out no IDs (reserve_floor alone doesn't count)"""
+        allocator = POIdAllocator(self.ledger)
+        allocator.reserve_floor(10, 10)
+        with self.assertRaises(LedgerNotSyncedError):
+            allocator.allocate('a', 1)
+        self.assertEqual(allocator.next_ids(), (10, 10))
+        self.assertEqual(POIdAllocator(self.ledger, require_sync=False).allocate('a', 1), (10, 10))
+
+    def test_receipt_key(self):
+        self.assertEqual(receipt_key({'order_id': '123', 'vendor': 'Costco'}, 'x.pdf'), 'order:Costco:123')
+        self.assertEqual(receipt_key({}, 'folder/x.pdf'), 'file:x.pdf')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Knowledge Base Write-Behind Tests
+Tests buffered, lock-protected KB updates and atomic flushes.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.kb_writer import KnowledgeBaseWriter
+
+
+class TestKnowledgeBaseWriteBehind(unittest.TestCase):
+    """Test write-behind knowledge base writer"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.kb_path = Path(self.tmp_dir.name) / 'knowledge_base.json'
+        with open(self.kb_path, 'w') as f:
+            json.dump({'111': ['Existing', 'Costco', '1 lb', 4.99]}, f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_disk(self):
+        with open(self.kb_path, 'r') as f:
+            return json.load(f)
+
+    def test_pending_entries_visible_before_flush(self):
+        """Buffered entries are visible to lookups but not yet on disk"""
+        writer = KnowledgeBaseWriter(self.kb_path, flush_every=0)
+        self.assertTrue(writer.add_if_missing('222', ['New', 'Costco', '', 2.5]))
+        self.assertIn('222', writer)
+        self.assertEqual(writer.get('222')[3], 2.5)
+        self.assertNotIn('222', self._read_disk())
+
+        self.assertEqual(writer.flush(), 1)
+        self.assertIn('222', self._read_disk())
+        self.assertEqual(writer.pending_count(), 0)
+
+    def test_existing_entries_not_overwritten(self):
+        """Known keys are never replaced by buffered entries"""
+        writer = KnowledgeBaseWriter(self.kb_path, flush_every=0)
+        self.assertFalse(writer.add_if_missing('111', ['Other', 'Costco', '', 1.0]))
+        self.assertEqual(writer.flush(), 0)
+        self.assertEqual(self._read_disk()['111'][0], 'Existing')
+
+    def test_flush_every_n(self):
+        """Writer flushes automatically once N entries are pending"""
+        writer = KnowledgeBaseWriter(self.kb_path, flush_every=2)
+        writer.add_if_missing('a', ['A', 'Costco', '', 1.0])
+        self.assertNotIn('a', self._read_disk())
+        writer.add_if_missing('b', ['B', 'Costco', '', 1.0])
+        disk = self._read_disk()
+        self.assertIn('a', disk)
+        self.assertIn('b', disk)
+        self.assertEqual(writer.get_stats()['flushes'], 1)
+
+    def test_flush_merges_concurrent_file_changes(self):
+        """Entries written by another writer since load are preserved"""
+        writer1 = KnowledgeBaseWriter(self.kb_path, flush_every=0)
+        writer2 = KnowledgeBaseWriter(self.kb_path, flush_every=0)
+        writer1.add_if_missing('x', ['X', 'Costco', '', 1.0])
+        writer2.add_if_missing('y', ['Y', 'Costco', '', 2.0])
+        writer1.flush()
+        writer2.flush()
+        disk = self._read_disk()
+        self.assertEqual(set(disk), {'111', 'x', 'y'})
+
+    def test_thread_safety(self):
+        """Concurrent adds from worker threads lose no entries"""
+        writer = KnowledgeBaseWriter(self.kb_path, flush_every=7)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    writer.add_if_missing(f'{n}-{i}', [f'Item {i}', 'Costco', '', 1.0])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.flush()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self._read_disk()), 251)
+        self.assertEqual(len(writer), 251)
+
+    def test_no_temp_files_left_behind(self):
+        """Atomic writes clean up their temp files"""
+        writer = KnowledgeBaseWriter(self.kb_path, flush_every=0)
+        writer.add_if_missing('z', ['Z', 'Costco', '', 1.0])
+        writer.flush()
+        leftovers = [p.name for p in Path(self.tmp_dir.name).iterdir() if p.suffix == '.tmp']
+        self.assertEqual(leftovers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
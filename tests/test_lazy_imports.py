@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Lazy Import Tests
+Heavy backends (PDF/OCR, LLM probe, psycopg2, pandas) must not load at import time.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.utils.lazy_import import lazy_module, module_available
+
+
+def _loaded_after_import(module: str, candidates):
+    """Import `module` in a fresh interpreter and return which candidates ended up in sys.modules"""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {list(candidates)!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True, check=True)
+    return [m for m in proc.stdout.strip().split(',') if m]
+
+
+class TestLazyImports(unittest.TestCase):
+    """Test deferred imports and backend probing"""
+
+    def test_lazy_module_loads_on_first_attribute(self):
+        """Proxy imports the real module on first attribute access"""
+        proxy = lazy_module('json')
+        self.assertIn('not loaded', repr(proxy))
+        self.assertEqual(proxy.dumps({'a': 1}), '{"a": 1}')
+        self.assertIn('loaded', repr(proxy))
+        self.assertTrue(module_available('json'))
+        self.assertFalse(module_available('no_such_module_xyz'))
+
+    def test_step1_main_import_is_light(self):
+        """Importing step1 CLI does not pull in PDF/OCR, LLM, DB or pandas"""
+        heavy = ['fitz', 'pdfplumber', 'pytesseract', 'PIL', 'cv2', 'transformers',
+                 'requests', 'psycopg2', 'pandas']
+        self.assertEqual(_loaded_after_import('step1_extract.main', heavy), [])
+
+    def test_ai_interpreter_import_does_not_probe(self):
+        """Backend is detected on first use, not at import"""
+        self.assertEqual(_loaded_after_import('step1_extract.ai_line_interpreter',
+                                              ['requests', 'transformers']), [])
+
+    def test_processors_import_without_backends(self):
+        """PDF processors and query_database import without loading their backends"""
+        modules = 'step1_extract.pdf_processor_unified, step1_extract.rd_pdf_processor, step3_mapping.query_database'
+        self.assertEqual(_loaded_after_import(modules, ['fitz', 'pdfplumber', 'PIL', 'pandas', 'psycopg2']), [])
+
+    def test_standardized_output_annotations_do_not_load_pandas(self):
+        """pd.DataFrame annotations are not evaluated at import"""
+        self.assertEqual(_loaded_after_import('step1_extract.standardized_output', ['pandas']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Lookup Cache Tests
+Tests negative entries, TTL expiry, LRU eviction and incremental persistence.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.lookup_cache import LookupCache
+
+
+class TestLookupCache(unittest.TestCase):
+    """Test persistent product lookup cache"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / 'lookup_cache.sqlite'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hit_miss_negative_counters(self):
+        """Hits, misses and negative hits are counted separately"""
+        cache = LookupCache(self.db_path, namespace='test')
+        cache.put('a', {'name': 'Cup'})
+        cache.put_negative('b')
+
+        self.assertEqual(cache.lookup('a'), (True, {'name': 'Cup'}))
+        self.assertEqual(cache.lookup('b'), (True, None))
+        self.assertEqual(cache.lookup('c'), (False, None))
+
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['negative_hits'], stats['misses']), (1, 1, 1))
+        self.assertIn('1 negative hits', cache.summary())
+        cache.close()
+
+    def test_persistence_across_instances(self):
+        """Entries (including negative ones) survive a reopen"""
+        cache = LookupCache(self.db_path, namespace='test')
+        cache.put('a', [1, 2, 3])
+        cache.put_negative('b')
+        cache.close()
+
+        reopened = LookupCache(self.db_path, namespace='test')
+        self.assertEqual(reopened.lookup('a'), (True, [1, 2, 3]))
+        self.assertEqual(reopened.lookup('b'), (True, None))
+        reopened.close()
+
+    def test_namespaces_are_isolated(self):
+        """Same key in different namespaces does not collide"""
+        one = LookupCache(self.db_path, namespace='one')
+        two = LookupCache(self.db_path, namespace='two')
+        one.put('k', 'first')
+        one.flush()
+        self.assertEqual(two.lookup('k'), (False, None))
+        one.close()
+        two.close()
+
+    def test_ttl_expiry(self):
+        """Expired entries behave like misses"""
+        cache = LookupCache(self.db_path, namespace='test')
+        cache.put('short', 'v', ttl=0.05)
+        cache.put_negative('neg', ttl=0.05)
+        cache.put('long', 'v', ttl=60)
+        time.sleep(0.1)
+        self.assertEqual(cache.lookup('short'), (False, None))
+        self.assertEqual(cache.lookup('neg'), (False, None))
+        self.assertEqual(cache.lookup('long'), (True, 'v'))
+        self.assertEqual(cache.get_stats()['expired'], 2)
+        cache.close()
+
+    def test_lru_eviction(self):
+        """Least-recently-used entries are evicted beyond max_entries"""
+        cache = LookupCache(self.db_path, namespace='test', max_entries=3)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, key)
+            time.sleep(0.01)
+        cache.lookup('a')  # refresh 'a'
+        time.sleep(0.01)
+        cache.put('d', 'd')
+        cache.flush()
+
+        self.assertEqual(len(cache), 3)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertIn('d', cache)
+        cache.close()
+
+    def test_thread_safety(self):
+        """Concurrent writers and readers do not fail"""
+        cache = LookupCache(self.db_path, namespace='test', evict_every=7)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    cache.put(f'{n}-{i}', i)
+                    cache.lookup(f'{n}-{i}')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cache.flush()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), 200)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
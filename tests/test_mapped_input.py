@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Mapped Input Tests
+Tests reading step 3 output as step 4 input (no PDF re-extraction).
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step4_sql.mapped_input import find_mapped_input, iter_mapped_receipts, matched_item_from_mapped
+
+
+class TestMappedInput(unittest.TestCase):
+    """Test iter_mapped_receipts over the workflow and rule-engine output formats"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _rule_items(self):
+        receipts = {'r1': {'vendor': 'Restaurant Depot', 'order_id': 'A1'}, 'r2': {'store_name': 'Jewel-Osco'}}
+        return [
+            {'receipt_id': 'r1', 'product_name': 'CHKN', 'product_id': 5, 'product_uom_id': 3,
+             'receipt_data': receipts['r1']},
+            {'receipt_id': 'r2', 'product_name': 'MILK', 'product_id': None, 'receipt_data': receipts['r2']},
+            {'receipt_id': 'r1', 'product_name': 'ONION', 'product_id': 6, 'receipt_data': receipts['r1']},
+        ]
+
+    def test_workflow_mapped_data(self):
+        """mapped_data.json items are grouped by receipt_item.receipt_id"""
+        mapped_data = {
+            'receipts': {'r1': {'vendor': 'Restaurant Depot'}, 'r2': {'vendor': 'Costco'}},
+            'matched_items': [
+                {'receipt_item': {'receipt_id': 'r2', 'product_name': 'A'}, 'matched': True},
+                {'receipt_item': {'receipt_id': 'r1', 'product_name': 'B'}, 'matched': True},
+                {'receipt_item': {'receipt_id': 'r2', 'product_name': 'C'}, 'matched': False},
+            ],
+        }
+        with open(self.dir / 'mapped_data.json', 'w') as f:
+            json.dump(mapped_data, f)
+
+        receipts = list(iter_mapped_receipts(self.dir))
+        self.assertEqual([r[0] for r in receipts], ['r1', 'r2'])
+        self.assertEqual([i['receipt_item']['product_name'] for i in receipts[1][2]], ['A', 'C'])
+
+    def test_rule_engine_items_json(self):
+        """mapped_items.json items are grouped by receipt_id in matched-item shape"""
+        items = self._rule_items()
+        with open(self.dir / 'mapped_items.json', 'w') as f:
+            json.dump(items, f)
+
+        from_json = list(iter_mapped_receipts(self.dir))
+        self.assertEqual(from_json, list(iter_mapped_receipts(self.dir / 'mapped_items.json')))
+
+        receipt_id, receipt_data, matched_items = from_json[0]
+        self.assertEqual((receipt_id, receipt_data['order_id']), ('r1', 'A1'))
+        self.assertEqual([m['product_match']['product_id'] for m in matched_items], [5, 6])
+        self.assertEqual(matched_items[0]['uom_match']['id'], 3)
+        self.assertIsNone(matched_items[1]['uom_match'])
+        self.assertNotIn('receipt_data', matched_items[0]['receipt_item'])
+        self.assertFalse(from_json[1][2][0]['matched'])
+
+    def test_lookup_order_and_missing_input(self):
+        """mapped_data.json wins over mapped_items.json; nothing found raises"""
+        self.assertIsNone(find_mapped_input(self.dir))
+        with self.assertRaises(FileNotFoundError):
+            list(iter_mapped_receipts(self.dir))
+        (self.dir / 'mapped_items.json').write_text('[]')
+        (self.dir / 'mapped_data.json').write_text('{}')
+        self.assertEqual(find_mapped_input(self.dir).name, 'mapped_data.json')
+
+    def test_unmatched_item(self):
+        self.assertEqual(matched_item_from_mapped({'product_name': 'X'})['matched'], False)
+
+
+if __name__ == '__main__':
+    unittest.main()
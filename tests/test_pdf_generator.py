@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+PDF Generator Tests
+Tests report discovery (split vendor pages included), unchanged-HTML skipping and browser discovery.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract import pdf_generator
+from step1_extract.pdf_generator import PDFRenderer, generate_pdfs_for_all_reports
+
+
+class TestGeneratePdfs(unittest.TestCase):
+    """Test generate_pdfs_for_all_reports batching and hash skipping"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name)
+        (self.out / 'bbi_based').mkdir()
+        (self.out / 'report.html').write_text('<html>combined</html>')
+        (self.out / 'bbi_based' / 'report.html').write_text('<html>bbi</html>')
+        self.batches = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _fake_render(self, jobs):
+        self.batches.append([html_path.name for html_path, _ in jobs])
+        for _, pdf_path in jobs:
+            pdf_path.write_bytes(b'%PDF')
+        return {html_path: True for html_path, _ in jobs}
+
+    def test_unchanged_reports_are_skipped(self):
+        """One batch for all reports; only edited HTML is rendered again"""
+        with mock.patch.object(PDFRenderer, 'render_many', self._fake_render):
+            pdfs = generate_pdfs_for_all_reports(self.out)
+            self.assertEqual(pdfs['combined_report'], self.out / 'report.pdf')
+            self.assertEqual(len(self.batches[0]), 2)
+
+            generate_pdfs_for_all_reports(self.out)
+            self.assertEqual(self.batches[1], [])
+
+            (self.out / 'bbi_based' / 'report.html').write_text('<html>bbi v2</html>')
+            pdfs = generate_pdfs_for_all_reports(self.out)
+            self.assertEqual(self.batches[2], ['report.html'])
+            self.assertEqual(pdfs['bbi_report'], self.out / 'bbi_based' / 'report.pdf')
+
+            generate_pdfs_for_all_reports(self.out, force=True)
+            self.assertEqual(len(self.batches[3]), 2)
+
+    def test_split_report_vendor_pages(self):
+        """Vendor pages of a split report are rendered and tracked in the hash manifest"""
+        pages_dir = self.out / 'bbi_based' / 'report_pages'
+        pages_dir.mkdir()
+        (pages_dir / 'bbi.html').write_text('<html>bbi receipts</html>')
+        (pages_dir / 'bbi_2.html').write_text('<html>more bbi receipts</html>')
+
+        with mock.patch.object(PDFRenderer, 'render_many', self._fake_render):
+            pdfs = generate_pdfs_for_all_reports(self.out)
+            self.assertEqual(sorted(self.batches[0]), ['bbi.html', 'bbi_2.html', 'report.html', 'report.html'])
+            self.assertEqual(pdfs['bbi_report/bbi_2'], pages_dir / 'bbi_2.pdf')
+            self.assertTrue((pages_dir / 'bbi.pdf').exists())
+
+            manifest = json.loads((self.out / pdf_generator.PDF_HASH_MANIFEST).read_text())
+            self.assertIn('bbi_based/report_pages/bbi_2.html', manifest)
+
+            (pages_dir / 'bbi_2.html').write_text('<html>edited</html>')
+            generate_pdfs_for_all_reports(self.out)
+            self.assertEqual(self.batches[1], ['bbi_2.html'])
+
+    def test_failed_render_returns_html(self):
+        with mock.patch.object(PDFRenderer, 'available_backends', return_value=[]):
+            pdfs = generate_pdfs_for_all_reports(self.out)
+        self.assertEqual(pdfs['combined_report'], self.out / 'report.html')
+
+    def test_find_chrome_env_override(self):
+        pdf_generator.find_chrome.cache_clear()
+        try:
+            with mock.patch.dict(os.environ, {'CHROME_PATH': str(self.out / 'report.html')}):
+                self.assertEqual(pdf_generator.find_chrome(), str(self.out / 'report.html'))
+        finally:
+            pdf_generator.find_chrome.cache_clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
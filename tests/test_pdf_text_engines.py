@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+PDF Text Engine Tests
+Tests engine selection, rule set pins and the PyMuPDF layout reconstruction against pdfplumber layout=True.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract import pdf_text_engines
+from step1_extract.pdf_processor_unified import UnifiedPDFProcessor
+from step1_extract.pdf_text_engines import extract_page_texts, layout_text, resolve_text_engine, words_text
+from step1_extract.rule_loader import RuleLoader
+from step1_extract.utils.lazy_import import module_available
+
+BACKENDS_AVAILABLE = module_available('fitz') and module_available('pdfplumber')
+
+
+class TestLayoutText(unittest.TestCase):
+    def test_words_placed_on_character_columns(self):
+        words = [(20.0, 100.0, 'E'), (35.0, 100.5, '123'), (240.0, 99.0, '4.99'), (20.0, 113.0, 'SUBTOTAL')]
+        self.assertEqual(layout_text(words), '\n' * 8 + '   E 123' + ' ' * 25 + '4.99\n   SUBTOTAL')
+        self.assertEqual(words_text(words), 'E 123 4.99\nSUBTOTAL')
+
+    def test_rows_and_page_padding(self):
+        """Vertical gaps become blank lines; lines and rows are padded to the page size"""
+        words = [(0.0, 0.0, 'A'), (0.0, 39.0, 'B')]
+        self.assertEqual(layout_text(words, width=29, height=78), 'A   \n    \n    \nB   \n    ')
+        self.assertEqual(layout_text(words, y_origin=13.0), 'A\n\nB')
+
+    def test_engine_selection(self):
+        available = {'pymupdf': False, 'pdfplumber_layout': True, 'pdfplumber_words': True}
+        with mock.patch.object(pdf_text_engines, 'engine_available', side_effect=lambda engine: available[engine]):
+            self.assertEqual(resolve_text_engine(None), 'pdfplumber_layout')
+            self.assertEqual(resolve_text_engine('pdfplumber_words'), 'pdfplumber_words')
+            self.assertEqual(resolve_text_engine('tesseract'), 'pdfplumber_layout')
+        with self.assertRaises(ValueError):
+            extract_page_texts('receipt.pdf', 'tesseract')
+
+    def test_layout_sensitive_rule_sets_pin_pdfplumber_layout(self):
+        """BBI (router rule sets), Wismettac and Odoo rely on pdfplumber's layout text"""
+        processor = UnifiedPDFProcessor(RuleLoader(PROJECT_ROOT / 'step1_rules'))
+        for vendor, filename in [('BBI', 'UNI_IL_UT_1001.pdf'), ('BBI', 'UNI_UT_0915_Mousse.pdf'),
+                                 ('BBI', 'UNI_UT_0915_YS.pdf'), ('BBI', 'other.pdf'),
+                                 ('WISMETTAC', 'invoice.pdf'), ('ODOO', 'P00012.pdf')]:
+            rules = processor._load_vendor_pdf_rules(vendor, Path(filename))
+            self.assertEqual(rules.get('text_engine'), 'pdfplumber_layout', f"{vendor} {filename}")
+
+
+@unittest.skipUnless(BACKENDS_AVAILABLE, 'PyMuPDF and pdfplumber required')
+class TestEngineParity(unittest.TestCase):
+    def setUp(self):
+        import fitz
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'costco_receipt.pdf'
+        doc = fitz.open()
+        page = doc.new_page(width=300, height=400)
+        rows = [('E', '81357', 'JASMINE RICE 25LB', '23.98 N'), ('E', '799601', 'KS ORGANIC MILK', '7.36 N')]
+        for y, (flag, code, name, price) in zip((40, 53), rows):
+            page.insert_text((20, y), flag, fontsize=9)
+            page.insert_text((35, y), code, fontsize=9)
+            page.insert_text((90, y), name, fontsize=9)
+            page.insert_text((240, y), price, fontsize=9)
+        page.insert_text((20, 80), 'SUBTOTAL', fontsize=9)
+        page.insert_text((240, 80), '31.34', fontsize=9)
+        doc.save(str(self.path))
+        doc.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pymupdf_text_matches_pdfplumber_layout(self):
+        pymupdf_pages = extract_page_texts(self.path, 'pymupdf')
+        layout_pages = extract_page_texts(self.path, 'pdfplumber_layout')
+
+        self.assertEqual(len(pymupdf_pages), 1)
+        # Byte for byte: blank lines for vertical gaps and page padding included
+        self.assertEqual(pymupdf_pages[0], layout_pages[0])
+        lines = pymupdf_pages[0].split('\n')
+        self.assertEqual(lines[3].rstrip(), '   E 81357  JASMINE RICE 25LB    23.98 N')
+        self.assertEqual(lines[5].strip(), '')
+        self.assertEqual(extract_page_texts(self.path, 'pdfplumber_words')[0].split('\n')[0],
+                         'E 81357 JASMINE RICE 25LB 23.98 N')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Product Canonicalization Tests
+Tests the precompiled canonicalization stage (grouped word removal, memoized names).
+"""
+
+import os
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.rule_executor import (
+    _compile_word_removal,
+    apply_product_canonicalization_stage,
+    execute_product_canonicalization_stage,
+    prepare_product_canonicalization_stage,
+)
+
+CONFIG = {'product_canonicalization': {
+    'normalize': {
+        'lowercase': True,
+        'strip_punctuation': True,
+        'remove_store_words': ['costco', 'jewel', 'jewel-osco', 'restaurant depot'],
+        'remove_brand_words': ['kirkland', 'jewel'],
+        'collapse_spaces': True,
+    },
+    'category_rules': [
+        {'name': 'whole_milk', 'keywords': ['whole milk'], 'canonical_name': 'Whole Milk'},
+    ],
+    'size_rules': [
+        {'match': ['1 gal', 'gallon'], 'canonical_size': '1 gal', 'canonical_uom': 'gal'},
+    ],
+    'vendor_specific_canonical_map': {'RD': {'ff bigc 1/2 crinkl 6/': 'rd_fries_crinkle_bigc_6bag'}},
+    'compose': {'pattern': '{{ canonical_name }} {{ canonical_size }}', 'fallback_pattern': '{{ canonical_name }}'},
+}}
+
+
+def remove_words(text, words):
+    for pattern in _compile_word_removal(words):
+        text = pattern.sub('', text)
+    return text
+
+
+class TestWordRemoval(unittest.TestCase):
+    def test_words_sharing_tokens_stay_in_order(self):
+        """'osco' is removed first, so 'jewel osco' no longer matches (as with one re.sub per word)"""
+        self.assertEqual(len(_compile_word_removal(['osco', 'jewel osco'])), 2)
+        self.assertEqual(remove_words('jewel osco milk', ['osco', 'jewel osco']), 'jewel  milk')
+
+    def test_disjoint_words_removed_in_one_pass(self):
+        self.assertEqual(len(_compile_word_removal(['costco', 'aldi', 'restaurant depot'])), 1)
+        self.assertEqual(remove_words('Costco milk aldi restaurant depot', ['costco', 'aldi', 'restaurant depot']),
+                         ' milk  ')
+
+
+class TestProductCanonicalization(unittest.TestCase):
+    def test_canonical_keys(self):
+        items = [
+            {'product_name': 'KIRKLAND Whole Milk 1 Gal', 'vendor_code': 'COSTCO'},
+            {'product_name': 'FF BIGC 1/2 CRINKL 6/', 'vendor_code': 'RD'},
+            {'product_name': 'FF BIGC 1/2 CRINKL 6/', 'vendor_code': 'COSTCO'},
+            {'product_name': 'Jewel-Osco Bananas', 'vendor_code': 'JEWEL'},
+        ]
+        result = execute_product_canonicalization_stage(items, CONFIG, {})
+
+        self.assertEqual([item['canonical_product_key'] for item in result],
+                         ['Whole Milk 1 gal', 'rd_fries_crinkle_bigc_6bag', 'ff bigc 1 2 crinkl 6', 'osco bananas'])
+        self.assertEqual(result[0]['canonical_uom'], 'gal')
+        self.assertEqual(result[3]['raw_product_name'], 'Jewel-Osco Bananas')
+        self.assertNotIn('canonical_product_key', items[0])
+
+    def test_repeated_names_are_memoized(self):
+        state = prepare_product_canonicalization_stage(CONFIG['product_canonicalization'], {})
+
+        first = apply_product_canonicalization_stage({'product_name': 'Whole Milk 1 Gal', 'vendor_code': 'COSTCO'}, state)
+        second = apply_product_canonicalization_stage({'product_name': 'Whole Milk 1 Gal', 'vendor_code': 'ALDI',
+                                                       'raw_product_name': 'WHOLE MILK'}, state)
+
+        self.assertEqual(len(state['memo']), 1)
+        self.assertEqual(first['canonical_product_key'], second['canonical_product_key'])
+        self.assertEqual(second['raw_product_name'], 'WHOLE MILK')
+
+
+if __name__ == '__main__':
+    unittest.main()
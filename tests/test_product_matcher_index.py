@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+ProductMatcher Index Tests
+Tests the id / alias hash indexes and memoized UoM matching in ProductMatcher.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.product_matcher import ProductMatcher
+
+DB_ANALYSIS = {
+    'uoms': {'1': {'name': 'Units'}, '2': {'name': 'lb'}, '3': {'name': 'Case of 12'}, '4': {'name': '4-pc'}},
+    'product_templates': {
+        '10': {'name': 'Whole Milk', 'uom_po_id': 3},
+        '11': {'name': 'Whole Milk'},
+        '12': {'name': 'Lime'},
+    },
+    'products': {
+        '100': {'product_tmpl_id': '10', 'uom_id': 1},
+        '101': {'product_tmpl_id': '11', 'uom_id': 2},
+        '102': {'product_tmpl_id': '12', 'uom_id': 1},
+    },
+}
+
+
+class TestProductMatcherIndexes(unittest.TestCase):
+    """Test ProductMatcher id lookups and UoM resolution"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = Path(cls.tmp.name) / 'products_uom_analysis.json'
+        path.write_text(json.dumps(DB_ANALYSIS))
+        cls.matcher = ProductMatcher(str(path))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_product_by_id_with_purchase_uom(self):
+        """Products are found by id with the purchase UoM preferred over the default one"""
+        product = self.matcher._get_product_by_id(102)
+        self.assertEqual((product['full_name'], product['product_uom_id']), ('Lime', 1))
+        # Product 100 lost its name-index entry to 101 ("whole milk") but is still found
+        product = self.matcher._get_product_by_id(100)
+        self.assertEqual((product['template_id'], product['product_uom_name']), (10, 'Case of 12'))
+        self.assertIsNone(self.matcher._get_product_by_id(999))
+
+    def test_match_uom_aliases_and_memo(self):
+        self.assertEqual(self.matcher.match_uom('Pieces')['id'], 1)
+        self.assertEqual(self.matcher.match_uom('LBS')['id'], 2)
+        self.assertEqual(self.matcher.match_uom('4pc')['id'], 4)
+        self.assertIsNone(self.matcher.match_uom('gallon'))
+        self.assertIs(self.matcher.match_uom('case'), self.matcher.match_uom('CASE'))
+
+    def test_match_uom_from_mapping(self):
+        self.assertEqual(self.matcher.match_uom_from_mapping({'database_uom_id': 3}, 'cs')['name'], 'Case of 12')
+        self.assertEqual(self.matcher.match_uom_from_mapping({'odoo_uom': 'LB'}, 'lb')['id'], 2)
+        self.assertEqual(self.matcher.match_uom_from_mapping({'database_uom_name': 'case'}, 'cs')['id'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
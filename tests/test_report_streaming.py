@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+HTML Report Tests
+Tests the streamed step 1 HTML report, its per-vendor split mode and the
+virtualized review report.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step1_extract.generate_report import generate_html_report
+from step1_extract.pdf_generator import PDFRenderer, generate_pdfs_for_all_reports
+from step1_extract.review_report import ITEM_COLUMNS, build_review_data, generate_review_report
+
+
+def _receipts(count):
+    data = {}
+    for i in range(count):
+        vendor = 'Costco' if i % 2 else 'Restaurant Depot'
+        items = [{'product_name': f'ITEM {i}', 'quantity': 2, 'unit_price': 1.5, 'total_price': 3.0,
+                  'purchase_uom': 'each'}]
+        data[f'r{i:03d}'] = {'vendor': vendor, 'total': 3.0, 'items': items, 'filename': f'r{i}.pdf'}
+    return data
+
+
+class TestHTMLReport(unittest.TestCase):
+    """Test generate_html_report single-file and split output"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name) / 'report.html'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_single_file(self):
+        """Small reports stay one file with every receipt; display fields are derived"""
+        data = _receipts(4)
+        generate_html_report(data, self.out)
+        html = self.out.read_text(encoding='utf-8')
+        self.assertEqual(html.count('class="receipt-section"'), 4)
+        self.assertIn('$12.00', html)
+        self.assertTrue(html.rstrip().endswith('</html>'))
+        self.assertEqual(data['r000']['items'][0]['display_uom'], 'pc')
+        self.assertFalse((self.out.parent / 'report_pages').exists())
+
+    def test_large_report_keeps_receipts_through_pdf_step(self):
+        """Over 300 receipts report.html still holds every receipt, and so does the HTML the PDF step renders"""
+        generate_html_report(_receipts(301), self.out)
+        self.assertFalse((self.out.parent / 'report_pages').exists())
+
+        rendered = {}
+
+        def render_many(renderer, jobs):
+            for html_path, pdf_path in jobs:
+                rendered[html_path.name] = html_path.read_text(encoding='utf-8')
+                pdf_path.write_bytes(b'%PDF')
+            return {html_path: True for html_path, _ in jobs}
+
+        with mock.patch.object(PDFRenderer, 'render_many', render_many):
+            pdfs = generate_pdfs_for_all_reports(self.out.parent)
+        self.assertEqual(pdfs['combined_report'], self.out.parent / 'report.pdf')
+        self.assertEqual(rendered['report.html'].count('class="receipt-section"'), 301)
+
+    def test_split_by_vendor_paginates(self):
+        """Split mode writes an index with vendor links and paginated vendor pages"""
+        generate_html_report(_receipts(7), self.out, split_by_vendor=True, receipts_per_page=2)
+        index = self.out.read_text(encoding='utf-8')
+        self.assertNotIn('class="receipt-section"', index)
+        self.assertIn('href="report_pages/costco.html"', index)
+
+        pages = sorted(p.name for p in (self.out.parent / 'report_pages').iterdir())
+        self.assertEqual(pages, ['costco.html', 'costco_2.html', 'restaurant_depot.html',
+                                 'restaurant_depot_2.html'])
+        last = (self.out.parent / 'report_pages' / 'restaurant_depot_2.html').read_text(encoding='utf-8')
+        self.assertEqual(last.count('class="receipt-section"'), 2)
+        self.assertIn('Page 2 of 2', last)
+        self.assertIn('href="restaurant_depot.html"', last)
+
+        # Rerunning replaces the pages; an unsplit report removes them
+        generate_html_report(_receipts(3), self.out, split_by_vendor=True, receipts_per_page=2)
+        pages = sorted(p.name for p in (self.out.parent / 'report_pages').iterdir())
+        self.assertEqual(pages, ['costco.html', 'restaurant_depot.html'])
+        generate_html_report(_receipts(3), self.out)
+        self.assertFalse((self.out.parent / 'report_pages').exists())
+
+
+class TestReviewReport(unittest.TestCase):
+    """Test the virtualized review report and its compact data file"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name) / 'report_review.html'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_payload_is_dictionary_encoded(self):
+        """Vendors and categories are stored once; item rows reference them by index"""
+        data = _receipts(4)
+        data['r001']['items'][0].update({'l1_category': 'A01', 'l1_category_name': 'COGS', 'needs_category_review': True})
+        payload = build_review_data(data)
+        self.assertEqual(payload['dicts']['vendor'], ['Restaurant Depot', 'Costco'])
+        self.assertEqual(payload['dicts']['l1'], ['', 'A01 - COGS'])
+        self.assertEqual(len(payload['rows']), 4)
+        row = payload['rows'][1]
+        self.assertEqual(row[ITEM_COLUMNS.index('l1')], 1)
+        self.assertEqual(row[ITEM_COLUMNS.index('needs_review')], 1)
+        self.assertEqual(row[ITEM_COLUMNS.index('uom')], 'pc')
+        self.assertEqual(payload['receipts'][row[0]][:2], ['r001', 1])
+
+    def test_data_file_next_to_page(self):
+        """Default writes a JS data file; compress writes gzip JSON the page fetches"""
+        generate_review_report(_receipts(3), self.out)
+        html = self.out.read_text(encoding='utf-8')
+        self.assertIn('<script src="report_review_data.js"></script>', html)
+        self.assertNotIn('ITEM 0', html)
+        js = (self.out.parent / 'report_review_data.js').read_text(encoding='utf-8')
+        self.assertEqual(len(json.loads(js[len('window.REPORT_DATA='):].rstrip().rstrip(';'))['rows']), 3)
+
+        generate_review_report(_receipts(3), self.out, compress=True)
+        self.assertIn('report_review_data.json.gz', self.out.read_text(encoding='utf-8'))
+        with gzip.open(self.out.parent / 'report_review_data.json.gz', 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['receipts']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Reviewed Excel Import Tests
+Tests the keyed merge of a reviewed step 2 workbook back into extracted data.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+import pandas as pd
+
+from step2_manual_review.main import export_to_excel
+from step2_manual_review.review_merge import apply_reviewed_data, item_keys, load_reviewed_excel
+
+
+def _extracted():
+    items = [
+        {'product_name': 'MILK', 'quantity': 1, 'unit_price': 3.0, 'total_price': 3.0, 'needs_review': True},
+        {'product_name': 'EGGS', 'quantity': 2, 'unit_price': 4.0, 'total_price': 8.0, 'needs_review': True},
+        {'product_name': 'MILK', 'quantity': 1, 'unit_price': 3.0, 'total_price': 3.0},
+    ]
+    return {
+        'r1': {'vendor': 'Costco', 'needs_review': True, 'items': items},
+        'r2': {'vendor': 'Jewel', 'items': [{'product_name': 'BREAD', 'total_price': 2.5}]},
+    }
+
+
+class TestReviewMerge(unittest.TestCase):
+    """Test load_reviewed_excel / apply_reviewed_data"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        (self.dir / 'step1' / 'bbi_based').mkdir(parents=True)
+        with open(self.dir / 'step1' / 'bbi_based' / 'extracted_data.json', 'w') as f:
+            json.dump(_extracted(), f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _review(self, edit):
+        excel = export_to_excel(self.dir / 'step1', self.dir / 'step2')
+        df = pd.read_excel(excel, sheet_name='Manual Review', dtype=str)
+        edit(df)
+        df.iloc[::-1].to_excel(excel, sheet_name='Manual Review', index=False)  # reviewer re-sorted the sheet
+        return load_reviewed_excel(excel)
+
+    def test_keyed_merge_applies_only_changes(self):
+        """Edits land on the right items after reordering; unchanged values are not logged"""
+        def edit(df):
+            eggs = df['product_name'] == 'EGGS'
+            df.loc[eggs, 'reviewed_quantity'] = '3'
+            df.loc[eggs, 'reviewed_product_name'] = 'EGGS'  # same as current
+            df.loc[df['item_index'] == '2', 'review_status'] = 'approved'
+            df.loc[df['item_index'] == '0', 'reviewed_unit_price'] = 'n/a'  # unparseable, ignored
+
+        extracted = _extracted()
+        change_log = []
+        updated = apply_reviewed_data(extracted, self._review(edit), change_log=change_log,
+                                      change_log_path=self.dir / 'changes.csv')
+
+        items = updated['r1']['items']
+        self.assertEqual(items[1]['quantity'], 3.0)
+        self.assertTrue(items[1]['_reviewed_quantity'])
+        self.assertNotIn('_reviewed_product_name', items[1])
+        self.assertEqual(items[2]['review_status'], 'approved')
+        self.assertNotIn('_manually_reviewed', items[0])
+        self.assertTrue(updated['r1']['_manually_reviewed'])
+        self.assertIs(updated['r2'], extracted['r2'])
+        self.assertNotIn('_manually_reviewed', extracted['r1'])  # input untouched
+
+        self.assertEqual([(c['item_index'], c['field'], c['old_value'], c['new_value']) for c in change_log],
+                         [(1, 'quantity', 2, 3.0), (2, 'review_status', None, 'approved')])
+        self.assertEqual(len((self.dir / 'changes.csv').read_text().splitlines()), 3)
+
+    def test_positional_fallback_and_legacy_dict(self):
+        """Workbooks without item_key merge on item_index; the older dict structure still works"""
+        def edit(df):
+            df.drop(columns=['item_key'], inplace=True)
+            df.loc[df['item_index'] == '0', 'reviewed_l2_category'] = 'C10'
+
+        updated = apply_reviewed_data(_extracted(), self._review(edit))
+        self.assertEqual(updated['r1']['items'][0]['l2_category'], 'C10')
+
+        updated = apply_reviewed_data(_extracted(), {'r1': [{'item_index': 1, 'total_price': 9.0}]})
+        self.assertEqual(updated['r1']['items'][1]['total_price'], 9.0)
+
+    def test_item_keys_stable_for_duplicates(self):
+        keys = item_keys('r1', _extracted()['r1']['items'])
+        self.assertEqual(keys, item_keys('r1', _extracted()['r1']['items']))
+        self.assertEqual(keys[2], f'{keys[0]}-1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Stage Engine Tests
+Tests that the fused single-pass engine matches stage-by-stage execution.
+"""
+
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.rule_executor import execute_stage
+from step3_mapping import stage_engine
+from step3_mapping.stage_engine import FusedStageEngine, shard_items
+
+RULES = {
+    '01_inputs.yaml': {'inputs': {'add_metadata': {'source_step': 'step1'}}},
+    '02_vendor_match.yaml': {'vendor_match': {'rules': [
+        {'name': 'costco', 'when_any': ['detected_vendor_name ILIKE "%costco%"'],
+         'set': {'vendor_code': 'COSTCO', 'review_reasons': ['check costco']}},
+    ]}},
+    '07_enrichment.yaml': {'enrichment': {'defaults': {'currency_id': 1},
+                                          'line_total': {'recompute_if_missing': True}}},
+    '09_validation.yaml': {'validation': {'checks': [
+        {'if': 'vendor_code is null', 'mark_review': True, 'add_reason': 'No vendor'},
+    ]}},
+    '10_outputs.yaml': {'outputs': {'mapped_items': {'schema': {
+        'required': ['product_name', 'vendor_code'],
+        'optional': ['line_total', 'currency_id', 'needs_review', 'review_reasons', 'source_step'],
+    }}}},
+    '11_quality_report.yaml': {'quality_report': {}},
+}
+
+
+class FakeRuleLoader:
+    def get_rule(self, filename):
+        return RULES.get(filename)
+
+    def get_processing_order(self):
+        return list(RULES)
+
+
+def make_items():
+    return [
+        {'product_name': 'Whole Milk', 'quantity': 2, 'unit_price': 3.5,
+         'receipt_id': 'R1', 'receipt_data': {'vendor': 'Costco'}},
+        {'product_name': 'Lime', 'quantity': 1, 'unit_price': 0.5, 'line_total': 0.5,
+         'receipt_id': 'R2', 'receipt_data': {'vendor': 'Corner Store'}},
+    ]
+
+
+class TestFusedStageEngine(unittest.TestCase):
+    """Test FusedStageEngine against execute_stage"""
+
+    def setUp(self):
+        self.loader = FakeRuleLoader()
+
+    def test_matches_staged_execution(self):
+        staged = make_items()
+        for rule_file in self.loader.get_processing_order():
+            staged = execute_stage(staged, rule_file, self.loader, {})
+        fused = FusedStageEngine(self.loader, {}).run(make_items())
+
+        self.assertEqual(fused, staged)
+        self.assertEqual(fused[0]['line_total'], 7.0)
+        self.assertEqual(fused[1]['review_reasons'], ['No vendor'])
+
+    def test_segments_and_stage_output(self):
+        engine = FusedStageEngine(self.loader, {})
+        self.assertEqual(engine.describe(),
+                         'fused: inputs -> vendor_match -> enrichment -> validation -> outputs | '
+                         'barrier: quality_report')
+        saved = []
+        engine.run(make_items(), on_segment=lambda rule_file, items: saved.append((rule_file, len(items))))
+        self.assertEqual(saved, [('10_outputs.yaml', 2), ('11_quality_report.yaml', 2)])
+
+    def test_items_updated_in_place_with_audit(self):
+        items = make_items()
+        first = items[0]
+        engine = FusedStageEngine(self.loader, {}, processing_order=['01_inputs.yaml', '02_vendor_match.yaml'],
+                                  audit=True)
+        result = engine.run(items)
+
+        self.assertIs(result[0], first)
+        self.assertEqual(first['vendor_code'], 'COSTCO')
+        vendor_entry = [entry for entry in engine.audit_trail
+                        if entry['item'] == 0 and entry['stage'] == '02_vendor_match.yaml'][0]
+        self.assertEqual(vendor_entry['receipt_id'], 'R1')
+        self.assertEqual(vendor_entry['changes']['vendor_code'], [None, 'COSTCO'])
+        self.assertEqual(vendor_entry['changes']['review_reasons'], [None, ['check costco']])
+
+
+class FakeCursor:
+    """Records queries; usage / BoM rows for the requested product IDs"""
+
+    def __init__(self, executed):
+        self.executed = executed
+        self.rows = []
+
+    def close(self):
+        pass
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        product_ids = (params or {}).get('product_ids', [])
+        if 'sale_order_line' in query:
+            self.rows = [{'product_id': pid, 'so_line_count': 3, 'so_qty': 6} for pid in product_ids]
+        else:
+            self.rows = [{'component_product_id': pid} for pid in product_ids if pid == 7]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+
+class TestProductIdStages(unittest.TestCase):
+    """Test usage / BoM queries limited to the matched product IDs"""
+
+    RULES = {
+        '04_db_match.yaml': {'db_match': {}},
+        '05_usage_probe.yaml': {'usage_probe': {
+            'time_window': {'days_back': 30},
+            'queries': {'sales_usage': 'SELECT ... FROM sale_order_line WHERE product_id = ANY(%(product_ids)s) '
+                                       'AND date >= NOW() - make_interval(days => %(days_back)s)'},
+            'infer_role': [{'name': 'actually_sold', 'when': {'so_line_count': '> 0'},
+                            'set': {'inferred_role': 'salable'}}],
+        }},
+        '07_enrichment.yaml': {'enrichment': {}},
+        '08_bom_protection.yaml': {'bom_protection': {
+            'db_queries': {'bom_lines': 'SELECT product_id AS component_product_id FROM mrp_bom_line '
+                                        'WHERE product_id = ANY(%(product_ids)s)'},
+            'rules': [{'name': 'keep_bom_bound', 'when': 'this.product_id IN (products_used_in_bom)',
+                       'action': {'bom_protected': True}}],
+        }},
+    }
+
+    def setUp(self):
+        self.loader = FakeRuleLoader()
+        self.loader.get_rule = self.RULES.get
+        self.loader.get_processing_order = lambda: list(self.RULES)
+
+    def test_new_segment_after_product_id_setter(self):
+        engine = FusedStageEngine(self.loader, {})
+        self.assertEqual(engine.describe(),
+                         'fused: db_match | fused: usage_probe -> enrichment -> bom_protection')
+
+    def test_queries_take_matched_product_ids(self):
+        conn = FakeConnection()
+        items = [{'product_id': 7}, {'product_id': 9, 'original_matched_product_id': 3}, {'product_name': 'x'}]
+        engine = FusedStageEngine(self.loader, {'db_conn': conn},
+                                  processing_order=['05_usage_probe.yaml', '08_bom_protection.yaml'])
+        result = engine.run(items)
+
+        self.assertEqual([params['product_ids'] for _, params in conn.executed], [[3, 7, 9], [3, 7, 9]])
+        self.assertEqual(conn.executed[0][1]['days_back'], 30)
+        self.assertEqual(result[0]['inferred_role'], 'salable')
+        self.assertTrue(result[0]['bom_protected'])
+        self.assertNotIn('bom_protected', result[1])
+        self.assertNotIn('inferred_role', result[2])
+
+    def test_no_matched_products_no_queries(self):
+        conn = FakeConnection()
+        engine = FusedStageEngine(self.loader, {'db_conn': conn}, processing_order=['05_usage_probe.yaml'])
+        engine.run([{'product_name': 'x'}])
+        self.assertEqual(conn.executed, [])
+
+
+class TestShardedExecution(unittest.TestCase):
+    """Test sharding items across worker processes"""
+
+    def setUp(self):
+        self.loader = FakeRuleLoader()
+
+    def test_shards_keep_receipts_together(self):
+        items = [{'receipt_id': f"R{i // 3}", 'receipt_data': {'vendor': 'Costco' if i < 6 else 'Aldi'}}
+                 for i in range(12)]
+        shards = shard_items(items, 'receipt', 3)
+        self.assertEqual(sorted(index for shard in shards for index in shard), list(range(12)))
+        for shard in shards:
+            self.assertEqual(len(shard) % 3, 0)
+        self.assertEqual(shard_items(items, 'vendor', 4), [list(range(6)), list(range(6, 12))])
+
+    def test_parallel_matches_serial(self):
+        items = [dict(item, receipt_id=f"R{i}") for i in range(20) for item in make_items()]
+        serial = FusedStageEngine(self.loader, {}, audit=True)
+        expected = serial.run([dict(item) for item in items])
+
+        with mock.patch.object(stage_engine, 'MIN_PARALLEL_ITEMS', 0):
+            parallel = FusedStageEngine(self.loader, {}, audit=True, workers=2)
+            result = parallel.run([dict(item) for item in items])
+
+        self.assertEqual(result, expected)
+        self.assertEqual(parallel.audit_trail, serial.audit_trail)
+
+    def test_invalid_shard_key(self):
+        with self.assertRaises(ValueError):
+            FusedStageEngine(self.loader, {}, shard_by='store')
+
+
+if __name__ == '__main__':
+    unittest.main()
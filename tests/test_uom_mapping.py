@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+UoM Mapping Tests
+Tests the uom_mapping stage's per-(receipt UoM, product UoM) resolution table.
+"""
+
+import os
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.rule_executor import apply_uom_mapping_stage, prepare_uom_mapping_stage
+
+STAGE_CONFIG = {
+    'receipt_uom_field': 'receipt_uom_raw',
+    'normalize': {'lowercase': True, 'strip_spaces': True, 'alias': {'lb': ['lbs', 'pound']}},
+    'if_category_mismatch': {'add_review_reason': 'UoM category mismatch (fallback to product UoM)'},
+}
+UOMS = {'lb': {'id': 2, 'name': 'lb'}, 'units': {'id': 1, 'name': 'Units'}}
+
+
+class _Matcher:
+    def __init__(self):
+        self.calls = []
+
+    def match_uom(self, uom):
+        self.calls.append(uom)
+        return UOMS.get(uom)
+
+
+class TestUomMapping(unittest.TestCase):
+    def setUp(self):
+        self.matcher = _Matcher()
+        self.state = prepare_uom_mapping_stage(STAGE_CONFIG, {'product_matcher': self.matcher})
+        self.state['uom_category'] = {1: (1, 'Unit'), 2: (2, 'Weight'), 3: (2, 'Weight')}
+
+    def apply(self, receipt_uom, product_uom_id, **fields):
+        return apply_uom_mapping_stage(dict(fields, receipt_uom_raw=receipt_uom, product_uom_id=product_uom_id),
+                                       self.state)
+
+    def test_pairs_resolved_once(self):
+        items = [self.apply(uom, 3) for uom in ('LBS', 'lbs ', 'pound', 'lbs')]
+
+        self.assertEqual(self.matcher.calls, ['lb', 'lb'])
+        self.assertEqual(len(self.state['resolutions']), 2)
+        self.assertEqual({item['final_uom_id'] for item in items}, {2})
+        self.assertEqual({item['uom_category_mismatch'] for item in items}, {False})
+
+    def test_review_reasons_applied_per_item(self):
+        first = self.apply('units', 2)
+        second = self.apply('units', 2, review_reasons=['UoM category mismatch: seen upstream'])
+        unmatched = self.apply('bushel', 2)
+        unmapped = self.apply('bushel', None)
+
+        self.assertTrue(first['uom_category_mismatch'])
+        self.assertEqual(first['review_reasons'],
+                         ["UoM category mismatch: receipt UoM category != product default UoM category"])
+        self.assertEqual(second['review_reasons'], ['UoM category mismatch: seen upstream'])
+        self.assertEqual(unmatched['final_uom_id'], 2)
+        self.assertTrue(unmatched['uom_conflict'])
+        self.assertEqual(unmatched['review_reasons'], ['UoM category mismatch (fallback to product UoM)'])
+        self.assertIsNone(unmatched['uom_category_mismatch'])
+        self.assertEqual(unmapped['review_reasons'], ['No UoM could be mapped'])
+        self.assertNotIn('final_uom_id', unmapped)
+
+
+if __name__ == '__main__':
+    unittest.main()
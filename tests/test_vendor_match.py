@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Vendor Match Tests
+Tests parsed vendor conditions and receipt-level vendor matching.
+"""
+
+import os
+import unittest
+from pathlib import Path
+
+# Setup path
+TEST_DIR = Path(__file__).parent
+PROJECT_ROOT = TEST_DIR.parent
+os.chdir(PROJECT_ROOT)
+
+from step3_mapping.rule_executor import (
+    VendorCondition,
+    apply_vendor_match_stage,
+    parse_condition,
+    prepare_vendor_match_stage,
+)
+
+STAGE_CONFIG = {'rules': [
+    {'name': 'instacart_costco',
+     'when_any': ['source_type == "instacart_based"', 'source_file ILIKE "%instacart%"'],
+     'and_also': ['receipt_text ILIKE "%costco%"'],
+     'set': {'vendor_code': 'IC-COSTCO'}},
+    {'name': 'instacart_other',
+     'when': 'source_type == "instacart_based"',
+     'set': {'vendor_code': 'IC-OTHER', 'needs_review': True,
+             'review_reasons': ['Instacart order without clear underlying store']}},
+]}
+
+
+class TestParseCondition(unittest.TestCase):
+    def test_conditions(self):
+        self.assertEqual(parse_condition('source_type == "Instacart_Based"'),
+                         VendorCondition('source_type', True, 'instacart_based'))
+        self.assertEqual(parse_condition('receipt_text ILIKE "%Restaurant Depot%"'),
+                         VendorCondition('receipt_text', False, 'restaurant depot'))
+        self.assertIsNone(parse_condition('vendor ILIKE "%costco%"'))
+
+
+class TestVendorMatch(unittest.TestCase):
+    def test_rules_evaluated_once_per_receipt(self):
+        state = prepare_vendor_match_stage(STAGE_CONFIG, {})
+        receipt = {'vendor': 'Instacart', 'filename': 'order.pdf', 'receipt_text': 'Costco delivery',
+                   'source_type': 'instacart_based'}
+        items = [apply_vendor_match_stage({'product_name': name, 'receipt_data': receipt,
+                                           'source_file': 'Instacart/order.pdf'}, state)
+                 for name in ('Milk', 'Eggs', 'Bread')]
+
+        self.assertEqual(len(state['receipts']), 1)
+        self.assertEqual([item['vendor_code'] for item in items], ['IC-COSTCO'] * 3)
+
+    def test_ic_other_inference_stays_per_item(self):
+        state = prepare_vendor_match_stage(STAGE_CONFIG, {})
+        receipt = {'vendor': 'Instacart', 'filename': 'order.pdf', 'source_type': 'instacart_based'}
+        kirkland, plain = [apply_vendor_match_stage({'product_name': name, 'receipt_data': receipt,
+                                                     'source_file': 'Instacart/order.pdf'}, state)
+                           for name in ('Kirkland Eggs', 'Bananas')]
+
+        self.assertEqual(kirkland['vendor_code'], 'IC-COSTCO')
+        self.assertEqual(kirkland['vendor_name'], 'IC-Costco')
+        self.assertFalse(kirkland['needs_review'])
+        self.assertNotIn('review_reasons', kirkland)
+        self.assertEqual(plain['vendor_code'], 'IC-OTHER')
+        self.assertEqual(plain['review_reasons'], ['Instacart order without clear underlying store'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,11 +26,8 @@ if _env_file.exists():
                 key, value = line.split('=', 1)
                 os.environ[key.strip()] = value.strip()
 
-# Import workflow steps
-from step1_extract.receipt_processor import ReceiptProcessor
-from step2_manual_review.main import export_to_excel, load_reviewed_excel, apply_reviewed_data
-from step3_mapping.product_matcher import ProductMatcher
-from step4_sql.generate_receipt_sql import ReceiptSQLGenerator
+# Workflow steps are imported inside the step methods, so running one step (or --help)
+# doesn't load every other step's dependencies
 from config import *
 
 
@@ -75,8 +72,8 @@ class ReceiptWorkflow:
         self.config = config or {}
         self.logger = logging.getLogger(__name__)
         
-        # Initialize step processors
-        self.step1_processor = ReceiptProcessor(self.config)
+        # Initialize step processors (step1_processor is created on first access)
+        self._step1_processor = None
         self.step3_matcher = None  # Will be initialized in step3
         self.step4_generator = None  # Will be initialized in step4
         
@@ -88,6 +85,14 @@ class ReceiptWorkflow:
         # Step-specific loggers
         self.step_loggers = {}
     
+    @property
+    def step1_processor(self):
+        """Step 1 ReceiptProcessor, created on first access"""
+        if self._step1_processor is None:
+            from step1_extract.receipt_processor import ReceiptProcessor
+            self._step1_processor = ReceiptProcessor(self.config)
+        return self._step1_processor
+    
     def _setup_step_logging(self, log_dir: Path, step_name: str):
         """Setup step-specific logging to a directory
         
@@ -302,6 +307,7 @@ class ReceiptWorkflow:
         self.logger.info(f"Log directory: {step_log_dir}")
         
         # Export to Excel
+        from step2_manual_review.main import export_to_excel
         excel_file = export_to_excel(input_path, output_path, filename)
         
         if excel_file and excel_file.exists():
@@ -342,6 +348,7 @@ class ReceiptWorkflow:
         step1_output_path = Path(step1_output_dir)
         
         # Load reviewed Excel
+        from step2_manual_review.main import load_reviewed_excel, apply_reviewed_data
         reviewed_data = load_reviewed_excel(reviewed_excel_path)
         
         # Load original extracted data
@@ -353,8 +360,9 @@ class ReceiptWorkflow:
                     extracted = json.load(f)
                     all_extracted.update(extracted)
         
-        # Apply reviewed data
-        updated_data = apply_reviewed_data(all_extracted, reviewed_data)
+        # Apply reviewed data (only changed items are updated; changes logged to review_changes.csv)
+        updated_data = apply_reviewed_data(all_extracted, reviewed_data,
+                                           change_log_path=step1_output_path / 'review_changes.csv')
         
         # Save updated data back to Step 1 output (will be used by Step 3)
         output_file = step1_output_path / 'reviewed_extracted_data.json'
@@ -485,6 +493,7 @@ class ReceiptWorkflow:
             self.logger.error(f"Database dump JSON not found: {db_dump_json}")
             return {}
         
+        from step3_mapping.product_matcher import ProductMatcher
         self.step3_matcher = ProductMatcher(
             db_dump_json,
             mapping_file=mapping_file,
@@ -541,16 +550,23 @@ class ReceiptWorkflow:
         return mapped_data
     
     def step4_generate_sql(self, input_dir: Optional[str] = None,
-                           output_dir: Optional[str] = None) -> List[str]:
+                           output_dir: Optional[str] = None,
+                           workers: Optional[int] = None,
+                           consolidated: Optional[bool] = None) -> List[str]:
         """
         Step 4: Generate SQL files
         
         Creates SQL INSERT statements for purchase orders and lines from mapped receipt data.
-        Only reads from input directory (Step 3 output).
+        Only reads from input directory (Step 3 output). Receipts are generated in shards
+        on a process pool. The PO ID ledger is synced with the database first (config
+        PO_ID_ALLOW_UNSYNCED skips the sync and allows a ledger that was never synced).
         
         Args:
             input_dir: Input directory with mapped data from Step 3 (defaults to STEP3_OUTPUT_DIR)
             output_dir: Output directory for SQL files (defaults to STEP4_OUTPUT_DIR)
+            workers: Worker processes (defaults to config STEP4_WORKERS, else the CPU count)
+            consolidated: Also write all receipts into one purchase_orders_all.sql
+                (defaults to config STEP4_CONSOLIDATED_SQL)
             
         Returns:
             List of generated SQL file paths
@@ -579,10 +595,6 @@ class ReceiptWorkflow:
             self.logger.error("No mapped data available. Run Step 3 first.")
             return []
         
-        self.logger.info(f"Loading mapped data from: {mapped_data_file}")
-        with open(mapped_data_file, 'r', encoding='utf-8') as f:
-            mapped_data = json.load(f)
-        
         # Create output directory if it doesn't exist
         output_path.mkdir(parents=True, exist_ok=True)
         
@@ -618,40 +630,39 @@ class ReceiptWorkflow:
             self.logger.info(f"Using fruit conversion file from input: {fruit_conversion_file}")
         
         # Initialize SQL generator with updated config
+        from step4_sql.generate_receipt_sql import ReceiptSQLGenerator
         self.step4_generator = ReceiptSQLGenerator(step4_config)
         
-        # Generate SQL for each receipt
-        receipts = mapped_data.get('receipts', {})
-        matched_items = mapped_data.get('matched_items', [])
-        
-        # Group matched items by receipt_id
-        items_by_receipt = {}
-        for item in matched_items:
-            receipt_item = item.get('receipt_item', {})
-            receipt_id = receipt_item.get('receipt_id') or 'unknown'
-            if receipt_id not in items_by_receipt:
-                items_by_receipt[receipt_id] = []
-            items_by_receipt[receipt_id].append(item)
-        
-        sql_files = []
-        for receipt_id, receipt_data in receipts.items():
-            try:
-                matched_items_for_receipt = items_by_receipt.get(receipt_id, [])
-                
-                sql_file = self.step4_generator.generate_sql_for_receipt(
-                    receipt_data,
-                    matched_items_for_receipt,
-                    output_dir=str(output_path)
-                )
-                
-                if sql_file:
-                    sql_files.append(sql_file)
-                    self.logger.info(f"  ✓ Generated: {Path(sql_file).name}")
-                
-            except Exception as e:
-                self.logger.error(f"Error generating SQL for receipt {receipt_id}: {e}", exc_info=True)
+        # Seed the PO ID ledger from the database so fresh IDs don't collide with existing rows
+        if not step4_config.get('PO_ID_ALLOW_UNSYNCED', False):
+            if not self.step4_generator.sync_ids_with_database():
+                self.logger.error("Could not sync the PO ID ledger with the database; no SQL generated.")
+                self.logger.error("Set PO_ID_ALLOW_UNSYNCED (--step4-no-sync-ids) to generate with the ledger as is.")
+                return []
+        
+        # Generate SQL for each receipt (receipt groups are the process pool work units)
+        from step4_sql.mapped_input import iter_mapped_receipts
+        
+        if workers is None:
+            workers = self.config.get('STEP4_WORKERS') or os.cpu_count() or 1
+        if consolidated is None:
+            consolidated = self.config.get('STEP4_CONSOLIDATED_SQL', False)
+        
+        result = self.step4_generator.generate_sql_parallel(
+            iter_mapped_receipts(mapped_data_file),
+            output_path,
+            workers=workers,
+            shard_size=self.config.get('STEP4_SHARD_SIZE', 50),
+            consolidated_file=output_path / 'purchase_orders_all.sql' if consolidated else None
+        )
+        sql_files = result['sql_files']
         
-        self.logger.info(f"\nStep 4 Complete: Generated {len(sql_files)} SQL files")
+        if result['failed']:
+            self.logger.warning(f"Failed to generate SQL for {result['failed']} receipt(s)")
+        if result['consolidated_file']:
+            self.logger.info(f"Consolidated SQL file: {result['consolidated_file']}")
+        self.logger.info(f"\nStep 4 Complete: Generated {len(sql_files)} SQL files "
+                         f"({result['skipped']} receipt(s) without matched items)")
         
         return sql_files
     
@@ -796,6 +807,13 @@ def main():
                        help='Path to mapping file (Step 3)')
     parser.add_argument('--reviewed-excel', type=str,
                        help='Path to reviewed Excel file from Step 2 (for Step 3)')
+    parser.add_argument('--step4-workers', type=int,
+                       help='Worker processes for Step 4 SQL generation (default: CPU count)')
+    parser.add_argument('--step4-consolidated', action='store_true',
+                       help='Step 4: also write all purchase orders into one purchase_orders_all.sql')
+    parser.add_argument('--step4-no-sync-ids', action='store_true',
+                       help='Step 4: do not sync the PO ID ledger with the database (offline runs; '
+                            'generated IDs may collide with existing rows)')
     parser.add_argument('--log-level', type=str, default='INFO',
                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
     
@@ -805,7 +823,11 @@ def main():
     logger = setup_logging(args.log_level)
     
     # Initialize workflow
-    workflow = ReceiptWorkflow()
+    workflow = ReceiptWorkflow({
+        'STEP4_WORKERS': args.step4_workers,
+        'STEP4_CONSOLIDATED_SQL': args.step4_consolidated,
+        'PO_ID_ALLOW_UNSYNCED': args.step4_no_sync_ids,
+    })
     
     reviewed_excel_path = Path(args.reviewed_excel) if args.reviewed_excel else None
     